@@ -0,0 +1,188 @@
+"""
+非同期サーバーのエントリーポイント
+index.pyと同じルート・JSON形式を、Quart + motor + genaiのaioクライアントで提供する。
+Geminiの応答待ちの間も他のリクエストを処理できるため、1プロセスで多数の会話を並行して扱える。
+
+起動方法:
+    python async_index.py                          # 開発用
+    hypercorn async_index:app --bind 0.0.0.0:5002  # 本番用
+"""
+import os
+import re
+import time
+from quart import Quart, Response, g, jsonify, request
+from quart_cors import cors
+from config import config
+from repositories import get_storage
+from services.async_db_service import async_db_service
+from services.history_cache import history_cache
+from services.metrics import CONTENT_TYPE, http_request_duration, metrics
+from services.response_cache import response_cache
+from services.tracing import TRACEPARENT_HEADER, tracer
+from routes.async_threads import threads_bp
+from routes.async_messages import messages_bp
+from routes.async_usage import usage_bp
+from routes.async_search import search_bp
+
+# Quartアプリケーションの作成
+app = Quart(__name__)
+
+# CORS設定（ワイルドカードを含むオリジンは正規表現に変換）
+app = cors(
+    app,
+    allow_origin=[
+        re.compile(re.escape(origin).replace(r'\*', '.*')) if '*' in origin else origin
+        for origin in config.CORS_ORIGINS
+    ],
+    allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
+    allow_headers=[
+        "Content-Type", config.RESPONSE_CACHE_BYPASS_HEADER,
+        config.TRACE_HEADER, TRACEPARENT_HEADER
+    ],
+    expose_headers=["Retry-After", config.TRACE_HEADER]
+)
+
+
+# データベース接続
+@app.before_serving
+async def connect_database():
+    """サーバー起動時にデータベースへ接続（MongoDB以外の保存先では何もしない）"""
+    if config.STORAGE_BACKEND != 'mongo':
+        return
+    if not await async_db_service.connect():
+        print("環境変数を確認してください")
+
+
+@app.after_serving
+async def close_database():
+    """サーバー停止時にデータベース接続を閉じる"""
+    async_db_service.close()
+
+
+# メトリクス・トレース
+@app.before_request
+async def start_request_timer():
+    """リクエストの開始時刻を記録し、ルートハンドラのスパンを開始"""
+    g.request_started = time.perf_counter()
+    g.trace_span = tracer.start_trace(
+        request.endpoint or 'unmatched', request.headers, method=request.method
+    )
+
+
+@app.after_request
+async def record_request_metrics(response):
+    """ルートごとの処理時間をメトリクスとトレースに記録（ストリーミングはレスポンス開始まで）"""
+    started = g.get('request_started')
+    if started is None:
+        return response
+
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    http_request_duration.observe(
+        time.perf_counter() - started, request.method, route, str(response.status_code)
+    )
+    span = g.get('trace_span')
+    if span is not None:
+        response.headers[config.TRACE_HEADER] = span.trace.trace_id
+        tracer.end_trace(span, route=route, status_code=response.status_code)
+    return response
+
+
+# ルートの登録
+app.register_blueprint(threads_bp, url_prefix='/api')
+app.register_blueprint(messages_bp, url_prefix='/api')
+app.register_blueprint(usage_bp, url_prefix='/api')
+app.register_blueprint(search_bp, url_prefix='/api')
+
+
+# シンプルなテストエンドポイント
+@app.route('/api/test', methods=['GET'])
+async def test():
+    """最もシンプルなテストエンドポイント（index.pyと同じ形式）"""
+    return jsonify({
+        'message': 'API is working!',
+        'vercel': os.getenv('VERCEL', 'not set'),
+        'mongodb_uri_exists': bool(os.getenv('MONGODB_URI')),
+        'gemini_key_exists': bool(os.getenv('GEMINI_API_KEY'))
+    })
+
+
+# ヘルスチェックエンドポイント
+@app.route('/api/health', methods=['GET'])
+async def health_check():
+    """サーバーの稼働状況を確認（index.pyと同じ形式）"""
+    if config.STORAGE_BACKEND == 'mongo':
+        connected = async_db_service.db is not None
+    else:
+        connected = get_storage().is_connected()
+    db_status = 'connected' if connected else 'disconnected'
+
+    # 環境変数の存在確認（値は表示しない）
+    env_check = {
+        'MONGODB_URI': 'set' if os.getenv('MONGODB_URI') else 'missing',
+        'GEMINI_API_KEY': 'set' if os.getenv('GEMINI_API_KEY') else 'missing',
+        'VERCEL': 'true' if os.getenv('VERCEL') else 'false'
+    }
+
+    return jsonify({
+        'status': 'ok',
+        'mode': 'async',
+        'database': db_status,
+        'storage': config.STORAGE_BACKEND,
+        'environment_variables': env_check,
+        'environment': config.FLASK_ENV,
+        'history_cache': history_cache.stats(),
+        'response_cache': response_cache.stats()
+    }), 200
+
+
+# メトリクスエンドポイント
+@app.route('/api/metrics', methods=['GET'])
+async def metrics_endpoint():
+    """Prometheus形式のメトリクスを返す（index.pyと同じ形式）"""
+    return Response(metrics.render(), mimetype=CONTENT_TYPE)
+
+
+# ルートエンドポイント
+@app.route('/', methods=['GET'])
+async def index():
+    """APIの情報を返す（index.pyと同じ形式）"""
+    return jsonify({
+        'name': 'AI Chatbot API',
+        'version': '1.0.0',
+        'endpoints': {
+            'health': '/api/health',
+            'metrics': '/api/metrics',
+            'threads': '/api/threads',
+            'messages': '/api/threads/<thread_id>/messages',
+            'messages_stream': '/api/threads/<thread_id>/messages/stream'
+        }
+    }), 200
+
+
+# エラーハンドラー
+@app.errorhandler(404)
+async def not_found(error):
+    """404エラーハンドラー"""
+    return jsonify({'error': 'Endpoint not found'}), 404
+
+
+@app.errorhandler(500)
+async def internal_error(error):
+    """500エラーハンドラー"""
+    return jsonify({'error': 'Internal server error'}), 500
+
+
+if __name__ == '__main__':
+    # ローカル開発サーバーの起動
+    print("=" * 50)
+    print("AI Chatbot API Server (async)")
+    print("=" * 50)
+    print(f"Environment: {config.FLASK_ENV}")
+    print(f"Server running on http://localhost:{config.ASYNC_PORT}")
+    print("=" * 50)
+
+    app.run(
+        host='0.0.0.0',
+        port=config.ASYNC_PORT,
+        debug=config.DEBUG
+    )
@@ -0,0 +1,190 @@
+"""
+ホットパス（models.thread・models.messageの主な操作）のベンチマーク
+
+使い方:
+    python benchmark_hotpaths.py
+    python benchmark_hotpaths.py --threads 10000 --messages 5000 --repeat 500
+
+インメモリの保存先（STORAGE_BACKEND=memory）にスレッドと長い会話を作り、
+一覧・ページ取得・会話履歴の構築などのレイテンシ（p50/p95）を表示する。
+MongoDBもGemini APIも使わないため、ミリ秒単位で繰り返し計測できる。
+保存先の往復を除いたモデル層（ウィンドウ・履歴の選択・整形など）の回帰の検出に使い、
+MongoDBを含めた計測は benchmark_load.py で行う。
+
+tests/test_memory_repository.py が HOTPATH_BUDGET_MS を使って回帰を検出する。
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+from config import config
+from loadtest.runner import percentile
+
+# 操作ごとのp95の上限（ミリ秒）
+HOTPATH_BUDGET_MS = float(os.getenv('HOTPATH_BUDGET_MS', '10'))
+
+
+def configure():
+    """インメモリの保存先に切り替え、中身を空にする（モデルのimport前でもよい）"""
+    from repositories import reset_storage
+
+    config.STORAGE_BACKEND = 'memory'
+    config.TRACE_SAMPLE_RATE = 0.0
+    reset_storage()
+
+
+def seed(thread_count, message_count):
+    """
+    スレッドと、message_count件のメッセージを持つ長い会話を作成
+
+    Returns:
+        dict: {'thread_id': 長い会話のスレッドID, 'thread_cursor': 一覧の中ほどのカーソル,
+               'message_cursor': メッセージの中ほどのカーソル}
+    """
+    from models import message as message_model
+    from models import thread as thread_model
+
+    for index in range(thread_count):
+        thread_model.create_thread(f'ベンチマーク {index}')
+
+    thread = thread_model.create_thread('ベンチマーク（長い会話）')
+    start = datetime.utcnow() - timedelta(seconds=message_count)
+    for offset in range(0, message_count, 100):
+        docs = []
+        for index in range(offset, min(offset + 100, message_count)):
+            role = 'user' if index % 2 == 0 else 'assistant'
+            doc = message_model.build_message(thread['id'], role, f'メッセージ {index} ' * 4)
+            doc['created_at'] = start + timedelta(seconds=index)
+            docs.append(doc)
+        message_model.save_messages(thread['id'], docs)
+
+    return {
+        'thread_id': thread['id'],
+        'thread_cursor': _walk(
+            lambda cursor: thread_model.get_threads(50, cursor), thread_count // 100
+        ),
+        'message_cursor': _walk(
+            lambda cursor: message_model.get_messages_page(thread['id'], 50, before=cursor),
+            message_count // 100
+        ),
+    }
+
+
+def _walk(read_page, pages):
+    """pagesページ読み進めた位置のカーソル"""
+    cursor = None
+    for _ in range(max(1, pages)):
+        _, next_cursor = read_page(cursor)
+        if not next_cursor:
+            break
+        cursor = next_cursor
+    return cursor
+
+
+def operations(context):
+    """
+    計測する操作
+
+    Returns:
+        dict: 操作名 -> 引数なしで呼び出す関数
+    """
+    from models import message as message_model
+    from models import search as search_model
+    from models import thread as thread_model
+    from services.history_cache import history_cache
+
+    thread_id = context['thread_id']
+
+    def send_turn():
+        message_model.save_messages(thread_id, [
+            message_model.build_message(thread_id, 'user', '質問です'),
+            message_model.build_message(thread_id, 'assistant', '回答です'),
+        ])
+
+    def thread_context():
+        # キャッシュを使わずに履歴を組み立てる
+        history_cache.invalidate(thread_id)
+        message_model.get_thread_context(thread_id)
+
+    return {
+        'create_thread': lambda: thread_model.create_thread('ベンチマーク'),
+        'list_threads': lambda: thread_model.get_threads(50),
+        'list_threads_deep': lambda: thread_model.get_threads(50, context['thread_cursor']),
+        'get_thread': lambda: thread_model.get_thread_by_id(thread_id),
+        'recent_messages': lambda: message_model.get_recent_messages(thread_id, 20),
+        'older_messages': lambda: message_model.get_messages_page(
+            thread_id, 50, before=context['message_cursor']
+        ),
+        'conversation_history': lambda: message_model.get_conversation_history(
+            thread_id, token_budget=config.HISTORY_TOKEN_BUDGET
+        ),
+        'thread_context': thread_context,
+        'search': lambda: search_model.search('メッセージ 1', 20),
+        'send_turn': send_turn,
+    }
+
+
+def measure(thread_count=2000, message_count=2000, repeat=100):
+    """
+    データを作成して各操作をrepeat回計測
+
+    Returns:
+        dict: 操作名 -> {'p50_ms', 'p95_ms', 'max_ms'}
+    """
+    configure()
+    context = seed(thread_count, message_count)
+
+    results = {}
+    for name, operation in operations(context).items():
+        operation()  # 初回の遅延importなどを除く
+        samples = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            operation()
+            samples.append((time.perf_counter() - started) * 1000)
+        results[name] = {
+            'p50_ms': percentile(samples, 50),
+            'p95_ms': percentile(samples, 95),
+            'max_ms': max(samples),
+        }
+    return results
+
+
+def run(thread_count, message_count, repeat):
+    """ベンチマークを実行して結果を表示"""
+    started = time.perf_counter()
+    results = measure(thread_count, message_count, repeat)
+    elapsed = time.perf_counter() - started
+
+    print("=" * 60)
+    print(f"ホットパス: スレッド {thread_count} 件 / 会話 {message_count} 件 / 各 {repeat} 回 "
+          f"({elapsed:.1f} 秒)")
+    print("=" * 60)
+    over = []
+    for name, stats in results.items():
+        mark = ''
+        if stats['p95_ms'] > HOTPATH_BUDGET_MS:
+            mark = '  ⚠️'
+            over.append(name)
+        print(f"  {name:22s} p50={stats['p50_ms']:7.3f} p95={stats['p95_ms']:7.3f} "
+              f"max={stats['max_ms']:7.3f} ms{mark}")
+
+    if over:
+        print(f"\n⚠️  p95が上限 {HOTPATH_BUDGET_MS:.1f} ms を超えました: {', '.join(over)}")
+    return not over
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='モデル層のホットパスのベンチマーク')
+    parser.add_argument('--threads', type=int, default=2000, help='作成するスレッド数')
+    parser.add_argument('--messages', type=int, default=2000, help='長い会話のメッセージ数')
+    parser.add_argument('--repeat', type=int, default=100, help='操作ごとの計測回数')
+    args = parser.parse_args()
+
+    try:
+        success = run(args.threads, args.messages, args.repeat)
+        sys.exit(0 if success else 1)
+    except Exception as e:
+        print(f"エラー: {e}")
+        sys.exit(1)
@@ -0,0 +1,203 @@
+"""
+チャットAPIのロードテスト
+
+使い方:
+    python benchmark_load.py
+    python benchmark_load.py --scenario long_conversation --concurrency 16 --iterations 64
+    python benchmark_load.py --gemini-ttft 0.8 --gemini-tps 40 --mongo-latency 0.005
+    python benchmark_load.py --output after.json --compare before.json
+    python benchmark_load.py --storage memory   # MongoDBを使わずにアプリケーション層だけを計測
+    python benchmark_load.py --gemini-url http://localhost:8765   # gemini_standin.pyを使う
+
+Flaskアプリケーションをテストクライアント経由で並行に呼び出し、シナリオごとの
+スループットとp50/p95/p99を表示して、JSONファイルに書き出す。
+Gemini APIは呼ばずにスタンドイン（loadtest.standins）が遅延を模した応答を返す。
+MongoDBはローカルのmongod（MONGODB_URI、未設定ならlocalhost）に専用のデータベース
+（DB_NAME + '_loadtest'）を作り、--keep を付けなければ終了時に削除する。
+--storage memory ではインメモリの保存先を使い、MongoDBには接続しない（--mongo-latencyは無効）。
+--gemini-url を指定すると、プロセス内のスタンドインの代わりにそのURLのサーバー
+（gemini_standin.py。HTTP・SSEの処理やカセットの再生を含めて計測できる）を呼び出す。
+このとき --gemini-ttft / --gemini-tps / --gemini-tokens は無効になる。
+
+シナリオ:
+    create_thread      スレッドを作成
+    long_conversation  スレッドを作成して --turns 回メッセージを送信
+    list_threads       スレッド一覧を --pages ページ目まで読む
+    paginate_messages  --seed-messages 件のスレッドを最新から最後のページまで読む
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from datetime import datetime, timezone
+from config import config
+from loadtest import standins
+from loadtest.runner import compare, run_scenario
+from loadtest.scenarios import SCENARIOS
+
+DEFAULT_MONGODB_URI = 'mongodb://localhost:27017'
+
+
+def git_commit():
+    """現在のコミット（取得できなければNone）"""
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def configure(args):
+    """ロードテスト用に設定を上書き（アプリケーションのimport前に呼ぶ）"""
+    config.STORAGE_BACKEND = args.storage
+    config.MONGODB_URI = args.mongodb_uri or os.getenv('MONGODB_URI') or DEFAULT_MONGODB_URI
+    config.DB_NAME = f"{config.DB_NAME}_loadtest"
+    config.MONGODB_ENSURE_INDEXES = True
+    # 無料枠のクォータ・応答キャッシュ・トレースは計測の邪魔になるため無効にする
+    config.GEMINI_QUOTA_ENABLED = False
+    config.RESPONSE_CACHE_ENABLED = False
+    config.TRACE_SAMPLE_RATE = 0.0
+    if args.gemini_url:
+        config.GEMINI_BASE_URL = args.gemini_url
+
+
+def print_result(name, result):
+    """シナリオの結果を表示"""
+    print(f"\n[{name}] {result['requests']} リクエスト / {result['elapsed_s']:.1f} 秒 "
+          f"= {result['throughput_rps']:.1f} req/s, エラー {result['errors']}")
+    for operation, stats in result['operations'].items():
+        print(
+            f"  {operation:14s} n={stats['requests']:6d} "
+            f"p50={stats['p50_ms']:8.1f} p95={stats['p95_ms']:8.1f} "
+            f"p99={stats['p99_ms']:8.1f} ms"
+        )
+
+
+def run(args):
+    """ロードテストを実行して結果を書き出す"""
+    configure(args)
+
+    # 設定を上書きしてからアプリケーションを読み込む
+    from index import app
+    from repositories import get_storage
+    from services.db_service import db_service
+    from services.gemini_service import gemini_service
+    from services.response_cache import response_cache
+
+    response_cache.enabled = False
+    standins.install(
+        None if args.gemini_url else gemini_service,
+        ttft=args.gemini_ttft,
+        tokens_per_second=args.gemini_tps,
+        response_tokens=args.gemini_tokens,
+        mongo_latency=args.mongo_latency,
+        mongo_jitter=args.mongo_jitter
+    )
+
+    storage = get_storage()
+    if not storage.connect():
+        print(f"MongoDBに接続できませんでした: {config.MONGODB_URI}")
+        return False
+
+    options = {
+        'turns': args.turns,
+        'pages': args.pages,
+        'page_size': args.page_size,
+        'seed_threads': args.seed_threads,
+        'seed_messages': args.seed_messages,
+    }
+    names = list(SCENARIOS) if args.scenario == 'all' else [args.scenario]
+
+    try:
+        results = {}
+        for name in names:
+            results[name] = run_scenario(
+                app, SCENARIOS[name](options), args.concurrency, args.iterations
+            )
+            print_result(name, results[name])
+
+        report = {
+            'commit': git_commit(),
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'settings': {
+                'concurrency': args.concurrency,
+                'iterations': args.iterations,
+                'gemini_url': args.gemini_url,
+                'gemini_ttft': args.gemini_ttft,
+                'gemini_tps': args.gemini_tps,
+                'gemini_tokens': args.gemini_tokens,
+                'mongo_latency': args.mongo_latency,
+                'mongo_jitter': args.mongo_jitter,
+                'storage': config.STORAGE_BACKEND,
+                'message_storage': config.MESSAGE_STORAGE,
+                **options
+            },
+            'scenarios': results
+        }
+
+        if args.compare:
+            with open(args.compare, encoding='utf-8') as f:
+                baseline = json.load(f)
+            report['compared_to'] = baseline.get('commit')
+            report['changes_pct'] = compare(results, baseline.get('scenarios', {}))
+            print(f"\n{args.compare}（{baseline.get('commit')}）との比較 (%)")
+            for name, changes in report['changes_pct'].items():
+                formatted = ', '.join(f"{key}={value:+.1f}" for key, value in changes.items())
+                print(f"  {name:18s} {formatted}")
+
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n結果を書き出しました: {args.output}")
+        return sum(result['errors'] for result in results.values()) == 0
+    finally:
+        if storage.name == 'mongo':
+            if not args.keep:
+                db_service.client.drop_database(config.DB_NAME)
+            db_service.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='チャットAPIのロードテスト')
+    parser.add_argument('--scenario', choices=['all', *SCENARIOS], default='all',
+                        help='実行するシナリオ')
+    parser.add_argument('--concurrency', type=int, default=8, help='並列数')
+    parser.add_argument('--iterations', type=int, default=32,
+                        help='シナリオごとの実行回数（全ワーカーの合計）')
+    parser.add_argument('--turns', type=int, default=10,
+                        help='long_conversationで送信するメッセージ数')
+    parser.add_argument('--pages', type=int, default=5, help='list_threadsで読むページ数')
+    parser.add_argument('--page-size', type=int, default=50, help='1ページの件数')
+    parser.add_argument('--seed-threads', type=int, default=300,
+                        help='list_threadsの前に作成するスレッド数')
+    parser.add_argument('--seed-messages', type=int, default=1000,
+                        help='paginate_messagesのスレッドのメッセージ数')
+    parser.add_argument('--gemini-ttft', type=float, default=0.3,
+                        help='Geminiスタンドインの最初のトークンまでの時間（秒）')
+    parser.add_argument('--gemini-tps', type=float, default=80,
+                        help='Geminiスタンドインの生成速度（トークン/秒）')
+    parser.add_argument('--gemini-tokens', type=int, default=200,
+                        help='Geminiスタンドインの応答トークン数')
+    parser.add_argument('--gemini-url',
+                        help='Geminiのスタンドインサーバー（gemini_standin.py）のURL')
+    parser.add_argument('--mongo-latency', type=float, default=0.002,
+                        help='MongoDBコマンドごとに加える遅延（秒）')
+    parser.add_argument('--mongo-jitter', type=float, default=0.0,
+                        help='MongoDBの遅延に加える0〜指定秒のばらつき')
+    parser.add_argument('--storage', choices=['mongo', 'memory'], default='mongo',
+                        help='スレッド・メッセージの保存先')
+    parser.add_argument('--mongodb-uri', help=f'接続先（省略時はMONGODB_URIまたは{DEFAULT_MONGODB_URI}）')
+    parser.add_argument('--output', default='loadtest-results.json', help='結果のJSONファイル')
+    parser.add_argument('--compare', help='比較する前回の結果のJSONファイル')
+    parser.add_argument('--keep', action='store_true', help='終了後もデータベースを残す')
+    args = parser.parse_args()
+
+    try:
+        success = run(args)
+        sys.exit(0 if success else 1)
+    except Exception as e:
+        print(f"エラー: {e}")
+        sys.exit(1)
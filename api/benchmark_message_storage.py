@@ -0,0 +1,172 @@
+"""
+メッセージの保存形式（1メッセージ1ドキュメント / バケット）を比較するベンチマーク
+
+使い方:
+    python benchmark_message_storage.py
+    python benchmark_message_storage.py --threads 20 --messages 2000 --repeat 50 --keep
+
+専用のデータベース（DB_NAME + '_bench'）に同じ会話を両方の形式で作成し、
+models.messageの読み込み処理のレイテンシ（p50/p95）と、コレクション・インデックスの
+サイズを表示する。--keep を付けなければ終了時にデータベースを削除する。
+"""
+import argparse
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+from bson import ObjectId
+from config import config
+from models import message as message_model
+from models import message_buckets
+from services.db_service import db_service
+
+LAYOUTS = ('document', 'bucket')
+
+
+def seed(thread_count, message_count, content_length):
+    """
+    両方の保存形式に同じ会話を作成
+
+    Returns:
+        list: 作成したスレッドIDのリスト
+    """
+    messages = db_service.get_messages_collection()
+    start = datetime.utcnow() - timedelta(days=1)
+    thread_ids = []
+
+    for _ in range(thread_count):
+        thread_oid = ObjectId()
+        thread_ids.append(thread_oid)
+        docs = [
+            {
+                '_id': ObjectId(),
+                'thread_id': thread_oid,
+                'role': 'user' if i % 2 == 0 else 'assistant',
+                'content': ('あいうえお' * content_length)[:content_length],
+                'pinned': i == 0,
+                'created_at': start + timedelta(milliseconds=i)
+            }
+            for i in range(message_count)
+        ]
+        messages.insert_many(docs)
+        message_buckets.append(thread_oid, docs)
+
+    return thread_ids
+
+
+def scenarios(thread_oid):
+    """計測する読み込み処理（名前 -> 引数なしの関数）"""
+    thread_id = str(thread_oid)
+    _, middle = message_model.get_messages_page(thread_id, 500)
+    return {
+        'latest_page': lambda: message_model.get_messages_page(thread_id, 50),
+        'deep_page': lambda: message_model.get_messages_page(thread_id, 50, before=middle),
+        'history': lambda: message_model.read_history(thread_oid, config.HISTORY_TOKEN_BUDGET),
+        'full_thread': lambda: message_model.get_messages_by_thread(thread_id),
+    }
+
+
+def measure(thread_ids, repeat):
+    """
+    現在のMESSAGE_STORAGEで各処理のレイテンシを計測
+
+    Returns:
+        dict: 処理名 -> {'p50_ms', 'p95_ms'}
+    """
+    samples = {}
+    for _ in range(repeat):
+        for thread_oid in thread_ids:
+            for name, run in scenarios(thread_oid).items():
+                started = time.perf_counter()
+                run()
+                samples.setdefault(name, []).append((time.perf_counter() - started) * 1000)
+
+    return {
+        name: {
+            'p50_ms': statistics.median(values),
+            'p95_ms': statistics.quantiles(values, n=20)[-1] if len(values) > 1 else values[0]
+        }
+        for name, values in samples.items()
+    }
+
+
+def collection_sizes():
+    """保存形式ごとのドキュメント数・データサイズ・インデックスサイズ（バイト）"""
+    sizes = {}
+    for layout, name in (
+        ('document', config.MESSAGES_COLLECTION),
+        ('bucket', config.MESSAGE_BUCKETS_COLLECTION),
+    ):
+        stats = db_service.db.command('collStats', name)
+        sizes[layout] = {
+            'documents': stats['count'],
+            'storage_bytes': stats['storageSize'],
+            'index_bytes': stats['totalIndexSize']
+        }
+    return sizes
+
+
+def run(thread_count, message_count, content_length, repeat, keep=False):
+    """ベンチマークを実行して結果を表示"""
+    if not db_service.connect():
+        print("MongoDBに接続できませんでした")
+        return False
+
+    # 本番のデータベースには触れない
+    bench_name = f"{config.DB_NAME}_bench"
+    db_service.db = db_service.client[bench_name]
+    db_service.ensure_indexes()
+    original_storage = config.MESSAGE_STORAGE
+
+    try:
+        print(f"データ作成中: {thread_count} スレッド x {message_count} メッセージ ...")
+        thread_ids = seed(thread_count, message_count, content_length)
+
+        print("=" * 60)
+        print("読み込みレイテンシ (ms)")
+        print("=" * 60)
+        results = {}
+        for layout in LAYOUTS:
+            config.MESSAGE_STORAGE = layout
+            results[layout] = measure(thread_ids, repeat)
+
+        for name in results['document']:
+            doc, bucket = results['document'][name], results['bucket'][name]
+            print(
+                f"  {name:12s} document p50={doc['p50_ms']:7.2f} p95={doc['p95_ms']:7.2f} | "
+                f"bucket p50={bucket['p50_ms']:7.2f} p95={bucket['p95_ms']:7.2f}"
+            )
+
+        print("\n" + "=" * 60)
+        print("コレクションサイズ")
+        print("=" * 60)
+        for layout, size in collection_sizes().items():
+            print(
+                f"  {layout:8s} documents={size['documents']:8d} "
+                f"storage={size['storage_bytes'] / 1024:10.1f} KiB "
+                f"index={size['index_bytes'] / 1024:10.1f} KiB"
+            )
+        return True
+    finally:
+        config.MESSAGE_STORAGE = original_storage
+        if not keep:
+            db_service.client.drop_database(bench_name)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='メッセージの保存形式のベンチマーク')
+    parser.add_argument('--threads', type=int, default=10, help='スレッド数')
+    parser.add_argument('--messages', type=int, default=1000, help='スレッドあたりのメッセージ数')
+    parser.add_argument('--content-length', type=int, default=200, help='メッセージの文字数')
+    parser.add_argument('--repeat', type=int, default=20, help='計測の繰り返し回数')
+    parser.add_argument('--keep', action='store_true', help='終了後もデータベースを残す')
+    args = parser.parse_args()
+
+    try:
+        success = run(args.threads, args.messages, args.content_length, args.repeat, args.keep)
+        sys.exit(0 if success else 1)
+    except Exception as e:
+        print(f"エラー: {e}")
+        sys.exit(1)
+    finally:
+        db_service.close()
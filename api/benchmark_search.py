@@ -0,0 +1,162 @@
+"""
+全文検索のパイプライン（repositories.mongo.build_search_pipeline）のベンチマーク
+
+使い方:
+    python benchmark_search.py
+    python benchmark_search.py --entries 50000 --repeat 20 --keep
+
+専用のデータベース（DB_NAME + '_bench'）のsearch_entriesに、すべてに一致する語と
+まれにしか一致しない語を含むエントリを作成し、実際のMongoDBでの検索のレイテンシ（p50/p95）を
+候補の上限（SEARCH_MAX_CANDIDATES）あり・なしで比較する。
+一致が多い語ほど、上限なしでは全件の並べ替えになりページごとに遅くなる。
+--keep を付けなければ終了時にデータベースを削除する。
+"""
+import argparse
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+from bson import ObjectId
+from config import config
+from models.search import split_results
+from repositories.base import search_entry
+from repositories.mongo import MongoSearchRepository, build_search_writes
+from services.db_service import db_service
+from services.search_tokenizer import query_terms
+
+# すべてのエントリに含まれる語と、RARE_EVERY件に1件だけ含まれる語
+COMMON_WORD = '会議'
+RARE_WORD = '棚卸し'
+RARE_EVERY = 500
+FILLER = ['資料', '確認', '予定', 'レビュー', 'デプロイ', '問い合わせ', '見積もり', '障害']
+
+
+def seed(entry_count, batch_size=1000):
+    """
+    検索用のエントリを作成（スレッド100件ごとにタイトルを1件含める）
+
+    Returns:
+        int: 作成したエントリ数
+    """
+    collection = db_service.get_collection(config.SEARCH_COLLECTION)
+    rng = random.Random(0)
+    start = datetime.utcnow() - timedelta(days=1)
+    thread_oid = ObjectId()
+    batch = []
+
+    for i in range(entry_count):
+        if i % 100 == 0:
+            thread_oid = ObjectId()
+            thread = {'_id': thread_oid, 'title': f'{COMMON_WORD}メモ {i}', 'created_at': start}
+            batch.append(search_entry('thread', thread, thread_oid))
+            continue
+
+        words = rng.sample(FILLER, 3) + [COMMON_WORD] * rng.randint(1, 3)
+        if i % RARE_EVERY == 0:
+            words.append(RARE_WORD)
+        rng.shuffle(words)
+        message = {
+            '_id': ObjectId(),
+            'role': 'user',
+            'content': 'の'.join(words),
+            'created_at': start + timedelta(milliseconds=i)
+        }
+        batch.append(search_entry('message', message, thread_oid))
+
+        if len(batch) >= batch_size:
+            collection.bulk_write(build_search_writes(batch), ordered=False)
+            batch = []
+
+    if batch:
+        collection.bulk_write(build_search_writes(batch), ordered=False)
+    return entry_count
+
+
+def measure(terms, limit, pages, repeat):
+    """
+    最初のページと、カーソルでpagesページ目まで読んだ各ページのレイテンシを計測
+
+    Returns:
+        dict: {'first_page': {'p50_ms', 'p95_ms'}, 'next_pages': {...}}
+    """
+    repository = MongoSearchRepository()
+    samples = {'first_page': [], 'next_pages': []}
+
+    for _ in range(repeat):
+        cursor = None
+        for page in range(pages):
+            started = time.perf_counter()
+            _, cursor = split_results(repository.search(terms, limit + 1, cursor), limit)
+            elapsed = (time.perf_counter() - started) * 1000
+            samples['first_page' if page == 0 else 'next_pages'].append(elapsed)
+            if not cursor:
+                break
+
+    return {
+        name: {
+            'p50_ms': statistics.median(values),
+            'p95_ms': statistics.quantiles(values, n=20)[-1] if len(values) > 1 else values[0]
+        }
+        for name, values in samples.items()
+        if values
+    }
+
+
+def run(entry_count, limit, pages, repeat, keep=False):
+    """ベンチマークを実行して結果を表示"""
+    if not db_service.connect():
+        print("MongoDBに接続できませんでした")
+        return False
+
+    # 本番のデータベースには触れない
+    bench_name = f"{config.DB_NAME}_bench"
+    db_service.db = db_service.client[bench_name]
+    db_service.ensure_indexes()
+    original_candidates = config.SEARCH_MAX_CANDIDATES
+
+    try:
+        print(f"データ作成中: {entry_count} エントリ ...")
+        seed(entry_count)
+
+        print("=" * 72)
+        print(f"検索レイテンシ (ms)  limit={limit} pages={pages} repeat={repeat}")
+        print("=" * 72)
+        settings = (
+            (f'上限{original_candidates}', original_candidates),
+            ('上限なし', entry_count + 1),
+        )
+        for query in (COMMON_WORD, RARE_WORD):
+            terms = query_terms(query)
+            for label, candidates in settings:
+                config.SEARCH_MAX_CANDIDATES = candidates
+                results = measure(terms, limit, pages, repeat)
+                line = ' | '.join(
+                    f"{name} p50={value['p50_ms']:7.2f} p95={value['p95_ms']:7.2f}"
+                    for name, value in results.items()
+                )
+                print(f"  {query:6s} {label:10s} {line}")
+        return True
+    finally:
+        config.SEARCH_MAX_CANDIDATES = original_candidates
+        if not keep:
+            db_service.client.drop_database(bench_name)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='全文検索のパイプラインのベンチマーク')
+    parser.add_argument('--entries', type=int, default=20000, help='作成するエントリ数')
+    parser.add_argument('--limit', type=int, default=20, help='1ページの件数')
+    parser.add_argument('--pages', type=int, default=5, help='カーソルで読むページ数')
+    parser.add_argument('--repeat', type=int, default=10, help='計測の繰り返し回数')
+    parser.add_argument('--keep', action='store_true', help='終了後もデータベースを残す')
+    args = parser.parse_args()
+
+    try:
+        success = run(args.entries, args.limit, args.pages, args.repeat, args.keep)
+        sys.exit(0 if success else 1)
+    except Exception as e:
+        print(f"エラー: {e}")
+        sys.exit(1)
+    finally:
+        db_service.close()
@@ -0,0 +1,175 @@
+"""
+コールドスタート（index.pyのimport）にかかる時間を計測するベンチマーク
+
+使い方:
+    python benchmark_startup.py
+    python benchmark_startup.py --repeat 10 --top 30
+    python benchmark_startup.py --local   # VERCELを設定せずに計測（.envの読み込みを含む）
+
+新しいPythonプロセスで `python -X importtime -c "import index"` を実行し、
+パッケージごと・アプリケーションのモジュールごとのimport時間を表示する。
+初回はバイトコードのコンパイルが入るため、複数回計測した中央値を使う。
+
+tests/test_startup.py が IMPORT_BUDGET_MS と LAZY_MODULES を使って回帰を検出する。
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+API_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# index.pyのimport時間の上限（ミリ秒）
+IMPORT_BUDGET_MS = float(os.getenv('STARTUP_IMPORT_BUDGET_MS', '1500'))
+
+# コールドスタートでは読み込まず、最初に使うときまで遅らせるモジュール
+LAZY_MODULES = ('google.genai', 'httpx', 'dotenv')
+
+# アプリケーション自身のモジュール（パッケージ単位に集計しない）
+APP_PACKAGES = ('index', 'config', 'routes', 'models', 'services')
+
+
+def profile_imports(module='index', vercel=True):
+    """
+    新しいプロセスでモジュールをimportし、-X importtimeの結果を集める
+
+    Args:
+        module (str): importするモジュール
+        vercel (bool): VERCEL環境変数を設定してサーバーレス環境と同じ条件にするか
+
+    Returns:
+        dict: モジュール名 -> {'self_us': 自身の時間, 'cumulative_us': 依存を含む時間}
+
+    Raises:
+        RuntimeError: importに失敗した場合
+    """
+    env = dict(os.environ)
+    if vercel:
+        env['VERCEL'] = '1'
+    else:
+        env.pop('VERCEL', None)
+
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=API_DIR,
+        env=env,
+        capture_output=True,
+        text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"{module}のimportに失敗しました:\n{result.stderr[-2000:]}")
+    return parse_importtime(result.stderr)
+
+
+def parse_importtime(output):
+    """
+    -X importtimeの出力を解析
+
+    Args:
+        output (str): 標準エラー出力
+
+    Returns:
+        dict: モジュール名 -> {'self_us', 'cumulative_us'}
+    """
+    modules = {}
+    for line in output.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue  # 見出し行
+        modules[fields[2].strip()] = {
+            'self_us': int(fields[0]),
+            'cumulative_us': int(fields[1])
+        }
+    return modules
+
+
+def breakdown(modules):
+    """
+    import時間を集計
+
+    Args:
+        modules (dict): parse_importtimeの結果
+
+    Returns:
+        dict: {
+            'packages': 外部パッケージ名 -> 自身の時間の合計（マイクロ秒）,
+            'app': アプリケーションのモジュール名 -> 自身の時間（マイクロ秒）
+        }
+    """
+    packages = {}
+    app = {}
+    for name, times in modules.items():
+        top = name.split('.')[0]
+        if top in APP_PACKAGES:
+            app[name] = times['self_us']
+        else:
+            packages[top] = packages.get(top, 0) + times['self_us']
+    return {'packages': packages, 'app': app}
+
+
+def measure(repeat, module='index', vercel=True):
+    """
+    import時間を複数回計測
+
+    Returns:
+        dict: {
+            'total_ms': 中央値のimport時間,
+            'samples_ms': 各回のimport時間,
+            'modules': 中央値に最も近い回のモジュール別の時間
+        }
+    """
+    runs = []
+    for _ in range(repeat):
+        modules = profile_imports(module, vercel)
+        runs.append((modules[module]['cumulative_us'] / 1000, modules))
+
+    samples = [total for total, _ in runs]
+    median = statistics.median(samples)
+    _, modules = min(runs, key=lambda run: abs(run[0] - median))
+    return {'total_ms': median, 'samples_ms': samples, 'modules': modules}
+
+
+def run(repeat, top, vercel=True):
+    """ベンチマークを実行して結果を表示"""
+    # 1回目はバイトコードのコンパイルを含むため捨てる
+    profile_imports('index', vercel)
+    result = measure(repeat, 'index', vercel)
+    summary = breakdown(result['modules'])
+
+    print("=" * 60)
+    print(f"index.py のimport時間: {result['total_ms']:.1f} ms "
+          f"(中央値 / {repeat}回, 上限 {IMPORT_BUDGET_MS:.0f} ms)")
+    print("=" * 60)
+
+    print(f"\nパッケージ別（自身の時間の合計, 上位{top}件）")
+    for name, us in sorted(summary['packages'].items(), key=lambda item: -item[1])[:top]:
+        print(f"  {name:30s} {us / 1000:8.2f} ms")
+
+    print("\nアプリケーションのモジュール")
+    for name, us in sorted(summary['app'].items(), key=lambda item: -item[1]):
+        print(f"  {name:30s} {us / 1000:8.2f} ms")
+
+    loaded = [name for name in LAZY_MODULES if name in result['modules']]
+    if loaded:
+        print(f"\n⚠️  起動時に読み込まれています（遅延importの対象）: {', '.join(loaded)}")
+
+    return result['total_ms'] <= IMPORT_BUDGET_MS and not loaded
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='コールドスタートのimport時間のベンチマーク')
+    parser.add_argument('--repeat', type=int, default=5, help='計測の繰り返し回数')
+    parser.add_argument('--top', type=int, default=20, help='表示するパッケージ数')
+    parser.add_argument('--local', action='store_true',
+                        help='VERCELを設定せずに計測する')
+    args = parser.parse_args()
+
+    try:
+        success = run(args.repeat, args.top, vercel=not args.local)
+        sys.exit(0 if success else 1)
+    except Exception as e:
+        print(f"エラー: {e}")
+        sys.exit(1)
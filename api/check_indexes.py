@@ -0,0 +1,56 @@
+"""
+MongoDBインデックスの状態を確認するスクリプト
+
+使い方:
+    python check_indexes.py           # 不足・未使用のインデックスを表示
+    python check_indexes.py --create  # 不足しているインデックスを作成してから表示
+"""
+import sys
+from services.db_service import db_service
+
+
+def check_indexes(create=False):
+    """登録済みインデックスと実際のインデックスの差分を表示"""
+    if not db_service.connect():
+        print("MongoDBに接続できませんでした")
+        return False
+
+    if create:
+        # connect時にも作成される（MONGODB_ENSURE_INDEXES）が、結果を表示するために明示的に呼ぶ
+        for collection_name, names in db_service.ensure_indexes().items():
+            print(f"作成/確認済み ({collection_name}): {', '.join(names)}")
+        print()
+
+    print("=" * 60)
+    print("MongoDB インデックス状況")
+    print("=" * 60)
+
+    ok = True
+    for collection_name, result in db_service.index_report().items():
+        print(f"\n【{collection_name}】")
+        for name, ops in result['usage'].items():
+            print(f"  {name}: {ops} 回使用")
+
+        if result['missing']:
+            ok = False
+            print(f"  ✗ 不足: {', '.join(result['missing'])}")
+        if result['unregistered']:
+            print(f"  ⚠️  未登録: {', '.join(result['unregistered'])}")
+        if result['unused']:
+            print(f"  ⚠️  未使用: {', '.join(result['unused'])}")
+
+    print("\n" + "=" * 60)
+    print("注意: 利用回数はmongodの再起動でリセットされます")
+    print("=" * 60)
+    return ok
+
+
+if __name__ == '__main__':
+    try:
+        success = check_indexes(create='--create' in sys.argv)
+        sys.exit(0 if success else 1)
+    except Exception as e:
+        print(f"エラー: {e}")
+        sys.exit(1)
+    finally:
+        db_service.close()
@@ -3,10 +3,13 @@
 環境変数の読み込みと設定管理
 """
 import os
-from dotenv import load_dotenv
+import tempfile
 
 # .envファイルから環境変数を読み込む
-load_dotenv()
+# Vercelでは環境変数が注入済みのため、コールドスタートを短くするよう読み込まない
+if 'VERCEL' not in os.environ:
+    from dotenv import load_dotenv
+    load_dotenv()
 
 
 class Config:
@@ -30,17 +33,161 @@ class Config:
     FLASK_ENV = os.getenv('FLASK_ENV', 'production')
     DEBUG = FLASK_ENV == 'development'
 
+    # メッセージ保存とスレッド更新をトランザクションで実行するか（レプリカセットが必要）
+    MONGODB_USE_TRANSACTIONS = os.getenv('MONGODB_USE_TRANSACTIONS', 'false').lower() == 'true'
+
+    # 接続時にインデックスを作成（確認）するか
+    # Vercelではコールドスタートのたびに往復が増えるため既定で無効
+    # （make deploy がデプロイ前に check_indexes.py --create で作成する）
+    MONGODB_ENSURE_INDEXES = os.getenv(
+        'MONGODB_ENSURE_INDEXES', 'false' if 'VERCEL' in os.environ else 'true'
+    ).lower() == 'true'
+
+    # メッセージ保存時の使用量の台帳・全文検索の書き込みをバックグラウンドで行うか
+    # （services.write_behind。トランザクション有効時は使わない）
+    # Vercelでは応答後にプロセスが止まり書き込みが遅れるため既定で無効
+    WRITE_BEHIND = os.getenv(
+        'WRITE_BEHIND', 'false' if 'VERCEL' in os.environ else 'true'
+    ).lower() == 'true'
+
+    # 非同期サーバー（async_index.py）のポート
+    ASYNC_PORT = int(os.getenv('ASYNC_PORT', '5002'))
+
     # データベース名
     DB_NAME = 'ai-chat'
 
     # コレクション名
     THREADS_COLLECTION = 'threads'
     MESSAGES_COLLECTION = 'messages'
+    QUOTA_COLLECTION = 'quota_buckets'
+    RESPONSE_CACHE_COLLECTION = 'response_cache'
+    MESSAGE_BUCKETS_COLLECTION = 'message_buckets'
+    MAINTENANCE_COLLECTION = 'maintenance_state'
+    USAGE_LEDGER_COLLECTION = 'usage_ledger'
+    SEARCH_COLLECTION = 'search_entries'
+
+    # スレッド・メッセージの保存先（repositoriesパッケージ）
+    # 'mongo': MongoDB（本番）
+    # 'memory': プロセス内のインデックス付きストア（テスト・ベンチマーク用。再起動で消える）
+    STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'mongo')
+
+    # メッセージの保存形式（STORAGE_BACKEND = 'mongo' のとき）
+    # 'document': 1メッセージ1ドキュメント（messagesコレクション）
+    # 'bucket': 1スレッドのメッセージをMESSAGE_BUCKET_SIZE件ずつまとめる（message_bucketsコレクション）
+    # 切り替え時は migrate_messages.py で既存データを移行する
+    MESSAGE_STORAGE = os.getenv('MESSAGE_STORAGE', 'document')
+    MESSAGE_BUCKET_SIZE = int(os.getenv('MESSAGE_BUCKET_SIZE', '100'))
 
     # Gemini モデル設定（無料枠）
     # 推奨: models/gemini-2.5-flash-lite (軽量・高クォータ), models/gemini-2.5-flash (最新)
     GEMINI_MODEL = 'models/gemini-2.5-flash-lite'
 
+    # Gemini APIの接続先（未設定ならGoogleのAPI）
+    # ローカルのスタンドイン（gemini_standin.py）を使う場合は http://localhost:8765 などを指定する
+    GEMINI_BASE_URL = os.getenv('GEMINI_BASE_URL')
+
+    # Gemini APIのリトライ・フォールバック設定
+    # 上限超過（429）時に順に切り替えるモデル（カンマ区切り）
+    GEMINI_FALLBACK_MODELS = [
+        model.strip()
+        for model in os.getenv('GEMINI_FALLBACK_MODELS', 'models/gemini-2.5-flash').split(',')
+        if model.strip()
+    ]
+    # 1モデルあたりのリトライ回数（429/5xx・通信エラーのみ）
+    GEMINI_MAX_RETRIES = int(os.getenv('GEMINI_MAX_RETRIES', '2'))
+    GEMINI_RETRY_BASE_DELAY = float(os.getenv('GEMINI_RETRY_BASE_DELAY', '0.5'))
+    GEMINI_RETRY_MAX_DELAY = float(os.getenv('GEMINI_RETRY_MAX_DELAY', '8'))
+    # リトライ・フォールバックを含めた1リクエスト全体の制限時間（秒）
+    GEMINI_REQUEST_DEADLINE = float(os.getenv('GEMINI_REQUEST_DEADLINE', '30'))
+
+    # Gemini APIクォータ設定（クライアント側で事前に制御し、429エラーを防ぐ）
+    # 既定では無効。有効にする場合は契約中のプランの上限をGEMINI_QUOTA_RPM/TPM/RPDに設定する
+    # （下の既定値は無料枠の目安: 5 requests/minute, 20 requests/day。check_quota_limits.pyを参照）
+    GEMINI_QUOTA_ENABLED = os.getenv('GEMINI_QUOTA_ENABLED', 'false').lower() == 'true'
+    GEMINI_QUOTA_DEFAULT_LIMITS = {
+        'rpm': int(os.getenv('GEMINI_QUOTA_RPM', '5')),
+        'tpm': int(os.getenv('GEMINI_QUOTA_TPM', '250000')),
+        'rpd': int(os.getenv('GEMINI_QUOTA_RPD', '20')),
+    }
+    # モデルごとに上限が異なる場合はここに追加する
+    GEMINI_QUOTA_LIMITS = {}
+    # 枠の回復をこの秒数まで待つ（超える場合は即座に429を返す）
+    GEMINI_QUOTA_MAX_WAIT = float(os.getenv('GEMINI_QUOTA_MAX_WAIT', '5'))
+    # バケット状態の共有方法: file（同一ホストのワーカー間）/ mongo（全インスタンス）/ memory
+    GEMINI_QUOTA_STORE = os.getenv('GEMINI_QUOTA_STORE', 'file')
+    GEMINI_QUOTA_FILE = os.getenv(
+        'GEMINI_QUOTA_FILE',
+        os.path.join(tempfile.gettempdir(), 'ai-chat-gemini-quota.json')
+    )
+    # 応答トークン数の見込み（TPMの事前確保に使い、応答後に実績で精算する）
+    GEMINI_EXPECTED_OUTPUT_TOKENS = int(os.getenv('GEMINI_EXPECTED_OUTPUT_TOKENS', '1024'))
+
+    # 会話履歴設定
+    # Geminiへ送る履歴のトークン予算（推定値）。超えた分は古い順に切り捨てる
+    HISTORY_TOKEN_BUDGET = int(os.getenv('HISTORY_TOKEN_BUDGET', '8000'))
+    # 履歴として読み込むメッセージ数の上限
+    HISTORY_MAX_MESSAGES = int(os.getenv('HISTORY_MAX_MESSAGES', '200'))
+
+    # スレッドに埋め込む直近メッセージの件数（スレッドを開くときと会話履歴の構築に使用）
+    THREAD_RECENT_MESSAGES = int(os.getenv('THREAD_RECENT_MESSAGES', '30'))
+
+    # スレッド一覧に表示する最新メッセージのプレビューの文字数
+    THREAD_PREVIEW_CHARS = int(os.getenv('THREAD_PREVIEW_CHARS', '80'))
+
+    # 削除済みスレッドの後片付け（thread_reaper）の設定
+    # 1回に削除するメッセージ数と、次の削除までの待ち時間（秒）
+    REAPER_BATCH_SIZE = int(os.getenv('REAPER_BATCH_SIZE', '500'))
+    REAPER_THROTTLE_SECONDS = float(os.getenv('REAPER_THROTTLE_SECONDS', '0.1'))
+    # 孤立メッセージの検出で1回に確認するスレッドID数
+    REAPER_ORPHAN_SCAN_SIZE = int(os.getenv('REAPER_ORPHAN_SCAN_SIZE', '1000'))
+
+    # トレース設定（services.tracing）
+    # サンプリング率（0〜1）。トレースIDのヘッダーが付いたリクエストは常に記録する
+    TRACE_SAMPLE_RATE = float(os.getenv('TRACE_SAMPLE_RATE', '0'))
+    # トレースIDを受け取り、レスポンスで返すヘッダー（W3Cのtraceparentにも対応）
+    TRACE_HEADER = os.getenv('TRACE_HEADER', 'X-Trace-Id')
+    # スパンをJSON Lines形式で書き出すファイル
+    TRACE_EXPORT_PATH = os.getenv(
+        'TRACE_EXPORT_PATH',
+        os.path.join(tempfile.gettempdir(), 'ai-chat-traces.jsonl')
+    )
+    # この時間（ミリ秒）以上かかったリクエストのトレースだけを書き出す
+    TRACE_MIN_DURATION_MS = float(os.getenv('TRACE_MIN_DURATION_MS', '0'))
+
+    # ページネーション設定
+    PAGE_SIZE_DEFAULT = int(os.getenv('PAGE_SIZE_DEFAULT', '50'))
+    PAGE_SIZE_MAX = int(os.getenv('PAGE_SIZE_MAX', '200'))
+
+    # 全文検索設定（GET /api/search）
+    # メッセージの先頭からこの文字数までを検索対象にする（n-gramでインデックスが大きくなるため）
+    SEARCH_MAX_INDEXED_CHARS = int(os.getenv('SEARCH_MAX_INDEXED_CHARS', '5000'))
+    # スレッドのタイトルに一致した場合にスコアへ掛ける倍率
+    SEARCH_TITLE_BOOST = float(os.getenv('SEARCH_TITLE_BOOST', '2.0'))
+    # textScoreの上位この件数だけを並べ替えとページネーションの対象にする
+    # （よくある語で一致が多くても、並べ替えのメモリと時間をこの件数に抑える）
+    SEARCH_MAX_CANDIDATES = int(os.getenv('SEARCH_MAX_CANDIDATES', '1000'))
+
+    # 会話履歴キャッシュ設定（プロセス内LRU、0でキャッシュ無効）
+    HISTORY_CACHE_MAX_THREADS = int(os.getenv('HISTORY_CACHE_MAX_THREADS', '256'))
+    HISTORY_CACHE_MAX_BYTES = int(os.getenv('HISTORY_CACHE_MAX_BYTES', str(32 * 1024 * 1024)))
+    # 他プロセスでの書き込みを取りこぼさないよう、一定時間で再読み込みする
+    HISTORY_CACHE_TTL_SECONDS = int(os.getenv('HISTORY_CACHE_TTL_SECONDS', '300'))
+
+    # AI応答キャッシュ設定（同じモデル・要約・会話履歴への応答を再利用する）
+    RESPONSE_CACHE_ENABLED = os.getenv('RESPONSE_CACHE_ENABLED', 'false').lower() == 'true'
+    # プロセス内LRUの最大件数
+    RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', '1024'))
+    # MongoDBに保存した応答の有効期間（TTLインデックスで自動削除）
+    RESPONSE_CACHE_TTL_SECONDS = int(os.getenv('RESPONSE_CACHE_TTL_SECONDS', '86400'))
+    # このヘッダーが付いたリクエストはキャッシュを読まずにGemini APIを呼び出す
+    RESPONSE_CACHE_BYPASS_HEADER = 'X-Cache-Bypass'
+
+    # 会話要約設定
+    # 新規メッセージがこの件数に達するたびにバックグラウンドで要約を更新する
+    SUMMARY_REFRESH_INTERVAL = int(os.getenv('SUMMARY_REFRESH_INTERVAL', '20'))
+    # 要約生成に使う軽量モデル
+    SUMMARY_MODEL = os.getenv('SUMMARY_MODEL', 'models/gemini-2.5-flash-lite')
+
     # CORS設定
     # 開発環境とVercel本番環境の両方をサポート
     CORS_ORIGINS = [
@@ -0,0 +1,91 @@
+"""
+Gemini APIのスタンドインサーバーを起動
+
+使い方:
+    python gemini_standin.py                                   # flash-liteに近い遅延で応答を合成
+    python gemini_standin.py --profile congested               # 429・503を混ぜる
+    python gemini_standin.py --ttft 0.5 --tps 60 --response-tokens 100 --max-response-tokens 800
+    python gemini_standin.py --rate-limit-rate 0.1 --seed 42
+    python gemini_standin.py --record cassettes/               # 実際のAPIに中継して記録
+    python gemini_standin.py --replay cassettes/ --replay-speed 2
+
+アプリケーションやロードテストからは GEMINI_BASE_URL で接続先を指定する:
+    GEMINI_BASE_URL=http://localhost:8765 python index.py
+    python benchmark_load.py --gemini-url http://localhost:8765
+
+--record ではクライアントが送ったAPIキー（GEMINI_API_KEY）をそのまま上流に送る。
+記録は一度だけ行い、以降は --replay でクォータを使わずに同じ応答を再生する。
+"""
+import argparse
+import json
+import sys
+from loadtest.gemini_server import DEFAULT_UPSTREAM, PROFILES, GeminiStandIn, make_profile
+
+
+def main(args):
+    """サーバーを起動して、Ctrl+Cで統計を表示して終了"""
+    mode = 'record' if args.record else 'replay' if args.replay else 'fake'
+    profile = make_profile(
+        args.profile,
+        ttft=args.ttft,
+        tokens_per_second=args.tps,
+        response_tokens=args.response_tokens,
+        response_tokens_max=args.max_response_tokens,
+        rate_limit_rate=args.rate_limit_rate,
+        unavailable_rate=args.unavailable_rate,
+    )
+    standin = GeminiStandIn(
+        profile=profile,
+        mode=mode,
+        cassette_dir=args.record or args.replay,
+        upstream=args.upstream,
+        replay_speed=args.replay_speed,
+        seed=args.seed,
+        host=args.host,
+        port=args.port,
+    )
+
+    print(f"Geminiのスタンドインを起動しました: {standin.base_url}（{mode}）")
+    if mode == 'fake':
+        print(f"  プロファイル: {args.profile} {json.dumps(profile.to_dict(), ensure_ascii=False)}")
+    elif mode == 'record':
+        print(f"  記録先: {args.record}（上流: {args.upstream}）")
+    else:
+        print(f"  再生元: {args.replay}（速度 x{args.replay_speed}）")
+    print(f"  GEMINI_BASE_URL={standin.base_url} を設定して接続してください")
+
+    try:
+        standin.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        standin.httpd.server_close()
+        print(f"\n統計: {json.dumps(standin.stats, ensure_ascii=False)}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Gemini APIのスタンドインサーバー')
+    parser.add_argument('--host', default='127.0.0.1', help='待ち受けるアドレス')
+    parser.add_argument('--port', type=int, default=8765, help='待ち受けるポート')
+    parser.add_argument('--profile', choices=list(PROFILES), default='flash-lite',
+                        help='遅延・エラー率の初期値')
+    parser.add_argument('--ttft', type=float, help='最初のトークンまでの時間（秒）')
+    parser.add_argument('--tps', type=float, help='生成速度（トークン/秒）')
+    parser.add_argument('--response-tokens', type=int, help='応答のトークン数（範囲の最小値）')
+    parser.add_argument('--max-response-tokens', type=int, help='応答のトークン数の最大値')
+    parser.add_argument('--rate-limit-rate', type=float, help='429を返す割合（0〜1）')
+    parser.add_argument('--unavailable-rate', type=float, help='503を返す割合（0〜1）')
+    parser.add_argument('--seed', type=int, help='応答の長さ・エラーの発生を決める乱数のシード')
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('--record', metavar='DIR', help='上流に中継してDIRにカセットを記録')
+    group.add_argument('--replay', metavar='DIR', help='DIRのカセットを再生')
+    parser.add_argument('--upstream', default=DEFAULT_UPSTREAM, help='--recordで中継する接続先')
+    parser.add_argument('--replay-speed', type=float, default=1.0,
+                        help='--replayの再生速度（2なら記録時の半分の間隔）')
+    args = parser.parse_args()
+
+    try:
+        main(args)
+    except Exception as e:
+        print(f"エラー: {e}")
+        sys.exit(1)
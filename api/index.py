@@ -3,6 +3,7 @@ Flaskアプリケーションのメインエントリーポイント
 """
 import sys
 import os
+import time
 
 # Vercel環境でのパス設定
 if 'VERCEL' in os.environ:
@@ -11,12 +12,18 @@ if 'VERCEL' in os.environ:
     if api_dir not in sys.path:
         sys.path.insert(0, api_dir)
 
-from flask import Flask, jsonify
+from flask import Flask, Response, g, jsonify, request
 from flask_cors import CORS
 from config import config
-from services.db_service import db_service
+from repositories import get_storage
+from services.history_cache import history_cache
+from services.metrics import CONTENT_TYPE, http_request_duration, metrics
+from services.response_cache import response_cache
+from services.tracing import TRACEPARENT_HEADER, tracer
 from routes.threads import threads_bp
 from routes.messages import messages_bp
+from routes.usage import usage_bp
+from routes.search import search_bp
 
 # Flaskアプリケーションの作成
 app = Flask(__name__)
@@ -26,7 +33,11 @@ CORS(app, resources={
     r"/api/*": {
         "origins": config.CORS_ORIGINS,
         "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-        "allow_headers": ["Content-Type"]
+        "allow_headers": [
+            "Content-Type", config.RESPONSE_CACHE_BYPASS_HEADER,
+            config.TRACE_HEADER, TRACEPARENT_HEADER
+        ],
+        "expose_headers": ["Retry-After", config.TRACE_HEADER]
     }
 })
 
@@ -34,14 +45,47 @@ CORS(app, resources={
 # データベース接続
 @app.before_request
 def before_request():
-    """リクエスト前にデータベース接続を確認"""
-    if db_service.db is None:
-        db_service.connect()
+    """リクエスト前に保存先（config.STORAGE_BACKEND）への接続を確認"""
+    g.request_started = time.perf_counter()
+    # ルートハンドラのスパン（サンプリングしない場合はNone）
+    g.trace_span = tracer.start_trace(
+        request.endpoint or 'unmatched', request.headers, method=request.method
+    )
+    storage = get_storage()
+    if not storage.is_connected():
+        storage.connect()
+
+
+@app.after_request
+def record_request_metrics(response):
+    """
+    ルートごとの処理時間をメトリクスとトレースに記録
+    ストリーミングでも送信完了までを計るよう、レスポンスを閉じたときに記録する
+    """
+    started = g.get('request_started')
+    if started is None:
+        return response
+
+    # URLそのものではなくルートのパターンをラベルにする（値の種類を抑えるため）
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    labels = (request.method, route, str(response.status_code))
+    span = g.get('trace_span')
+    if span is not None:
+        response.headers[config.TRACE_HEADER] = span.trace.trace_id
+
+    def on_close():
+        http_request_duration.observe(time.perf_counter() - started, *labels)
+        tracer.end_trace(span, route=route, status_code=response.status_code)
+
+    response.call_on_close(on_close)
+    return response
 
 
 # ルートの登録
 app.register_blueprint(threads_bp, url_prefix='/api')
 app.register_blueprint(messages_bp, url_prefix='/api')
+app.register_blueprint(usage_bp, url_prefix='/api')
+app.register_blueprint(search_bp, url_prefix='/api')
 
 
 # シンプルなテストエンドポイント
@@ -66,7 +110,8 @@ def health_check():
         JSON: ステータス情報
     """
     import os
-    db_status = 'connected' if db_service.db is not None else 'disconnected'
+    storage = get_storage()
+    db_status = 'connected' if storage.is_connected() else 'disconnected'
 
     # 環境変数の存在確認（値は表示しない）
     env_check = {
@@ -78,11 +123,26 @@ def health_check():
     return jsonify({
         'status': 'ok',
         'database': db_status,
+        'storage': storage.name,
         'environment_variables': env_check,
-        'environment': config.FLASK_ENV
+        'environment': config.FLASK_ENV,
+        'history_cache': history_cache.stats(),
+        'response_cache': response_cache.stats()
     }), 200
 
 
+# メトリクスエンドポイント
+@app.route('/api/metrics', methods=['GET'])
+def metrics_endpoint():
+    """
+    Prometheus形式のメトリクスを返す
+
+    Returns:
+        text/plain: ルート・MongoDB・Gemini APIのレイテンシとカウンタ
+    """
+    return Response(metrics.render(), mimetype=CONTENT_TYPE)
+
+
 # ルートエンドポイント
 @app.route('/', methods=['GET'])
 def index():
@@ -97,8 +157,10 @@ def index():
         'version': '1.0.0',
         'endpoints': {
             'health': '/api/health',
+            'metrics': '/api/metrics',
             'threads': '/api/threads',
-            'messages': '/api/threads/<thread_id>/messages'
+            'messages': '/api/threads/<thread_id>/messages',
+            'messages_stream': '/api/threads/<thread_id>/messages/stream'
         }
     }), 200
 
@@ -130,10 +192,11 @@ if __name__ == '__main__':
     print("=" * 50)
 
     # データベース接続
-    if db_service.connect():
-        print("✓ MongoDB接続成功")
+    print(f"Storage: {config.STORAGE_BACKEND}")
+    if get_storage().connect():
+        print("✓ データベース接続成功")
     else:
-        print("✗ MongoDB接続失敗")
+        print("✗ データベース接続失敗")
         print("環境変数を確認してください")
 
     print("=" * 50)
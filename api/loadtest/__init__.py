@@ -0,0 +1 @@
+# Load Testing Package
@@ -0,0 +1,526 @@
+"""
+Gemini APIのローカルのスタンドインサーバー
+GEMINI_BASE_URLにこのサーバーを指定すると、GeminiServiceは実際のAPIの代わりにここを呼び出す
+
+エンドポイント（Gemini APIのREST版と同じパス・形式）:
+    POST /v1beta/models/{model}:generateContent
+    POST /v1beta/models/{model}:streamGenerateContent?alt=sse
+    GET  /v1beta/models
+
+モード:
+    fake    Profileの設定（TTFT・生成速度・応答の長さ・429の発生率）から応答を合成する
+    record  上流（実際のAPI）に中継し、やり取りをカセット（JSONファイル）に記録する
+    replay  カセットに記録したやり取りを、記録時の間隔で決まった順に返す
+
+カセットはリクエスト（メソッド・パス・本文）のハッシュごとに1ファイルで、
+同じリクエストに複数のやり取りが記録されていれば順に繰り返して返す。
+APIキーとヘッダーは記録しない。
+
+標準ライブラリのみで動くため、ロードテストの環境にgoogle-genaiがなくても起動できる。
+"""
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlencode, urlsplit
+from loadtest.standins import response_text
+from services.token_estimator import estimate_tokens
+
+DEFAULT_UPSTREAM = 'https://generativelanguage.googleapis.com'
+
+# 上流に中継するリクエストヘッダー
+FORWARD_HEADERS = ('content-type', 'x-goog-api-key', 'x-goog-api-client', 'user-agent')
+
+# 一覧（GET /v1beta/models）で返すモデル
+DEFAULT_MODELS = ['models/gemini-2.5-flash-lite', 'models/gemini-2.5-flash']
+
+_GENERATE_PATH = re.compile(r'^/(v1beta|v1alpha|v1)/models/([^/:]+):(generateContent|streamGenerateContent)$')
+_MODELS_PATH = re.compile(r'^/(v1beta|v1alpha|v1)/models/?$')
+
+
+class Profile:
+    """合成する応答の遅延・長さ・失敗の設定"""
+
+    def __init__(self, ttft=0.3, tokens_per_second=80, response_tokens=200,
+                 response_tokens_max=None, rate_limit_rate=0.0, unavailable_rate=0.0,
+                 retry_delay=2, chunk_tokens=20):
+        """
+        Args:
+            ttft (float): 最初のトークンまでの時間（秒）
+            tokens_per_second (float): 生成速度
+            response_tokens (int): 応答のトークン数（response_tokens_maxがあれば最小値）
+            response_tokens_max (int, optional): 応答のトークン数の最大値（範囲内で一様に選ぶ）
+            rate_limit_rate (float): 429（RESOURCE_EXHAUSTED）を返す割合（0〜1）
+            unavailable_rate (float): 503（UNAVAILABLE）を返す割合（0〜1）
+            retry_delay (int): 429に含めるretryDelay（秒）
+            chunk_tokens (int): ストリーミングの1チャンクのトークン数
+        """
+        self.ttft = ttft
+        self.tokens_per_second = tokens_per_second
+        self.response_tokens = response_tokens
+        self.response_tokens_max = response_tokens_max
+        self.rate_limit_rate = rate_limit_rate
+        self.unavailable_rate = unavailable_rate
+        self.retry_delay = retry_delay
+        self.chunk_tokens = chunk_tokens
+
+    def response_length(self, rng):
+        """応答のトークン数を選ぶ"""
+        if self.response_tokens_max and self.response_tokens_max > self.response_tokens:
+            return rng.randint(self.response_tokens, self.response_tokens_max)
+        return self.response_tokens
+
+    def to_dict(self):
+        return dict(vars(self))
+
+
+# 名前付きの設定（遅延はおおよその目安。実測に合わせて --ttft などで上書きする）
+PROFILES = {
+    'instant': dict(ttft=0.0, tokens_per_second=1_000_000, response_tokens=50),
+    'flash-lite': dict(ttft=0.35, tokens_per_second=150, response_tokens=150,
+                       response_tokens_max=600),
+    'flash': dict(ttft=0.8, tokens_per_second=90, response_tokens=200,
+                  response_tokens_max=1200),
+    'congested': dict(ttft=1.5, tokens_per_second=40, response_tokens=200,
+                      response_tokens_max=800, rate_limit_rate=0.2, unavailable_rate=0.05),
+}
+
+
+def make_profile(name='flash-lite', **overrides):
+    """
+    名前付きの設定から、Noneでない値を上書きしたProfileを作成
+
+    Raises:
+        ValueError: 名前が不明な場合
+    """
+    if name not in PROFILES:
+        raise ValueError(f"不明なプロファイルです: {name}（{', '.join(PROFILES)}）")
+    options = dict(PROFILES[name])
+    options.update({key: value for key, value in overrides.items() if value is not None})
+    return Profile(**options)
+
+
+def error_body(code, status, message, retry_delay=None):
+    """
+    Gemini APIと同じ形式のエラー本文
+    retry_delayはservices.retry_policy.retry_afterが読むRetryInfoとして含める
+    """
+    error = {'code': code, 'status': status, 'message': message}
+    if retry_delay is not None:
+        error['details'] = [{
+            '@type': 'type.googleapis.com/google.rpc.RetryInfo',
+            'retryDelay': f"{retry_delay}s",
+        }]
+    return {'error': error}
+
+
+def prompt_tokens(body):
+    """リクエスト本文（contentsとsystemInstruction）の推定トークン数"""
+    contents = list(body.get('contents') or [])
+    if body.get('systemInstruction'):
+        contents.append(body['systemInstruction'])
+    return sum(
+        estimate_tokens(part.get('text') or '')
+        for content in contents
+        for part in (content.get('parts') or [])
+    )
+
+
+def response_chunk(text, model, prompt, output, finished):
+    """generateContentの応答（ストリーミングでは1チャンク）"""
+    candidate = {'content': {'role': 'model', 'parts': [{'text': text}]}, 'index': 0}
+    if finished:
+        candidate['finishReason'] = 'STOP'
+    return {
+        'candidates': [candidate],
+        'usageMetadata': {
+            'promptTokenCount': prompt,
+            'candidatesTokenCount': output,
+            'totalTokenCount': prompt + output,
+        },
+        'modelVersion': model,
+    }
+
+
+def cassette_key(method, path, body):
+    """
+    カセットのキー（メソッド・パス・クエリ（APIキーを除く）・本文のハッシュ）
+
+    Args:
+        method (str): HTTPメソッド
+        path (str): クエリを含むパス
+        body (bytes): リクエスト本文
+
+    Returns:
+        str: 16進のハッシュ
+    """
+    parts = urlsplit(path)
+    query = urlencode(sorted(
+        (key, value) for key, value in parse_qsl(parts.query) if key != 'key'
+    ))
+    try:
+        canonical = json.dumps(json.loads(body), sort_keys=True, ensure_ascii=False)
+    except ValueError:
+        canonical = body.decode('utf-8', 'replace')
+    source = '\n'.join([method, parts.path, query, canonical])
+    return hashlib.sha256(source.encode('utf-8')).hexdigest()
+
+
+class CassetteStore:
+    """カセット（やり取りの記録）のファイル"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._loaded = {}
+        self._positions = {}
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def append(self, key, request, interaction):
+        """
+        やり取りを記録（同じキーのファイルに追記する）
+
+        Args:
+            key (str): cassette_keyのキー
+            request (dict): 確認用のリクエスト（method・path・body）
+            interaction (dict): status・body、またはstatus・events（[{'delay', 'data'}]）
+        """
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            cassette = self._read(key) or {'request': request, 'interactions': []}
+            cassette['interactions'].append(interaction)
+            temp = f"{self._path(key)}.tmp"
+            with open(temp, 'w', encoding='utf-8') as f:
+                json.dump(cassette, f, ensure_ascii=False, indent=2)
+            os.replace(temp, self._path(key))
+            self._loaded[key] = cassette
+
+    def next(self, key):
+        """
+        次に返すやり取り（記録された順に繰り返す）
+
+        Returns:
+            dict or None: やり取り（記録がなければNone）
+        """
+        with self._lock:
+            cassette = self._loaded.get(key) or self._read(key)
+            if not cassette or not cassette['interactions']:
+                return None
+            self._loaded[key] = cassette
+            position = self._positions.get(key, 0)
+            self._positions[key] = position + 1
+            interactions = cassette['interactions']
+            return interactions[position % len(interactions)]
+
+    def _read(self, key):
+        try:
+            with open(self._path(key), encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+
+class GeminiStandIn:
+    """Gemini APIのスタンドインサーバー"""
+
+    def __init__(self, profile=None, mode='fake', cassette_dir=None, upstream=DEFAULT_UPSTREAM,
+                 replay_speed=1.0, models=None, seed=None, host='127.0.0.1', port=8765):
+        """
+        Args:
+            profile (Profile, optional): fakeモードの設定（省略時はflash-lite）
+            mode (str): 'fake' / 'record' / 'replay'
+            cassette_dir (str, optional): カセットのディレクトリ（record・replayで必須）
+            upstream (str): recordモードで中継する接続先
+            replay_speed (float): replayモードの再生速度（2なら記録時の半分の間隔）
+            models (list, optional): 一覧で返すモデル名
+            seed (int, optional): 応答の長さ・エラーの発生を決める乱数のシード
+            host (str): 待ち受けるアドレス
+            port (int): 待ち受けるポート（0なら空いているポート）
+
+        Raises:
+            ValueError: モードが不明な場合、またはカセットのディレクトリがない場合
+        """
+        if mode not in ('fake', 'record', 'replay'):
+            raise ValueError(f"不明なモードです: {mode}")
+        if mode != 'fake' and not cassette_dir:
+            raise ValueError(f"{mode}モードにはカセットのディレクトリが必要です")
+
+        self.profile = profile or make_profile()
+        self.mode = mode
+        self.cassettes = CassetteStore(cassette_dir) if cassette_dir else None
+        self.upstream = upstream.rstrip('/')
+        self.replay_speed = replay_speed
+        self.models = models or DEFAULT_MODELS
+        self.stats = {
+            'requests': 0, 'rate_limited': 0, 'unavailable': 0,
+            'recorded': 0, 'replayed': 0, 'misses': 0,
+        }
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._thread = None
+
+        standin = self
+
+        class Handler(_Handler):
+            server_standin = standin
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+
+    @property
+    def base_url(self):
+        """GEMINI_BASE_URLに指定するURL"""
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        """バックグラウンドのスレッドで待ち受けを開始"""
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self.base_url
+
+    def serve_forever(self):
+        """現在のスレッドで待ち受ける（Ctrl+Cまで）"""
+        self.httpd.serve_forever()
+
+    def stop(self):
+        """待ち受けを終了"""
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self._thread:
+            self._thread.join()
+
+    def count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def draw(self):
+        """
+        このリクエストで返すエラーと応答の長さを決める
+
+        Returns:
+            tuple: (エラーのステータスコードまたはNone, 応答のトークン数)
+        """
+        with self._lock:
+            roll = self._rng.random()
+            length = self.profile.response_length(self._rng)
+        if roll < self.profile.rate_limit_rate:
+            return 429, length
+        if roll < self.profile.rate_limit_rate + self.profile.unavailable_rate:
+            return 503, length
+        return None, length
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """リクエストをモードごとの処理に振り分けるハンドラー"""
+
+    server_standin = None
+
+    def log_message(self, format, *args):
+        # リクエストごとのアクセスログは出さない（GeminiStandIn.statsで集計する）
+        pass
+
+    def do_GET(self):
+        standin = self.server_standin
+        standin.count('requests')
+        path = urlsplit(self.path).path
+        if not _MODELS_PATH.match(path):
+            self._send_json(404, error_body(404, 'NOT_FOUND', f"不明なパスです: {path}"))
+            return
+        if standin.mode == 'fake':
+            self._send_json(200, {'models': [
+                {
+                    'name': name,
+                    'displayName': name.split('/')[-1],
+                    'supportedGenerationMethods': ['generateContent', 'countTokens'],
+                }
+                for name in standin.models
+            ]})
+            return
+        self._dispatch(b'')
+
+    def do_POST(self):
+        standin = self.server_standin
+        standin.count('requests')
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        match = _GENERATE_PATH.match(urlsplit(self.path).path)
+        if not match:
+            self._send_json(404, error_body(404, 'NOT_FOUND', f"不明なパスです: {self.path}"))
+            return
+        if standin.mode != 'fake':
+            self._dispatch(body)
+            return
+
+        try:
+            request = json.loads(body or b'{}')
+        except ValueError:
+            self._send_json(400, error_body(400, 'INVALID_ARGUMENT', '本文がJSONではありません'))
+            return
+        model = f"models/{match.group(2)}"
+        if match.group(3) == 'streamGenerateContent':
+            self._fake_stream(model, request)
+        else:
+            self._fake_generate(model, request)
+
+    # ---- fake ----
+
+    def _fake_error(self, status):
+        """注入するエラーを返したらTrue"""
+        standin = self.server_standin
+        if status == 429:
+            standin.count('rate_limited')
+            self._send_json(429, error_body(
+                429, 'RESOURCE_EXHAUSTED', 'スタンドインが注入した上限超過です',
+                retry_delay=standin.profile.retry_delay
+            ))
+            return True
+        if status == 503:
+            standin.count('unavailable')
+            self._send_json(503, error_body(503, 'UNAVAILABLE', 'スタンドインが注入した一時的なエラーです'))
+            return True
+        return False
+
+    def _fake_generate(self, model, request):
+        profile = self.server_standin.profile
+        status, length = self.server_standin.draw()
+        if self._fake_error(status):
+            return
+        time.sleep(profile.ttft + length / profile.tokens_per_second)
+        self._send_json(200, response_chunk(
+            response_text(length), model, prompt_tokens(request), length, finished=True
+        ))
+
+    def _fake_stream(self, model, request):
+        profile = self.server_standin.profile
+        status, length = self.server_standin.draw()
+        if self._fake_error(status):
+            return
+
+        text = response_text(length)
+        prompt = prompt_tokens(request)
+        size = max(1, profile.chunk_tokens)
+        self._start_stream(200)
+        time.sleep(profile.ttft)
+        for start in range(0, len(text), size):
+            chunk = text[start:start + size]
+            if start > 0:
+                time.sleep(len(chunk) / profile.tokens_per_second)
+            end = start + len(chunk)
+            data = json.dumps(response_chunk(chunk, model, prompt, end, end >= len(text)),
+                              ensure_ascii=False)
+            if not self._write_event(data):
+                return
+
+    # ---- record / replay ----
+
+    def _dispatch(self, body):
+        standin = self.server_standin
+        key = cassette_key(self.command, self.path, body)
+        if standin.mode == 'record':
+            self._record(key, body)
+        else:
+            self._replay(key)
+
+    def _replay(self, key):
+        standin = self.server_standin
+        interaction = standin.cassettes.next(key)
+        if interaction is None:
+            standin.count('misses')
+            self._send_json(404, error_body(
+                404, 'NOT_FOUND', f"カセットに記録がありません: {self.command} {self.path} ({key})"
+            ))
+            return
+
+        standin.count('replayed')
+        if 'events' not in interaction:
+            self._send_json(interaction['status'], interaction['body'])
+            return
+        self._start_stream(interaction['status'])
+        for event in interaction['events']:
+            time.sleep(event['delay'] / standin.replay_speed)
+            if not self._write_event(event['data']):
+                return
+
+    def _record(self, key, body):
+        standin = self.server_standin
+        request = urllib.request.Request(
+            standin.upstream + self.path,
+            data=body if self.command == 'POST' else None,
+            method=self.command,
+            headers={
+                name: self.headers[name] for name in FORWARD_HEADERS if self.headers.get(name)
+            },
+        )
+        try:
+            response = urllib.request.urlopen(request, timeout=120)
+        except urllib.error.HTTPError as e:
+            response = e
+        except urllib.error.URLError as e:
+            self._send_json(502, error_body(502, 'UNAVAILABLE', f"上流に接続できません: {e.reason}"))
+            return
+
+        with response:
+            status = response.getcode()
+            streaming = 'text/event-stream' in (response.headers.get('Content-Type') or '')
+            summary = {
+                'method': self.command,
+                'path': urlsplit(self.path).path,
+                'body': body.decode('utf-8', 'replace'),
+            }
+            if not streaming:
+                text = response.read().decode('utf-8')
+                self._send_json(status, text)
+                interaction = {'status': status, 'body': text}
+            else:
+                self._start_stream(status)
+                events, last = [], time.monotonic()
+                for line in response:
+                    line = line.strip()
+                    if not line.startswith(b'data:'):
+                        continue
+                    now = time.monotonic()
+                    data = line[len(b'data:'):].strip().decode('utf-8')
+                    events.append({'delay': round(now - last, 4), 'data': data})
+                    last = now
+                    self._write_event(data)
+                interaction = {'status': status, 'events': events}
+
+        standin.cassettes.append(key, summary, interaction)
+        standin.count('recorded')
+
+    # ---- 応答の書き出し ----
+
+    def _send_json(self, status, body):
+        payload = (body if isinstance(body, str) else json.dumps(body, ensure_ascii=False))
+        payload = payload.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=UTF-8')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _start_stream(self, status):
+        # 長さが決まらないため、送信後に接続を閉じて終わりを伝える
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+
+    def _write_event(self, data):
+        """SSEのイベントを1つ送る（クライアントが切断していたらFalse）"""
+        try:
+            self.wfile.write(f"data: {data}\r\n\r\n".encode('utf-8'))
+            self.wfile.flush()
+            return True
+        except (BrokenPipeError, ConnectionResetError):
+            return False
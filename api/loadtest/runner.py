@@ -0,0 +1,165 @@
+"""
+ロードテストの実行と集計
+Flaskアプリケーションをテストクライアント経由で並行に呼び出し、
+リクエストごとのレイテンシからスループットとp50/p95/p99を求める
+"""
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+def percentile(values, p):
+    """
+    最近傍順位法によるパーセンタイル
+
+    Args:
+        values (list): 値のリスト
+        p (float): 0〜100
+
+    Returns:
+        float: パーセンタイル値（空ならNone）
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(p / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarize(latencies_ms, errors, elapsed):
+    """
+    レイテンシのリストを集計
+
+    Args:
+        latencies_ms (list): リクエストごとのレイテンシ（ミリ秒）
+        errors (int): 失敗したリクエスト数
+        elapsed (float): 計測にかかった時間（秒）
+
+    Returns:
+        dict: 件数・スループット・パーセンタイル
+    """
+    count = len(latencies_ms)
+    return {
+        'requests': count,
+        'errors': errors,
+        'throughput_rps': count / elapsed if elapsed > 0 else 0.0,
+        'mean_ms': sum(latencies_ms) / count if count else None,
+        'p50_ms': percentile(latencies_ms, 50),
+        'p95_ms': percentile(latencies_ms, 95),
+        'p99_ms': percentile(latencies_ms, 99),
+        'max_ms': max(latencies_ms) if latencies_ms else None
+    }
+
+
+class Session:
+    """1ワーカー分のテストクライアント（発行したリクエストのレイテンシを記録する）"""
+
+    def __init__(self, client):
+        self.client = client
+        # 操作名 -> [(レイテンシ（ミリ秒）, 成功したか)]
+        self.samples = {}
+
+    def request(self, operation, method, path, json=None, expect=200):
+        """
+        リクエストを発行して計測
+
+        Args:
+            operation (str): 集計に使う操作名
+            method (str): HTTPメソッド
+            path (str): パス
+            json (dict, optional): リクエストボディ
+            expect (int): 成功とみなすステータスコード
+
+        Returns:
+            dict: レスポンスのJSON（失敗した場合はNone）
+        """
+        started = time.perf_counter()
+        response = self.client.open(path, method=method, json=json)
+        latency_ms = (time.perf_counter() - started) * 1000
+
+        ok = response.status_code == expect
+        self.samples.setdefault(operation, []).append((latency_ms, ok))
+        return response.get_json(silent=True) if ok else None
+
+
+def run_scenario(app, scenario, concurrency, iterations):
+    """
+    シナリオをconcurrency並列で合計iterations回実行
+
+    Args:
+        app (Flask): 対象のアプリケーション
+        scenario (Scenario): 実行するシナリオ
+        concurrency (int): 並列数
+        iterations (int): シナリオを実行する合計回数
+
+    Returns:
+        dict: シナリオ全体と操作ごとの集計
+    """
+    context = scenario.setup()
+    sessions = [Session(app.test_client()) for _ in range(concurrency)]
+    remaining = [iterations]
+    lock = threading.Lock()
+
+    def worker(session):
+        while True:
+            with lock:
+                if remaining[0] <= 0:
+                    return
+                remaining[0] -= 1
+            scenario.run(session, context)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        # 例外はresult()で呼び出し元に伝える
+        for future in [executor.submit(worker, session) for session in sessions]:
+            future.result()
+    elapsed = time.perf_counter() - started
+
+    operations = {}
+    for session in sessions:
+        for operation, samples in session.samples.items():
+            operations.setdefault(operation, []).extend(samples)
+
+    all_latencies = [latency for samples in operations.values() for latency, _ in samples]
+    all_errors = sum(1 for samples in operations.values() for _, ok in samples if not ok)
+
+    result = summarize(all_latencies, all_errors, elapsed)
+    result.update({
+        'iterations': iterations,
+        'concurrency': concurrency,
+        'elapsed_s': elapsed,
+        'operations': {
+            operation: summarize(
+                [latency for latency, _ in samples],
+                sum(1 for _, ok in samples if not ok),
+                elapsed
+            )
+            for operation, samples in operations.items()
+        }
+    })
+    return result
+
+
+def compare(current, baseline):
+    """
+    前回の結果と比べたp50/p95/p99とスループットの変化率
+
+    Args:
+        current (dict): 今回の結果（シナリオ名 -> 集計）
+        baseline (dict): 比較対象の結果
+
+    Returns:
+        dict: シナリオ名 -> 指標名 -> 変化率（%）
+    """
+    changes = {}
+    for name, result in current.items():
+        before = baseline.get(name)
+        if not before:
+            continue
+        changes[name] = {
+            key: (result[key] - before[key]) / before[key] * 100
+            for key in ('throughput_rps', 'p50_ms', 'p95_ms', 'p99_ms')
+            if result.get(key) is not None and before.get(key)
+        }
+    return changes
@@ -0,0 +1,120 @@
+"""
+ロードテストのシナリオ
+各シナリオは事前のデータ作成（setup）と、1回分の操作（run）からなる
+"""
+from datetime import datetime, timedelta
+from models import message as message_model
+from models import thread as thread_model
+
+
+class Scenario:
+    """シナリオの基底クラス"""
+
+    name = None
+
+    def __init__(self, options):
+        self.options = options
+
+    def setup(self):
+        """
+        計測前のデータ作成
+
+        Returns:
+            dict: runに渡すコンテキスト
+        """
+        return {}
+
+    def run(self, session, context):
+        """
+        1回分の操作（session.requestで発行したリクエストが計測される）
+
+        Args:
+            session (Session): 計測付きのテストクライアント
+            context (dict): setupの戻り値
+        """
+        raise NotImplementedError
+
+
+class CreateThread(Scenario):
+    """スレッドを作成する"""
+
+    name = 'create_thread'
+
+    def run(self, session, context):
+        session.request('create_thread', 'POST', '/api/threads',
+                        json={'title': 'ロードテスト'}, expect=201)
+
+
+class LongConversation(Scenario):
+    """スレッドを作成し、options['turns']回メッセージを送信する"""
+
+    name = 'long_conversation'
+
+    def run(self, session, context):
+        thread = session.request('create_thread', 'POST', '/api/threads',
+                                 json={'title': 'ロードテスト'}, expect=201)
+        if thread is None:
+            return
+
+        path = f"/api/threads/{thread['id']}/messages"
+        for turn in range(self.options['turns']):
+            session.request('send_message', 'POST', path,
+                            json={'content': f'{turn}回目の質問です。続きを教えてください。'},
+                            expect=201)
+
+
+class ListThreads(Scenario):
+    """スレッド一覧をoptions['pages']ページ目まで読む"""
+
+    name = 'list_threads'
+
+    def setup(self):
+        for index in range(self.options['seed_threads']):
+            thread_model.create_thread(f'ロードテスト {index}')
+        return {}
+
+    def run(self, session, context):
+        cursor = None
+        for _ in range(self.options['pages']):
+            path = f"/api/threads?limit={self.options['page_size']}"
+            if cursor:
+                path += f'&cursor={cursor}'
+            page = session.request('list_threads', 'GET', path, expect=200)
+            cursor = page and page.get('next_cursor')
+            if not cursor:
+                break
+
+
+class PaginateMessages(Scenario):
+    """長いスレッドのメッセージを最新から最後のページまで読む"""
+
+    name = 'paginate_messages'
+
+    def setup(self):
+        thread = thread_model.create_thread('ロードテスト（メッセージ一覧）')
+        count = self.options['seed_messages']
+        start = datetime.utcnow() - timedelta(seconds=count)
+
+        for offset in range(0, count, 100):
+            docs = []
+            for index in range(offset, min(offset + 100, count)):
+                role = 'user' if index % 2 == 0 else 'assistant'
+                doc = message_model.build_message(thread['id'], role, f'メッセージ {index}')
+                doc['created_at'] = start + timedelta(seconds=index)
+                docs.append(doc)
+            message_model.save_messages(thread['id'], docs)
+        return {'thread_id': thread['id']}
+
+    def run(self, session, context):
+        base = f"/api/threads/{context['thread_id']}/messages?limit={self.options['page_size']}"
+        page = session.request('first_page', 'GET', base, expect=200)
+        cursor = page and page.get('next_cursor')
+        while cursor:
+            page = session.request('older_page', 'GET', f'{base}&before={cursor}', expect=200)
+            cursor = page and page.get('next_cursor')
+
+
+SCENARIOS = {
+    scenario.name: scenario
+    for scenario in (CreateThread, LongConversation, ListThreads, PaginateMessages)
+}
@@ -0,0 +1,148 @@
+"""
+ロードテスト用のスタンドイン
+Gemini APIの代わりに応答を返すクライアントと、MongoDBコマンドに遅延を加えるリスナー
+
+Geminiのスタンドインは実際のAPIを呼ばずに、最初のトークンまでの時間（TTFT）と
+生成速度（トークン/秒）から計算した時間だけ待ってから応答を返す。
+MongoDBはローカルのmongodを使い、コマンドごとに指定した遅延を加えてネットワーク越しの
+接続（Atlasなど）に近づける。
+"""
+import random
+import time
+from pymongo import monitoring
+from services.token_estimator import estimate_tokens
+
+# 応答テキストの元になる文（1文字約1トークン）
+_FILLER = 'これはロードテスト用のスタンドインが生成した応答です。'
+
+
+def response_text(tokens):
+    """
+    約tokensトークンの応答テキスト（1文字約1トークン）
+
+    Args:
+        tokens (int): 応答のトークン数
+
+    Returns:
+        str: tokens文字のテキスト
+    """
+    repeat = tokens // len(_FILLER) + 1
+    return (_FILLER * repeat)[:tokens]
+
+
+class FakeUsage:
+    """genaiのusage_metadataと同じ属性を持つ使用量"""
+
+    def __init__(self, prompt_tokens, output_tokens):
+        self.prompt_token_count = prompt_tokens
+        self.candidates_token_count = output_tokens
+        self.total_token_count = prompt_tokens + output_tokens
+
+
+class FakeResponse:
+    """genaiの応答（またはストリーミングの1チャンク）と同じ属性を持つ応答"""
+
+    def __init__(self, text, usage=None):
+        self.text = text
+        self.usage_metadata = usage
+
+
+class FakeModels:
+    """client.modelsのスタンドイン"""
+
+    def __init__(self, ttft, tokens_per_second, response_tokens, chunk_tokens=20):
+        self.ttft = ttft
+        self.tokens_per_second = tokens_per_second
+        self.response_tokens = response_tokens
+        self.chunk_tokens = chunk_tokens
+
+    def generate_content(self, model, contents, config=None):
+        """応答全体の生成時間だけ待ってから応答を返す"""
+        text = self._response_text()
+        time.sleep(self.ttft + self.response_tokens / self.tokens_per_second)
+        return FakeResponse(text, FakeUsage(self._prompt_tokens(contents), self.response_tokens))
+
+    def generate_content_stream(self, model, contents, config=None):
+        """TTFTだけ待ってから、生成速度に合わせてchunk_tokensずつ返す"""
+        text = self._response_text()
+        time.sleep(self.ttft)
+
+        chunks = [
+            text[start:start + self.chunk_tokens]
+            for start in range(0, len(text), self.chunk_tokens)
+        ]
+        for index, chunk in enumerate(chunks):
+            if index > 0:
+                time.sleep(len(chunk) / self.tokens_per_second)
+            usage = None
+            if index == len(chunks) - 1:
+                # 使用量は最後のチャンクに含まれる
+                usage = FakeUsage(self._prompt_tokens(contents), self.response_tokens)
+            yield FakeResponse(chunk, usage)
+
+    def list(self):
+        return []
+
+    def _response_text(self):
+        """response_tokens文字の応答テキスト"""
+        return response_text(self.response_tokens)
+
+    @staticmethod
+    def _prompt_tokens(contents):
+        """送信された会話履歴の推定トークン数"""
+        if isinstance(contents, str):
+            return estimate_tokens(contents)
+        return sum(
+            estimate_tokens(part.text or '')
+            for content in contents
+            for part in (content.parts or [])
+        )
+
+
+class FakeGeminiClient:
+    """genai.Clientのスタンドイン（同期インターフェースのみ）"""
+
+    def __init__(self, ttft=0.3, tokens_per_second=80, response_tokens=200):
+        self.models = FakeModels(ttft, tokens_per_second, response_tokens)
+
+
+class MongoLatency(monitoring.CommandListener):
+    """
+    MongoDBコマンドの送信前に遅延を加えるリスナー
+    （同期版のpymongoはコマンドを呼び出したスレッドでstartedを通知するため、その場で待つ）
+    """
+
+    def __init__(self, latency, jitter=0.0):
+        self.latency = latency
+        self.jitter = jitter
+
+    def started(self, event):
+        delay = self.latency + random.uniform(0, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+def install(gemini_service, ttft, tokens_per_second, response_tokens,
+            mongo_latency, mongo_jitter=0.0):
+    """
+    スタンドインを組み込む（db_service.connectより前に呼ぶ）
+
+    Args:
+        gemini_service (GeminiService): クライアントを差し替えるサービス
+            （Noneなら差し替えない。GEMINI_BASE_URLでスタンドインサーバーを使う場合）
+        ttft (float): 最初のトークンまでの時間（秒）
+        tokens_per_second (float): 生成速度
+        response_tokens (int): 応答のトークン数
+        mongo_latency (float): MongoDBコマンドごとに加える遅延（秒）
+        mongo_jitter (float): 遅延に加える0〜jitter秒のばらつき
+    """
+    if gemini_service is not None:
+        gemini_service.client = FakeGeminiClient(ttft, tokens_per_second, response_tokens)
+    # 以降に作成されるMongoClientすべてに適用される
+    monitoring.register(MongoLatency(mongo_latency, mongo_jitter))
@@ -0,0 +1,165 @@
+"""
+メッセージの保存形式を移行するスクリプト（アプリケーションの稼働中に実行可能）
+
+使い方:
+    python migrate_messages.py --to bucket     # messages → message_buckets
+    python migrate_messages.py --to document   # message_buckets → messages（切り戻し）
+    python migrate_messages.py --to bucket --dry-run
+
+バケット形式への切り替え手順:
+    1. --to bucket を実行して既存のメッセージを移す
+    2. MESSAGE_STORAGE=bucket に切り替えてデプロイする
+    3. もう一度 --to bucket を実行し、切り替えまでに書き込まれたメッセージを移す
+
+スレッドごとに「移行先へのコピー → 移行元からの削除」の順で処理し、
+移行先に既にあるメッセージはコピーしないため、中断しても再実行で続きから処理できる。
+"""
+import argparse
+import sys
+from pymongo.errors import BulkWriteError
+from config import config
+from models import message_buckets
+from services.db_service import db_service
+
+# 重複キーエラー（既に移行済みのメッセージ）
+_DUPLICATE_KEY = 11000
+
+
+def migrate_thread_to_buckets(thread_oid, batch_size, dry_run=False):
+    """
+    1スレッド分のメッセージをmessagesからmessage_bucketsに移す
+
+    Args:
+        thread_oid (ObjectId): スレッドID
+        batch_size (int): 一度にコピー・削除するメッセージ数
+        dry_run (bool): Trueなら件数を数えるだけで書き込まない
+
+    Returns:
+        int: 移したメッセージ数
+    """
+    messages = db_service.get_messages_collection()
+    buckets = message_buckets.get_collection()
+
+    moved = 0
+    batch = []
+    cursor = messages.find({'thread_id': thread_oid}).sort([('created_at', 1), ('_id', 1)])
+    for message in cursor:
+        batch.append(message)
+        if len(batch) >= batch_size:
+            moved += _move_batch_to_buckets(messages, buckets, thread_oid, batch, dry_run)
+            batch = []
+    if batch:
+        moved += _move_batch_to_buckets(messages, buckets, thread_oid, batch, dry_run)
+    return moved
+
+
+def _move_batch_to_buckets(messages, buckets, thread_oid, batch, dry_run):
+    """メッセージの一塊をバケットにコピーしてから元のドキュメントを削除"""
+    ids = [msg['_id'] for msg in batch]
+    if dry_run:
+        return len(ids)
+
+    # 前回の実行でコピー済み（削除前に中断した）のメッセージは飛ばす
+    copied = set()
+    for bucket in buckets.find(
+        {'thread_id': thread_oid, 'messages._id': {'$in': ids}},
+        {'messages._id': 1}
+    ):
+        copied.update(msg['_id'] for msg in bucket['messages'])
+
+    pending = [msg for msg in batch if msg['_id'] not in copied]
+    if pending:
+        message_buckets.append(thread_oid, pending)
+    messages.delete_many({'_id': {'$in': ids}})
+    return len(ids)
+
+
+def migrate_thread_to_documents(thread_oid, dry_run=False):
+    """
+    1スレッド分のメッセージをmessage_bucketsからmessagesに戻す
+
+    Args:
+        thread_oid (ObjectId): スレッドID
+        dry_run (bool): Trueなら件数を数えるだけで書き込まない
+
+    Returns:
+        int: 移したメッセージ数
+    """
+    messages = db_service.get_messages_collection()
+    buckets = message_buckets.get_collection()
+
+    moved = 0
+    for bucket in buckets.find({'thread_id': thread_oid}):
+        docs = [dict(msg, thread_id=thread_oid) for msg in bucket['messages']]
+        moved += len(docs)
+        if dry_run:
+            continue
+
+        if docs:
+            try:
+                messages.insert_many(docs, ordered=False)
+            except BulkWriteError as e:
+                # 前回の実行で戻し済みのメッセージは無視する
+                errors = e.details.get('writeErrors', [])
+                if any(error['code'] != _DUPLICATE_KEY for error in errors):
+                    raise
+        buckets.delete_one({'_id': bucket['_id']})
+    return moved
+
+
+def migrate(target, batch_size, dry_run=False):
+    """
+    全スレッドのメッセージを指定した保存形式に移行
+
+    Args:
+        target (str): 'bucket' または 'document'
+        batch_size (int): 一度にコピー・削除するメッセージ数
+        dry_run (bool): Trueなら件数を数えるだけで書き込まない
+
+    Returns:
+        bool: 成功したか
+    """
+    if not db_service.connect():
+        print("MongoDBに接続できませんでした")
+        return False
+
+    threads = db_service.get_threads_collection()
+    total_threads = 0
+    total_messages = 0
+
+    for thread in threads.find({}, {'_id': 1}).sort('_id', 1):
+        if target == 'bucket':
+            moved = migrate_thread_to_buckets(thread['_id'], batch_size, dry_run)
+        else:
+            moved = migrate_thread_to_documents(thread['_id'], dry_run)
+
+        if moved:
+            total_threads += 1
+            total_messages += moved
+            print(f"  {thread['_id']}: {moved} 件")
+
+    action = "移行対象" if dry_run else "移行済み"
+    print(f"\n{action}: {total_threads} スレッド / {total_messages} メッセージ")
+    if target != config.MESSAGE_STORAGE:
+        print(f"注意: 現在の MESSAGE_STORAGE は '{config.MESSAGE_STORAGE}' です")
+    return True
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='メッセージの保存形式を移行')
+    parser.add_argument('--to', choices=['bucket', 'document'], required=True,
+                        help='移行先の保存形式')
+    parser.add_argument('--batch-size', type=int, default=config.MESSAGE_BUCKET_SIZE,
+                        help='一度にコピー・削除するメッセージ数')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='件数を表示するだけで書き込まない')
+    args = parser.parse_args()
+
+    try:
+        success = migrate(args.to, args.batch_size, args.dry_run)
+        sys.exit(0 if success else 1)
+    except Exception as e:
+        print(f"エラー: {e}")
+        sys.exit(1)
+    finally:
+        db_service.close()
@@ -0,0 +1,345 @@
+"""
+メッセージモデル（非同期版）
+非同期サーバー用に、models.messageと同じ操作をmotorで提供
+バケット形式（config.MESSAGE_STORAGE = 'bucket'）とMongoDB以外の保存先
+（config.STORAGE_BACKEND）では同期版をスレッドで実行する
+"""
+import asyncio
+from bson import ObjectId
+from config import config
+from models import async_thread as thread_model
+from models import message as sync_model
+from models.message import (
+    drop_summarized,
+    format_message,
+    history_from_window,
+    messages_from_window,
+    select_history,
+)
+from models.pagination import split_page
+from models.search import message_entries
+from models.thread import format_thread
+from repositories import get_storage
+from repositories.base import ledger_entries
+from repositories.mongo import build_context_pipeline, build_page_query, live_filter, use_buckets
+from services.async_db_service import async_db_service
+from services.history_cache import history_cache, make_history_entry
+from services.tracing import traced
+from services.write_behind import write_behind
+
+
+def use_sync_model():
+    """
+    同期版のモデル（models.message）にスレッドで処理を任せるか
+    （motorの実装はmessagesコレクションに保存する場合だけ）
+    """
+    return thread_model.use_sync_model() or use_buckets()
+
+
+@traced()
+async def save_messages(thread_id, messages):
+    """
+    複数メッセージの保存とスレッド更新日時の更新をまとめて実行
+    （models.message.save_messagesと同じ仕様）
+
+    Args:
+        thread_id (str): スレッドID
+        messages (list): build_messageで作成したドキュメントのリスト
+
+    Returns:
+        tuple: (保存されたメッセージのリスト, 更新されたスレッドまたはNone)
+    """
+    if use_sync_model():
+        return await asyncio.to_thread(sync_model.save_messages, thread_id, messages)
+
+    collection = async_db_service.get_messages_collection()
+
+    # 台帳と全文検索を後回しにする場合は、同期版と同じくwrite_behindのスレッドで
+    # db_serviceのpymongoクライアントを使って書き込む
+    deferred = sync_model.defer_secondary_writes()
+
+    async def write(session=None):
+        await collection.insert_many(messages, ordered=True, session=session)
+        thread = await thread_model.touch_thread(thread_id, session=session, messages=messages)
+        if thread is None:
+            # 生成中にスレッドが削除された場合、孤立メッセージを残さない
+            await collection.delete_many(
+                {'_id': {'$in': [msg['_id'] for msg in messages]}},
+                session=session
+            )
+        elif not deferred:
+            thread_oid = ObjectId(thread_id)
+            entries = ledger_entries(thread_oid, messages)
+            if entries:
+                await async_db_service.get_collection(config.USAGE_LEDGER_COLLECTION).insert_many(
+                    entries, ordered=False, session=session
+                )
+            await thread_model.index_search_entries(
+                message_entries(thread_oid, messages), session=session
+            )
+        return thread
+
+    if config.MONGODB_USE_TRANSACTIONS:
+        async with await async_db_service.client.start_session() as session:
+            async with session.start_transaction():
+                thread = await write(session)
+    else:
+        thread = await write()
+
+    if thread is not None:
+        if deferred:
+            thread_oid = ObjectId(thread_id)
+            storage = get_storage()
+
+            def write_secondary():
+                storage.usage.record(thread_oid, messages)
+                storage.search.index(message_entries(thread_oid, messages))
+
+            write_behind.submit(write_secondary)
+        # キャッシュ済みの会話履歴にも追加
+        history_cache.extend(
+            str(thread_id), [make_history_entry(msg) for msg in messages], thread['version']
+        )
+
+    return [format_message(msg) for msg in messages], thread
+
+
+@traced()
+async def get_messages_by_thread(thread_id):
+    """
+    特定スレッドの全メッセージを取得（作成日時の昇順）
+
+    Args:
+        thread_id (str): スレッドID
+
+    Returns:
+        list: メッセージのリスト
+    """
+    if use_sync_model():
+        return await asyncio.to_thread(sync_model.get_messages_by_thread, thread_id)
+
+    collection = async_db_service.get_messages_collection()
+
+    try:
+        messages = await collection.find(
+            {'thread_id': ObjectId(thread_id)}
+        ).sort('created_at', 1).to_list(length=None)
+
+        return [format_message(msg) for msg in messages]
+    except Exception as e:
+        print(f"メッセージ取得エラー: {e}")
+        return []
+
+
+@traced()
+async def get_recent_messages(thread_id, limit=None):
+    """
+    スレッドを開いたときに表示するメッセージを取得
+    （models.message.get_recent_messagesと同じ仕様。ウィンドウ導入前のスレッドの
+    埋め込みは同期版に任せ、ここではmessagesコレクションから読む）
+
+    Returns:
+        tuple: (メッセージのリスト, 続きを取得するカーソルまたはNone)、
+            スレッドが存在しない場合はNone
+    """
+    if thread_model.use_sync_model():
+        return await asyncio.to_thread(sync_model.get_recent_messages, thread_id, limit)
+
+    threads = async_db_service.get_threads_collection()
+
+    try:
+        thread = await threads.find_one(
+            live_filter(thread_id),
+            {'recent_messages': 1, 'message_count': 1, 'recent_window': 1}
+        )
+    except Exception as e:
+        print(f"スレッド取得エラー: {e}")
+        return None
+    if not thread:
+        return None
+
+    page = messages_from_window(thread, limit)
+    if page is not None:
+        return page
+
+    if limit is None:
+        return await get_messages_by_thread(thread_id), None
+    return await get_messages_page(thread_id, limit)
+
+
+@traced()
+async def get_messages_page(thread_id, limit, before=None, after=None):
+    """
+    特定スレッドのメッセージを1ページ分取得（models.message.get_messages_pageと同じ仕様）
+
+    Raises:
+        ValueError: カーソルの形式が不正な場合
+    """
+    if use_sync_model():
+        return await asyncio.to_thread(sync_model.get_messages_page, thread_id, limit, before, after)
+
+    collection = async_db_service.get_messages_collection()
+    query, sort = build_page_query(thread_id, before, after)
+
+    docs = await collection.find(query).sort(sort).limit(limit + 1).to_list(length=None)
+
+    docs, next_cursor = split_page(docs, limit, 'created_at')
+    if not after:
+        docs.reverse()
+
+    return [format_message(msg) for msg in docs], next_cursor
+
+
+@traced()
+async def get_thread_context(thread_id):
+    """
+    メッセージ送信に必要なスレッドと会話履歴を1回のクエリで取得
+    （models.message.get_thread_contextと同じ仕様）
+
+    Args:
+        thread_id (str): スレッドID
+
+    Returns:
+        dict: {'thread', 'summary', 'history'}、スレッドが存在しない場合はNone
+    """
+    if use_sync_model():
+        return await asyncio.to_thread(sync_model.get_thread_context, thread_id)
+
+    threads = async_db_service.get_threads_collection()
+
+    try:
+        thread_oid = ObjectId(thread_id)
+
+        thread = await threads.find_one(live_filter(thread_oid))
+        if not thread:
+            return None
+
+        # 他のワーカーの書き込みでversionが変わっていればキャッシュを使わない
+        version = thread.get('version', 0)
+        history = history_cache.get(thread_id, version)
+
+        if history is None:
+            history = history_from_window(thread)
+            if history is None:
+                results = await threads.aggregate(
+                    build_context_pipeline(thread_oid)
+                ).to_list(length=1)
+                if not results:
+                    return None
+
+                thread = results[0]
+                history = select_history(
+                    thread.pop('pinned_messages'),
+                    thread.pop('recent_messages'),
+                    config.HISTORY_TOKEN_BUDGET
+                )
+            history_cache.put(thread_id, history, version)
+    except Exception as e:
+        print(f"スレッド取得エラー: {e}")
+        return None
+
+    return {
+        'thread': format_thread(thread),
+        'summary': thread.get('summary'),
+        'history': drop_summarized(history, thread.get('summarized_until'))
+    }
+
+
+@traced()
+async def set_message_pinned(message_id, pinned):
+    """
+    メッセージのピン留め状態を設定
+
+    Args:
+        message_id (str): メッセージID
+        pinned (bool): ピン留めするか
+
+    Returns:
+        dict: 更新されたメッセージ、存在しない場合はNone
+    """
+    if use_sync_model():
+        return await asyncio.to_thread(sync_model.set_message_pinned, message_id, pinned)
+
+    collection = async_db_service.get_messages_collection()
+
+    try:
+        result = await collection.find_one_and_update(
+            {'_id': ObjectId(message_id)},
+            {'$set': {'pinned': bool(pinned)}},
+            return_document=True
+        )
+        if not result:
+            return None
+
+        await thread_model.set_window_pinned(result['thread_id'], result['_id'], pinned)
+
+        # ピン留めは切り捨て対象が変わるため、履歴を読み直させる
+        history_cache.invalidate(str(result['thread_id']))
+        return format_message(result)
+    except Exception as e:
+        print(f"メッセージ更新エラー: {e}")
+        return None
+
+
+@traced()
+async def delete_messages_by_thread(thread_id):
+    """
+    特定スレッドの全メッセージを削除
+
+    Args:
+        thread_id (str): スレッドID
+
+    Returns:
+        int: 削除されたメッセージ数
+    """
+    if use_sync_model():
+        return await asyncio.to_thread(sync_model.delete_messages_by_thread, thread_id)
+
+    collection = async_db_service.get_messages_collection()
+
+    try:
+        result = await collection.delete_many({'thread_id': ObjectId(thread_id)})
+        history_cache.invalidate(thread_id)
+        return result.deleted_count
+    except Exception as e:
+        print(f"メッセージ削除エラー: {e}")
+        return 0
+
+
+@traced()
+async def delete_message(message_id):
+    """
+    特定のメッセージを削除
+
+    Args:
+        message_id (str): メッセージID
+
+    Returns:
+        bool: 削除成功したか
+    """
+    if use_sync_model():
+        return await asyncio.to_thread(sync_model.delete_message, message_id)
+
+    collection = async_db_service.get_messages_collection()
+
+    try:
+        deleted = await collection.find_one_and_delete(
+            {'_id': ObjectId(message_id)},
+            projection={'thread_id': 1}
+        )
+        if not deleted:
+            return False
+
+        await thread_model.remove_from_window(deleted['thread_id'], deleted['_id'])
+        if sync_model.defer_secondary_writes():
+            # 後回しにしたエントリの追加より後に実行されるよう、同じキューに入れる
+            sync_model.remove_search_entry(deleted['_id'])
+        else:
+            await async_db_service.get_collection(config.SEARCH_COLLECTION).delete_one(
+                {'_id': deleted['_id']}
+            )
+        history_cache.remove(str(deleted['thread_id']), deleted['_id'])
+        return True
+    except Exception as e:
+        print(f"メッセージ削除エラー: {e}")
+        return False
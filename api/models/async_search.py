@@ -0,0 +1,43 @@
+"""
+全文検索モデル（非同期版）
+非同期サーバー用に、models.searchと同じ検索をmotorで提供
+MongoDB以外の保存先（config.STORAGE_BACKEND）では同期版をスレッドで実行する
+"""
+import asyncio
+from config import config
+from models import async_thread as thread_model
+from models import search as sync_model
+from repositories.mongo import NOT_DELETED, THREAD_PROJECTION, build_search_pipeline
+from services.async_db_service import async_db_service
+from services.search_tokenizer import query_terms
+from services.tracing import traced
+
+
+@traced()
+async def search(query, limit, cursor=None):
+    """
+    スレッドのタイトルとメッセージの本文を検索（models.search.searchと同じ仕様）
+
+    Raises:
+        QueryTooShort: 検索語が1文字のかなだけの場合
+        ValueError: カーソルの形式が不正な場合
+    """
+    if thread_model.use_sync_model():
+        return await asyncio.to_thread(sync_model.search, query, limit, cursor)
+
+    terms = query_terms(query)
+    if not terms:
+        return [], None
+
+    collection = async_db_service.get_collection(config.SEARCH_COLLECTION)
+    entries = await collection.aggregate(
+        build_search_pipeline(terms, limit + 1, cursor)
+    ).to_list(length=None)
+    entries, next_cursor = sync_model.split_results(entries, limit)
+
+    thread_ids = list({entry['thread_id'] for entry in entries})
+    threads = await async_db_service.get_threads_collection().find(
+        {'_id': {'$in': thread_ids}, **NOT_DELETED}, THREAD_PROJECTION
+    ).to_list(length=None)
+    threads = {thread['_id']: thread for thread in threads}
+    return sync_model.format_results(entries, threads, query), next_cursor
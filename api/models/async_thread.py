@@ -0,0 +1,265 @@
+"""
+スレッドモデル（非同期版）
+非同期サーバー用に、models.threadと同じ操作をmotorで提供
+MongoDB以外の保存先（config.STORAGE_BACKEND）では同期版をスレッドで実行する
+"""
+import asyncio
+from datetime import datetime
+from config import config
+from models import thread as sync_model
+from models.pagination import split_page
+from models.search import thread_entry
+from models.thread import format_thread, new_thread_document
+from repositories.base import preview_entry
+from repositories.mongo import (
+    THREAD_PROJECTION,
+    THREADS_SORT,
+    WINDOW_TAIL_PROJECTION,
+    build_remove_update,
+    build_search_writes,
+    build_threads_query,
+    build_touch_update,
+    live_filter,
+)
+from services.async_db_service import async_db_service
+from services.tracing import traced
+
+
+def use_sync_model():
+    """同期版のモデル（models.thread）にスレッドで処理を任せるか（motorの実装はMongoDBだけ）"""
+    return config.STORAGE_BACKEND != 'mongo'
+
+
+@traced()
+async def create_thread(title="新しい会話"):
+    """
+    新規スレッドを作成
+
+    Args:
+        title (str): スレッドのタイトル
+
+    Returns:
+        dict: 作成されたスレッド
+    """
+    if use_sync_model():
+        return await asyncio.to_thread(sync_model.create_thread, title)
+
+    collection = async_db_service.get_threads_collection()
+
+    thread = new_thread_document(title)
+
+    result = await collection.insert_one(thread)
+    thread['_id'] = result.inserted_id
+    await index_search_entries([thread_entry(thread)])
+
+    return format_thread(thread)
+
+
+async def index_search_entries(entries, session=None):
+    """
+    全文検索のエントリを保存（repositories.mongo.MongoSearchRepository.indexと同じ）
+
+    Args:
+        entries (list): search_entryで作成したエントリ
+        session (AsyncIOMotorClientSession, optional): トランザクション用のセッション
+    """
+    if entries:
+        await async_db_service.get_collection(config.SEARCH_COLLECTION).bulk_write(
+            build_search_writes(entries), ordered=False, session=session
+        )
+
+
+@traced()
+async def get_threads(limit, cursor=None, title_prefix=None, query=None):
+    """
+    スレッドを1ページ分取得（models.thread.get_threadsと同じ仕様）
+
+    Raises:
+        ValueError: カーソルの形式が不正な場合
+    """
+    if use_sync_model():
+        return await asyncio.to_thread(sync_model.get_threads, limit, cursor, title_prefix, query)
+
+    collection = async_db_service.get_threads_collection()
+
+    threads = await collection.find(
+        build_threads_query(cursor, title_prefix, query),
+        THREAD_PROJECTION
+    ).sort(THREADS_SORT).limit(limit + 1).to_list(length=None)
+
+    threads, next_cursor = split_page(threads, limit, 'updated_at')
+    return [format_thread(thread) for thread in threads], next_cursor
+
+
+@traced()
+async def get_thread_by_id(thread_id):
+    """
+    IDでスレッドを取得
+
+    Args:
+        thread_id (str): スレッドID
+
+    Returns:
+        dict: スレッド、存在しない場合はNone
+    """
+    if use_sync_model():
+        return await asyncio.to_thread(sync_model.get_thread_by_id, thread_id)
+
+    collection = async_db_service.get_threads_collection()
+
+    try:
+        thread = await collection.find_one(live_filter(thread_id), THREAD_PROJECTION)
+        return format_thread(thread) if thread else None
+    except Exception as e:
+        print(f"スレッド取得エラー: {e}")
+        return None
+
+
+@traced()
+async def get_thread_version(thread_id):
+    """スレッドのversionだけを取得（models.thread.get_thread_versionと同じ仕様）"""
+    if use_sync_model():
+        return await asyncio.to_thread(sync_model.get_thread_version, thread_id)
+
+    collection = async_db_service.get_threads_collection()
+
+    try:
+        thread = await collection.find_one(live_filter(thread_id), {'version': 1})
+        return thread.get('version', 0) if thread else None
+    except Exception as e:
+        print(f"スレッド取得エラー: {e}")
+        return None
+
+
+@traced()
+async def update_thread(thread_id, title=None):
+    """
+    スレッドを更新
+
+    Args:
+        thread_id (str): スレッドID
+        title (str, optional): 新しいタイトル
+
+    Returns:
+        dict: 更新されたスレッド、失敗時はNone
+    """
+    if use_sync_model():
+        return await asyncio.to_thread(sync_model.update_thread, thread_id, title)
+
+    collection = async_db_service.get_threads_collection()
+
+    update_data = {'updated_at': datetime.utcnow()}
+    if title:
+        update_data['title'] = title
+
+    try:
+        result = await collection.find_one_and_update(
+            live_filter(thread_id),
+            {'$set': update_data, '$inc': {'version': 1}},
+            projection=THREAD_PROJECTION,
+            return_document=True
+        )
+        if result and title:
+            # タイトルの検索エントリを置き換える
+            await index_search_entries([thread_entry(result)])
+        return format_thread(result) if result else None
+    except Exception as e:
+        print(f"スレッド更新エラー: {e}")
+        return None
+
+
+@traced()
+async def touch_thread(thread_id, session=None, messages=None):
+    """
+    スレッドの更新日時を現在時刻に更新
+    追加したメッセージがあれば直近メッセージのウィンドウにも追加する
+
+    Args:
+        thread_id (str): スレッドID
+        session (AsyncIOMotorClientSession, optional): トランザクション用のセッション
+        messages (list, optional): 追加したメッセージのドキュメント（作成日時の昇順）
+
+    Returns:
+        dict: 更新されたスレッド、存在しない場合はNone
+    """
+    collection = async_db_service.get_threads_collection()
+
+    result = await collection.find_one_and_update(
+        live_filter(thread_id),
+        build_touch_update(messages),
+        projection=THREAD_PROJECTION,
+        return_document=True,
+        session=session
+    )
+    return format_thread(result) if result else None
+
+
+@traced()
+async def remove_from_window(thread_id, message_id):
+    """
+    削除したメッセージをウィンドウから取り除き、メッセージ数を減らす
+    （models.thread.remove_from_windowと同じく、最新メッセージならプレビューを付け直す）
+    """
+    collection = async_db_service.get_threads_collection()
+    thread = await collection.find_one_and_update(
+        {'_id': thread_id},
+        build_remove_update(message_id),
+        projection=WINDOW_TAIL_PROJECTION,
+        return_document=True
+    )
+    last = thread.get('last_message') if thread else None
+    if not last or last['_id'] != message_id:
+        return
+
+    window = thread.get('recent_messages')
+    if window:
+        replacement = window[-1]
+    elif thread.get('message_count', 0) > 0:
+        # ウィンドウを使い切った場合だけメッセージを1件読む
+        replacement = await async_db_service.get_messages_collection().find_one(
+            {'thread_id': thread_id}, sort=[('created_at', -1), ('_id', -1)]
+        )
+    else:
+        replacement = None
+    await collection.update_one(
+        {'_id': thread_id, 'last_message._id': message_id},
+        {'$set': {'last_message': preview_entry(replacement)}, '$inc': {'version': 1}}
+    )
+
+
+@traced()
+async def set_window_pinned(thread_id, message_id, pinned):
+    """ウィンドウ内のメッセージのピン留め状態を更新（ウィンドウ外なら何もしない）"""
+    collection = async_db_service.get_threads_collection()
+    await collection.update_one(
+        {'_id': thread_id},
+        {'$set': {'recent_messages.$[m].pinned': bool(pinned)}, '$inc': {'version': 1}},
+        array_filters=[{'m._id': message_id}]
+    )
+
+
+@traced()
+async def delete_thread(thread_id):
+    """
+    スレッドを削除（墓標を付けるだけで、メッセージと本体の削除はthread_reaperが行う）
+
+    Args:
+        thread_id (str): スレッドID
+
+    Returns:
+        bool: 削除成功したか
+    """
+    if use_sync_model():
+        return await asyncio.to_thread(sync_model.delete_thread, thread_id)
+
+    collection = async_db_service.get_threads_collection()
+
+    try:
+        result = await collection.update_one(
+            live_filter(thread_id),
+            {'$set': {'deleted_at': datetime.utcnow()}}
+        )
+        return result.modified_count > 0
+    except Exception as e:
+        print(f"スレッド削除エラー: {e}")
+        return False
@@ -0,0 +1,33 @@
+"""
+使用量モデル（非同期版）
+非同期サーバー用に、models.usageと同じ集計をmotorで提供
+MongoDB以外の保存先（config.STORAGE_BACKEND）では同期版をスレッドで実行する
+"""
+import asyncio
+from config import config
+from models import async_thread as thread_model
+from models import usage as sync_model
+from repositories.mongo import build_usage_pipeline
+from services.async_db_service import async_db_service
+from services.tracing import traced
+
+
+@traced()
+async def get_usage_by_day(start_day, end_day):
+    """
+    期間内の使用量を日付・モデルごとに集計（models.usage.get_usage_by_dayと同じ仕様）
+
+    Args:
+        start_day (str): 集計開始日（'YYYY-MM-DD'、この日を含む）
+        end_day (str): 集計終了日（'YYYY-MM-DD'、この日を含む）
+
+    Returns:
+        dict: models.usage.summarizeの形式
+    """
+    if thread_model.use_sync_model():
+        return await asyncio.to_thread(sync_model.get_usage_by_day, start_day, end_day)
+
+    collection = async_db_service.get_collection(config.USAGE_LEDGER_COLLECTION)
+    cursor = collection.aggregate(build_usage_pipeline(start_day, end_day))
+    rows = await cursor.to_list(length=None)
+    return sync_model.summarize(rows, start_day, end_day)
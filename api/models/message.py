@@ -4,36 +4,138 @@
 """
 from datetime import datetime
 from bson import ObjectId
-from services.db_service import db_service
+from config import config
+from models import thread as thread_model
+from models.pagination import encode_cursor, split_page
+from models.search import message_entries
+from repositories import get_storage
+from services.history_cache import history_cache, make_history_entry
+from services.tracing import traced
+from services.write_behind import write_behind
 
 
-def create_message(thread_id, role, content):
+def build_message(thread_id, role, content, usage=None):
     """
-    新規メッセージを作成
+    保存前のメッセージドキュメントを作成
+    _idをクライアント側で採番するため、保存前からIDを返せる
 
     Args:
         thread_id (str): スレッドID
         role (str): 'user' または 'assistant'
         content (str): メッセージ内容
+        usage (dict, optional): AI応答の使用量（GeminiServiceが書き込んだもの）
+            {'model', 'prompt_tokens', 'output_tokens', 'cached_tokens', 'latency_ms'}
 
     Returns:
-        dict: 作成されたメッセージ
+        dict: MongoDBのメッセージドキュメント
     """
-    collection = db_service.get_messages_collection()
-
     message = {
+        '_id': ObjectId(),
         'thread_id': ObjectId(thread_id),
         'role': role,
         'content': content,
         'created_at': datetime.utcnow()
     }
+    if usage:
+        message['usage'] = dict(usage)
+    return message
+
+
+@traced()
+def create_message(thread_id, role, content):
+    """
+    新規メッセージを作成
+
+    Args:
+        thread_id (str): スレッドID
+        role (str): 'user' または 'assistant'
+        content (str): メッセージ内容
+
+    Returns:
+        dict: 作成されたメッセージ
+    """
+    # スレッドの直近メッセージ・履歴キャッシュの更新はsave_messagesと共通
+    message = build_message(thread_id, role, content)
+    (created,), _ = save_messages(thread_id, [message])
+    return created
+
+
+@traced()
+def save_messages(thread_id, messages):
+    """
+    複数メッセージの保存とスレッド更新日時の更新をまとめて実行
+
+    メッセージは1回のinsert_manyで保存し、続けてスレッドの更新日時と
+    直近メッセージのウィンドウ・使用量の合計を1回の更新で書き換え、
+    使用量を持つメッセージを台帳に、本文を全文検索のエントリに記録する。
+    すべてをStorage.transactionで実行する（MongoDBではconfig.MONGODB_USE_TRANSACTIONSが
+    有効な場合にトランザクションになる）。トランザクションを使わない場合、
+    台帳と全文検索はwrite_behindで応答の後に書き込む（defer_secondary_writes）。
+    スレッドが削除されていた場合は保存したメッセージを取り消す。
+
+    Args:
+        thread_id (str): スレッドID
+        messages (list): build_messageで作成したドキュメントのリスト
+
+    Returns:
+        tuple: (保存されたメッセージのリスト, 更新されたスレッドまたはNone)
+    """
+    storage = get_storage()
+    thread_oid = ObjectId(thread_id)
+    deferred = defer_secondary_writes()
 
-    result = collection.insert_one(message)
-    message['_id'] = result.inserted_id
+    def write_secondary(session=None):
+        storage.usage.record(thread_oid, messages, session=session)
+        storage.search.index(message_entries(thread_oid, messages), session=session)
 
-    return _format_message(message)
+    def write(session):
+        storage.messages.insert_many(thread_oid, messages, session=session)
 
+        thread = thread_model.touch_thread(thread_id, session=session, messages=messages)
+        if thread is None:
+            # 生成中にスレッドが削除された場合、孤立メッセージを残さない
+            message_ids = [msg['_id'] for msg in messages]
+            storage.messages.remove_many(thread_oid, message_ids, session=session)
+        elif not deferred:
+            write_secondary(session)
+        return thread
 
+    thread = storage.transaction(write)
+
+    if thread is not None:
+        if deferred:
+            write_behind.submit(write_secondary)
+        # キャッシュ済みの会話履歴にも追加
+        history_cache.extend(
+            str(thread_id), [make_history_entry(msg) for msg in messages], thread['version']
+        )
+
+    return [format_message(msg) for msg in messages], thread
+
+
+def defer_secondary_writes():
+    """
+    メッセージ保存時の台帳と全文検索の書き込みを応答の後に回すか
+    （トランザクションを使う場合はメッセージと一緒に書き込む）
+    """
+    return write_behind.enabled and not config.MONGODB_USE_TRANSACTIONS
+
+
+def remove_search_entry(message_id):
+    """
+    削除したメッセージの全文検索のエントリを取り除く
+    エントリの追加を後回しにしている場合は、追加より後に実行されるよう同じキューに入れる
+    """
+    def remove():
+        get_storage().search.remove([message_id])
+
+    if defer_secondary_writes():
+        write_behind.submit(remove)
+    else:
+        remove()
+
+
+@traced()
 def get_messages_by_thread(thread_id):
     """
     特定スレッドの全メッセージを取得（作成日時の昇順）
@@ -44,44 +146,428 @@ def get_messages_by_thread(thread_id):
     Returns:
         list: メッセージのリスト
     """
-    collection = db_service.get_messages_collection()
-
     try:
-        messages = collection.find(
-            {'thread_id': ObjectId(thread_id)}
-        ).sort('created_at', 1)
-
-        return [_format_message(msg) for msg in messages]
+        messages = get_storage().messages.find_all(ObjectId(thread_id))
+        return [format_message(msg) for msg in messages]
     except Exception as e:
         print(f"メッセージ取得エラー: {e}")
         return []
 
 
-def get_conversation_history(thread_id):
+@traced()
+def get_recent_messages(thread_id, limit=None):
+    """
+    スレッドを開いたときに表示するメッセージを取得
+
+    スレッドに埋め込んだ直近メッセージで足りる場合はスレッドの1回の読み込みで返し、
+    足りない場合はメッセージの保存先から読む。
+
+    Args:
+        thread_id (str): スレッドID
+        limit (int, optional): 件数（省略時は全件）
+
+    Returns:
+        tuple: (メッセージのリスト（作成日時の昇順）, 続きを取得するカーソルまたはNone)
+            スレッドが存在しない場合はNone
+    """
+    try:
+        thread = get_storage().threads.find(ObjectId(thread_id), window=True)
+    except Exception as e:
+        print(f"スレッド取得エラー: {e}")
+        return None
+    if not thread:
+        return None
+
+    page = messages_from_window(thread, limit)
+    if page is not None:
+        return page
+
+    if not thread.get('recent_window'):
+        # ウィンドウ導入前のスレッドは一度だけmessagesから埋める
+        backfill_recent_window(thread)
+
+    if limit is None:
+        return get_messages_by_thread(thread_id), None
+    return get_messages_page(thread_id, limit)
+
+
+def messages_from_window(thread, limit=None):
+    """
+    スレッドに埋め込んだ直近メッセージから最新のページを作る
+
+    Args:
+        thread (dict): recent_messages・message_count・recent_windowを含むスレッド
+        limit (int, optional): 件数（省略時は全件）
+
+    Returns:
+        tuple: (メッセージのリスト（作成日時の昇順）, 続きを取得するカーソルまたはNone)
+            ウィンドウだけでは足りない場合はNone
+    """
+    if not thread.get('recent_window'):
+        return None
+
+    window = thread.get('recent_messages', [])
+    count = thread.get('message_count', 0)
+    covers_thread = count <= len(window)
+
+    if limit is None:
+        if not covers_thread:
+            return None
+        docs = window
+    else:
+        if limit > len(window) and not covers_thread:
+            return None
+        docs = window[-limit:]
+
+    next_cursor = None
+    if docs and count > len(docs):
+        next_cursor = encode_cursor(docs[0]['created_at'], docs[0]['_id'])
+
+    return [
+        format_message(dict(doc, thread_id=thread['_id']))
+        for doc in docs
+    ], next_cursor
+
+
+@traced()
+def backfill_recent_window(thread):
+    """
+    ウィンドウを持たない既存スレッドに直近メッセージとメッセージ数を書き込む
+
+    読み込み後に他のリクエストがメッセージを追加した場合（updated_atが変わる）は
+    書き込まず、次にスレッドを開いたときに改めて埋める。
+
+    Args:
+        thread (dict): _idとupdated_atを含むスレッド
+    """
+    storage = get_storage()
+
+    try:
+        # 更新日時より後に作成されたメッセージは、このあとtouch_threadで追加される
+        count, recent = storage.messages.latest_until(
+            thread['_id'], thread['updated_at'], config.THREAD_RECENT_MESSAGES
+        )
+        recent.reverse()
+        storage.threads.set_window(thread, recent, count)
+    except Exception as e:
+        print(f"直近メッセージの埋め込みエラー: {e}")
+
+
+@traced()
+def get_messages_page(thread_id, limit, before=None, after=None):
+    """
+    特定スレッドのメッセージを1ページ分取得（キーセットページネーション）
+
+    (created_at, _id) の複合キーでシークするため、ページの深さに関わらず
+    コストは一定（保存先がインデックスまたはソート済みリストで引く）。before/afterのどちらも指定しない場合は最新のページを返す。
+
+    Args:
+        thread_id (str): スレッドID
+        limit (int): 1ページの件数
+        before (str, optional): このカーソルより古いメッセージを取得
+        after (str, optional): このカーソルより新しいメッセージを取得
+
+    Returns:
+        tuple: (メッセージのリスト（作成日時の昇順）, 続きを取得するカーソルまたはNone)
+
+    Raises:
+        ValueError: カーソルの形式が不正な場合
+    """
+    # 1件多く読んで続きがあるか判定する
+    docs = get_storage().messages.find_page(ObjectId(thread_id), limit + 1, before, after)
+
+    docs, next_cursor = split_page(docs, limit, 'created_at')
+    if not after:
+        docs.reverse()
+
+    return [format_message(msg) for msg in docs], next_cursor
+
+
+@traced()
+def get_conversation_history(thread_id, token_budget=None):
     """
     会話履歴をAI API用のフォーマットで取得
 
+    トークン予算に収まる範囲で新しいメッセージから順に読み込む。
+    最新のメッセージとピン留めされたメッセージは予算に関わらず必ず含める。
+    既定の予算ではスレッド単位でプロセス内にキャッシュし、
+    create_message等の書き込み時にライトスルーで更新する。
+
     Args:
         thread_id (str): スレッドID
+        token_budget (int, optional): 推定トークン数の上限
+            （省略時はconfig.HISTORY_TOKEN_BUDGET）
 
     Returns:
-        list: AI API用の会話履歴
+        list: AI API用の会話履歴（作成日時の昇順）
             [
-                {'role': 'user', 'content': 'こんにちは'},
-                {'role': 'assistant', 'content': 'こんにちは！'}
+                {'role': 'user', 'content': 'こんにちは', ...},
+                {'role': 'assistant', 'content': 'こんにちは！', ...}
             ]
+            各要素はmake_history_entryの形式で、構築済みのGemini Contentを含む
     """
-    messages = get_messages_by_thread(thread_id)
+    use_cache = token_budget is None
+    if use_cache:
+        cached = history_cache.get(thread_id)
+        if cached is not None:
+            return cached
+        token_budget = config.HISTORY_TOKEN_BUDGET
+
+    try:
+        history = read_history(ObjectId(thread_id), token_budget)
+    except Exception as e:
+        print(f"会話履歴取得エラー: {e}")
+        return []
+
+    if use_cache:
+        history_cache.put(thread_id, history)
+
+    return history
+
+
+@traced()
+def read_history(thread_oid, token_budget):
+    """
+    保存先から直近・ピン留めメッセージを読み、トークン予算に収まる会話履歴を作る
+
+    Args:
+        thread_oid (ObjectId): スレッドID
+        token_budget (int): 推定トークン数の上限
+
+    Returns:
+        list: 履歴エントリのリスト（作成日時の昇順）
+    """
+    # 新しい順に読み、予算を超えた時点で打ち切る
+    pinned, recent = get_storage().messages.history_sources(thread_oid)
+    try:
+        return select_history(pinned, recent, token_budget)
+    finally:
+        recent.close()
+
+
+@traced()
+def get_thread_context(thread_id):
+    """
+    メッセージ送信に必要なスレッドと会話履歴を1回のクエリで取得
+
+    履歴がキャッシュ済み（スレッドのversionが格納時と同じ）か、スレッドに埋め込んだ
+    直近メッセージが会話全体を含む場合はスレッドの読み込みだけで済ませる。それ以外は保存先の
+    context_sourcesで直近・ピン留めメッセージを読む（MongoDBでは$lookupで
+    スレッドとまとめて読む）。
+
+    Args:
+        thread_id (str): スレッドID
+
+    Returns:
+        dict: スレッドが存在しない場合はNone
+            {
+                'thread': フォーマット済みのスレッド,
+                'summary': スレッドの要約（未作成ならNone）,
+                'history': get_conversation_historyと同じ形式の会話履歴
+                    （要約があれば要約済みのメッセージを除く。drop_summarizedを参照）
+            }
+    """
+    storage = get_storage()
+
+    try:
+        thread_oid = ObjectId(thread_id)
+
+        thread = storage.threads.find(thread_oid, window=True)
+        if not thread:
+            return None
+
+        # 他のワーカーの書き込みでversionが変わっていればキャッシュを使わない
+        version = thread.get('version', 0)
+        history = history_cache.get(thread_id, version)
+
+        if history is None:
+            history = history_from_window(thread)
+            if history is None:
+                # 長い会話はメッセージの保存先から直近・ピン留めメッセージを読む
+                sources = storage.messages.context_sources(thread_oid)
+                if sources is None:
+                    return None
+                pinned, recent = sources
+                try:
+                    history = select_history(pinned, recent, config.HISTORY_TOKEN_BUDGET)
+                finally:
+                    recent.close()
+            history_cache.put(thread_id, history, version)
+    except Exception as e:
+        print(f"スレッド取得エラー: {e}")
+        return None
+
+    return {
+        'thread': thread_model.format_thread(thread),
+        'summary': thread.get('summary'),
+        'history': drop_summarized(history, thread.get('summarized_until'))
+    }
+
+
+def drop_summarized(history, summarized_until):
+    """
+    要約に織り込み済みのメッセージを会話履歴から除く
+    要約がある場合は「要約 + 要約以降の直近メッセージ」だけを送るため、
+    キャッシュ・ウィンドウ・保存先のどれから作った履歴にも同じ規則で適用する
+
+    Args:
+        history (list): 履歴エントリのリスト（作成日時の昇順）
+        summarized_until (datetime): 要約済み最終メッセージの作成日時（未要約ならNone）
+
+    Returns:
+        list: summarized_untilより後のメッセージとピン留めメッセージ
+    """
+    if summarized_until is None:
+        return history
+
+    kept = [
+        entry for entry in history
+        if entry['pinned'] or entry['created_at'] is None or entry['created_at'] > summarized_until
+    ]
+
+    # 途中のAI応答から始まらないよう、先頭はユーザーメッセージに揃える
+    tail = [entry for entry in kept if not entry['pinned']]
+    dropped = set()
+    while len(tail) > 1 and tail[0]['role'] != 'user':
+        dropped.add(tail.pop(0)['id'])
+    return [entry for entry in kept if entry['id'] not in dropped]
+
+
+def history_from_window(thread):
+    """
+    スレッドに埋め込んだ直近メッセージから会話履歴を作る
+
+    Args:
+        thread (dict): MongoDBのスレッドドキュメント
+
+    Returns:
+        list: 履歴エントリのリスト（作成日時の昇順）
+            ウィンドウが会話全体を含まない場合はNone
+    """
+    if not thread.get('recent_window'):
+        return None
+
+    window = thread.get('recent_messages', [])
+    if thread.get('message_count', 0) > len(window):
+        return None
+
+    return select_history(
+        [msg for msg in window if msg.get('pinned')],
+        reversed(window),
+        config.HISTORY_TOKEN_BUDGET
+    )
+
+
+def select_history(pinned, recent, token_budget):
+    """
+    トークン予算に収まる会話履歴を選ぶ
+
+    Args:
+        pinned (iterable): ピン留めメッセージのドキュメント
+        recent (iterable): メッセージのドキュメント（新しい順）
+            予算を超えた時点で読むのをやめるため、カーソルも渡せる
+        token_budget (int): 推定トークン数の上限
+
+    Returns:
+        list: 履歴エントリのリスト（作成日時の昇順）
+    """
+    # ピン留めメッセージは常に含め、その分を予算から差し引く
+    pinned = [(msg, make_history_entry(msg)) for msg in pinned]
+    pinned_ids = {msg['_id'] for msg, _ in pinned}
+    remaining = token_budget - sum(entry['tokens'] for _, entry in pinned)
+
+    # 最新のメッセージは予算に関わらず含める
+    selected = []
+    for msg in recent:
+        if msg['_id'] in pinned_ids:
+            continue
+        entry = make_history_entry(msg)
+        if selected and entry['tokens'] > remaining:
+            break
+        selected.append((msg, entry))
+        remaining -= entry['tokens']
+
+    # 途中のAI応答から始まらないよう、先頭はユーザーメッセージに揃える
+    while len(selected) > 1 and selected[-1][0]['role'] != 'user':
+        selected.pop()
 
     return [
-        {
-            'role': msg['role'],
-            'content': msg['content']
-        }
-        for msg in messages
+        entry for _, entry in sorted(
+            pinned + selected,
+            key=lambda pair: (pair[0]['created_at'], pair[0]['_id'])
+        )
     ]
 
 
+@traced()
+def count_messages_after(thread_id, after, limit):
+    """
+    指定日時より後に作成されたメッセージ数を数える（limit件で打ち切り）
+
+    Args:
+        thread_id (str): スレッドID
+        after (datetime): この日時より後のメッセージを数える（Noneなら全件）
+        limit (int): 数える最大件数
+
+    Returns:
+        int: メッセージ数
+    """
+    try:
+        return get_storage().messages.count_after(ObjectId(thread_id), after, limit)
+    except Exception as e:
+        print(f"メッセージ件数取得エラー: {e}")
+        return 0
+
+
+@traced()
+def get_messages_after(thread_id, after, limit):
+    """
+    指定日時より後に作成されたメッセージを取得（作成日時の昇順）
+
+    Args:
+        thread_id (str): スレッドID
+        after (datetime): この日時より後のメッセージを取得（Noneなら先頭から）
+        limit (int): 取得する最大件数
+
+    Returns:
+        list: {'role', 'content', 'created_at'}のリスト
+    """
+    try:
+        return get_storage().messages.find_after(ObjectId(thread_id), after, limit)
+    except Exception as e:
+        print(f"メッセージ取得エラー: {e}")
+        return []
+
+
+@traced()
+def set_message_pinned(message_id, pinned):
+    """
+    メッセージのピン留め状態を設定
+    ピン留めされたメッセージは会話履歴の切り捨て対象外になる
+
+    Args:
+        message_id (str): メッセージID
+        pinned (bool): ピン留めするか
+
+    Returns:
+        dict: 更新されたメッセージ、存在しない場合はNone
+    """
+    try:
+        result = get_storage().messages.set_pinned(ObjectId(message_id), pinned)
+        if not result:
+            return None
+
+        thread_model.set_window_pinned(result['thread_id'], result['_id'], pinned)
+
+        # ピン留めは切り捨て対象が変わるため、履歴を読み直させる
+        history_cache.invalidate(str(result['thread_id']))
+        return format_message(result)
+    except Exception as e:
+        print(f"メッセージ更新エラー: {e}")
+        return None
+
+
+@traced()
 def delete_messages_by_thread(thread_id):
     """
     特定スレッドの全メッセージを削除
@@ -92,16 +578,46 @@ def delete_messages_by_thread(thread_id):
     Returns:
         int: 削除されたメッセージ数
     """
-    collection = db_service.get_messages_collection()
-
     try:
-        result = collection.delete_many({'thread_id': ObjectId(thread_id)})
-        return result.deleted_count
+        deleted_count = get_storage().messages.delete_by_thread(ObjectId(thread_id))
+        history_cache.invalidate(thread_id)
+        return deleted_count
     except Exception as e:
         print(f"メッセージ削除エラー: {e}")
         return 0
 
 
+@traced()
+def delete_message_batch(thread_oid, limit):
+    """
+    スレッドのメッセージを最大limit件だけ削除（thread_reaperが少しずつ消すために使用）
+
+    Args:
+        thread_oid (ObjectId): スレッドID
+        limit (int): 1回に削除する最大件数（バケット形式ではバケット数に換算）
+
+    Returns:
+        int: 削除されたメッセージ数（0なら残っていない）
+    """
+    return get_storage().messages.delete_batch(thread_oid, limit)
+
+
+@traced()
+def get_message_thread_ids(after, limit):
+    """
+    メッセージが参照しているスレッドIDを昇順に取得（孤立メッセージの検出用）
+
+    Args:
+        after (ObjectId): このIDより後のスレッドIDから取得（Noneなら先頭から）
+        limit (int): 取得する最大件数
+
+    Returns:
+        list: ObjectIdのリスト
+    """
+    return get_storage().messages.find_thread_ids(after, limit)
+
+
+@traced()
 def delete_message(message_id):
     """
     特定のメッセージを削除
@@ -112,17 +628,22 @@ def delete_message(message_id):
     Returns:
         bool: 削除成功したか
     """
-    collection = db_service.get_messages_collection()
-
     try:
-        result = collection.delete_one({'_id': ObjectId(message_id)})
-        return result.deleted_count > 0
+        # 履歴キャッシュを更新するため、削除したメッセージのスレッドIDを受け取る
+        deleted = get_storage().messages.delete_one(ObjectId(message_id))
+        if not deleted:
+            return False
+
+        thread_model.remove_from_window(deleted['thread_id'], deleted['_id'])
+        remove_search_entry(deleted['_id'])
+        history_cache.remove(str(deleted['thread_id']), deleted['_id'])
+        return True
     except Exception as e:
         print(f"メッセージ削除エラー: {e}")
         return False
 
 
-def _format_message(message):
+def format_message(message):
     """
     メッセージをフロントエンド用にフォーマット
 
@@ -135,10 +656,14 @@ def _format_message(message):
     if not message:
         return None
 
-    return {
+    formatted = {
         'id': str(message['_id']),
         'thread_id': str(message['thread_id']),
         'role': message['role'],
         'content': message['content'],
+        'pinned': message.get('pinned', False),
         'created_at': message['created_at'].isoformat()
     }
+    if message.get('usage'):
+        formatted['usage'] = message['usage']
+    return formatted
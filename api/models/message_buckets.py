@@ -0,0 +1,306 @@
+"""
+メッセージのバケット保存
+1スレッドのメッセージを最大MESSAGE_BUCKET_SIZE件ずつ1ドキュメントにまとめて保存する
+（config.MESSAGE_STORAGE = 'bucket' のときにmodels.messageから使用）
+
+バケットドキュメント:
+    {
+        '_id': ObjectId,
+        'thread_id': ObjectId,
+        'messages': [{'_id', 'role', 'content', 'pinned', 'created_at', 'usage'（任意）}, ...],
+        'slots': バケットに追加したメッセージ数（削除しても減らさない）,
+        'count': バケット内の現存メッセージ数,
+        'first_at': 最古のメッセージの作成日時,
+        'last_at': 最新のメッセージの作成日時
+    }
+
+追加先は常に空きのあるバケットで、slotsを削除で減らさないため空きがあるのは
+基本的に最新のバケットだけになる。同時書き込みで空きのあるバケットが2つできても、
+読み込みはメッセージの作成日時で並べ直すため順序は崩れない。
+"""
+import heapq
+from datetime import datetime
+from bson import ObjectId
+from pymongo import ReturnDocument
+from config import config
+from models.pagination import decode_cursor
+from services.db_service import db_service
+from services.tracing import traced
+
+_EPOCH = datetime(1970, 1, 1)
+_MAX_OBJECT_ID = ObjectId('f' * 24)
+
+
+def get_collection():
+    """message_bucketsコレクションを取得"""
+    return db_service.get_collection(config.MESSAGE_BUCKETS_COLLECTION)
+
+
+def _embedded(message):
+    """メッセージドキュメントをバケットに埋め込む形式に変換"""
+    embedded = {
+        '_id': message['_id'],
+        'role': message['role'],
+        'content': message['content'],
+        'pinned': message.get('pinned', False),
+        'created_at': message['created_at']
+    }
+    if message.get('usage'):
+        embedded['usage'] = message['usage']
+    return embedded
+
+
+def _unbucket(bucket, message):
+    """バケット内のメッセージをmessagesコレクションと同じ形式に戻す"""
+    return dict(message, thread_id=bucket['thread_id'])
+
+
+@traced()
+def append(thread_oid, messages, session=None):
+    """
+    メッセージをスレッドの最新バケットに追加（空きがなければ新しいバケットを作成）
+
+    Args:
+        thread_oid (ObjectId): スレッドID
+        messages (list): 作成日時の昇順に並んだメッセージドキュメント
+        session (ClientSession, optional): トランザクション用のセッション
+    """
+    collection = get_collection()
+    size = config.MESSAGE_BUCKET_SIZE
+
+    for start in range(0, len(messages), size):
+        chunk = messages[start:start + size]
+        collection.update_one(
+            # まとめて入りきるバケットだけを対象にし、なければupsertで作る
+            {'thread_id': thread_oid, 'slots': {'$lte': size - len(chunk)}},
+            {
+                '$push': {'messages': {'$each': [_embedded(msg) for msg in chunk]}},
+                '$inc': {'slots': len(chunk), 'count': len(chunk)},
+                '$min': {'first_at': chunk[0]['created_at']},
+                '$max': {'last_at': chunk[-1]['created_at']}
+            },
+            upsert=True,
+            session=session
+        )
+
+
+@traced()
+def remove(thread_oid, message_ids, session=None):
+    """
+    スレッドのバケットから指定したメッセージを取り除く
+
+    Args:
+        thread_oid (ObjectId): スレッドID
+        message_ids (list): 取り除くメッセージのID
+        session (ClientSession, optional): トランザクション用のセッション
+    """
+    collection = get_collection()
+    for message_id in message_ids:
+        collection.update_one(
+            {'thread_id': thread_oid, 'messages._id': message_id},
+            {
+                '$pull': {'messages': {'_id': message_id}},
+                '$inc': {'count': -1}
+            },
+            session=session
+        )
+
+
+def iter_messages(thread_oid, direction=-1, bound=None):
+    """
+    スレッドのメッセージを作成日時順に1件ずつ返す
+
+    バケットを時系列順に読み、次のバケットより確実に新しい（古い）メッセージから
+    順に返すため、途中で読むのをやめれば残りのバケットは読まない。
+
+    Args:
+        thread_oid (ObjectId): スレッドID
+        direction (int): -1なら新しい順、1なら古い順
+        bound (tuple, optional): (created_at, _id)。この位置より先のメッセージだけを返す
+            （新しい順ならより古いもの、古い順ならより新しいもの）
+
+    Yields:
+        dict: messagesコレクションと同じ形式のメッセージ
+    """
+    query = {'thread_id': thread_oid}
+    if bound is not None:
+        if direction < 0:
+            query['first_at'] = {'$lte': bound[0]}
+        else:
+            query['last_at'] = {'$gte': bound[0]}
+
+    # 新しい順ならlast_atの降順、古い順ならfirst_atの昇順にバケットを読む
+    edge = 'last_at' if direction < 0 else 'first_at'
+    buckets = get_collection().find(query).sort([(edge, direction), ('_id', direction)])
+
+    heap = []
+    try:
+        for bucket in buckets:
+            # このバケット以降に含まれえないメッセージは確定
+            while heap and _passes(heap[0][0], _order_key(bucket[edge], None, direction)):
+                yield heapq.heappop(heap)[1]
+
+            for message in bucket['messages']:
+                key = (message['created_at'], message['_id'])
+                if bound is not None and not _after_bound(key, bound, direction):
+                    continue
+                message = _unbucket(bucket, message)
+                heapq.heappush(heap, (_order_key(*key, direction), message))
+
+        while heap:
+            yield heapq.heappop(heap)[1]
+    finally:
+        buckets.close()
+
+
+def _order_key(created_at, object_id, direction):
+    """ヒープ用の並び順キー（新しい順では符号を反転する）"""
+    seconds = (created_at - _EPOCH).total_seconds()
+    oid = int.from_bytes(object_id.binary, 'big') if object_id is not None else 0
+    if direction < 0:
+        return (-seconds, -oid)
+    return (seconds, oid)
+
+
+def _passes(key, edge_key):
+    """キーのメッセージが、次のバケットのどのメッセージよりも先に来るか"""
+    return key[0] < edge_key[0]
+
+
+def _after_bound(key, bound, direction):
+    """(created_at, _id)がカーソル位置より先にあるか"""
+    return key < bound if direction < 0 else key > bound
+
+
+@traced()
+def find_all(thread_oid):
+    """スレッドの全メッセージを取得（作成日時の昇順）"""
+    return list(iter_messages(thread_oid, direction=1))
+
+
+@traced()
+def find_page(thread_oid, limit, before=None, after=None):
+    """
+    キーセットページネーション用にメッセージをlimit件まで取得
+    （messagesコレクションに対するbuild_page_queryの検索と同じ結果を返す）
+
+    Args:
+        thread_oid (ObjectId): スレッドID
+        limit (int): 取得する最大件数
+        before (str, optional): このカーソルより古いメッセージを取得
+        after (str, optional): このカーソルより新しいメッセージを取得
+
+    Returns:
+        list: メッセージのリスト（afterなら昇順、それ以外は降順）
+
+    Raises:
+        ValueError: カーソルの形式が不正な場合
+    """
+    direction = 1 if after else -1
+    cursor = before or after
+    bound = decode_cursor(cursor) if cursor else None
+
+    messages = []
+    for message in iter_messages(thread_oid, direction, bound):
+        messages.append(message)
+        if len(messages) >= limit:
+            break
+    return messages
+
+
+@traced()
+def find_pinned(thread_oid):
+    """スレッドのピン留めメッセージを取得"""
+    pinned = []
+    for bucket in get_collection().find(
+        {'thread_id': thread_oid, 'messages.pinned': True}
+    ):
+        pinned.extend(
+            _unbucket(bucket, msg) for msg in bucket['messages'] if msg.get('pinned')
+        )
+    return pinned
+
+
+@traced()
+def count_after(thread_oid, after, limit):
+    """指定日時より後に作成されたメッセージ数を数える（limit件で打ち切り）"""
+    count = 0
+    for message in iter_messages(thread_oid, direction=-1):
+        if after is not None and message['created_at'] <= after:
+            break
+        count += 1
+        if count >= limit:
+            break
+    return count
+
+
+@traced()
+def find_after(thread_oid, after, limit):
+    """指定日時より後に作成されたメッセージを取得（作成日時の昇順）"""
+    # 同じ日時のどのIDよりも後ろを起点にして、afterより新しいものだけを読む
+    bound = (after, _MAX_OBJECT_ID) if after is not None else None
+
+    messages = []
+    for message in iter_messages(thread_oid, direction=1, bound=bound):
+        messages.append(message)
+        if len(messages) >= limit:
+            break
+    return messages
+
+
+@traced()
+def set_pinned(message_oid, pinned):
+    """
+    メッセージのピン留め状態を設定
+
+    Returns:
+        dict: 更新されたメッセージ、存在しない場合はNone
+    """
+    bucket = get_collection().find_one_and_update(
+        {'messages._id': message_oid},
+        {'$set': {'messages.$.pinned': bool(pinned)}},
+        projection={'thread_id': 1, 'messages.$': 1},
+        return_document=ReturnDocument.AFTER
+    )
+    if not bucket:
+        return None
+    return _unbucket(bucket, bucket['messages'][0])
+
+
+@traced()
+def delete_one(message_oid):
+    """
+    メッセージを削除
+
+    Returns:
+        dict: 削除したメッセージ（thread_idを含む）、存在しない場合はNone
+    """
+    bucket = get_collection().find_one_and_update(
+        {'messages._id': message_oid},
+        {
+            '$pull': {'messages': {'_id': message_oid}},
+            '$inc': {'count': -1}
+        },
+        projection={'thread_id': 1, 'messages': {'$elemMatch': {'_id': message_oid}}},
+        return_document=ReturnDocument.BEFORE
+    )
+    if not bucket:
+        return None
+    return _unbucket(bucket, bucket['messages'][0])
+
+
+@traced()
+def delete_thread(thread_oid):
+    """
+    スレッドの全バケットを削除
+
+    Returns:
+        int: 削除されたメッセージ数
+    """
+    collection = get_collection()
+    count = sum(
+        bucket.get('count', 0)
+        for bucket in collection.find({'thread_id': thread_oid}, {'count': 1})
+    )
+    collection.delete_many({'thread_id': thread_oid})
+    return count
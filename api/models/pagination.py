@@ -0,0 +1,146 @@
+"""
+キーセットページネーション
+(ソートキー, _id) の組をカーソルとしてエンコード・デコードする
+"""
+import base64
+from datetime import datetime, timedelta
+from bson import ObjectId
+from bson.errors import InvalidId
+from config import config
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def encode_cursor(sort_value, object_id):
+    """
+    ページ境界のドキュメントからカーソル文字列を作成
+
+    Args:
+        sort_value (datetime): ソートキーの値（created_at / updated_at）
+        object_id (ObjectId): ドキュメントの_id
+
+    Returns:
+        str: URLセーフなカーソル文字列
+    """
+    # MongoDBの日時はミリ秒精度なので、ミリ秒整数で保持する
+    millis = (sort_value - _EPOCH) // timedelta(milliseconds=1)
+    raw = f"{millis}:{object_id}".encode('ascii')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    カーソル文字列を (ソートキー, _id) に戻す
+
+    Args:
+        cursor (str): encode_cursorで作成したカーソル
+
+    Returns:
+        tuple: (datetime, ObjectId)
+
+    Raises:
+        ValueError: カーソルの形式が不正な場合
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        millis, object_id = base64.urlsafe_b64decode(padded).decode('ascii').split(':')
+        return _EPOCH + timedelta(milliseconds=int(millis)), ObjectId(object_id)
+    except (ValueError, TypeError, InvalidId, UnicodeDecodeError):
+        raise ValueError(f"不正なカーソルです: {cursor}")
+
+
+def encode_score_cursor(score, object_id):
+    """
+    スコア順（全文検索）のページ境界からカーソル文字列を作成
+
+    Args:
+        score (float): ページ末尾のスコア
+        object_id (ObjectId): ページ末尾の_id
+
+    Returns:
+        str: URLセーフなカーソル文字列
+    """
+    raw = f"{score!r}:{object_id}".encode('ascii')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_score_cursor(cursor):
+    """
+    encode_score_cursorで作成したカーソルを (スコア, _id) に戻す
+
+    Raises:
+        ValueError: カーソルの形式が不正な場合
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        score, object_id = base64.urlsafe_b64decode(padded).decode('ascii').split(':')
+        return float(score), ObjectId(object_id)
+    except (ValueError, TypeError, InvalidId, UnicodeDecodeError):
+        raise ValueError(f"不正なカーソルです: {cursor}")
+
+
+def keyset_filter(field, cursor, direction):
+    """
+    カーソルの位置より先のドキュメントを絞り込む条件を作成
+
+    Args:
+        field (str): ソートキーのフィールド名
+        cursor (str): 基準となるカーソル
+        direction (int): 1ならカーソルより後（昇順）、-1なら前（降順）
+
+    Returns:
+        dict: MongoDBのクエリ条件
+    """
+    sort_value, object_id = decode_cursor(cursor)
+    op = '$gt' if direction == 1 else '$lt'
+
+    return {
+        '$or': [
+            {field: {op: sort_value}},
+            {field: sort_value, '_id': {op: object_id}}
+        ]
+    }
+
+
+def split_page(docs, limit, field):
+    """
+    limit+1件読んだ結果を1ページ分と次ページのカーソルに分ける
+
+    Args:
+        docs (list): limit+1件まで読んだドキュメント（読み進める順）
+        limit (int): 1ページの件数
+        field (str): ソートキーのフィールド名
+
+    Returns:
+        tuple: (1ページ分のドキュメント, 続きを取得するカーソルまたはNone)
+    """
+    if len(docs) <= limit:
+        return docs, None
+
+    docs = docs[:limit]
+    last = docs[-1]
+    return docs, encode_cursor(last[field], last['_id'])
+
+
+def parse_page_size(value, default=None):
+    """
+    ページサイズのクエリパラメータを解釈（上限で切り詰める）
+
+    Args:
+        value (str): limitパラメータ（未指定ならNone）
+        default (int, optional): 未指定時のページサイズ
+            （省略時はconfig.PAGE_SIZE_DEFAULT）
+
+    Returns:
+        int: ページサイズ
+
+    Raises:
+        ValueError: 正の整数でない場合
+    """
+    if value is None:
+        return min(default or config.PAGE_SIZE_DEFAULT, config.PAGE_SIZE_MAX)
+
+    limit = int(value)
+    if limit <= 0:
+        raise ValueError(f"不正なページサイズです: {value}")
+    return min(limit, config.PAGE_SIZE_MAX)
@@ -0,0 +1,134 @@
+"""
+全文検索モデル
+スレッドのタイトルとメッセージの本文をn-gramで検索する（services.search_tokenizer）
+
+検索用のエントリは保存先のsearchリポジトリ（MongoDBではsearch_entriesコレクション）にあり、
+スレッドの作成・タイトル変更、メッセージの保存・削除のたびに更新する。
+削除済み（墓標の付いた）スレッドのエントリは検索結果から除き、thread_reaperが後で消す。
+既存のデータは reindex_search.py で作り直す。
+"""
+from bson import ObjectId
+from models.pagination import encode_score_cursor, split_page
+from repositories import get_storage
+from repositories.base import search_entry
+from services.search_tokenizer import highlight, query_terms
+from services.tracing import traced
+
+
+def thread_entry(thread):
+    """スレッドのタイトルのエントリ"""
+    return search_entry('thread', thread, thread['_id'])
+
+
+def message_entries(thread_oid, messages):
+    """メッセージの本文のエントリ"""
+    return [search_entry('message', message, thread_oid) for message in messages]
+
+
+def split_results(entries, limit):
+    """
+    limit+1件読んだ検索結果を1ページ分と次ページのカーソルに分ける
+
+    Returns:
+        tuple: (1ページ分のエントリ, 続きを取得するカーソルまたはNone)
+    """
+    if len(entries) <= limit:
+        return entries, None
+    entries = entries[:limit]
+    last = entries[-1]
+    return entries, encode_score_cursor(last['score'], last['_id'])
+
+
+def format_results(entries, threads, query):
+    """
+    検索結果をフロントエンド用にフォーマット（削除済みのスレッドの結果は除く）
+
+    Args:
+        entries (list): 1ページ分のエントリ
+        threads (dict): スレッドID -> 削除済みでないスレッド
+        query (str): 検索語（スニペットの強調に使う）
+
+    Returns:
+        list: [{'type', 'id', 'thread_id', 'thread_title', 'role', 'snippet',
+                'highlights', 'score', 'created_at'}, ...]
+            highlightsはsnippet内で一致した [開始位置, 終了位置] のリスト
+    """
+    results = []
+    for entry in entries:
+        thread = threads.get(entry['thread_id'])
+        if thread is None:
+            continue
+        snippet, highlights = highlight(entry['text'], query)
+        results.append({
+            'type': entry['kind'],
+            'id': str(entry['_id']),
+            'thread_id': str(entry['thread_id']),
+            'thread_title': thread['title'],
+            'role': entry.get('role'),
+            'snippet': snippet,
+            'highlights': highlights,
+            'score': round(entry['score'], 4),
+            'created_at': entry['created_at'].isoformat(),
+        })
+    return results
+
+
+@traced()
+def search(query, limit, cursor=None):
+    """
+    スレッドのタイトルとメッセージの本文を検索（スコアの降順）
+
+    Args:
+        query (str): 検索語（すべてのn-gramを含むものが一致する）
+        limit (int): 1ページの件数
+        cursor (str, optional): 前ページのnext_cursor
+
+    Returns:
+        tuple: (検索結果のリスト, 続きを取得するカーソルまたはNone)
+            削除済みのスレッドの結果を除くため、1ページがlimit件より少ないことがある。
+            読めるのはスコアの上位config.SEARCH_MAX_CANDIDATES件まで
+
+    Raises:
+        QueryTooShort: 検索語が1文字のかなだけの場合
+        ValueError: カーソルの形式が不正な場合
+    """
+    terms = query_terms(query)
+    if not terms:
+        return [], None
+
+    storage = get_storage()
+    entries, next_cursor = split_results(storage.search.search(terms, limit + 1, cursor), limit)
+    threads = storage.threads.find_many({entry['thread_id'] for entry in entries})
+    return format_results(entries, threads, query), next_cursor
+
+
+def rebuild_index(batch_size=200, progress=None):
+    """
+    削除済みでない全スレッドのタイトルとメッセージのエントリを作り直す
+    （全文検索の導入前のデータや、トークン化の変更後に使う）
+
+    Args:
+        batch_size (int): 1回に読むスレッド数
+        progress (callable, optional): スレッドを1つ処理するたびに (スレッド数, エントリ数) で呼ぶ
+
+    Returns:
+        dict: {'threads': 処理したスレッド数, 'entries': 作成したエントリ数}
+    """
+    storage = get_storage()
+    stats = {'threads': 0, 'entries': 0}
+    cursor = None
+    while True:
+        threads = storage.threads.find_page(batch_size + 1, cursor)
+        page, cursor = split_page(threads, batch_size, 'updated_at')
+        for thread in page:
+            thread_oid = ObjectId(thread['_id'])
+            storage.search.remove_by_thread(thread_oid)
+            entries = [thread_entry(thread)]
+            entries.extend(message_entries(thread_oid, storage.messages.find_all(thread_oid)))
+            storage.search.index(entries)
+            stats['threads'] += 1
+            stats['entries'] += len(entries)
+            if progress:
+                progress(stats['threads'], stats['entries'])
+        if not cursor:
+            return stats
@@ -4,9 +4,14 @@
 """
 from datetime import datetime
 from bson import ObjectId
-from services.db_service import db_service
+from models.pagination import split_page
+from models.search import thread_entry
+from models.usage import format_usage
+from repositories import get_storage
+from services.tracing import traced
 
 
+@traced()
 def create_thread(title="新しい会話"):
     """
     新規スレッドを作成
@@ -17,33 +22,67 @@ def create_thread(title="新しい会話"):
     Returns:
         dict: 作成されたスレッド
     """
-    collection = db_service.get_threads_collection()
+    thread = new_thread_document(title)
+    storage = get_storage()
+    storage.threads.insert(thread)
+    storage.search.index([thread_entry(thread)])
 
-    thread = {
+    return format_thread(thread)
+
+
+def new_thread_document(title):
+    """
+    保存前のスレッドドキュメントを作成
+    直近メッセージのウィンドウは作成時から維持するため、空の状態で持たせる
+
+    Args:
+        title (str): スレッドのタイトル
+
+    Returns:
+        dict: MongoDBのスレッドドキュメント
+    """
+    now = datetime.utcnow()
+    return {
         'title': title,
-        'created_at': datetime.utcnow(),
-        'updated_at': datetime.utcnow()
+        'created_at': now,
+        'updated_at': now,
+        'recent_messages': [],
+        'message_count': 0,
+        'last_message': None,
+        'recent_window': True,
+        'version': 0
     }
 
-    result = collection.insert_one(thread)
-    thread['_id'] = result.inserted_id
 
-    return _format_thread(thread)
+@traced()
+def get_threads(limit, cursor=None, title_prefix=None, query=None):
+    """
+    スレッドを1ページ分取得（更新日時の降順、キーセットページネーション）
 
+    (updated_at, _id) の複合インデックス（インメモリでは同じキーのソート済みリスト）で
+    シークするため、
+    スレッド総数やページの深さに関わらずコストは一定。
 
-def get_threads():
-    """
-    全スレッドを取得（更新日時の降順）
+    Args:
+        limit (int): 1ページの件数
+        cursor (str, optional): 前ページのnext_cursor
+        title_prefix (str, optional): タイトルの前方一致条件
+        query (str, optional): タイトルの部分一致条件（大文字小文字を区別しない）
 
     Returns:
-        list: スレッドのリスト
+        tuple: (スレッドのリスト, 続きを取得するカーソルまたはNone)
+
+    Raises:
+        ValueError: カーソルの形式が不正な場合
     """
-    collection = db_service.get_threads_collection()
-    threads = collection.find().sort('updated_at', -1)
+    # 1件多く読んで続きがあるか判定する
+    threads = get_storage().threads.find_page(limit + 1, cursor, title_prefix, query)
 
-    return [_format_thread(thread) for thread in threads]
+    threads, next_cursor = split_page(threads, limit, 'updated_at')
+    return [format_thread(thread) for thread in threads], next_cursor
 
 
+@traced()
 def get_thread_by_id(thread_id):
     """
     IDでスレッドを取得
@@ -54,16 +93,33 @@ def get_thread_by_id(thread_id):
     Returns:
         dict: スレッド、存在しない場合はNone
     """
-    collection = db_service.get_threads_collection()
+    try:
+        thread = get_storage().threads.find(ObjectId(thread_id))
+        return format_thread(thread) if thread else None
+    except Exception as e:
+        print(f"スレッド取得エラー: {e}")
+        return None
+
+
+@traced()
+def get_thread_version(thread_id):
+    """
+    スレッドのversionだけを取得（条件付きGETでメッセージを読む前に使う）
+
+    Args:
+        thread_id (str): スレッドID
 
+    Returns:
+        int: version、存在しない場合はNone
+    """
     try:
-        thread = collection.find_one({'_id': ObjectId(thread_id)})
-        return _format_thread(thread) if thread else None
+        return get_storage().threads.find_version(ObjectId(thread_id))
     except Exception as e:
         print(f"スレッド取得エラー: {e}")
         return None
 
 
+@traced()
 def update_thread(thread_id, title=None):
     """
     スレッドを更新
@@ -75,27 +131,139 @@ def update_thread(thread_id, title=None):
     Returns:
         dict: 更新されたスレッド、失敗時はNone
     """
-    collection = db_service.get_threads_collection()
-
     update_data = {'updated_at': datetime.utcnow()}
     if title:
         update_data['title'] = title
 
     try:
-        result = collection.find_one_and_update(
-            {'_id': ObjectId(thread_id)},
-            {'$set': update_data},
-            return_document=True
-        )
-        return _format_thread(result) if result else None
+        storage = get_storage()
+        result = storage.threads.update(ObjectId(thread_id), update_data)
+        if result and title:
+            # タイトルの検索エントリを置き換える
+            storage.search.index([thread_entry(result)])
+        return format_thread(result) if result else None
     except Exception as e:
         print(f"スレッド更新エラー: {e}")
         return None
 
 
+@traced()
+def touch_thread(thread_id, session=None, messages=None):
+    """
+    スレッドの更新日時を現在時刻に更新
+    追加したメッセージがあれば直近メッセージのウィンドウにも追加する
+
+    Args:
+        thread_id (str): スレッドID
+        session (optional): Storage.transactionから渡されたセッション
+        messages (list, optional): 追加したメッセージのドキュメント（作成日時の昇順）
+
+    Returns:
+        dict: 更新されたスレッド、存在しない場合はNone
+    """
+    result = get_storage().threads.touch(ObjectId(thread_id), messages, session=session)
+    return format_thread(result) if result else None
+
+
+@traced()
+def remove_from_window(thread_id, message_id):
+    """
+    削除したメッセージをウィンドウから取り除き、メッセージ数を減らす
+    最新メッセージを削除した場合は、1つ前のメッセージをプレビューにする
+
+    Args:
+        thread_id (ObjectId): スレッドID
+        message_id (ObjectId): 削除したメッセージのID
+    """
+    storage = get_storage()
+    thread = storage.threads.remove_from_window(thread_id, message_id)
+    last = thread.get('last_message') if thread else None
+    if not last or last['_id'] != message_id:
+        return
+
+    window = thread.get('recent_messages')
+    if window:
+        replacement = window[-1]
+    elif thread.get('message_count', 0) > 0:
+        # ウィンドウを使い切った場合だけメッセージを1件読む
+        latest = storage.messages.find_page(thread_id, 1)
+        replacement = latest[0] if latest else None
+    else:
+        replacement = None
+    storage.threads.replace_last_message(thread_id, message_id, replacement)
+
+
+@traced()
+def set_window_pinned(thread_id, message_id, pinned):
+    """
+    ウィンドウ内のメッセージのピン留め状態を更新（ウィンドウ外なら何もしない）
+
+    Args:
+        thread_id (ObjectId): スレッドID
+        message_id (ObjectId): メッセージID
+        pinned (bool): ピン留めするか
+    """
+    get_storage().threads.set_window_pinned(thread_id, message_id, pinned)
+
+
+@traced()
+def get_summary(thread_id):
+    """
+    スレッドの要約情報を取得
+
+    Args:
+        thread_id (str): スレッドID
+
+    Returns:
+        dict: {'summary': 要約テキスト, 'summarized_until': 要約済み最終メッセージの作成日時,
+               'message_count': メッセージ数, 'summarized_count': 要約済みのメッセージ数}
+            スレッドが存在しない場合はNone
+    """
+    try:
+        thread = get_storage().threads.find(ObjectId(thread_id))
+        if not thread:
+            return None
+
+        return {
+            'summary': thread.get('summary'),
+            'summarized_until': thread.get('summarized_until'),
+            'message_count': thread.get('message_count', 0),
+            'summarized_count': thread.get('summarized_count', 0)
+        }
+    except Exception as e:
+        print(f"スレッド要約取得エラー: {e}")
+        return None
+
+
+@traced()
+def update_summary(thread_id, summary, summarized_until, previous_until, summarized_count=0):
+    """
+    スレッドの要約を更新
+    他のワーカーが先に更新していた場合は上書きしない
+
+    Args:
+        thread_id (str): スレッドID
+        summary (str): 新しい要約
+        summarized_until (datetime): 要約に含めた最終メッセージの作成日時
+        previous_until (datetime): 更新前のsummarized_until（未要約ならNone）
+        summarized_count (int): 要約済みのメッセージ数（保存時に要約の要否を判定するのに使う）
+
+    Returns:
+        bool: 更新されたか
+    """
+    try:
+        return get_storage().threads.update_summary(
+            ObjectId(thread_id), summary, summarized_until, previous_until, summarized_count
+        )
+    except Exception as e:
+        print(f"スレッド要約更新エラー: {e}")
+        return False
+
+
+@traced()
 def delete_thread(thread_id):
     """
-    スレッドを削除
+    スレッドを削除（墓標を付けるだけで、メッセージと本体の削除はthread_reaperが行う）
 
     Args:
         thread_id (str): スレッドID
@@ -103,17 +271,90 @@ def delete_thread(thread_id):
     Returns:
         bool: 削除成功したか
     """
-    collection = db_service.get_threads_collection()
-
     try:
-        result = collection.delete_one({'_id': ObjectId(thread_id)})
-        return result.deleted_count > 0
+        return get_storage().threads.mark_deleted(ObjectId(thread_id))
     except Exception as e:
         print(f"スレッド削除エラー: {e}")
         return False
 
 
-def _format_thread(thread):
+@traced()
+def get_deleted_thread_ids(limit):
+    """
+    墓標の付いたスレッドのIDを削除日時の古い順に取得
+
+    Args:
+        limit (int): 取得する最大件数
+
+    Returns:
+        list: ObjectIdのリスト
+    """
+    return get_storage().threads.find_deleted_ids(limit)
+
+
+@traced()
+def get_existing_thread_ids(thread_ids):
+    """
+    指定したIDのうち、スレッドドキュメントが存在するもの（削除済みを含む）を取得
+
+    Args:
+        thread_ids (list): ObjectIdのリスト
+
+    Returns:
+        set: 存在するスレッドのObjectId
+    """
+    return get_storage().threads.find_existing_ids(thread_ids)
+
+
+@traced()
+def purge_thread(thread_oid):
+    """
+    墓標の付いたスレッドのドキュメントと検索エントリを削除（メッセージの削除後に呼ぶ）
+
+    Args:
+        thread_oid (ObjectId): スレッドID
+
+    Returns:
+        bool: 削除したか
+    """
+    storage = get_storage()
+    storage.search.remove_by_thread(thread_oid)
+    return storage.threads.purge(thread_oid)
+
+
+def recount_messages():
+    """
+    全スレッドのメッセージ数と最新メッセージのプレビューを数え直す
+    （増分更新がずれた場合や、プレビュー導入前のスレッドの修復用。recount_threads.pyから使用）
+
+    Returns:
+        int: 数え直したスレッド数
+    """
+    return get_storage().recount_messages()
+
+
+def format_preview(last_message):
+    """
+    最新メッセージのプレビューをフロントエンド用にフォーマット
+
+    Args:
+        last_message (dict): スレッドのlast_message（なければNone）
+
+    Returns:
+        dict: {'id', 'role', 'preview', 'created_at'}、メッセージがなければNone
+    """
+    if not last_message:
+        return None
+
+    return {
+        'id': str(last_message['_id']),
+        'role': last_message['role'],
+        'preview': last_message['preview'],
+        'created_at': last_message['created_at'].isoformat()
+    }
+
+
+def format_thread(thread):
     """
     スレッドをフロントエンド用にフォーマット
 
@@ -130,5 +371,10 @@ def _format_thread(thread):
         'id': str(thread['_id']),
         'title': thread['title'],
         'created_at': thread['created_at'].isoformat(),
-        'updated_at': thread['updated_at'].isoformat()
+        'updated_at': thread['updated_at'].isoformat(),
+        'message_count': thread.get('message_count', 0),
+        'summarized_count': thread.get('summarized_count', 0),
+        'version': thread.get('version', 0),
+        'last_message': format_preview(thread.get('last_message')),
+        'usage': format_usage(thread.get('usage'))
     }
@@ -0,0 +1,122 @@
+"""
+使用量モデル
+アシスタントメッセージに保存したGemini APIの使用量（トークン数・レイテンシ）の集計を提供
+
+使用量は次の3か所に記録される（models.message.save_messagesで同時に書き込む）
+    メッセージ:   usage（その応答1回分）
+    スレッド:     usage（スレッドの合計。$incで加算）
+    使用量の台帳: 1応答1件（usage_ledgerコレクション。日付・モデルごとの集計に使う）
+"""
+from datetime import datetime, timedelta
+from repositories import get_storage
+from repositories.base import USAGE_FIELDS
+from services.tracing import traced
+
+# 集計期間の既定の日数と上限
+USAGE_DEFAULT_DAYS = 30
+USAGE_MAX_DAYS = 366
+
+
+def format_usage(usage):
+    """
+    使用量の合計をフロントエンド用にフォーマット
+
+    Args:
+        usage (dict): requests・prompt_tokens・output_tokens・cached_tokens・latency_msの合計
+            （Noneなら使用量なし）
+
+    Returns:
+        dict: 合計に加えて、total_tokensとavg_latency_ms（1応答あたり）を含む
+    """
+    usage = usage or {}
+    requests = usage.get('requests', 0)
+    prompt_tokens = usage.get('prompt_tokens', 0)
+    output_tokens = usage.get('output_tokens', 0)
+    return {
+        'requests': requests,
+        'prompt_tokens': prompt_tokens,
+        'output_tokens': output_tokens,
+        'cached_tokens': usage.get('cached_tokens', 0),
+        'total_tokens': prompt_tokens + output_tokens,
+        'avg_latency_ms': round(usage.get('latency_ms', 0) / requests, 1) if requests else None,
+    }
+
+
+def parse_period(start=None, end=None):
+    """
+    集計期間を検証して 'YYYY-MM-DD' の組にする
+    省略時は今日（UTC）までのUSAGE_DEFAULT_DAYS日間
+
+    Args:
+        start (str, optional): 集計開始日（'YYYY-MM-DD'）
+        end (str, optional): 集計終了日（'YYYY-MM-DD'）
+
+    Returns:
+        tuple: (開始日, 終了日)
+
+    Raises:
+        ValueError: 日付の形式が不正な場合、開始日が終了日より後の場合、
+            期間がUSAGE_MAX_DAYS日を超える場合
+    """
+    end_date = _parse_day(end) if end else datetime.utcnow().date()
+    start_date = (
+        _parse_day(start) if start else end_date - timedelta(days=USAGE_DEFAULT_DAYS - 1)
+    )
+    if start_date > end_date:
+        raise ValueError('from must not be after to')
+    if (end_date - start_date).days + 1 > USAGE_MAX_DAYS:
+        raise ValueError(f'Period must be at most {USAGE_MAX_DAYS} days')
+    return start_date.isoformat(), end_date.isoformat()
+
+
+def _parse_day(value):
+    """'YYYY-MM-DD'を日付に変換（不正な形式はValueError）"""
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+
+def summarize(rows, start_day, end_day):
+    """
+    台帳の集計結果（日付・モデルごと）を、モデルごと・全体の合計と合わせて整形
+
+    Args:
+        rows (list): UsageRepository.aggregateの結果
+        start_day (str): 集計開始日
+        end_day (str): 集計終了日
+
+    Returns:
+        dict: {'from', 'to', 'days': [{'day', 'model', ...}], 'models': {モデル名: 合計},
+               'totals': 全体の合計}
+    """
+    models = {}
+    totals = {}
+    for row in rows:
+        for target in (models.setdefault(row['model'], {}), totals):
+            for field in ('requests', *USAGE_FIELDS):
+                target[field] = target.get(field, 0) + row[field]
+
+    return {
+        'from': start_day,
+        'to': end_day,
+        'days': [
+            {'day': row['day'], 'model': row['model'], **format_usage(row)}
+            for row in rows
+        ],
+        'models': {model: format_usage(usage) for model, usage in models.items()},
+        'totals': format_usage(totals),
+    }
+
+
+@traced()
+def get_usage_by_day(start_day, end_day):
+    """
+    期間内の使用量を日付・モデルごとに集計
+
+    Args:
+        start_day (str): 集計開始日（'YYYY-MM-DD'、この日を含む）
+        end_day (str): 集計終了日（'YYYY-MM-DD'、この日を含む）
+
+    Returns:
+        dict: summarizeの形式
+    """
+    rows = get_storage().usage.aggregate(start_day, end_day)
+    return summarize(rows, start_day, end_day)
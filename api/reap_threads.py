@@ -0,0 +1,37 @@
+"""
+削除済みスレッドのメッセージと孤立メッセージを削除するスクリプト
+（通常はスレッド削除時にバックグラウンドで実行される。定期実行や中断後の再開に使う）
+
+使い方:
+    python reap_threads.py            # 墓標の付いたスレッドを片付ける
+    python reap_threads.py --orphans  # 孤立メッセージ（スレッドが存在しない）も削除
+"""
+import sys
+from services.db_service import db_service
+from services.thread_reaper import thread_reaper
+
+
+def reap(orphans=False):
+    """削除済みスレッドを片付け、結果を表示"""
+    if not db_service.connect():
+        print("MongoDBに接続できませんでした")
+        return False
+
+    stats = thread_reaper.reap_deleted_threads()
+    print(f"削除済みスレッド: {stats['threads']} 件 / メッセージ: {stats['messages']} 件")
+
+    if orphans:
+        stats = thread_reaper.sweep_orphans()
+        print(f"孤立メッセージのスレッド: {stats['threads']} 件 / メッセージ: {stats['messages']} 件")
+    return True
+
+
+if __name__ == '__main__':
+    try:
+        success = reap(orphans='--orphans' in sys.argv)
+        sys.exit(0 if success else 1)
+    except Exception as e:
+        print(f"エラー: {e}")
+        sys.exit(1)
+    finally:
+        db_service.close()
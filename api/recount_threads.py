@@ -0,0 +1,33 @@
+"""
+スレッドのメッセージ数と最新メッセージのプレビューを数え直すスクリプト
+（通常はメッセージの保存・削除のたびに更新される。増分更新がずれた場合や、
+プレビュー導入前のスレッドの修復に使う。MongoDBでは1回の集計で書き戻す）
+
+使い方:
+    python recount_threads.py
+"""
+import sys
+from models import thread as thread_model
+from services.db_service import db_service
+
+
+def recount():
+    """全スレッドを数え直し、結果を表示"""
+    if not db_service.connect():
+        print("MongoDBに接続できませんでした")
+        return False
+
+    count = thread_model.recount_messages()
+    print(f"数え直したスレッド: {count} 件")
+    return True
+
+
+if __name__ == '__main__':
+    try:
+        success = recount()
+        sys.exit(0 if success else 1)
+    except Exception as e:
+        print(f"エラー: {e}")
+        sys.exit(1)
+    finally:
+        db_service.close()
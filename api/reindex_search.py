@@ -0,0 +1,38 @@
+"""
+全文検索のエントリを作り直すスクリプト
+（全文検索の導入前に保存したスレッド・メッセージの取り込みや、トークン化を変更した後に使う）
+
+使い方:
+    python reindex_search.py
+"""
+import sys
+from models import search as search_model
+from services.db_service import db_service
+
+
+def show_progress(threads, entries):
+    """100スレッドごとに進捗を表示"""
+    if threads % 100 == 0:
+        print(f"  {threads} スレッド / {entries} エントリ")
+
+
+def reindex():
+    """削除済みでない全スレッドのエントリを作り直し、結果を表示"""
+    if not db_service.connect():
+        print("MongoDBに接続できませんでした")
+        return False
+
+    stats = search_model.rebuild_index(progress=show_progress)
+    print(f"スレッド: {stats['threads']} 件 / 検索エントリ: {stats['entries']} 件")
+    return True
+
+
+if __name__ == '__main__':
+    try:
+        success = reindex()
+        sys.exit(0 if success else 1)
+    except Exception as e:
+        print(f"エラー: {e}")
+        sys.exit(1)
+    finally:
+        db_service.close()
@@ -0,0 +1,46 @@
+# Repositories Package
+"""
+スレッド・メッセージの保存先
+config.STORAGE_BACKENDで選んだ保存先（Storage）をget_storageで取得する
+"""
+import threading
+from config import config
+
+# 保存先の名前 -> Storage（保存先ごとに1つ）
+_storages = {}
+_lock = threading.Lock()
+
+
+def get_storage():
+    """
+    config.STORAGE_BACKENDの保存先を取得
+    使われない保存先の実装（MongoDBのクライアントなど）を読み込まないよう、初回に実装をimportする
+
+    Returns:
+        Storage: 保存先
+
+    Raises:
+        ValueError: STORAGE_BACKENDが不明な値の場合
+    """
+    backend = config.STORAGE_BACKEND
+    storage = _storages.get(backend)
+    if storage is not None:
+        return storage
+
+    with _lock:
+        if backend not in _storages:
+            if backend == 'mongo':
+                from repositories.mongo import MongoStorage
+                _storages[backend] = MongoStorage()
+            elif backend == 'memory':
+                from repositories.memory import MemoryStorage
+                _storages[backend] = MemoryStorage()
+            else:
+                raise ValueError(f"不明なSTORAGE_BACKENDです: {backend}")
+        return _storages[backend]
+
+
+def reset_storage():
+    """保存先を作り直す（インメモリの保存先の中身を捨てる。テスト・ベンチマーク用）"""
+    with _lock:
+        _storages.clear()
@@ -0,0 +1,577 @@
+"""
+リポジトリのインターフェース
+スレッド・メッセージの保存先が実装する操作を定義する
+
+リポジトリはMongoDBのドキュメントと同じ形式の辞書（_idはObjectId、日時はdatetime）を
+受け渡しし、フロントエンド用の整形や履歴の選択などはmodelsパッケージが行う。
+"""
+from config import config
+from services.search_tokenizer import normalize, search_text
+
+# 使用量（アシスタントメッセージのusage）のうち、スレッドと台帳で合計する値
+USAGE_FIELDS = ('prompt_tokens', 'output_tokens', 'cached_tokens', 'latency_ms')
+
+
+def window_entry(message):
+    """
+    メッセージドキュメントをウィンドウに埋め込む形式に変換
+
+    Args:
+        message (dict): MongoDBのメッセージドキュメント
+
+    Returns:
+        dict: スレッドIDを除いたメッセージ
+    """
+    entry = {
+        '_id': message['_id'],
+        'role': message['role'],
+        'content': message['content'],
+        'pinned': message.get('pinned', False),
+        'created_at': message['created_at']
+    }
+    if message.get('usage'):
+        entry['usage'] = message['usage']
+    return entry
+
+
+def preview_entry(message):
+    """
+    スレッド一覧に表示する最新メッセージのプレビュー（スレッドのlast_message）
+
+    Args:
+        message (dict): メッセージドキュメント（Noneならプレビューなし）
+
+    Returns:
+        dict: {'_id', 'role', 'preview', 'created_at'}、messageがNoneならNone
+            previewは本文の先頭THREAD_PREVIEW_CHARS文字
+    """
+    if message is None:
+        return None
+    return {
+        '_id': message['_id'],
+        'role': message['role'],
+        'preview': message['content'][:config.THREAD_PREVIEW_CHARS],
+        'created_at': message['created_at']
+    }
+
+
+def usage_increments(messages):
+    """
+    スレッドの使用量の合計に加える値（$incの内容）
+
+    Args:
+        messages (list): 保存するメッセージのドキュメント
+
+    Returns:
+        dict: 'usage.requests'などのフィールド -> 加える値（使用量がなければ空）
+    """
+    increments = {}
+    for message in messages:
+        usage = message.get('usage')
+        if not usage:
+            continue
+        increments['usage.requests'] = increments.get('usage.requests', 0) + 1
+        for field in USAGE_FIELDS:
+            key = f"usage.{field}"
+            increments[key] = increments.get(key, 0) + usage.get(field, 0)
+    return increments
+
+
+def ledger_entries(thread_oid, messages):
+    """
+    使用量の台帳に記録するエントリ（使用量を持つメッセージごとに1件）
+    _idはメッセージのIDと同じにし、同じメッセージを二重に記録しないようにする
+
+    Args:
+        thread_oid (ObjectId): スレッドID
+        messages (list): 保存するメッセージのドキュメント
+
+    Returns:
+        list: 台帳のドキュメント（day は作成日（UTC）の 'YYYY-MM-DD'）
+    """
+    return [
+        {
+            '_id': message['_id'],
+            'thread_id': thread_oid,
+            'model': message['usage']['model'],
+            'day': message['created_at'].strftime('%Y-%m-%d'),
+            'created_at': message['created_at'],
+            **{field: message['usage'].get(field, 0) for field in USAGE_FIELDS},
+        }
+        for message in messages
+        if message.get('usage')
+    ]
+
+
+def search_entry(kind, doc, thread_oid):
+    """
+    全文検索のエントリを作成
+    _idは元のスレッド・メッセージのIDと同じにし、作り直すときは置き換える
+
+    Args:
+        kind (str): 'thread'（タイトル）または 'message'（本文）
+        doc (dict): スレッドまたはメッセージのドキュメント
+        thread_oid (ObjectId): スレッドID
+
+    Returns:
+        dict: {'_id', 'kind', 'thread_id', 'role', 'text', 'terms', 'created_at'}
+            textはスニペット用の正規化したテキスト、termsはn-gramを空白でつないだもの
+    """
+    source = doc['title'] if kind == 'thread' else doc['content']
+    text = normalize(source)[:config.SEARCH_MAX_INDEXED_CHARS]
+    return {
+        '_id': doc['_id'],
+        'kind': kind,
+        'thread_id': thread_oid,
+        'role': doc.get('role'),
+        'text': text,
+        'terms': search_text(text),
+        'created_at': doc['created_at'],
+    }
+
+
+class ThreadRepository:
+    """
+    スレッドの保存先
+    一覧・メッセージの表示が変わる更新（タイトル・ウィンドウ・プレビュー・使用量）では
+    スレッドのversionを1増やす（条件付きGETのETagに使う）
+    """
+
+    def insert(self, thread):
+        """
+        スレッドを保存
+
+        Args:
+            thread (dict): new_thread_documentで作成したドキュメント（_idが設定される）
+        """
+        raise NotImplementedError
+
+    def find_page(self, limit, cursor=None, title_prefix=None, query=None):
+        """
+        削除済みでないスレッドを(updated_at, _id)の降順に最大limit件取得
+
+        Args:
+            limit (int): 取得する最大件数
+            cursor (str, optional): 前ページのnext_cursor
+            title_prefix (str, optional): タイトルの前方一致条件
+            query (str, optional): タイトルの部分一致条件（大文字小文字を区別しない）
+
+        Returns:
+            list: 直近メッセージを除いたスレッドのリスト
+
+        Raises:
+            ValueError: カーソルの形式が不正な場合
+        """
+        raise NotImplementedError
+
+    def find(self, thread_oid, window=False):
+        """
+        削除済みでないスレッドをIDで取得
+
+        Args:
+            thread_oid (ObjectId): スレッドID
+            window (bool): 直近メッセージ（recent_messages）も含めるか
+
+        Returns:
+            dict: スレッド、存在しない場合はNone
+        """
+        raise NotImplementedError
+
+    def update(self, thread_oid, fields):
+        """
+        削除済みでないスレッドのフィールドを更新
+
+        Returns:
+            dict: 更新後のスレッド（直近メッセージを除く）、存在しない場合はNone
+        """
+        raise NotImplementedError
+
+    def touch(self, thread_oid, messages=None, session=None):
+        """
+        更新日時を現在時刻にし、追加したメッセージを直近メッセージのウィンドウに追加
+        （ウィンドウは末尾THREAD_RECENT_MESSAGES件に保ち、message_countを増やし、
+        最後のメッセージを最新メッセージのプレビュー（last_message）にする）
+
+        Args:
+            thread_oid (ObjectId): スレッドID
+            messages (list, optional): 追加したメッセージのドキュメント（作成日時の昇順）
+            session (optional): Storage.transactionから渡されたセッション
+
+        Returns:
+            dict: 更新後のスレッド（直近メッセージを除く）、存在しない場合はNone
+        """
+        raise NotImplementedError
+
+    def set_window(self, thread, recent, count):
+        """
+        ウィンドウを持たない既存スレッドに直近メッセージとメッセージ数を書き込む
+        読み込み後にupdated_atが変わっていた場合は書き込まない
+
+        Args:
+            thread (dict): _idとupdated_atを含むスレッド
+            recent (list): 直近メッセージ（作成日時の昇順。最後の1件を最新メッセージのプレビューにする）
+            count (int): メッセージ数
+        """
+        raise NotImplementedError
+
+    def remove_from_window(self, thread_oid, message_oid):
+        """
+        削除したメッセージをウィンドウから取り除き、メッセージ数を減らす（0未満にはしない）
+
+        Returns:
+            dict: 更新後のスレッド（recent_messagesは最新の1件まで）、存在しない場合はNone
+        """
+        raise NotImplementedError
+
+    def replace_last_message(self, thread_oid, removed_oid, message):
+        """
+        最新メッセージのプレビューを置き換える
+        プレビューがremoved_oidのままの場合だけ書き込む（先に新しいメッセージが追加されていれば何もしない）
+
+        Args:
+            thread_oid (ObjectId): スレッドID
+            removed_oid (ObjectId): 削除したメッセージのID
+            message (dict): 新しい最新メッセージ（残っていなければNone）
+        """
+        raise NotImplementedError
+
+    def set_window_pinned(self, thread_oid, message_oid, pinned):
+        """ウィンドウ内のメッセージのピン留め状態を更新（ウィンドウ外なら何もしない）"""
+        raise NotImplementedError
+
+    def update_summary(self, thread_oid, summary, summarized_until, previous_until,
+                       summarized_count):
+        """
+        summarized_untilがprevious_untilのままの場合だけ要約と要約済みのメッセージ数を更新
+
+        Returns:
+            bool: 更新されたか
+        """
+        raise NotImplementedError
+
+    def mark_deleted(self, thread_oid):
+        """
+        スレッドに墓標（deleted_at）を付ける
+
+        Returns:
+            bool: 墓標を付けたか（存在しない・削除済みならFalse）
+        """
+        raise NotImplementedError
+
+    def find_version(self, thread_oid):
+        """
+        削除済みでないスレッドのversionだけを読む（メッセージは読まない）
+
+        Returns:
+            int: version（導入前のスレッドは0）、存在しない場合はNone
+        """
+        raise NotImplementedError
+
+    def find_deleted_ids(self, limit):
+        """墓標の付いたスレッドのIDを削除日時の古い順に最大limit件取得"""
+        raise NotImplementedError
+
+    def find_many(self, thread_oids):
+        """
+        指定したIDの削除済みでないスレッドを取得（直近メッセージを除く）
+
+        Returns:
+            dict: ObjectId -> スレッド
+        """
+        raise NotImplementedError
+
+    def find_existing_ids(self, thread_oids):
+        """
+        指定したIDのうち、スレッドが存在するもの（削除済みを含む）を取得
+
+        Returns:
+            set: 存在するスレッドのObjectId
+        """
+        raise NotImplementedError
+
+    def purge(self, thread_oid):
+        """
+        墓標の付いたスレッドを削除
+
+        Returns:
+            bool: 削除したか
+        """
+        raise NotImplementedError
+
+
+class MessageRepository:
+    """メッセージの保存先"""
+
+    def insert_many(self, thread_oid, messages, session=None):
+        """
+        メッセージを保存
+
+        Args:
+            thread_oid (ObjectId): スレッドID
+            messages (list): build_messageで作成したドキュメント（作成日時の昇順）
+            session (optional): Storage.transactionから渡されたセッション
+        """
+        raise NotImplementedError
+
+    def remove_many(self, thread_oid, message_oids, session=None):
+        """保存したメッセージを取り消す"""
+        raise NotImplementedError
+
+    def find_all(self, thread_oid):
+        """スレッドの全メッセージを取得（作成日時の昇順）"""
+        raise NotImplementedError
+
+    def find_page(self, thread_oid, limit, before=None, after=None):
+        """
+        キーセットページネーション用にメッセージを最大limit件取得
+
+        Args:
+            thread_oid (ObjectId): スレッドID
+            limit (int): 取得する最大件数
+            before (str, optional): このカーソルより古いメッセージを取得
+            after (str, optional): このカーソルより新しいメッセージを取得
+
+        Returns:
+            list: メッセージのリスト（afterなら昇順、それ以外は降順）
+
+        Raises:
+            ValueError: カーソルの形式が不正な場合
+        """
+        raise NotImplementedError
+
+    def history_sources(self, thread_oid):
+        """
+        会話履歴の構築に使うメッセージ
+
+        Args:
+            thread_oid (ObjectId): スレッドID
+
+        Returns:
+            tuple: (ピン留めメッセージのリスト,
+                新しい順に最大HISTORY_MAX_MESSAGES件を返すジェネレーター)
+                ジェネレーターは読み終えたらcloseする
+        """
+        raise NotImplementedError
+
+    def context_sources(self, thread_oid):
+        """
+        メッセージ送信時の会話履歴の構築に使うメッセージ
+        （保存先によってはスレッドの存在確認とまとめて1回で読む）
+
+        Returns:
+            tuple: history_sourcesと同じ形式、スレッドが存在しない場合はNone
+        """
+        return self.history_sources(thread_oid)
+
+    def latest_until(self, thread_oid, until, limit):
+        """
+        指定日時以前に作成されたメッセージの件数と、そのうち新しいlimit件
+
+        Returns:
+            tuple: (件数, メッセージのリスト（新しい順）)
+        """
+        raise NotImplementedError
+
+    def count_after(self, thread_oid, after, limit):
+        """指定日時より後に作成されたメッセージ数を数える（limit件で打ち切り）"""
+        raise NotImplementedError
+
+    def find_after(self, thread_oid, after, limit):
+        """指定日時より後に作成されたメッセージを最大limit件取得（作成日時の昇順）"""
+        raise NotImplementedError
+
+    def set_pinned(self, message_oid, pinned):
+        """
+        メッセージのピン留め状態を設定
+
+        Returns:
+            dict: 更新されたメッセージ、存在しない場合はNone
+        """
+        raise NotImplementedError
+
+    def delete_one(self, message_oid):
+        """
+        メッセージを削除
+
+        Returns:
+            dict: 削除したメッセージ（thread_idを含む）、存在しない場合はNone
+        """
+        raise NotImplementedError
+
+    def delete_by_thread(self, thread_oid):
+        """
+        スレッドの全メッセージを削除
+
+        Returns:
+            int: 削除されたメッセージ数
+        """
+        raise NotImplementedError
+
+    def delete_batch(self, thread_oid, limit):
+        """
+        スレッドのメッセージを最大limit件だけ削除
+
+        Returns:
+            int: 削除されたメッセージ数（0なら残っていない）
+        """
+        raise NotImplementedError
+
+    def find_thread_ids(self, after, limit):
+        """
+        メッセージが参照しているスレッドIDを昇順に最大limit件取得
+
+        Args:
+            after (ObjectId): このIDより後のスレッドIDから取得（Noneなら先頭から）
+            limit (int): 取得する最大件数
+
+        Returns:
+            list: ObjectIdのリスト
+        """
+        raise NotImplementedError
+
+
+class UsageRepository:
+    """
+    使用量の台帳の保存先
+    スレッドやメッセージを削除しても、消費したクォータの記録として残す
+    """
+
+    def record(self, thread_oid, messages, session=None):
+        """
+        使用量を持つメッセージを台帳に記録
+
+        Args:
+            thread_oid (ObjectId): スレッドID
+            messages (list): 保存したメッセージのドキュメント（使用量がないものは記録しない）
+            session (ClientSession, optional): トランザクション用のセッション
+        """
+        raise NotImplementedError
+
+    def aggregate(self, start_day, end_day):
+        """
+        期間内の使用量を日付・モデルごとに集計
+
+        Args:
+            start_day (str): 集計開始日（'YYYY-MM-DD'、この日を含む）
+            end_day (str): 集計終了日（'YYYY-MM-DD'、この日を含む）
+
+        Returns:
+            list: [{'day', 'model', 'requests', 'prompt_tokens', 'output_tokens',
+                    'cached_tokens', 'latency_ms'}, ...]（日付・モデルの昇順）
+        """
+        raise NotImplementedError
+
+
+class SearchRepository:
+    """
+    全文検索のエントリ（search_entryで作成）の保存先
+    スレッドの削除（墓標）はエントリに反映せず、検索結果から除いたうえで後片付けで消す
+    """
+
+    def index(self, entries, session=None):
+        """
+        エントリを保存（同じ_idのエントリは置き換える）
+
+        Args:
+            entries (list): search_entryで作成したエントリ
+            session (ClientSession, optional): トランザクション用のセッション
+        """
+        raise NotImplementedError
+
+    def remove(self, entry_ids):
+        """指定した_idのエントリを削除"""
+        raise NotImplementedError
+
+    def remove_by_thread(self, thread_oid):
+        """
+        スレッドのエントリ（タイトルと全メッセージ）を削除
+
+        Returns:
+            int: 削除したエントリ数
+        """
+        raise NotImplementedError
+
+    def search(self, terms, limit, cursor=None):
+        """
+        すべてのトークンを含むエントリをスコアの高い順に最大limit件取得
+
+        Args:
+            terms (list): search_tokenizer.query_termsのトークン
+            limit (int): 取得する最大件数
+            cursor (str, optional): このカーソル（スコア, _id）より後から取得
+
+        Returns:
+            list: エントリ（termsを除き、scoreを加えたもの）のリスト（スコアの降順、同点は_idの降順）
+
+        Raises:
+            ValueError: カーソルの形式が不正な場合
+        """
+        raise NotImplementedError
+
+
+class Storage:
+    """スレッド・メッセージ・使用量・全文検索のリポジトリと、保存先全体にかかわる操作"""
+
+    # 保存先の名前（config.STORAGE_BACKENDの値）
+    name = None
+
+    def __init__(self, threads, messages, usage, search):
+        self.threads = threads
+        self.messages = messages
+        self.usage = usage
+        self.search = search
+
+    def connect(self):
+        """
+        保存先に接続（接続済みなら何もしない）
+
+        Returns:
+            bool: 接続できたか
+        """
+        return True
+
+    def is_connected(self):
+        """保存先に接続済みか"""
+        return True
+
+    def transaction(self, write):
+        """
+        write(session)を1つのまとまりとして実行
+
+        Args:
+            write (callable): セッションを受け取り、リポジトリへの書き込みを行う関数
+
+        Returns:
+            writeの戻り値
+        """
+        return write(None)
+
+    def load_checkpoint(self, name):
+        """
+        保守処理の進捗を読む
+
+        Args:
+            name (str): 進捗の名前
+
+        Returns:
+            dict: 保存した値（なければ空の辞書）
+        """
+        raise NotImplementedError
+
+    def save_checkpoint(self, name, values):
+        """保守処理の進捗を保存"""
+        raise NotImplementedError
+
+    def clear_checkpoint(self, name):
+        """保守処理の進捗を消す"""
+        raise NotImplementedError
+
+    def recount_messages(self):
+        """
+        削除済みでない全スレッドのメッセージ数と最新メッセージのプレビューを
+        メッセージから数え直す（増分更新がずれた場合の修復用）
+
+        Returns:
+            int: 数え直したスレッド数
+        """
+        raise NotImplementedError
@@ -0,0 +1,580 @@
+"""
+インメモリのリポジトリ
+MongoDBを使わずにプロセス内の辞書へ保存する（テスト・ベンチマーク用。再起動で消える）
+
+MongoDBのインデックスと同じキーのソート済みリストを持ち、一覧やページの取得は
+二分探索でシークするため、件数やページの深さに関わらず読むのは返す分だけになる。
+    スレッド一覧:     (updated_at, _id)  … updated_at_descインデックス
+    削除済みスレッド: (deleted_at, _id)  … deleted_atインデックス
+    メッセージ:       スレッドごとの (created_at, _id) … thread_id_created_atインデックス
+    使用量の台帳:     (day, model, _id)  … day_modelインデックス
+    全文検索:         トークン -> エントリIDの集合（転置インデックス） … terms_textインデックス
+日時はMongoDBと同じくミリ秒精度に切り捨てて保存し、カーソルの扱いを揃える。
+"""
+import heapq
+import threading
+from bisect import bisect_left, bisect_right, insort
+from collections import Counter
+from datetime import datetime
+from bson import ObjectId
+from config import config
+from models.pagination import decode_cursor, decode_score_cursor
+from repositories.base import (
+    USAGE_FIELDS,
+    MessageRepository,
+    SearchRepository,
+    Storage,
+    ThreadRepository,
+    UsageRepository,
+    ledger_entries,
+    preview_entry,
+    usage_increments,
+    window_entry,
+)
+
+_MAX_OBJECT_ID = ObjectId('f' * 24)
+
+# ミリ秒精度で保存する日時のフィールド
+_DATETIME_FIELDS = ('created_at', 'updated_at', 'deleted_at', 'summarized_until')
+
+
+def _truncate(value):
+    """日時をMongoDBと同じミリ秒精度に切り捨てる"""
+    if isinstance(value, datetime):
+        return value.replace(microsecond=value.microsecond // 1000 * 1000)
+    return value
+
+
+def _stored(doc):
+    """保存用のコピー（日時はミリ秒精度）"""
+    doc = dict(doc)
+    for field in _DATETIME_FIELDS:
+        if field in doc:
+            doc[field] = _truncate(doc[field])
+    if 'recent_messages' in doc:
+        doc['recent_messages'] = [_stored(msg) for msg in doc['recent_messages']]
+    if doc.get('last_message'):
+        doc['last_message'] = _stored(doc['last_message'])
+    return doc
+
+
+def _copy(doc, window=True):
+    """呼び出し元に返すコピー（保存中のドキュメントを書き換えられないようにする）"""
+    doc = dict(doc)
+    if 'usage' in doc:
+        doc['usage'] = dict(doc['usage'])
+    if doc.get('last_message'):
+        doc['last_message'] = dict(doc['last_message'])
+    if not window:
+        doc.pop('recent_messages', None)
+    elif 'recent_messages' in doc:
+        doc['recent_messages'] = [dict(msg) for msg in doc['recent_messages']]
+    return doc
+
+
+def _bump(thread):
+    """スレッドのversionを1増やす（MongoDB版の$incと同じ）"""
+    thread['version'] = thread.get('version', 0) + 1
+
+
+def _discard(keys, key):
+    """ソート済みリストからキーを取り除く（なければ何もしない）"""
+    index = bisect_left(keys, key)
+    if index < len(keys) and keys[index] == key:
+        del keys[index]
+
+
+class MemoryThreadRepository(ThreadRepository):
+    """スレッドのインメモリ保存先"""
+
+    def __init__(self, lock):
+        self._lock = lock
+        # _id -> スレッド（削除済みを含む）
+        self._threads = {}
+        # 削除済みでないスレッドの (updated_at, _id) の昇順
+        self._live = []
+        # 削除済みスレッドの (deleted_at, _id) の昇順
+        self._deleted = []
+
+    def _get_live(self, thread_oid):
+        thread = self._threads.get(ObjectId(thread_oid))
+        if thread is None or 'deleted_at' in thread:
+            return None
+        return thread
+
+    def _set_updated_at(self, thread, updated_at):
+        """更新日時を変え、一覧のキーを付け直す"""
+        _discard(self._live, (thread['updated_at'], thread['_id']))
+        thread['updated_at'] = _truncate(updated_at)
+        insort(self._live, (thread['updated_at'], thread['_id']))
+
+    def insert(self, thread):
+        thread.setdefault('_id', ObjectId())
+        doc = _stored(thread)
+        with self._lock:
+            self._threads[doc['_id']] = doc
+            insort(self._live, (doc['updated_at'], doc['_id']))
+
+    def find_page(self, limit, cursor=None, title_prefix=None, query=None):
+        # カーソルは検索前に検証する（MongoDB版と同じくValueErrorを送出）
+        bound = decode_cursor(cursor) if cursor else None
+        needle = query.casefold() if query else None
+
+        with self._lock:
+            # 降順に読むため、カーソルより前（古い側）の末尾から遡る
+            index = bisect_left(self._live, bound) if bound else len(self._live)
+            threads = []
+            while index > 0 and len(threads) < limit:
+                index -= 1
+                thread = self._threads[self._live[index][1]]
+                if title_prefix and not thread['title'].startswith(title_prefix):
+                    continue
+                if needle and needle not in thread['title'].casefold():
+                    continue
+                threads.append(_copy(thread, window=False))
+            return threads
+
+    def find(self, thread_oid, window=False):
+        with self._lock:
+            thread = self._get_live(thread_oid)
+            return _copy(thread, window) if thread else None
+
+    def update(self, thread_oid, fields):
+        fields = _stored(fields)
+        with self._lock:
+            thread = self._get_live(thread_oid)
+            if thread is None:
+                return None
+            if 'updated_at' in fields:
+                self._set_updated_at(thread, fields.pop('updated_at'))
+            thread.update(fields)
+            _bump(thread)
+            return _copy(thread, window=False)
+
+    def touch(self, thread_oid, messages=None, session=None):
+        with self._lock:
+            thread = self._get_live(thread_oid)
+            if thread is None:
+                return None
+            self._set_updated_at(thread, datetime.utcnow())
+            _bump(thread)
+            if messages:
+                window = thread.get('recent_messages', [])
+                window.extend(_stored(window_entry(msg)) for msg in messages)
+                thread['recent_messages'] = window[-config.THREAD_RECENT_MESSAGES:]
+                thread['message_count'] = thread.get('message_count', 0) + len(messages)
+                thread['last_message'] = _stored(preview_entry(messages[-1]))
+                totals = thread.setdefault('usage', {})
+                for key, value in usage_increments(messages).items():
+                    field = key.split('.', 1)[1]
+                    totals[field] = totals.get(field, 0) + value
+            return _copy(thread, window=False)
+
+    def set_window(self, thread, recent, count):
+        with self._lock:
+            stored = self._threads.get(thread['_id'])
+            if (stored is None or stored['updated_at'] != thread['updated_at']
+                    or 'recent_window' in stored):
+                return
+            stored['recent_messages'] = [_stored(window_entry(msg)) for msg in recent]
+            stored['message_count'] = count
+            stored['last_message'] = _stored(preview_entry(recent[-1])) if recent else None
+            stored['recent_window'] = True
+            _bump(stored)
+
+    def remove_from_window(self, thread_oid, message_oid):
+        with self._lock:
+            thread = self._threads.get(thread_oid)
+            if thread is None:
+                return None
+            thread['recent_messages'] = [
+                msg for msg in thread.get('recent_messages', []) if msg['_id'] != message_oid
+            ]
+            thread['message_count'] = max(thread.get('message_count', 0) - 1, 0)
+            _bump(thread)
+            result = _copy(thread)
+            result['recent_messages'] = result['recent_messages'][-1:]
+            return result
+
+    def replace_last_message(self, thread_oid, removed_oid, message):
+        with self._lock:
+            thread = self._threads.get(thread_oid)
+            last = thread.get('last_message') if thread else None
+            if last and last['_id'] == removed_oid:
+                thread['last_message'] = _stored(preview_entry(message)) if message else None
+                _bump(thread)
+
+    def set_window_pinned(self, thread_oid, message_oid, pinned):
+        with self._lock:
+            thread = self._threads.get(thread_oid)
+            if thread is None:
+                return
+            _bump(thread)
+            for msg in thread.get('recent_messages', []):
+                if msg['_id'] == message_oid:
+                    msg['pinned'] = bool(pinned)
+
+    def update_summary(self, thread_oid, summary, summarized_until, previous_until,
+                       summarized_count):
+        with self._lock:
+            thread = self._get_live(thread_oid)
+            if thread is None or thread.get('summarized_until') != previous_until:
+                return False
+            thread['summary'] = summary
+            thread['summarized_until'] = _truncate(summarized_until)
+            thread['summarized_count'] = summarized_count
+            return True
+
+    def mark_deleted(self, thread_oid):
+        with self._lock:
+            thread = self._get_live(thread_oid)
+            if thread is None:
+                return False
+            _discard(self._live, (thread['updated_at'], thread['_id']))
+            thread['deleted_at'] = _truncate(datetime.utcnow())
+            insort(self._deleted, (thread['deleted_at'], thread['_id']))
+            return True
+
+    def find_version(self, thread_oid):
+        with self._lock:
+            thread = self._get_live(thread_oid)
+            return thread.get('version', 0) if thread else None
+
+    def find_deleted_ids(self, limit):
+        with self._lock:
+            return [thread_oid for _, thread_oid in self._deleted[:limit]]
+
+    def find_many(self, thread_oids):
+        with self._lock:
+            return {
+                thread_oid: _copy(self._threads[thread_oid], window=False)
+                for thread_oid in thread_oids
+                if self._get_live(thread_oid) is not None
+            }
+
+    def find_existing_ids(self, thread_oids):
+        with self._lock:
+            return {thread_oid for thread_oid in thread_oids if thread_oid in self._threads}
+
+    def purge(self, thread_oid):
+        with self._lock:
+            thread = self._threads.get(thread_oid)
+            if thread is None or 'deleted_at' not in thread:
+                return False
+            del self._threads[thread_oid]
+            _discard(self._deleted, (thread['deleted_at'], thread_oid))
+            return True
+
+
+class MemoryMessageRepository(MessageRepository):
+    """メッセージのインメモリ保存先"""
+
+    def __init__(self, lock):
+        self._lock = lock
+        # _id -> メッセージ
+        self._messages = {}
+        # thread_id -> (created_at, _id) の昇順
+        self._by_thread = {}
+        # thread_id -> ピン留めメッセージの_id
+        self._pinned = {}
+        # メッセージのあるスレッドIDの昇順（孤立メッセージの検出用）
+        self._thread_ids = []
+
+    def _keys(self, thread_oid):
+        return self._by_thread.get(thread_oid, [])
+
+    def _remove(self, message_oid):
+        """メッセージと索引を削除（呼び出し元でロックを取る）"""
+        message = self._messages.pop(message_oid, None)
+        if message is None:
+            return None
+
+        thread_oid = message['thread_id']
+        keys = self._by_thread[thread_oid]
+        _discard(keys, (message['created_at'], message_oid))
+        self._pinned.get(thread_oid, set()).discard(message_oid)
+        if not keys:
+            del self._by_thread[thread_oid]
+            self._pinned.pop(thread_oid, None)
+            _discard(self._thread_ids, thread_oid)
+        return message
+
+    def _docs(self, keys):
+        """キーのメッセージのコピー（読む間に削除されたものは飛ばす）"""
+        for _, message_oid in keys:
+            message = self._messages.get(message_oid)
+            if message is not None:
+                yield dict(message)
+
+    def insert_many(self, thread_oid, messages, session=None):
+        with self._lock:
+            keys = self._by_thread.get(thread_oid)
+            if keys is None:
+                keys = self._by_thread[thread_oid] = []
+                insort(self._thread_ids, thread_oid)
+            for message in messages:
+                doc = _stored(message)
+                self._messages[doc['_id']] = doc
+                insort(keys, (doc['created_at'], doc['_id']))
+                if doc.get('pinned'):
+                    self._pinned.setdefault(thread_oid, set()).add(doc['_id'])
+
+    def remove_many(self, thread_oid, message_oids, session=None):
+        with self._lock:
+            for message_oid in message_oids:
+                self._remove(message_oid)
+
+    def find_all(self, thread_oid):
+        with self._lock:
+            return list(self._docs(self._keys(thread_oid)))
+
+    def find_page(self, thread_oid, limit, before=None, after=None):
+        cursor = before or after
+        bound = decode_cursor(cursor) if cursor else None
+
+        with self._lock:
+            keys = self._keys(thread_oid)
+            if after:
+                start = bisect_right(keys, bound)
+                return list(self._docs(keys[start:start + limit]))
+
+            end = bisect_left(keys, bound) if bound else len(keys)
+            return list(self._docs(reversed(keys[max(0, end - limit):end])))
+
+    def history_sources(self, thread_oid):
+        with self._lock:
+            pinned = list(self._docs(
+                sorted(
+                    (self._messages[message_oid]['created_at'], message_oid)
+                    for message_oid in self._pinned.get(thread_oid, ())
+                )
+            ))
+            # ロック中は最新HISTORY_MAX_MESSAGES件のキーだけを写し、本文は読みながら取り出す
+            keys = self._keys(thread_oid)[-config.HISTORY_MAX_MESSAGES:]
+        return pinned, self._docs(reversed(keys))
+
+    def latest_until(self, thread_oid, until, limit):
+        with self._lock:
+            keys = self._keys(thread_oid)
+            end = bisect_right(keys, (_truncate(until), _MAX_OBJECT_ID))
+            return end, list(self._docs(reversed(keys[max(0, end - limit):end])))
+
+    def _start_after(self, keys, after):
+        if after is None:
+            return 0
+        return bisect_right(keys, (_truncate(after), _MAX_OBJECT_ID))
+
+    def count_after(self, thread_oid, after, limit):
+        with self._lock:
+            keys = self._keys(thread_oid)
+            return min(len(keys) - self._start_after(keys, after), limit)
+
+    def find_after(self, thread_oid, after, limit):
+        with self._lock:
+            keys = self._keys(thread_oid)
+            start = self._start_after(keys, after)
+            return [
+                {'role': msg['role'], 'content': msg['content'], 'created_at': msg['created_at']}
+                for msg in self._docs(keys[start:start + limit])
+            ]
+
+    def set_pinned(self, message_oid, pinned):
+        with self._lock:
+            message = self._messages.get(message_oid)
+            if message is None:
+                return None
+            message['pinned'] = bool(pinned)
+            pinned_ids = self._pinned.setdefault(message['thread_id'], set())
+            if pinned:
+                pinned_ids.add(message_oid)
+            else:
+                pinned_ids.discard(message_oid)
+            return dict(message)
+
+    def delete_one(self, message_oid):
+        with self._lock:
+            message = self._remove(message_oid)
+            return dict(message) if message else None
+
+    def delete_by_thread(self, thread_oid):
+        return self.delete_batch(thread_oid, None)
+
+    def delete_batch(self, thread_oid, limit):
+        with self._lock:
+            keys = self._keys(thread_oid)[:limit]
+            for _, message_oid in keys:
+                self._remove(message_oid)
+            return len(keys)
+
+    def find_thread_ids(self, after, limit):
+        with self._lock:
+            start = bisect_right(self._thread_ids, after) if after is not None else 0
+            return self._thread_ids[start:start + limit]
+
+
+class MemoryUsageRepository(UsageRepository):
+    """使用量の台帳のインメモリ保存先"""
+
+    def __init__(self, lock):
+        self._lock = lock
+        # _id -> 台帳のエントリ
+        self._entries = {}
+        # (day, model, _id) の昇順
+        self._keys = []
+
+    def record(self, thread_oid, messages, session=None):
+        with self._lock:
+            for entry in ledger_entries(thread_oid, messages):
+                if entry['_id'] in self._entries:
+                    continue
+                self._entries[entry['_id']] = _stored(entry)
+                insort(self._keys, (entry['day'], entry['model'], entry['_id']))
+
+    def aggregate(self, start_day, end_day):
+        rows = {}
+        with self._lock:
+            index = bisect_left(self._keys, (start_day,))
+            while index < len(self._keys) and self._keys[index][0] <= end_day:
+                day, model, entry_id = self._keys[index]
+                index += 1
+                row = rows.get((day, model))
+                if row is None:
+                    row = rows[(day, model)] = {
+                        'day': day, 'model': model, 'requests': 0,
+                        **{field: 0 for field in USAGE_FIELDS},
+                    }
+                entry = self._entries[entry_id]
+                row['requests'] += 1
+                for field in USAGE_FIELDS:
+                    row[field] += entry[field]
+        # キーの順に読んでいるため、日付・モデルの昇順になっている
+        return list(rows.values())
+
+
+class MemorySearchRepository(SearchRepository):
+    """
+    全文検索のインメモリ保存先
+    スコアはMongoDBのtextScoreに近い値（一致したトークンごとに、出現回数をエントリの
+    トークン数で割った値を加える）で、順位付けの傾向を揃える
+    """
+
+    def __init__(self, lock):
+        self._lock = lock
+        # _id -> (termsを除いたエントリ, トークンの出現回数, トークン数)
+        self._entries = {}
+        # トークン -> _idの集合
+        self._postings = {}
+        # スレッドID -> _idの集合
+        self._by_thread = {}
+
+    def index(self, entries, session=None):
+        with self._lock:
+            for entry in entries:
+                self._remove(entry['_id'])
+                tokens = entry['terms'].split()
+                counts = Counter(tokens)
+                stored = _stored({k: v for k, v in entry.items() if k != 'terms'})
+                self._entries[entry['_id']] = (stored, counts, len(tokens))
+                for token in counts:
+                    self._postings.setdefault(token, set()).add(entry['_id'])
+                self._by_thread.setdefault(entry['thread_id'], set()).add(entry['_id'])
+
+    def _remove(self, entry_id):
+        found = self._entries.pop(entry_id, None)
+        if found is None:
+            return False
+        entry, counts, _ = found
+        for token in counts:
+            ids = self._postings.get(token)
+            ids.discard(entry_id)
+            if not ids:
+                del self._postings[token]
+        self._by_thread.get(entry['thread_id'], set()).discard(entry_id)
+        return True
+
+    def remove(self, entry_ids):
+        with self._lock:
+            for entry_id in entry_ids:
+                self._remove(entry_id)
+
+    def remove_by_thread(self, thread_oid):
+        with self._lock:
+            entry_ids = self._by_thread.pop(thread_oid, set())
+            return sum(1 for entry_id in list(entry_ids) if self._remove(entry_id))
+
+    def search(self, terms, limit, cursor=None):
+        # カーソルは検索前に検証する（MongoDB版と同じくValueErrorを送出）
+        bound = decode_score_cursor(cursor) if cursor else None
+
+        with self._lock:
+            postings = sorted((self._postings.get(term, set()) for term in terms), key=len)
+            if not postings or not postings[0]:
+                return []
+            # 最も少ないトークンの集合から絞り込む
+            candidates = postings[0].intersection(*postings[1:])
+
+            ranked = []
+            for entry_id in candidates:
+                entry, counts, total = self._entries[entry_id]
+                score = sum(0.5 + 0.5 * counts[term] / total for term in terms)
+                ranked.append((score, entry_id, entry))
+
+            # MongoDB版と同じく、倍率を掛ける前のスコアの上位だけを候補にする
+            ranked = heapq.nlargest(
+                config.SEARCH_MAX_CANDIDATES, ranked, key=lambda item: item[:2]
+            )
+            scored = []
+            for score, entry_id, entry in ranked:
+                if entry['kind'] == 'thread':
+                    score *= config.SEARCH_TITLE_BOOST
+                key = (score, entry_id)
+                if bound is None or key < bound:
+                    scored.append((key, entry))
+
+        scored.sort(key=lambda item: item[0], reverse=True)
+        return [dict(entry, score=key[0]) for key, entry in scored[:limit]]
+
+
+class MemoryStorage(Storage):
+    """インメモリの保存先"""
+
+    name = 'memory'
+
+    def __init__(self):
+        # transactionで複数のリポジトリへの書き込みをまとめられるよう、ロックを共有する
+        self._lock = threading.RLock()
+        self._checkpoints = {}
+        super().__init__(
+            MemoryThreadRepository(self._lock),
+            MemoryMessageRepository(self._lock),
+            MemoryUsageRepository(self._lock),
+            MemorySearchRepository(self._lock)
+        )
+
+    def transaction(self, write):
+        """ロックを取ったままwriteを実行（他のリクエストからは途中の状態が見えない）"""
+        with self._lock:
+            return write(None)
+
+    def load_checkpoint(self, name):
+        with self._lock:
+            return dict(self._checkpoints.get(name, {}))
+
+    def save_checkpoint(self, name, values):
+        with self._lock:
+            self._checkpoints.setdefault(name, {}).update(values)
+
+    def clear_checkpoint(self, name):
+        with self._lock:
+            self._checkpoints.pop(name, None)
+
+    def recount_messages(self):
+        with self._lock:
+            live = [self.threads._threads[thread_oid] for _, thread_oid in self.threads._live]
+            for thread in live:
+                keys = self.messages._keys(thread['_id'])
+                last = self.messages._messages[keys[-1][1]] if keys else None
+                thread['message_count'] = len(keys)
+                thread['last_message'] = _stored(preview_entry(last)) if last else None
+                _bump(thread)
+            return len(live)
@@ -0,0 +1,722 @@
+"""
+MongoDBのリポジトリ
+threadsコレクションと、messagesコレクションまたはmessage_bucketsコレクション
+（config.MESSAGE_STORAGE = 'bucket'）に保存する
+"""
+import re
+from datetime import datetime
+from itertools import islice
+from bson import ObjectId
+from config import config
+from models import message_buckets
+from pymongo import ReplaceOne
+from models.pagination import decode_score_cursor, keyset_filter
+from repositories.base import (
+    USAGE_FIELDS,
+    MessageRepository,
+    SearchRepository,
+    Storage,
+    ThreadRepository,
+    UsageRepository,
+    ledger_entries,
+    preview_entry,
+    usage_increments,
+    window_entry,
+)
+from services.db_service import db_service
+
+# スレッド一覧の並び順（updated_at_descインデックスと一致させる）
+THREADS_SORT = [('updated_at', -1), ('_id', -1)]
+
+# 埋め込みの直近メッセージを除いたスレッドの射影（一覧・単体取得用）
+THREAD_PROJECTION = {'recent_messages': 0}
+
+# メッセージ削除後に最新メッセージのプレビューを付け直すのに使うフィールド
+WINDOW_TAIL_PROJECTION = {
+    'last_message': 1, 'message_count': 1, 'recent_messages': {'$slice': -1}
+}
+
+# 削除済み（墓標付き）のスレッドを除く条件
+NOT_DELETED = {'deleted_at': {'$exists': False}}
+
+# 会話履歴の構築に必要なフィールド
+HISTORY_PROJECTION = {'role': 1, 'content': 1, 'pinned': 1, 'created_at': 1}
+
+
+def use_buckets():
+    """メッセージをバケット形式で保存しているか（config.MESSAGE_STORAGE）"""
+    return config.MESSAGE_STORAGE == 'bucket'
+
+
+def live_filter(thread_id):
+    """
+    削除済みでないスレッドをIDで指定する条件
+
+    Args:
+        thread_id (str or ObjectId): スレッドID
+
+    Returns:
+        dict: MongoDBのクエリ条件
+    """
+    return {'_id': ObjectId(thread_id), **NOT_DELETED}
+
+
+def build_threads_query(cursor=None, title_prefix=None, query=None):
+    """
+    スレッド一覧の絞り込み条件を作成
+    前方一致は先頭固定の正規表現なのでtitleのインデックスの範囲検索になるが、
+    部分一致は先頭が固定されないため、更新日時順に読みながら全件を照合する（スキャン）
+
+    Args:
+        cursor (str, optional): 前ページのnext_cursor
+        title_prefix (str, optional): タイトルの前方一致条件
+        query (str, optional): タイトルの部分一致条件（大文字小文字を区別しない）
+
+    Returns:
+        dict: MongoDBのクエリ条件
+
+    Raises:
+        ValueError: カーソルの形式が不正な場合
+    """
+    conditions = [NOT_DELETED]
+    if cursor:
+        conditions.append(keyset_filter('updated_at', cursor, -1))
+    if title_prefix:
+        conditions.append({'title': {'$regex': f'^{re.escape(title_prefix)}'}})
+    if query:
+        conditions.append({'title': {'$regex': re.escape(query), '$options': 'i'}})
+
+    return {'$and': conditions}
+
+
+def build_touch_update(messages=None):
+    """
+    更新日時の更新と直近メッセージの追加を行う更新内容を作成
+    ウィンドウは$pushの$sliceで末尾THREAD_RECENT_MESSAGES件に保ち、
+    最後のメッセージを最新メッセージのプレビュー（last_message）にし、
+    アシスタントメッセージの使用量はスレッドの合計（usage）に$incで加える。
+    スレッドのversion（ETagに使う）も増やす
+
+    Args:
+        messages (list, optional): 追加したメッセージのドキュメント（作成日時の昇順）
+
+    Returns:
+        dict: MongoDBの更新内容
+    """
+    update = {'$set': {'updated_at': datetime.utcnow()}, '$inc': {'version': 1}}
+    if messages:
+        update['$push'] = {'recent_messages': {
+            '$each': [window_entry(msg) for msg in messages],
+            '$slice': -config.THREAD_RECENT_MESSAGES
+        }}
+        update['$set']['last_message'] = preview_entry(messages[-1])
+        update['$inc'].update({'message_count': len(messages), **usage_increments(messages)})
+    return update
+
+
+def build_remove_update(message_oid):
+    """
+    削除したメッセージをウィンドウから取り除き、メッセージ数を減らす更新内容を作成
+    メッセージ数がずれていても負にならないよう、0で止める（更新パイプラインで1回で書き込む）。
+    ウィンドウ導入前のスレッドにはrecent_messagesを作らない。スレッドのversionも増やす
+
+    Args:
+        message_oid (ObjectId): 削除したメッセージのID
+
+    Returns:
+        list: MongoDBの更新パイプライン
+    """
+    return [{'$set': {
+        'recent_messages': {'$cond': [
+            {'$isArray': '$recent_messages'},
+            {'$filter': {
+                'input': '$recent_messages',
+                'cond': {'$ne': ['$$this._id', message_oid]}
+            }},
+            '$$REMOVE'
+        ]},
+        'message_count': {'$max': [{'$subtract': [{'$ifNull': ['$message_count', 0]}, 1]}, 0]},
+        'version': {'$add': [{'$ifNull': ['$version', 0]}, 1]}
+    }}]
+
+
+def build_page_query(thread_id, before=None, after=None):
+    """
+    メッセージのページ取得に使う条件と並び順を作成
+
+    Args:
+        thread_id (str or ObjectId): スレッドID
+        before (str, optional): このカーソルより古いメッセージを取得
+        after (str, optional): このカーソルより新しいメッセージを取得
+
+    Returns:
+        tuple: (MongoDBのクエリ条件, 並び順)
+            afterなら昇順、それ以外は降順で読み進める
+
+    Raises:
+        ValueError: カーソルの形式が不正な場合
+    """
+    direction = 1 if after else -1
+    query = {'thread_id': ObjectId(thread_id)}
+    if before or after:
+        query.update(keyset_filter('created_at', before or after, direction))
+
+    return query, [('created_at', direction), ('_id', direction)]
+
+
+def build_context_pipeline(thread_oid):
+    """
+    スレッドと直近・ピン留めメッセージをまとめて読む集計パイプラインを作成
+
+    Args:
+        thread_oid (ObjectId): スレッドID
+
+    Returns:
+        list: threadsコレクションに対する集計パイプライン
+            結果のスレッドにはrecent_messages（新しい順）と
+            pinned_messagesが含まれる
+    """
+    return [
+        {'$match': live_filter(thread_oid)},
+        {'$lookup': {
+            'from': config.MESSAGES_COLLECTION,
+            'localField': '_id',
+            'foreignField': 'thread_id',
+            'pipeline': [
+                {'$sort': {'created_at': -1, '_id': -1}},
+                {'$limit': config.HISTORY_MAX_MESSAGES},
+                {'$project': HISTORY_PROJECTION}
+            ],
+            'as': 'recent_messages'
+        }},
+        {'$lookup': {
+            'from': config.MESSAGES_COLLECTION,
+            'localField': '_id',
+            'foreignField': 'thread_id',
+            'pipeline': [
+                {'$match': {'pinned': True}},
+                {'$project': HISTORY_PROJECTION}
+            ],
+            'as': 'pinned_messages'
+        }}
+    ]
+
+
+def build_recount_pipeline(buckets=False):
+    """
+    全スレッドのメッセージ数と最新メッセージのプレビューを数え直すパイプラインを作成
+    threadsコレクションから各スレッドのメッセージを$lookupで集計し、$mergeで書き戻す
+
+    Args:
+        buckets (bool): メッセージをmessage_bucketsコレクションから読むか
+
+    Returns:
+        list: threadsコレクションに対する集計パイプライン（結果は返さない）
+    """
+    if buckets:
+        source = config.MESSAGE_BUCKETS_COLLECTION
+        # バケットを展開してmessagesコレクションと同じ形にする
+        flatten = [{'$unwind': '$messages'}, {'$replaceWith': '$messages'}]
+    else:
+        source = config.MESSAGES_COLLECTION
+        flatten = []
+
+    return [
+        {'$match': NOT_DELETED},
+        {'$lookup': {
+            'from': source,
+            'localField': '_id',
+            'foreignField': 'thread_id',
+            'pipeline': flatten + [
+                {'$sort': {'created_at': -1, '_id': -1}},
+                {'$group': {'_id': None, 'count': {'$sum': 1}, 'last': {'$first': '$$ROOT'}}}
+            ],
+            'as': 'counted'
+        }},
+        {'$set': {'counted': {'$arrayElemAt': ['$counted', 0]}}},
+        {'$project': {
+            'version': {'$add': [{'$ifNull': ['$version', 0]}, 1]},
+            'message_count': {'$ifNull': ['$counted.count', 0]},
+            'last_message': {'$cond': [
+                {'$gt': ['$counted.count', 0]},
+                {
+                    '_id': '$counted.last._id',
+                    'role': '$counted.last.role',
+                    'preview': {'$substrCP': [
+                        '$counted.last.content', 0, config.THREAD_PREVIEW_CHARS
+                    ]},
+                    'created_at': '$counted.last.created_at'
+                },
+                None
+            ]}
+        }},
+        {'$merge': {
+            'into': config.THREADS_COLLECTION,
+            'on': '_id',
+            'whenMatched': 'merge',
+            'whenNotMatched': 'discard'
+        }}
+    ]
+
+
+def build_usage_pipeline(start_day, end_day):
+    """
+    使用量の台帳を日付・モデルごとに集計するパイプラインを作成
+    最初の$matchがday_modelインデックスで期間内の台帳だけを読む
+
+    Args:
+        start_day (str): 集計開始日（'YYYY-MM-DD'、この日を含む）
+        end_day (str): 集計終了日（'YYYY-MM-DD'、この日を含む）
+
+    Returns:
+        list: 集計パイプライン
+    """
+    return [
+        {'$match': {'day': {'$gte': start_day, '$lte': end_day}}},
+        {'$group': {
+            '_id': {'day': '$day', 'model': '$model'},
+            'requests': {'$sum': 1},
+            **{field: {'$sum': f"${field}"} for field in USAGE_FIELDS},
+        }},
+        {'$sort': {'_id.day': 1, '_id.model': 1}},
+        {'$project': {
+            '_id': 0,
+            'day': '$_id.day',
+            'model': '$_id.model',
+            'requests': 1,
+            **{field: 1 for field in USAGE_FIELDS},
+        }},
+    ]
+
+
+def build_search_pipeline(terms, limit, cursor=None):
+    """
+    全文検索のパイプラインを作成
+
+    termsの各トークンをフレーズとして指定し、すべてを含むエントリだけに絞り込む
+    （テキストインデックスの$textは最初のステージである必要がある）。
+    一致したエントリはtextScoreで直接並べ、上位config.SEARCH_MAX_CANDIDATES件だけを残す
+    （$sortの直後の$limitは上位k件だけを保持する並べ替えになり、メモリが件数で抑えられる）。
+    その候補の中で、textScoreにタイトルの倍率を掛けたスコアと _id の降順に並べる。
+    候補より後ろの結果は返さないため、倍率を掛ける前のtextScoreが低いタイトルは漏れることがある
+
+    Args:
+        terms (list): search_tokenizer.query_termsのトークン
+        limit (int): 取得する最大件数
+        cursor (str, optional): このカーソルより後から取得
+
+    Returns:
+        list: 集計パイプライン
+
+    Raises:
+        ValueError: カーソルの形式が不正な場合
+    """
+    pipeline = [
+        {'$match': {'$text': {'$search': ' '.join(f'"{term}"' for term in terms)}}},
+        {'$sort': {'text_score': {'$meta': 'textScore'}, '_id': -1}},
+        {'$limit': config.SEARCH_MAX_CANDIDATES},
+        {'$addFields': {'score': {'$multiply': [
+            {'$meta': 'textScore'},
+            {'$cond': [{'$eq': ['$kind', 'thread']}, config.SEARCH_TITLE_BOOST, 1]}
+        ]}}},
+    ]
+    if cursor:
+        score, object_id = decode_score_cursor(cursor)
+        pipeline.append({'$match': {'$or': [
+            {'score': {'$lt': score}},
+            {'score': score, '_id': {'$lt': object_id}}
+        ]}})
+    pipeline.extend([
+        {'$sort': {'score': -1, '_id': -1}},
+        {'$limit': limit},
+        {'$project': {'terms': 0}},
+    ])
+    return pipeline
+
+
+def build_search_writes(entries):
+    """全文検索のエントリを置き換える（なければ作る）一括書き込み"""
+    return [ReplaceOne({'_id': entry['_id']}, entry, upsert=True) for entry in entries]
+
+
+def _iterate(docs, close=None):
+    """closeできるジェネレーターにする（読み終えたら、または途中でやめたらcloseを呼ぶ）"""
+    try:
+        yield from docs
+    finally:
+        if close is not None:
+            close()
+
+
+class MongoThreadRepository(ThreadRepository):
+    """threadsコレクション"""
+
+    @staticmethod
+    def _collection():
+        return db_service.get_threads_collection()
+
+    def insert(self, thread):
+        result = self._collection().insert_one(thread)
+        thread['_id'] = result.inserted_id
+
+    def find_page(self, limit, cursor=None, title_prefix=None, query=None):
+        return list(self._collection().find(
+            build_threads_query(cursor, title_prefix, query),
+            THREAD_PROJECTION
+        ).sort(THREADS_SORT).limit(limit))
+
+    def find(self, thread_oid, window=False):
+        projection = None if window else THREAD_PROJECTION
+        return self._collection().find_one(live_filter(thread_oid), projection)
+
+    def update(self, thread_oid, fields):
+        return self._collection().find_one_and_update(
+            live_filter(thread_oid),
+            {'$set': fields, '$inc': {'version': 1}},
+            projection=THREAD_PROJECTION,
+            return_document=True
+        )
+
+    def touch(self, thread_oid, messages=None, session=None):
+        return self._collection().find_one_and_update(
+            live_filter(thread_oid),
+            build_touch_update(messages),
+            projection=THREAD_PROJECTION,
+            return_document=True,
+            session=session
+        )
+
+    def set_window(self, thread, recent, count):
+        self._collection().update_one(
+            {
+                '_id': thread['_id'],
+                'updated_at': thread['updated_at'],
+                'recent_window': {'$exists': False}
+            },
+            {'$set': {
+                'recent_messages': [window_entry(msg) for msg in recent],
+                'message_count': count,
+                'last_message': preview_entry(recent[-1] if recent else None),
+                'recent_window': True
+            }, '$inc': {'version': 1}}
+        )
+
+    def remove_from_window(self, thread_oid, message_oid):
+        return self._collection().find_one_and_update(
+            {'_id': thread_oid},
+            build_remove_update(message_oid),
+            projection=WINDOW_TAIL_PROJECTION,
+            return_document=True
+        )
+
+    def replace_last_message(self, thread_oid, removed_oid, message):
+        self._collection().update_one(
+            {'_id': thread_oid, 'last_message._id': removed_oid},
+            {'$set': {'last_message': preview_entry(message)}, '$inc': {'version': 1}}
+        )
+
+    def set_window_pinned(self, thread_oid, message_oid, pinned):
+        self._collection().update_one(
+            {'_id': thread_oid},
+            {'$set': {'recent_messages.$[m].pinned': bool(pinned)}, '$inc': {'version': 1}},
+            array_filters=[{'m._id': message_oid}]
+        )
+
+    def update_summary(self, thread_oid, summary, summarized_until, previous_until,
+                       summarized_count):
+        result = self._collection().update_one(
+            {**live_filter(thread_oid), 'summarized_until': previous_until},
+            {'$set': {
+                'summary': summary,
+                'summarized_until': summarized_until,
+                'summarized_count': summarized_count
+            }}
+        )
+        return result.modified_count > 0
+
+    def mark_deleted(self, thread_oid):
+        result = self._collection().update_one(
+            live_filter(thread_oid),
+            {'$set': {'deleted_at': datetime.utcnow()}}
+        )
+        return result.modified_count > 0
+
+    def find_version(self, thread_oid):
+        thread = self._collection().find_one(live_filter(thread_oid), {'version': 1})
+        return thread.get('version', 0) if thread else None
+
+    def find_deleted_ids(self, limit):
+        threads = self._collection().find(
+            {'deleted_at': {'$exists': True}},
+            {'_id': 1}
+        ).sort('deleted_at', 1).limit(limit)
+        return [thread['_id'] for thread in threads]
+
+    def find_many(self, thread_oids):
+        return {
+            thread['_id']: thread
+            for thread in self._collection().find(
+                {'_id': {'$in': list(thread_oids)}, 'deleted_at': {'$exists': False}},
+                THREAD_PROJECTION
+            )
+        }
+
+    def find_existing_ids(self, thread_oids):
+        return {
+            thread['_id']
+            for thread in self._collection().find({'_id': {'$in': thread_oids}}, {'_id': 1})
+        }
+
+    def purge(self, thread_oid):
+        result = self._collection().delete_one(
+            {'_id': thread_oid, 'deleted_at': {'$exists': True}}
+        )
+        return result.deleted_count > 0
+
+
+class MongoMessageRepository(MessageRepository):
+    """messagesコレクション（バケット形式ではmessage_bucketsコレクション）"""
+
+    @staticmethod
+    def _collection():
+        return db_service.get_messages_collection()
+
+    def insert_many(self, thread_oid, messages, session=None):
+        if use_buckets():
+            message_buckets.append(thread_oid, messages, session=session)
+        else:
+            self._collection().insert_many(messages, ordered=True, session=session)
+
+    def remove_many(self, thread_oid, message_oids, session=None):
+        if use_buckets():
+            message_buckets.remove(thread_oid, message_oids, session=session)
+        else:
+            self._collection().delete_many({'_id': {'$in': message_oids}}, session=session)
+
+    def find_all(self, thread_oid):
+        if use_buckets():
+            return message_buckets.find_all(thread_oid)
+        return list(self._collection().find({'thread_id': thread_oid}).sort('created_at', 1))
+
+    def find_page(self, thread_oid, limit, before=None, after=None):
+        if use_buckets():
+            return message_buckets.find_page(thread_oid, limit, before, after)
+        query, sort = build_page_query(thread_oid, before, after)
+        return list(self._collection().find(query).sort(sort).limit(limit))
+
+    def history_sources(self, thread_oid):
+        if use_buckets():
+            pinned = message_buckets.find_pinned(thread_oid)
+            # 新しい順に読み、予算を超えた時点で残りのバケットは読まない
+            recent = message_buckets.iter_messages(thread_oid)
+            return pinned, _iterate(islice(recent, config.HISTORY_MAX_MESSAGES), recent.close)
+
+        collection = self._collection()
+        pinned = list(collection.find(
+            {'thread_id': thread_oid, 'pinned': True},
+            HISTORY_PROJECTION
+        ))
+        # 新しい順に読み、予算を超えた時点で打ち切る
+        recent = collection.find(
+            {'thread_id': thread_oid},
+            HISTORY_PROJECTION
+        ).sort([('created_at', -1), ('_id', -1)]).limit(config.HISTORY_MAX_MESSAGES)
+        return pinned, _iterate(recent, recent.close)
+
+    def context_sources(self, thread_oid):
+        if use_buckets():
+            return self.history_sources(thread_oid)
+
+        # 長い会話は$lookupでスレッドと直近・ピン留めメッセージをまとめて読む
+        threads = db_service.get_threads_collection()
+        thread = next(threads.aggregate(build_context_pipeline(thread_oid)), None)
+        if not thread:
+            return None
+        return thread['pinned_messages'], _iterate(thread['recent_messages'])
+
+    def latest_until(self, thread_oid, until, limit):
+        if use_buckets():
+            # 移行直後のスレッドで一度だけ行うため、全件を数える
+            kept = [
+                msg for msg in message_buckets.iter_messages(thread_oid)
+                if msg['created_at'] <= until
+            ]
+            return len(kept), kept[:limit]
+
+        collection = self._collection()
+        query = {'thread_id': thread_oid, 'created_at': {'$lte': until}}
+        count = collection.count_documents(query)
+        recent = list(collection.find(query, HISTORY_PROJECTION).sort(
+            [('created_at', -1), ('_id', -1)]
+        ).limit(limit))
+        return count, recent
+
+    def count_after(self, thread_oid, after, limit):
+        if use_buckets():
+            return message_buckets.count_after(thread_oid, after, limit)
+
+        query = {'thread_id': thread_oid}
+        if after is not None:
+            query['created_at'] = {'$gt': after}
+        return self._collection().count_documents(query, limit=limit)
+
+    def find_after(self, thread_oid, after, limit):
+        if use_buckets():
+            return [
+                {'role': msg['role'], 'content': msg['content'], 'created_at': msg['created_at']}
+                for msg in message_buckets.find_after(thread_oid, after, limit)
+            ]
+
+        query = {'thread_id': thread_oid}
+        if after is not None:
+            query['created_at'] = {'$gt': after}
+        return list(self._collection().find(
+            query,
+            {'_id': 0, 'role': 1, 'content': 1, 'created_at': 1}
+        ).sort('created_at', 1).limit(limit))
+
+    def set_pinned(self, message_oid, pinned):
+        if use_buckets():
+            return message_buckets.set_pinned(message_oid, pinned)
+        return self._collection().find_one_and_update(
+            {'_id': message_oid},
+            {'$set': {'pinned': bool(pinned)}},
+            return_document=True
+        )
+
+    def delete_one(self, message_oid):
+        if use_buckets():
+            return message_buckets.delete_one(message_oid)
+        return self._collection().find_one_and_delete(
+            {'_id': message_oid},
+            projection={'thread_id': 1}
+        )
+
+    def delete_by_thread(self, thread_oid):
+        if use_buckets():
+            return message_buckets.delete_thread(thread_oid)
+        return self._collection().delete_many({'thread_id': thread_oid}).deleted_count
+
+    def delete_batch(self, thread_oid, limit):
+        if use_buckets():
+            collection = message_buckets.get_collection()
+            bucket_limit = max(1, limit // config.MESSAGE_BUCKET_SIZE)
+            buckets = list(collection.find(
+                {'thread_id': thread_oid}, {'count': 1}
+            ).limit(bucket_limit))
+            if not buckets:
+                return 0
+            collection.delete_many({'_id': {'$in': [bucket['_id'] for bucket in buckets]}})
+            # 中身が空のバケットだけを消した場合も、進んだことを呼び出し元に伝える
+            return sum(bucket.get('count', 0) for bucket in buckets) or len(buckets)
+
+        collection = self._collection()
+        ids = [
+            msg['_id']
+            for msg in collection.find({'thread_id': thread_oid}, {'_id': 1}).limit(limit)
+        ]
+        if not ids:
+            return 0
+        return collection.delete_many({'_id': {'$in': ids}}).deleted_count
+
+    def find_thread_ids(self, after, limit):
+        if use_buckets():
+            collection = message_buckets.get_collection()
+        else:
+            collection = self._collection()
+
+        pipeline = []
+        if after is not None:
+            pipeline.append({'$match': {'thread_id': {'$gt': after}}})
+        pipeline += [
+            # thread_idで始まるインデックスを使って重複を除く
+            {'$sort': {'thread_id': 1}},
+            {'$group': {'_id': '$thread_id'}},
+            {'$sort': {'_id': 1}},
+            {'$limit': limit}
+        ]
+        return [doc['_id'] for doc in collection.aggregate(pipeline)]
+
+
+class MongoUsageRepository(UsageRepository):
+    """usage_ledgerコレクション"""
+
+    @staticmethod
+    def _collection():
+        return db_service.get_collection(config.USAGE_LEDGER_COLLECTION)
+
+    def record(self, thread_oid, messages, session=None):
+        entries = ledger_entries(thread_oid, messages)
+        if entries:
+            self._collection().insert_many(entries, ordered=False, session=session)
+
+    def aggregate(self, start_day, end_day):
+        return list(self._collection().aggregate(build_usage_pipeline(start_day, end_day)))
+
+
+class MongoSearchRepository(SearchRepository):
+    """search_entriesコレクション"""
+
+    @staticmethod
+    def _collection():
+        return db_service.get_collection(config.SEARCH_COLLECTION)
+
+    def index(self, entries, session=None):
+        if entries:
+            self._collection().bulk_write(
+                build_search_writes(entries), ordered=False, session=session
+            )
+
+    def remove(self, entry_ids):
+        self._collection().delete_many({'_id': {'$in': list(entry_ids)}})
+
+    def remove_by_thread(self, thread_oid):
+        return self._collection().delete_many({'thread_id': thread_oid}).deleted_count
+
+    def search(self, terms, limit, cursor=None):
+        return list(self._collection().aggregate(build_search_pipeline(terms, limit, cursor)))
+
+
+class MongoStorage(Storage):
+    """MongoDBの保存先"""
+
+    name = 'mongo'
+
+    def __init__(self):
+        super().__init__(
+            MongoThreadRepository(),
+            MongoMessageRepository(),
+            MongoUsageRepository(),
+            MongoSearchRepository()
+        )
+
+    def connect(self):
+        return db_service.connect()
+
+    def is_connected(self):
+        return db_service.db is not None
+
+    def transaction(self, write):
+        """config.MONGODB_USE_TRANSACTIONSが有効な場合はMongoDBのトランザクションで実行"""
+        if config.MONGODB_USE_TRANSACTIONS:
+            with db_service.client.start_session() as session:
+                return session.with_transaction(write)
+        return write(None)
+
+    def load_checkpoint(self, name):
+        state = db_service.get_collection(config.MAINTENANCE_COLLECTION)
+        return state.find_one({'_id': name}, {'_id': 0}) or {}
+
+    def save_checkpoint(self, name, values):
+        state = db_service.get_collection(config.MAINTENANCE_COLLECTION)
+        state.update_one({'_id': name}, {'$set': values}, upsert=True)
+
+    def clear_checkpoint(self, name):
+        state = db_service.get_collection(config.MAINTENANCE_COLLECTION)
+        state.delete_one({'_id': name})
+
+    def recount_messages(self):
+        threads = db_service.get_threads_collection()
+        # $mergeの出力先なので結果は返らない（最後まで読んで実行を完了させる）
+        list(threads.aggregate(build_recount_pipeline(use_buckets())))
+        return threads.count_documents(NOT_DELETED)
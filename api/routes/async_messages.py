@@ -0,0 +1,287 @@
+"""
+メッセージ関連のAPIエンドポイント（非同期版）
+routes.messagesと同じURL・JSON形式をQuartで提供
+"""
+from quart import Blueprint, Response, request, jsonify
+from models import async_message as message_model
+from models import async_thread as thread_model
+from models.message import build_message
+from models.pagination import parse_page_size
+from routes.etag import etag_headers, is_not_modified, messages_etag
+from routes.sse import sse_event
+from services.gemini_service import gemini_service
+from services.history_cache import make_history_entry
+from services.quota_scheduler import QuotaExceeded
+from services.response_cache import bypass_requested
+from services.summary_service import summary_service
+
+messages_bp = Blueprint('messages', __name__)
+
+
+@messages_bp.route('/threads/<thread_id>/messages', methods=['GET'])
+async def get_messages(thread_id):
+    """特定スレッドのメッセージ一覧を取得（limit/before/afterでページネーション）"""
+    try:
+        limit = request.args.get('limit')
+        before = request.args.get('before')
+        after = request.args.get('after')
+
+        if before and after:
+            return jsonify({'error': 'Specify either before or after, not both'}), 400
+
+        if limit is not None or before or after:
+            try:
+                limit = parse_page_size(limit)
+            except ValueError:
+                return jsonify({'error': 'Limit must be a positive integer'}), 400
+
+        # メッセージを読む前に、スレッドのversionだけで変更の有無を判定する
+        version = await thread_model.get_thread_version(thread_id)
+        if version is None:
+            return jsonify({'error': 'Thread not found'}), 404
+
+        etag = messages_etag(thread_id, version, limit, before, after)
+        if is_not_modified(request.headers.get('If-None-Match'), etag):
+            return '', 304, etag_headers(etag)
+
+        # スレッドを開いたとき（カーソルなし）はスレッドに埋め込んだ直近メッセージを使う
+        if not before and not after:
+            page = await message_model.get_recent_messages(thread_id, limit)
+            if page is None:
+                return jsonify({'error': 'Thread not found'}), 404
+
+            messages, next_cursor = page
+            # パラメータがなければ従来どおり全件を返す
+            if limit is None:
+                return jsonify({'messages': messages}), 200, etag_headers(etag)
+            return jsonify({
+                'messages': messages,
+                'next_cursor': next_cursor
+            }), 200, etag_headers(etag)
+
+        try:
+            messages, next_cursor = await message_model.get_messages_page(
+                thread_id, limit, before=before, after=after
+            )
+        except ValueError:
+            return jsonify({'error': 'Invalid cursor'}), 400
+
+        return jsonify({
+            'messages': messages,
+            'next_cursor': next_cursor
+        }), 200, etag_headers(etag)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+async def _prepare_send(thread_id):
+    """
+    メッセージ送信の共通前処理（リクエスト検証・スレッドと履歴の取得）
+
+    Returns:
+        tuple: (context, user_doc, history, エラーレスポンスまたはNone)
+    """
+    data = await request.get_json(silent=True)
+    if not data or 'content' not in data:
+        return None, None, None, (jsonify({'error': 'Content is required'}), 400)
+
+    user_content = data['content'].strip()
+    if not user_content:
+        return None, None, None, (jsonify({'error': 'Content cannot be empty'}), 400)
+
+    # スレッドの存在確認と会話履歴・要約の取得（1クエリ）
+    context = await message_model.get_thread_context(thread_id)
+    if not context:
+        return None, None, None, (jsonify({'error': 'Thread not found'}), 404)
+
+    # ユーザーメッセージはAI応答と一緒に保存する（IDは先に採番済み）
+    user_doc = build_message(thread_id, 'user', user_content)
+    history = context['history'] + [make_history_entry(user_doc)]
+
+    return context, user_doc, history, None
+
+
+@messages_bp.route('/threads/<thread_id>/messages', methods=['POST'])
+async def send_message(thread_id):
+    """メッセージを送信し、AI応答を取得"""
+    try:
+        context, user_doc, history, error = await _prepare_send(thread_id)
+        if error:
+            return error
+
+        # AI応答を生成（待機中は他のリクエストを処理できる）
+        try:
+            usage = {}
+            ai_response = await gemini_service.generate_response_async(
+                history,
+                summary=context['summary'],
+                use_cache=not bypass_requested(request.headers),
+                usage=usage
+            )
+        except QuotaExceeded as quota_error:
+            # 再送されるため、ユーザーメッセージは保存しない
+            return _quota_exceeded_response(quota_error)
+        except Exception as ai_error:
+            # AI応答生成に失敗した場合でもユーザーメッセージは保存する
+            (user_message,), _ = await message_model.save_messages(thread_id, [user_doc])
+            return jsonify({
+                'error': 'AI応答の生成に失敗しました',
+                'details': str(ai_error),
+                'user_message': user_message
+            }), 500
+
+        # ユーザーメッセージとAI応答の保存、スレッドの更新日時の更新
+        assistant_doc = build_message(thread_id, 'assistant', ai_response, usage=usage)
+        (user_message, assistant_message), thread = await message_model.save_messages(
+            thread_id, [user_doc, assistant_doc]
+        )
+        if not thread:
+            return jsonify({'error': 'Thread not found'}), 404
+
+        # 必要に応じて要約をバックグラウンドで更新
+        await summary_service.schedule_refresh_async(
+            thread_id, thread['message_count'], thread['summarized_count']
+        )
+
+        return jsonify({
+            'user_message': user_message,
+            'assistant_message': assistant_message,
+            'thread': thread
+        }), 201
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@messages_bp.route('/threads/<thread_id>/messages/stream', methods=['POST'])
+async def send_message_stream(thread_id):
+    """メッセージを送信し、AI応答をServer-Sent Eventsでストリーミング"""
+    try:
+        context, user_doc, history, error = await _prepare_send(thread_id)
+        if error:
+            return error
+
+        # クォータはストリーム開始前に確保し、不足時は通常の429で返す
+        # 使用量はストリームの完了時に書き込まれる
+        usage = {}
+        stream = await gemini_service.generate_response_stream_async(
+            history,
+            summary=context['summary'],
+            use_cache=not bypass_requested(request.headers),
+            usage=usage
+        )
+    except QuotaExceeded as quota_error:
+        return _quota_exceeded_response(quota_error)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+    # ユーザーメッセージはストリームの開始前に保存し、途中で切断されても失われないようにする
+    try:
+        (user_message,), thread = await message_model.save_messages(thread_id, [user_doc])
+    except Exception as e:
+        await stream.aclose()
+        return jsonify({'error': str(e)}), 500
+    if not thread:
+        await stream.aclose()
+        return jsonify({'error': 'Thread not found'}), 404
+
+    async def generate():
+        try:
+            yield sse_event('user_message', user_message)
+
+            # 受信したチャンクをそのままクライアントへ流し、最後に連結して保存
+            chunks = []
+            try:
+                async for text in stream:
+                    chunks.append(text)
+                    yield sse_event('chunk', {'text': text})
+            except Exception as ai_error:
+                # ユーザーメッセージは保存済み
+                yield sse_event('error', {
+                    'error': 'AI応答の生成に失敗しました',
+                    'details': str(ai_error)
+                })
+                return
+
+            try:
+                # AI応答の保存、スレッドの更新日時の更新
+                assistant_doc = build_message(thread_id, 'assistant', ''.join(chunks), usage=usage)
+                (assistant_message,), thread = await message_model.save_messages(
+                    thread_id, [assistant_doc]
+                )
+                if not thread:
+                    yield sse_event('error', {'error': 'Thread not found'})
+                    return
+
+                # 必要に応じて要約をバックグラウンドで更新
+                await summary_service.schedule_refresh_async(
+                    thread_id, thread['message_count'], thread['summarized_count']
+                )
+            except Exception as e:
+                yield sse_event('error', {'error': str(e)})
+                return
+
+            yield sse_event('done', assistant_message)
+        finally:
+            # クライアントの切断で途中で閉じられた場合も、未使用のクォータを返す
+            await stream.aclose()
+
+    response = Response(
+        generate(),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            # プロキシによるバッファリングを無効化し、チャンクを即時に届ける
+            'X-Accel-Buffering': 'no'
+        }
+    )
+    # 長い生成でもストリームを打ち切らない
+    response.timeout = None
+    return response
+
+
+@messages_bp.route('/messages/<message_id>/pin', methods=['PUT'])
+async def pin_message(message_id):
+    """メッセージのピン留め状態を設定"""
+    try:
+        data = await request.get_json(silent=True)
+        if not data or 'pinned' not in data:
+            return jsonify({'error': 'Pinned is required'}), 400
+
+        message = await message_model.set_message_pinned(message_id, data['pinned'])
+        if not message:
+            return jsonify({'error': 'Message not found'}), 404
+
+        return jsonify(message), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@messages_bp.route('/messages/<message_id>', methods=['DELETE'])
+async def delete_message(message_id):
+    """特定のメッセージを削除"""
+    try:
+        success = await message_model.delete_message(message_id)
+
+        if not success:
+            return jsonify({'error': 'Message not found'}), 404
+
+        return jsonify({'message': 'Message deleted successfully'}), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+def _quota_exceeded_response(error):
+    """
+    クォータ超過時の429レスポンスを作成（Retry-Afterヘッダー付き）
+
+    Args:
+        error (QuotaExceeded): スケジューラーが送出した例外
+
+    Returns:
+        tuple: (レスポンス, ステータスコード, ヘッダー)
+    """
+    return jsonify({
+        'error': 'Gemini APIの利用上限に達しました',
+        'retry_after': error.retry_after
+    }), 429, {'Retry-After': error.retry_after_header}
@@ -0,0 +1,40 @@
+"""
+全文検索のAPIエンドポイント（非同期版）
+routes.searchと同じURL・JSON形式をQuartで提供
+"""
+from quart import Blueprint, request, jsonify
+from models import async_search as search_model
+from models.pagination import parse_page_size
+from services.search_tokenizer import QueryTooShort
+
+search_bp = Blueprint('search', __name__)
+
+
+@search_bp.route('/search', methods=['GET'])
+async def search():
+    """スレッドのタイトルとメッセージの本文を検索"""
+    try:
+        query = (request.args.get('q') or '').strip()
+        if not query:
+            return jsonify({'error': 'Query is required'}), 400
+
+        try:
+            limit = parse_page_size(request.args.get('limit'))
+        except ValueError:
+            return jsonify({'error': 'Limit must be a positive integer'}), 400
+
+        try:
+            results, next_cursor = await search_model.search(
+                query, limit, cursor=request.args.get('cursor')
+            )
+        except QueryTooShort:
+            return jsonify({'error': 'Kana queries must be at least 2 characters'}), 400
+        except ValueError:
+            return jsonify({'error': 'Invalid cursor'}), 400
+
+        return jsonify({
+            'results': results,
+            'next_cursor': next_cursor
+        }), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
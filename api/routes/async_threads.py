@@ -0,0 +1,108 @@
+"""
+スレッド関連のAPIエンドポイント（非同期版）
+routes.threadsと同じURL・JSON形式をQuartで提供
+"""
+from quart import Blueprint, request, jsonify
+from config import config
+from models import async_thread as thread_model
+from models.pagination import parse_page_size
+from routes.etag import etag_headers, is_not_modified, threads_etag
+from services.history_cache import history_cache
+from services.thread_reaper import thread_reaper
+
+threads_bp = Blueprint('threads', __name__)
+
+
+@threads_bp.route('/threads', methods=['GET'])
+async def get_threads():
+    """スレッド一覧を取得（更新日時の降順）"""
+    try:
+        try:
+            limit = parse_page_size(
+                request.args.get('limit'),
+                default=config.PAGE_SIZE_MAX
+            )
+        except ValueError:
+            return jsonify({'error': 'Limit must be a positive integer'}), 400
+
+        try:
+            threads, next_cursor = await thread_model.get_threads(
+                limit,
+                cursor=request.args.get('cursor'),
+                title_prefix=request.args.get('prefix'),
+                query=request.args.get('q')
+            )
+        except ValueError:
+            return jsonify({'error': 'Invalid cursor'}), 400
+
+        etag = threads_etag(threads, next_cursor)
+        if is_not_modified(request.headers.get('If-None-Match'), etag):
+            return '', 304, etag_headers(etag)
+
+        return jsonify({
+            'threads': threads,
+            'next_cursor': next_cursor
+        }), 200, etag_headers(etag)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@threads_bp.route('/threads', methods=['POST'])
+async def create_thread():
+    """新規スレッドを作成"""
+    try:
+        data = await request.get_json(silent=True) or {}
+        title = data.get('title', '新しい会話')
+
+        thread = await thread_model.create_thread(title)
+        return jsonify(thread), 201
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@threads_bp.route('/threads/<thread_id>', methods=['GET'])
+async def get_thread(thread_id):
+    """特定のスレッドを取得"""
+    try:
+        thread = await thread_model.get_thread_by_id(thread_id)
+        if not thread:
+            return jsonify({'error': 'Thread not found'}), 404
+
+        return jsonify(thread), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@threads_bp.route('/threads/<thread_id>', methods=['PUT'])
+async def update_thread(thread_id):
+    """スレッドを更新"""
+    try:
+        data = await request.get_json(silent=True)
+        if not data or 'title' not in data:
+            return jsonify({'error': 'Title is required'}), 400
+
+        thread = await thread_model.update_thread(thread_id, data['title'])
+        if not thread:
+            return jsonify({'error': 'Thread not found'}), 404
+
+        return jsonify(thread), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@threads_bp.route('/threads/<thread_id>', methods=['DELETE'])
+async def delete_thread(thread_id):
+    """スレッドを削除（関連メッセージはバックグラウンドで削除）"""
+    try:
+        # 墓標を付けてすぐに返し、メッセージの削除はバックグラウンドで行う
+        success = await thread_model.delete_thread(thread_id)
+
+        if not success:
+            return jsonify({'error': 'Thread not found'}), 404
+
+        history_cache.invalidate(thread_id)
+        thread_reaper.schedule()
+
+        return jsonify({'message': 'Thread deleted successfully'}), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
@@ -0,0 +1,23 @@
+"""
+使用量関連のAPIエンドポイント（非同期版）
+routes.usageと同じURL・JSON形式をQuartで提供
+"""
+from quart import Blueprint, request, jsonify
+from models import async_usage as usage_model
+from models.usage import parse_period
+
+usage_bp = Blueprint('usage', __name__)
+
+
+@usage_bp.route('/usage', methods=['GET'])
+async def get_usage():
+    """Gemini APIの使用量を日付・モデルごとに集計"""
+    try:
+        try:
+            start_day, end_day = parse_period(request.args.get('from'), request.args.get('to'))
+        except ValueError as e:
+            return jsonify({'error': f'Invalid period: {e}'}), 400
+
+        return jsonify(await usage_model.get_usage_by_day(start_day, end_day)), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
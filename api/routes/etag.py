@@ -0,0 +1,85 @@
+"""
+条件付きGET（ETag / If-None-Match）
+同期版・非同期版の一覧エンドポイントで共通して使う
+
+ETagはスレッドのversion（一覧・メッセージの表示が変わる更新のたびに増える）から作る。
+Cache-Control: no-cacheを付けるため、ブラウザは毎回If-None-Matchで問い合わせ、
+304ならキャッシュした本文をそのまま使う（フロントエンドの変更は不要）。
+"""
+import hashlib
+
+# 条件付きGETの応答に付けるキャッシュ指定（保存は許すが、使う前に必ず問い合わせる）
+CACHE_CONTROL = 'no-cache'
+
+
+def make_etag(*parts):
+    """
+    強いETagを作る
+
+    Args:
+        *parts: 応答の内容を決める値（スレッドID・versionなど）
+
+    Returns:
+        str: 引用符で囲んだETag
+    """
+    source = '\n'.join(str(part) for part in parts).encode('utf-8')
+    return f'"{hashlib.blake2b(source, digest_size=12).hexdigest()}"'
+
+
+def threads_etag(threads, next_cursor):
+    """
+    スレッド一覧のETag（ページ内のスレッドのIDとversionから作る）
+    スレッドの追加・削除・並び替えとスレッドの更新のどれでも変わる
+
+    Args:
+        threads (list): format_threadでフォーマットしたスレッド
+        next_cursor (str): 次ページのカーソル（なければNone）
+
+    Returns:
+        str: ETag
+    """
+    return make_etag(*(f"{thread['id']}:{thread['version']}" for thread in threads), next_cursor)
+
+
+def messages_etag(thread_id, version, limit=None, before=None, after=None):
+    """
+    メッセージ一覧のETag（スレッドのversionとページの指定だけで決まるため、
+    メッセージを読まずに作れる）
+    同じスレッドでもページが違えば本文が違うため、ページネーションの指定も含める
+
+    Args:
+        thread_id (str): スレッドID
+        version (int): スレッドのversion
+        limit (int, optional): parse_page_sizeで検証済みの1ページの件数
+        before (str, optional): このカーソルより古いページ
+        after (str, optional): このカーソルより新しいページ
+
+    Returns:
+        str: ETag
+    """
+    return make_etag('messages', thread_id, version, limit, before or None, after or None)
+
+
+def is_not_modified(if_none_match, etag):
+    """
+    If-None-Matchヘッダーがetagと一致するか（一致すれば304を返す）
+    If-None-Matchは弱い比較なので、W/付きのETagも一致とみなす
+
+    Args:
+        if_none_match (str): If-None-Matchヘッダーの値（なければNone）
+        etag (str): 現在のETag
+
+    Returns:
+        bool: 一致したか
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    candidates = (tag.strip() for tag in if_none_match.split(','))
+    return any(tag.removeprefix('W/') == etag for tag in candidates)
+
+
+def etag_headers(etag):
+    """200・304の応答に付けるヘッダー"""
+    return {'ETag': etag, 'Cache-Control': CACHE_CONTROL}
@@ -1,10 +1,17 @@
 """
 メッセージ関連のAPIエンドポイント
 """
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify, stream_with_context
 from models import message as message_model
 from models import thread as thread_model
+from models.pagination import parse_page_size
+from routes.etag import etag_headers, is_not_modified, messages_etag
+from routes.sse import sse_event
 from services.gemini_service import gemini_service
+from services.history_cache import make_history_entry
+from services.quota_scheduler import QuotaExceeded
+from services.response_cache import bypass_requested
+from services.summary_service import summary_service
 
 messages_bp = Blueprint('messages', __name__)
 
@@ -17,17 +24,68 @@ def get_messages(thread_id):
     Args:
         thread_id (str): スレッドID
 
+    Query Parameters:
+        limit (int, optional): 1ページの件数（指定時はページネーション）
+        before (str, optional): このカーソルより古いページを取得
+        after (str, optional): このカーソルより新しいページを取得
+
+    Headers:
+        If-None-Match (str, optional): 前回のETag（スレッドが変わっていなければ
+            メッセージを読まずに304を返す）
+
     Returns:
         JSON: メッセージリスト
+            ページネーション時は next_cursor（続きがなければnull）も返す。ETagヘッダーを付ける
     """
     try:
-        # スレッドの存在確認
-        thread = thread_model.get_thread_by_id(thread_id)
-        if not thread:
+        limit = request.args.get('limit')
+        before = request.args.get('before')
+        after = request.args.get('after')
+
+        if before and after:
+            return jsonify({'error': 'Specify either before or after, not both'}), 400
+
+        if limit is not None or before or after:
+            try:
+                limit = parse_page_size(limit)
+            except ValueError:
+                return jsonify({'error': 'Limit must be a positive integer'}), 400
+
+        # メッセージを読む前に、スレッドのversionだけで変更の有無を判定する
+        version = thread_model.get_thread_version(thread_id)
+        if version is None:
             return jsonify({'error': 'Thread not found'}), 404
 
-        messages = message_model.get_messages_by_thread(thread_id)
-        return jsonify({'messages': messages}), 200
+        etag = messages_etag(thread_id, version, limit, before, after)
+        if is_not_modified(request.headers.get('If-None-Match'), etag):
+            return '', 304, etag_headers(etag)
+
+        # スレッドを開いたとき（カーソルなし）はスレッドに埋め込んだ直近メッセージを使う
+        if not before and not after:
+            page = message_model.get_recent_messages(thread_id, limit)
+            if page is None:
+                return jsonify({'error': 'Thread not found'}), 404
+
+            messages, next_cursor = page
+            # パラメータがなければ従来どおり全件を返す
+            if limit is None:
+                return jsonify({'messages': messages}), 200, etag_headers(etag)
+            return jsonify({
+                'messages': messages,
+                'next_cursor': next_cursor
+            }), 200, etag_headers(etag)
+
+        try:
+            messages, next_cursor = message_model.get_messages_page(
+                thread_id, limit, before=before, after=after
+            )
+        except ValueError:
+            return jsonify({'error': 'Invalid cursor'}), 400
+
+        return jsonify({
+            'messages': messages,
+            'next_cursor': next_cursor
+        }), 200, etag_headers(etag)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -49,11 +107,6 @@ def send_message(thread_id):
         JSON: ユーザーメッセージとAI応答
     """
     try:
-        # スレッドの存在確認
-        thread = thread_model.get_thread_by_id(thread_id)
-        if not thread:
-            return jsonify({'error': 'Thread not found'}), 404
-
         # リクエストボディの検証
         data = request.get_json()
         if not data or 'content' not in data:
@@ -63,46 +116,207 @@ def send_message(thread_id):
         if not user_content:
             return jsonify({'error': 'Content cannot be empty'}), 400
 
-        # ユーザーメッセージを保存
-        user_message = message_model.create_message(
-            thread_id=thread_id,
-            role='user',
-            content=user_content
-        )
+        # スレッドの存在確認と会話履歴・要約の取得（1クエリ）
+        context = message_model.get_thread_context(thread_id)
+        if not context:
+            return jsonify({'error': 'Thread not found'}), 404
 
-        # 会話履歴を取得
-        conversation_history = message_model.get_conversation_history(thread_id)
+        # ユーザーメッセージはAI応答と一緒に保存する（IDは先に採番済み）
+        user_doc = message_model.build_message(thread_id, 'user', user_content)
+        history = context['history'] + [make_history_entry(user_doc)]
 
         # AI応答を生成
         try:
-            ai_response = gemini_service.generate_response(conversation_history)
+            usage = {}
+            ai_response = gemini_service.generate_response(
+                history,
+                summary=context['summary'],
+                use_cache=not bypass_requested(request.headers),
+                usage=usage
+            )
+        except QuotaExceeded as quota_error:
+            # 再送されるため、ユーザーメッセージは保存しない
+            return _quota_exceeded_response(quota_error)
         except Exception as ai_error:
-            # AI応答生成に失敗した場合でもユーザーメッセージは保存済み
+            # AI応答生成に失敗した場合でもユーザーメッセージは保存する
+            (user_message,), _ = message_model.save_messages(thread_id, [user_doc])
             return jsonify({
                 'error': 'AI応答の生成に失敗しました',
                 'details': str(ai_error),
                 'user_message': user_message
             }), 500
 
-        # AI応答を保存
-        assistant_message = message_model.create_message(
-            thread_id=thread_id,
-            role='assistant',
-            content=ai_response
+        # ユーザーメッセージとAI応答の保存、スレッドの更新日時の更新
+        assistant_doc = message_model.build_message(thread_id, 'assistant', ai_response, usage=usage)
+        (user_message, assistant_message), thread = message_model.save_messages(
+            thread_id, [user_doc, assistant_doc]
         )
+        if not thread:
+            return jsonify({'error': 'Thread not found'}), 404
 
-        # スレッドの更新日時を更新
-        thread_model.update_thread(thread_id)
+        # 必要に応じて要約をバックグラウンドで更新
+        summary_service.schedule_refresh(
+            thread_id, thread['message_count'], thread['summarized_count']
+        )
 
         return jsonify({
             'user_message': user_message,
-            'assistant_message': assistant_message
+            'assistant_message': assistant_message,
+            'thread': thread
         }), 201
 
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
+@messages_bp.route('/threads/<thread_id>/messages/stream', methods=['POST'])
+def send_message_stream(thread_id):
+    """
+    メッセージを送信し、AI応答をServer-Sent Eventsでストリーミング
+
+    Args:
+        thread_id (str): スレッドID
+
+    Request Body:
+        {
+            "content": "ユーザーのメッセージ"
+        }
+
+    Returns:
+        text/event-stream: 以下のイベントを順に送信
+            user_message: ユーザーメッセージ（ストリームの開始前に保存済み）
+            chunk: AI応答の断片 {"text": "..."}
+            done: 保存されたAI応答メッセージ
+            error: 生成失敗時のエラー情報
+    """
+    try:
+        # リクエストボディの検証
+        data = request.get_json()
+        if not data or 'content' not in data:
+            return jsonify({'error': 'Content is required'}), 400
+
+        user_content = data['content'].strip()
+        if not user_content:
+            return jsonify({'error': 'Content cannot be empty'}), 400
+
+        # スレッドの存在確認と会話履歴・要約の取得（1クエリ）
+        context = message_model.get_thread_context(thread_id)
+        if not context:
+            return jsonify({'error': 'Thread not found'}), 404
+
+        # ユーザーメッセージはクォータを確保してから保存する（429なら再送されるため保存しない）
+        user_doc = message_model.build_message(thread_id, 'user', user_content)
+        history = context['history'] + [make_history_entry(user_doc)]
+
+        # クォータはストリーム開始前に確保し、不足時は通常の429で返す
+        # 使用量はストリームの完了時に書き込まれる
+        usage = {}
+        stream = gemini_service.generate_response_stream(
+            history,
+            summary=context['summary'],
+            use_cache=not bypass_requested(request.headers),
+            usage=usage
+        )
+    except QuotaExceeded as quota_error:
+        return _quota_exceeded_response(quota_error)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+    # ユーザーメッセージはストリームの開始前に保存し、途中で切断されても失われないようにする
+    try:
+        (user_message,), thread = message_model.save_messages(thread_id, [user_doc])
+    except Exception as e:
+        stream.close()
+        return jsonify({'error': str(e)}), 500
+    if not thread:
+        stream.close()
+        return jsonify({'error': 'Thread not found'}), 404
+
+    def generate():
+        try:
+            yield sse_event('user_message', user_message)
+
+            # 受信したチャンクをそのままクライアントへ流し、最後に連結して保存
+            chunks = []
+            try:
+                for text in stream:
+                    chunks.append(text)
+                    yield sse_event('chunk', {'text': text})
+            except Exception as ai_error:
+                # ユーザーメッセージは保存済み
+                yield sse_event('error', {
+                    'error': 'AI応答の生成に失敗しました',
+                    'details': str(ai_error)
+                })
+                return
+
+            try:
+                # AI応答の保存、スレッドの更新日時の更新
+                assistant_doc = message_model.build_message(
+                    thread_id, 'assistant', ''.join(chunks), usage=usage
+                )
+                (assistant_message,), thread = message_model.save_messages(
+                    thread_id, [assistant_doc]
+                )
+                if not thread:
+                    yield sse_event('error', {'error': 'Thread not found'})
+                    return
+
+                # 必要に応じて要約をバックグラウンドで更新
+                summary_service.schedule_refresh(
+                    thread_id, thread['message_count'], thread['summarized_count']
+                )
+            except Exception as e:
+                yield sse_event('error', {'error': str(e)})
+                return
+
+            yield sse_event('done', assistant_message)
+        finally:
+            # クライアントの切断で途中で閉じられた場合も、未使用のクォータを返す
+            stream.close()
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            # プロキシによるバッファリングを無効化し、チャンクを即時に届ける
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
+
+@messages_bp.route('/messages/<message_id>/pin', methods=['PUT'])
+def pin_message(message_id):
+    """
+    メッセージのピン留め状態を設定
+    ピン留めしたメッセージは長い会話でも常にAIへ送信される
+
+    Args:
+        message_id (str): メッセージID
+
+    Request Body:
+        {
+            "pinned": true
+        }
+
+    Returns:
+        JSON: 更新されたメッセージ
+    """
+    try:
+        data = request.get_json()
+        if not data or 'pinned' not in data:
+            return jsonify({'error': 'Pinned is required'}), 400
+
+        message = message_model.set_message_pinned(message_id, data['pinned'])
+        if not message:
+            return jsonify({'error': 'Message not found'}), 404
+
+        return jsonify(message), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
 @messages_bp.route('/messages/<message_id>', methods=['DELETE'])
 def delete_message(message_id):
     """
@@ -123,3 +337,19 @@ def delete_message(message_id):
         return jsonify({'message': 'Message deleted successfully'}), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
+
+
+def _quota_exceeded_response(error):
+    """
+    クォータ超過時の429レスポンスを作成（Retry-Afterヘッダー付き）
+
+    Args:
+        error (QuotaExceeded): スケジューラーが送出した例外
+
+    Returns:
+        tuple: (レスポンス, ステータスコード, ヘッダー)
+    """
+    return jsonify({
+        'error': 'Gemini APIの利用上限に達しました',
+        'retry_after': error.retry_after
+    }), 429, {'Retry-After': error.retry_after_header}
@@ -0,0 +1,49 @@
+"""
+全文検索のAPIエンドポイント
+"""
+from flask import Blueprint, request, jsonify
+from models import search as search_model
+from models.pagination import parse_page_size
+from services.search_tokenizer import QueryTooShort
+
+search_bp = Blueprint('search', __name__)
+
+
+@search_bp.route('/search', methods=['GET'])
+def search():
+    """
+    スレッドのタイトルとメッセージの本文を検索（スコアの降順）
+
+    Query Parameters:
+        q (str): 検索語（日本語はn-gramで、英数字は単語で一致。かなだけの場合は2文字以上）
+        limit (int, optional): 1ページの件数（上限はPAGE_SIZE_MAX）
+        cursor (str, optional): 前ページのnext_cursor
+
+    Returns:
+        JSON: 検索結果（スニペットと強調位置を含む）と next_cursor（続きがなければnull）
+    """
+    try:
+        query = (request.args.get('q') or '').strip()
+        if not query:
+            return jsonify({'error': 'Query is required'}), 400
+
+        try:
+            limit = parse_page_size(request.args.get('limit'))
+        except ValueError:
+            return jsonify({'error': 'Limit must be a positive integer'}), 400
+
+        try:
+            results, next_cursor = search_model.search(
+                query, limit, cursor=request.args.get('cursor')
+            )
+        except QueryTooShort:
+            return jsonify({'error': 'Kana queries must be at least 2 characters'}), 400
+        except ValueError:
+            return jsonify({'error': 'Invalid cursor'}), 400
+
+        return jsonify({
+            'results': results,
+            'next_cursor': next_cursor
+        }), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
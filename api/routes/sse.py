@@ -0,0 +1,19 @@
+"""
+Server-Sent Events のフォーマット
+同期版・非同期版のストリーミングエンドポイントで共通して使う
+"""
+import json
+
+
+def sse_event(event, data):
+    """
+    Server-Sent Events形式の1イベントを組み立てる
+
+    Args:
+        event (str): イベント名
+        data (dict): 送信するデータ
+
+    Returns:
+        str: SSEフォーマットの文字列
+    """
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
@@ -2,8 +2,12 @@
 スレッド関連のAPIエンドポイント
 """
 from flask import Blueprint, request, jsonify
+from config import config
 from models import thread as thread_model
-from models import message as message_model
+from models.pagination import parse_page_size
+from routes.etag import etag_headers, is_not_modified, threads_etag
+from services.history_cache import history_cache
+from services.thread_reaper import thread_reaper
 
 threads_bp = Blueprint('threads', __name__)
 
@@ -11,14 +15,49 @@ threads_bp = Blueprint('threads', __name__)
 @threads_bp.route('/threads', methods=['GET'])
 def get_threads():
     """
-    スレッド一覧を取得
+    スレッド一覧を取得（更新日時の降順）
+
+    Query Parameters:
+        limit (int, optional): 1ページの件数（上限はPAGE_SIZE_MAX）
+        cursor (str, optional): 前ページのnext_cursor
+        prefix (str, optional): タイトルの前方一致で絞り込み
+        q (str, optional): タイトルの部分一致で絞り込み（インデックスを使えないスキャン。
+            大量のスレッドではprefixか全文検索の/searchを使う）
+
+    Headers:
+        If-None-Match (str, optional): 前回のETag（一覧が変わっていなければ304を返す）
 
     Returns:
-        JSON: スレッドリスト
+        JSON: スレッドリスト（メッセージ数と最新メッセージのプレビューを含む）と
+            next_cursor（続きがなければnull）。ETagヘッダーを付ける
     """
     try:
-        threads = thread_model.get_threads()
-        return jsonify({'threads': threads}), 200
+        try:
+            limit = parse_page_size(
+                request.args.get('limit'),
+                default=config.PAGE_SIZE_MAX
+            )
+        except ValueError:
+            return jsonify({'error': 'Limit must be a positive integer'}), 400
+
+        try:
+            threads, next_cursor = thread_model.get_threads(
+                limit,
+                cursor=request.args.get('cursor'),
+                title_prefix=request.args.get('prefix'),
+                query=request.args.get('q')
+            )
+        except ValueError:
+            return jsonify({'error': 'Invalid cursor'}), 400
+
+        etag = threads_etag(threads, next_cursor)
+        if is_not_modified(request.headers.get('If-None-Match'), etag):
+            return '', 304, etag_headers(etag)
+
+        return jsonify({
+            'threads': threads,
+            'next_cursor': next_cursor
+        }), 200, etag_headers(etag)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -100,7 +139,7 @@ def update_thread(thread_id):
 @threads_bp.route('/threads/<thread_id>', methods=['DELETE'])
 def delete_thread(thread_id):
     """
-    スレッドを削除（関連メッセージも削除）
+    スレッドを削除（関連メッセージはバックグラウンドで削除）
 
     Args:
         thread_id (str): スレッドID
@@ -109,18 +148,15 @@ def delete_thread(thread_id):
         JSON: 削除結果
     """
     try:
-        # 関連メッセージを削除
-        deleted_messages = message_model.delete_messages_by_thread(thread_id)
-
-        # スレッドを削除
+        # 墓標を付けてすぐに返し、メッセージの削除はバックグラウンドで行う
         success = thread_model.delete_thread(thread_id)
 
         if not success:
             return jsonify({'error': 'Thread not found'}), 404
 
-        return jsonify({
-            'message': 'Thread deleted successfully',
-            'deleted_messages': deleted_messages
-        }), 200
+        history_cache.invalidate(thread_id)
+        thread_reaper.schedule()
+
+        return jsonify({'message': 'Thread deleted successfully'}), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
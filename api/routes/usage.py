@@ -0,0 +1,32 @@
+"""
+使用量関連のAPIエンドポイント
+"""
+from flask import Blueprint, request, jsonify
+from models import usage as usage_model
+
+usage_bp = Blueprint('usage', __name__)
+
+
+@usage_bp.route('/usage', methods=['GET'])
+def get_usage():
+    """
+    Gemini APIの使用量を日付・モデルごとに集計
+
+    Query Parameters:
+        from (str, optional): 集計開始日（YYYY-MM-DD、UTC。省略時は終了日の29日前）
+        to (str, optional): 集計終了日（YYYY-MM-DD、UTC。省略時は今日）
+
+    Returns:
+        JSON: 日付・モデルごとの使用量（days）、モデルごとの合計（models）、全体の合計（totals）
+    """
+    try:
+        try:
+            start_day, end_day = usage_model.parse_period(
+                request.args.get('from'), request.args.get('to')
+            )
+        except ValueError as e:
+            return jsonify({'error': f'Invalid period: {e}'}), 400
+
+        return jsonify(usage_model.get_usage_by_day(start_day, end_day)), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
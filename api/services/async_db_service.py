@@ -0,0 +1,74 @@
+"""
+MongoDB非同期接続サービス
+非同期サーバー（async_index.py）用にmotorでの接続とコレクション取得を管理
+"""
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import ConnectionFailure, OperationFailure, ServerSelectionTimeoutError
+from config import config
+from services.db_indexes import INDEX_REGISTRY
+from services.metrics import mongo_command_listener
+from services.tracing import mongo_command_tracing
+
+
+class AsyncDatabaseService:
+    """MongoDBへの非同期接続を管理するクラス"""
+
+    def __init__(self):
+        self.client = None
+        self.db = None
+
+    async def connect(self):
+        """MongoDBへの接続を確立"""
+        try:
+            self.client = AsyncIOMotorClient(
+                config.MONGODB_URI,
+                serverSelectionTimeoutMS=5000,  # 5秒でタイムアウト
+                event_listeners=[mongo_command_listener, mongo_command_tracing]
+            )
+            # 接続テスト
+            await self.client.admin.command('ping')
+            self.db = self.client[config.DB_NAME]
+            await self.ensure_indexes()
+            print(f"MongoDB接続成功（非同期）: {config.DB_NAME}")
+            return True
+        except (ConnectionFailure, ServerSelectionTimeoutError) as e:
+            print(f"MongoDB接続失敗: {e}")
+            return False
+
+    async def ensure_indexes(self):
+        """INDEX_REGISTRYに登録されたインデックスを作成（冪等）"""
+        for collection_name, indexes in INDEX_REGISTRY.items():
+            try:
+                await self.db[collection_name].create_indexes(indexes)
+            except OperationFailure as e:
+                print(f"インデックス作成エラー ({collection_name}): {e}")
+
+    def get_collection(self, collection_name):
+        """
+        指定されたコレクションを取得
+
+        Args:
+            collection_name (str): コレクション名
+
+        Returns:
+            AsyncIOMotorCollection: MongoDBコレクション
+        """
+        return self.db[collection_name]
+
+    def get_threads_collection(self):
+        """threadsコレクションを取得"""
+        return self.get_collection(config.THREADS_COLLECTION)
+
+    def get_messages_collection(self):
+        """messagesコレクションを取得"""
+        return self.get_collection(config.MESSAGES_COLLECTION)
+
+    def close(self):
+        """データベース接続を閉じる"""
+        if self.client:
+            self.client.close()
+            print("MongoDB接続を閉じました")
+
+
+# シングルトンインスタンス
+async_db_service = AsyncDatabaseService()
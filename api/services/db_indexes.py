@@ -0,0 +1,104 @@
+"""
+MongoDBインデックス定義
+アプリケーションが必要とするインデックスを宣言的に管理
+"""
+from pymongo import ASCENDING, DESCENDING, TEXT, IndexModel
+from config import config
+
+
+# コレクション名 -> 必要なインデックスのリスト
+# 新しいクエリを追加したら、それを支えるインデックスをここに登録する
+INDEX_REGISTRY = {
+    config.MESSAGES_COLLECTION: [
+        # スレッド内のメッセージを作成日時順に読む（履歴取得・キーセットページネーション）
+        IndexModel(
+            [('thread_id', ASCENDING), ('created_at', ASCENDING), ('_id', ASCENDING)],
+            name='thread_id_created_at'
+        ),
+        # ピン留めメッセージの取得（ピン留めされたものだけを索引する）
+        IndexModel(
+            [('thread_id', ASCENDING)],
+            name='thread_id_pinned',
+            partialFilterExpression={'pinned': True}
+        ),
+    ],
+    config.THREADS_COLLECTION: [
+        # スレッド一覧を更新日時の降順に読む（キーセットページネーション）
+        IndexModel(
+            [('updated_at', DESCENDING), ('_id', DESCENDING)],
+            name='updated_at_desc'
+        ),
+        # 墓標の付いたスレッドを削除日時順に読む（削除済みのものだけを索引する）
+        IndexModel(
+            [('deleted_at', ASCENDING)],
+            name='deleted_at',
+            partialFilterExpression={'deleted_at': {'$exists': True}}
+        ),
+        # タイトルの前方一致（prefix、先頭固定の正規表現）で絞り込む
+        # 部分一致（q）は先頭が固定されないためインデックスを使えず、スキャンになる
+        IndexModel(
+            [('title', ASCENDING)],
+            name='title'
+        ),
+    ],
+    config.MESSAGE_BUCKETS_COLLECTION: [
+        # スレッドのバケットを新しい順・古い順に読む
+        IndexModel(
+            [('thread_id', ASCENDING), ('last_at', DESCENDING)],
+            name='thread_id_last_at'
+        ),
+        IndexModel(
+            [('thread_id', ASCENDING), ('first_at', ASCENDING)],
+            name='thread_id_first_at'
+        ),
+        # メッセージIDでの更新・削除（ピン留め・個別削除）
+        IndexModel(
+            [('messages._id', ASCENDING)],
+            name='messages_id'
+        ),
+    ],
+    config.USAGE_LEDGER_COLLECTION: [
+        # 使用量を期間で絞り込み、日付・モデルごとに集計する
+        IndexModel(
+            [('day', ASCENDING), ('model', ASCENDING)],
+            name='day_model'
+        ),
+    ],
+    config.SEARCH_COLLECTION: [
+        # 全文検索（n-gramに分けたtermsをそのまま索引するため、言語は'none'）
+        IndexModel(
+            [('terms', TEXT)],
+            name='terms_text',
+            default_language='none'
+        ),
+        # スレッドの後片付けでエントリをまとめて削除する
+        IndexModel(
+            [('thread_id', ASCENDING)],
+            name='thread_id'
+        ),
+    ],
+    config.RESPONSE_CACHE_COLLECTION: [
+        # 有効期限を過ぎたAI応答キャッシュを自動削除
+        IndexModel(
+            [('expires_at', ASCENDING)],
+            name='expires_at_ttl',
+            expireAfterSeconds=0
+        ),
+    ],
+}
+
+
+def registered_index_names(collection_name):
+    """
+    コレクションに登録されているインデックス名の一覧を取得
+
+    Args:
+        collection_name (str): コレクション名
+
+    Returns:
+        list: インデックス名のリスト
+    """
+    return [
+        index.document['name']
+        for index in INDEX_REGISTRY.get(collection_name, [])
+    ]
@@ -2,9 +2,13 @@
 MongoDB接続サービス
 データベースへの接続とコレクション取得を管理
 """
+import threading
 from pymongo import MongoClient
-from pymongo.errors import ConnectionFailure, ServerSelectionTimeoutError
+from pymongo.errors import ConnectionFailure, OperationFailure, ServerSelectionTimeoutError
 from config import config
+from services.db_indexes import INDEX_REGISTRY, registered_index_names
+from services.metrics import mongo_command_listener
+from services.tracing import mongo_command_tracing
 
 
 class DatabaseService:
@@ -13,22 +17,101 @@ class DatabaseService:
     def __init__(self):
         self.client = None
         self.db = None
+        self._lock = threading.Lock()
 
     def connect(self):
-        """MongoDBへの接続を確立"""
-        try:
-            self.client = MongoClient(
-                config.MONGODB_URI,
-                serverSelectionTimeoutMS=5000  # 5秒でタイムアウト
-            )
-            # 接続テスト
-            self.client.admin.command('ping')
-            self.db = self.client[config.DB_NAME]
-            print(f"MongoDB接続成功: {config.DB_NAME}")
+        """
+        MongoDBへの接続を確立
+
+        サーバーレス環境ではウォームスタートの間プロセスが再利用されるため、
+        接続済みのクライアントがあればpingもインデックス確認もせずにそのまま使う
+        （MongoClientは接続プールを持ち、切断されても自動で再接続する）
+
+        Returns:
+            bool: 接続できたか
+        """
+        if self.db is not None:
             return True
-        except (ConnectionFailure, ServerSelectionTimeoutError) as e:
-            print(f"MongoDB接続失敗: {e}")
-            return False
+
+        with self._lock:
+            if self.db is not None:
+                return True
+            try:
+                client = MongoClient(
+                    config.MONGODB_URI,
+                    serverSelectionTimeoutMS=5000,  # 5秒でタイムアウト
+                    event_listeners=[mongo_command_listener, mongo_command_tracing]
+                )
+                # 接続テスト（新しいクライアントを作ったときだけ）
+                client.admin.command('ping')
+                self.client = client
+                self.db = client[config.DB_NAME]
+                if config.MONGODB_ENSURE_INDEXES:
+                    self.ensure_indexes()
+                print(f"MongoDB接続成功: {config.DB_NAME}")
+                return True
+            except (ConnectionFailure, ServerSelectionTimeoutError) as e:
+                print(f"MongoDB接続失敗: {e}")
+                return False
+
+    def ensure_indexes(self):
+        """
+        INDEX_REGISTRYに登録されたインデックスを作成
+        同じ定義のインデックスが既にある場合は何もしない（冪等）
+
+        Returns:
+            dict: コレクション名 -> 作成（確認）したインデックス名のリスト
+        """
+        created = {}
+        for collection_name, indexes in INDEX_REGISTRY.items():
+            try:
+                created[collection_name] = self.db[collection_name].create_indexes(indexes)
+            except OperationFailure as e:
+                # 同名で定義の異なるインデックスがある場合など。起動は継続する
+                print(f"インデックス作成エラー ({collection_name}): {e}")
+                created[collection_name] = []
+        return created
+
+    def index_report(self):
+        """
+        登録済みインデックスと実際のインデックスを比較
+
+        $indexStatsの利用回数から、使われていないインデックスも検出する。
+        利用回数はmongodの再起動でリセットされる点に注意。
+
+        Returns:
+            dict: コレクション名 -> {
+                'missing': 登録済みだが存在しないインデックス名,
+                'unregistered': 存在するが登録されていないインデックス名,
+                'unused': 起動以降一度も使われていないインデックス名（_id_は削除できないため除く）,
+                'usage': インデックス名 -> 利用回数
+            }
+        """
+        if self.db is None:
+            self.connect()
+
+        report = {}
+        for collection_name in INDEX_REGISTRY:
+            collection = self.db[collection_name]
+            stats = {
+                stat['name']: stat['accesses']['ops']
+                for stat in collection.aggregate([{'$indexStats': {}}])
+            }
+            registered = registered_index_names(collection_name)
+
+            report[collection_name] = {
+                'missing': [name for name in registered if name not in stats],
+                'unregistered': [
+                    name for name in stats
+                    if name != '_id_' and name not in registered
+                ],
+                'unused': [
+                    name for name, ops in stats.items()
+                    if name != '_id_' and ops == 0
+                ],
+                'usage': stats
+            }
+        return report
 
     def get_collection(self, collection_name):
         """
@@ -56,6 +139,8 @@ class DatabaseService:
         """データベース接続を閉じる"""
         if self.client:
             self.client.close()
+            self.client = None
+            self.db = None
             print("MongoDB接続を閉じました")
 
     def test_connection(self):
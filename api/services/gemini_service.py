@@ -2,23 +2,120 @@
 Google Gemini API連携サービス
 AIチャット機能を提供
 """
-from google import genai
-from google.genai import types
+import asyncio
+import threading
+import time
 from config import config
+from services.metrics import gemini_rate_limited, gemini_request_duration, gemini_retries, gemini_tokens
+from services.quota_scheduler import QuotaExceeded, quota_scheduler
+from services.response_cache import make_cache_key, response_cache
+from services.retry_policy import (
+    backoff_delay, is_rate_limited, is_retryable, retry_after, status_code
+)
+from services.token_estimator import estimate_message_tokens, estimate_tokens
+from services.tracing import tracer
+
+# 応答キャッシュから返した応答の使用量に記録するモデル名
+RESPONSE_CACHE_MODEL = 'response_cache'
+
+
+class ReservedStream:
+    """
+    クォータを確保済みのストリーム（generate_response_streamの戻り値）
+    最初の断片を読む前に閉じられた場合（クライアントの切断や保存の失敗など）は、
+    生成を始めていないため確保したトークンを返す
+    """
+
+    def __init__(self, stream, release=None):
+        self._stream = stream
+        self._release = release
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        self._release = None
+        return next(self._stream)
+
+    def close(self):
+        """ストリームを閉じる（未読なら確保したトークンを返す）"""
+        release, self._release = self._release, None
+        if release:
+            release()
+        self._stream.close()
+
+
+class AsyncReservedStream:
+    """ReservedStreamの非同期版（generate_response_stream_asyncの戻り値）"""
+
+    def __init__(self, stream, release=None):
+        self._stream = stream
+        self._release = release
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        self._release = None
+        return await self._stream.__anext__()
+
+    async def aclose(self):
+        """ストリームを閉じる（未読なら確保したトークンを返す）"""
+        release, self._release = self._release, None
+        if release:
+            release()
+        await self._stream.aclose()
 
 
 class GeminiService:
     """Gemini APIを管理するクラス"""
 
     def __init__(self):
-        """Gemini APIの初期化"""
-        self.client = genai.Client(api_key=config.GEMINI_API_KEY)
+        """Gemini APIの初期化（クライアントは初回の呼び出し時に作成する）"""
+        self._client = None
+        self._client_lock = threading.Lock()
         self.model_id = config.GEMINI_MODEL
-        print(f"Gemini APIを初期化しました: {self.model_id}")
 
-    def generate_response(self, messages):
+    @property
+    def client(self):
+        """
+        genaiクライアント
+        google.genaiのimportとクライアント作成はコールドスタートでは重いため、
+        最初にAPIを呼び出すときまで遅らせ、以降は同じクライアントを使い回す
+        """
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    from google import genai
+                    self._client = genai.Client(**self._client_options())
+                    print(f"Gemini APIを初期化しました: {self.model_id}")
+        return self._client
+
+    @client.setter
+    def client(self, value):
+        self._client = value
+
+    @staticmethod
+    def _client_options():
+        """
+        genai.Clientの引数
+        GEMINI_BASE_URLが設定されていればその接続先（ローカルのスタンドインなど）を使う
+
+        Returns:
+            dict: genai.Clientのキーワード引数
+        """
+        if not config.GEMINI_BASE_URL:
+            return {'api_key': config.GEMINI_API_KEY}
+        return {
+            # スタンドインはAPIキーを確認しないため、未設定でもクライアントを作れるようにする
+            'api_key': config.GEMINI_API_KEY or 'standin',
+            'http_options': {'base_url': config.GEMINI_BASE_URL},
+        }
+
+    def generate_response(self, messages, summary=None, use_cache=True, usage=None):
         """
         会話履歴を元にAIの応答を生成
+        一時的なエラーはバックオフしてリトライし、上限超過時はフォールバック先のモデルに切り替える
 
         Args:
             messages (list): 会話履歴
@@ -26,32 +123,559 @@ class GeminiService:
                     {'role': 'user', 'content': 'こんにちは'},
                     {'role': 'assistant', 'content': 'こんにちは！'}
                 ]
+            summary (str, optional): これまでの会話の要約
+            use_cache (bool): 応答キャッシュを読むか（Falseでも新しい応答は格納する）
+            usage (dict, optional): 渡すと応答後に使用量（_build_usageの形式）を書き込む
 
         Returns:
             str: AIの応答テキスト
+
+        Raises:
+            QuotaExceeded: すべてのモデルが利用上限に達している場合
+        """
+        started = time.perf_counter()
+        cache_key = self._cache_key(messages, summary)
+        if cache_key and use_cache:
+            cached = response_cache.get(cache_key)
+            if cached is not None:
+                self._fill_usage(usage, None, None, started)
+                return cached
+
+        contents = self._build_contents(messages)
+        generate_config = self._build_config(summary)
+
+        def call(model):
+            return self.client.models.generate_content(
+                model=model,
+                contents=contents,
+                config=generate_config
+            )
+
+        try:
+            model, reserved, response = self._call_with_fallback(
+                call, messages, summary, self._deadline(), operation='generate'
+            )
+        except QuotaExceeded:
+            raise
+        except Exception as e:
+            print(f"Gemini API エラー: {e}")
+            raise Exception(f"AI応答の生成に失敗しました: {str(e)}")
+
+        self._settle_quota(model, reserved, response)
+        self._record_tokens(model, response)
+        self._fill_usage(usage, model, response, started)
+        if self._cacheable(cache_key, model):
+            response_cache.put(cache_key, response.text, self._total_tokens(response))
+        return response.text
+
+    def generate_response_stream(self, messages, summary=None, use_cache=True, usage=None):
+        """
+        会話履歴を元にAIの応答をストリーミングで生成
+        クォータは呼び出し時点で確保するため、レスポンス開始前に429を判定できる
+        リトライとフォールバックは最初のチャンクを受信するまでに限る
+
+        Args:
+            messages (list): 会話履歴（generate_responseと同じ形式）
+            summary (str, optional): これまでの会話の要約
+            use_cache (bool): 応答キャッシュを読むか（ヒット時は応答全体を1つの断片で返す）
+            usage (dict, optional): 渡すとストリームの完了時に使用量を書き込む
+
+        Returns:
+            ReservedStream: 生成されたテキストの断片（受信した順）
+                読み終える前にやめる場合はclose()で閉じる
+
+        Raises:
+            QuotaExceeded: すべてのモデルが利用上限に達している場合
         """
+        started = time.perf_counter()
+        cache_key = self._cache_key(messages, summary)
+        if cache_key and use_cache:
+            cached = response_cache.get(cache_key)
+            if cached is not None:
+                self._fill_usage(usage, None, None, started)
+                return ReservedStream(self._replay(cached))
+
+        deadline = self._deadline()
+        start = self._acquire_first_available(messages, summary, deadline)
+        return ReservedStream(
+            self._stream(messages, summary, deadline, start, cache_key, usage, started),
+            lambda: self._release_quota(self._model_chain()[start[0]], start[1])
+        )
+
+    @staticmethod
+    def _replay(text):
+        """キャッシュ済みの応答を1つの断片として返すイテレータ"""
+        yield text
+
+    def _stream(self, messages, summary, deadline, start, cache_key, usage=None, started=None):
+        """generate_response_streamの本体（チャンクが届くたびに呼び出し元へ渡す）"""
+        contents = self._build_contents(messages)
+        generate_config = self._build_config(summary)
+
+        def open_stream(model):
+            # 最初のチャンクの受信までをリトライの対象にする
+            stream = iter(self.client.models.generate_content_stream(
+                model=model,
+                contents=contents,
+                config=generate_config
+            ))
+            return next(stream, None), stream
+
         try:
-            # 会話履歴を構築（全メッセージを含む）
-            contents = []
-            for msg in messages:
-                role = 'user' if msg['role'] == 'user' else 'model'
-                contents.append(types.Content(
-                    role=role,
-                    parts=[types.Part(text=msg['content'])]
-                ))
-
-            # AI応答を生成
-            response = self.client.models.generate_content(
-                model=self.model_id,
-                contents=contents
+            model, reserved, (chunk, stream) = self._call_with_fallback(
+                open_stream, messages, summary, deadline, start, operation='stream'
             )
+            texts = []
+            if chunk is not None and chunk.text:
+                texts.append(chunk.text)
+                yield chunk.text
 
-            return response.text
+            for chunk in stream:
+                if chunk.text:
+                    texts.append(chunk.text)
+                    yield chunk.text
+
+            # 使用量は最後のチャンクに含まれる
+            self._settle_quota(model, reserved, chunk)
+            self._record_tokens(model, chunk)
+            self._fill_usage(usage, model, chunk, started)
+            if self._cacheable(cache_key, model):
+                response_cache.put(cache_key, ''.join(texts), self._total_tokens(chunk))
+
+        except Exception as e:
+            print(f"Gemini API エラー: {e}")
+            raise Exception(f"AI応答の生成に失敗しました: {str(e)}")
+
+    async def generate_response_async(self, messages, summary=None, use_cache=True, usage=None):
+        """
+        generate_responseの非同期版（genaiクライアントのaioインターフェースを使用）
+
+        Args:
+            messages (list): 会話履歴（generate_responseと同じ形式）
+            summary (str, optional): これまでの会話の要約
+            use_cache (bool): 応答キャッシュを読むか
+            usage (dict, optional): 渡すと使用量を書き込む（generate_responseと同じ）
+
+        Returns:
+            str: AIの応答テキスト
+
+        Raises:
+            QuotaExceeded: すべてのモデルが利用上限に達している場合
+        """
+        started = time.perf_counter()
+        cache_key = self._cache_key(messages, summary)
+        if cache_key and use_cache:
+            cached = await asyncio.to_thread(response_cache.get, cache_key)
+            if cached is not None:
+                self._fill_usage(usage, None, None, started)
+                return cached
+
+        contents = self._build_contents(messages)
+        generate_config = self._build_config(summary)
+
+        async def call(model):
+            return await self.client.aio.models.generate_content(
+                model=model,
+                contents=contents,
+                config=generate_config
+            )
+
+        try:
+            model, reserved, response = await self._call_with_fallback_async(
+                call, messages, summary, self._deadline(), operation='generate'
+            )
+        except QuotaExceeded:
+            raise
+        except Exception as e:
+            print(f"Gemini API エラー: {e}")
+            raise Exception(f"AI応答の生成に失敗しました: {str(e)}")
+
+        self._settle_quota(model, reserved, response)
+        self._record_tokens(model, response)
+        self._fill_usage(usage, model, response, started)
+        if self._cacheable(cache_key, model):
+            await asyncio.to_thread(
+                response_cache.put, cache_key, response.text, self._total_tokens(response)
+            )
+        return response.text
+
+    async def generate_response_stream_async(self, messages, summary=None, use_cache=True,
+                                             usage=None):
+        """
+        generate_response_streamの非同期版
+
+        Args:
+            messages (list): 会話履歴（generate_responseと同じ形式）
+            summary (str, optional): これまでの会話の要約
+            use_cache (bool): 応答キャッシュを読むか
+            usage (dict, optional): 渡すと使用量を書き込む（generate_responseと同じ）
+
+        Returns:
+            AsyncReservedStream: 生成されたテキストの断片（受信した順）
+                読み終える前にやめる場合はaclose()で閉じる
+
+        Raises:
+            QuotaExceeded: すべてのモデルが利用上限に達している場合
+        """
+        started = time.perf_counter()
+        cache_key = self._cache_key(messages, summary)
+        if cache_key and use_cache:
+            cached = await asyncio.to_thread(response_cache.get, cache_key)
+            if cached is not None:
+                self._fill_usage(usage, None, None, started)
+                return AsyncReservedStream(self._replay_async(cached))
+
+        deadline = self._deadline()
+        start = await self._acquire_first_available_async(messages, summary, deadline)
+        return AsyncReservedStream(
+            self._stream_async(messages, summary, deadline, start, cache_key, usage, started),
+            lambda: self._release_quota(self._model_chain()[start[0]], start[1])
+        )
+
+    @staticmethod
+    async def _replay_async(text):
+        """キャッシュ済みの応答を1つの断片として返す非同期イテレータ"""
+        yield text
+
+    async def _stream_async(self, messages, summary, deadline, start, cache_key, usage=None,
+                            started=None):
+        """generate_response_stream_asyncの本体"""
+        contents = self._build_contents(messages)
+        generate_config = self._build_config(summary)
+
+        async def open_stream(model):
+            stream = await self.client.aio.models.generate_content_stream(
+                model=model,
+                contents=contents,
+                config=generate_config
+            )
+            try:
+                first = await stream.__anext__()
+            except StopAsyncIteration:
+                first = None
+            return first, stream
+
+        try:
+            model, reserved, (chunk, stream) = await self._call_with_fallback_async(
+                open_stream, messages, summary, deadline, start, operation='stream'
+            )
+            texts = []
+            if chunk is not None and chunk.text:
+                texts.append(chunk.text)
+                yield chunk.text
+
+            async for chunk in stream:
+                if chunk.text:
+                    texts.append(chunk.text)
+                    yield chunk.text
+
+            # 使用量は最後のチャンクに含まれる
+            self._settle_quota(model, reserved, chunk)
+            self._record_tokens(model, chunk)
+            self._fill_usage(usage, model, chunk, started)
+            if self._cacheable(cache_key, model):
+                await asyncio.to_thread(
+                    response_cache.put, cache_key, ''.join(texts), self._total_tokens(chunk)
+                )
 
         except Exception as e:
             print(f"Gemini API エラー: {e}")
             raise Exception(f"AI応答の生成に失敗しました: {str(e)}")
 
+    def _call_with_fallback(self, call, messages, summary, deadline, start=None,
+                            operation='generate'):
+        """
+        モデルのフォールバックチェーンに沿ってAPIを呼び出す
+        429/5xx・通信エラーは同じモデルでバックオフしてリトライし、
+        429またはリトライ上限に達した場合は次のモデルに切り替える
+
+        Args:
+            call (callable): モデル名を受け取りAPIを呼び出す関数
+            messages (list): 会話履歴（クォータの見積もりに使用）
+            summary (str): これまでの会話の要約（クォータの見積もりに使用）
+            deadline (float): 全体の制限時刻（time.monotonic基準）
+            start (tuple, optional): 確保済みの(チェーン上の位置, トークン数)
+            operation (str): メトリクスのラベル（'generate' または 'stream'）
+
+        Returns:
+            tuple: (応答したモデル名, 確保したトークン数, callの戻り値)
+
+        Raises:
+            QuotaExceeded: すべてのモデルが利用上限に達している場合
+            Exception: リトライしないエラー、またはリトライを使い切ったエラー
+        """
+        chain = self._model_chain()
+        first_index, reserved = start or (0, None)
+        quota_errors = []
+        last_error = None
+
+        for index in range(first_index, len(chain)):
+            model = chain[index]
+            attempt = 0
+            while time.monotonic() < deadline:
+                if reserved is None:
+                    try:
+                        reserved = self._acquire_quota(model, messages, summary, deadline)
+                    except QuotaExceeded as e:
+                        quota_errors.append(e)
+                        break
+                started = time.perf_counter()
+                try:
+                    result = call(model)
+                    self._record_call(model, operation, started)
+                    return model, reserved, result
+                except Exception as e:
+                    self._record_call(model, operation, started, e)
+                    attempt += 1
+                    last_error = e
+                    delay = self._retry_delay(e, attempt, index < len(chain) - 1, deadline)
+                    if delay is None:
+                        break
+                    gemini_retries.inc(model)
+                    print(f"Gemini API エラー（{delay:.1f}秒後に再試行 {attempt}/{config.GEMINI_MAX_RETRIES}）: {e}")
+                    # 同じモデルへのリトライは確保済みの枠をそのまま使う
+                    time.sleep(delay)
+            # 次のモデルに移る前に、このモデルで確保したトークンを返す
+            self._release_quota(model, reserved)
+            reserved = None
+
+        raise self._exhausted_error(chain, last_error, quota_errors)
+
+    async def _call_with_fallback_async(self, call, messages, summary, deadline, start=None,
+                                        operation='generate'):
+        """_call_with_fallbackの非同期版（callはコルーチン関数）"""
+        chain = self._model_chain()
+        first_index, reserved = start or (0, None)
+        quota_errors = []
+        last_error = None
+
+        for index in range(first_index, len(chain)):
+            model = chain[index]
+            attempt = 0
+            while time.monotonic() < deadline:
+                if reserved is None:
+                    try:
+                        reserved = await self._acquire_quota_async(model, messages, summary, deadline)
+                    except QuotaExceeded as e:
+                        quota_errors.append(e)
+                        break
+                started = time.perf_counter()
+                try:
+                    result = await call(model)
+                    self._record_call(model, operation, started)
+                    return model, reserved, result
+                except Exception as e:
+                    self._record_call(model, operation, started, e)
+                    attempt += 1
+                    last_error = e
+                    delay = self._retry_delay(e, attempt, index < len(chain) - 1, deadline)
+                    if delay is None:
+                        break
+                    gemini_retries.inc(model)
+                    print(f"Gemini API エラー（{delay:.1f}秒後に再試行 {attempt}/{config.GEMINI_MAX_RETRIES}）: {e}")
+                    # 同じモデルへのリトライは確保済みの枠をそのまま使う
+                    await asyncio.sleep(delay)
+            # 次のモデルに移る前に、このモデルで確保したトークンを返す
+            self._release_quota(model, reserved)
+            reserved = None
+
+        raise self._exhausted_error(chain, last_error, quota_errors)
+
+    @staticmethod
+    def _record_call(model, operation, started, error=None):
+        """
+        API呼び出し1回の所要時間をメトリクスとトレースに記録
+
+        Args:
+            model (str): 呼び出したモデル名
+            operation (str): 'generate' または 'stream'
+            started (float): 呼び出し開始時刻（time.perf_counter基準）
+            error (Exception, optional): 失敗した場合の例外
+        """
+        if error is None:
+            outcome = 'ok'
+        else:
+            code = status_code(error)
+            outcome = str(code) if code is not None else 'error'
+            if is_rate_limited(error):
+                gemini_rate_limited.inc(model)
+        duration = time.perf_counter() - started
+        gemini_request_duration.observe(duration, model, operation, outcome)
+        tracer.record(f"gemini.{operation}", duration, error, model=model, outcome=outcome)
+
+    @staticmethod
+    def _record_tokens(model, response):
+        """応答の使用量メタデータから入力・出力トークン数をメトリクスに記録"""
+        usage = getattr(response, 'usage_metadata', None)
+        if not usage:
+            return
+        prompt_tokens = getattr(usage, 'prompt_token_count', None)
+        output_tokens = getattr(usage, 'candidates_token_count', None)
+        if prompt_tokens is not None:
+            gemini_tokens.observe(prompt_tokens, model, 'in')
+        if output_tokens is not None:
+            gemini_tokens.observe(output_tokens, model, 'out')
+
+    @classmethod
+    def _fill_usage(cls, usage, model, response, started):
+        """usageが渡されていれば_build_usageの結果を書き込む"""
+        if usage is not None:
+            usage.update(cls._build_usage(model, response, started))
+
+    @staticmethod
+    def _build_usage(model, response, started):
+        """
+        1回の応答の使用量（アシスタントメッセージと使用量の台帳に保存する形式）
+
+        Args:
+            model (str): 応答したモデル名（応答キャッシュのヒット時はNone）
+            response: genaiの応答（ストリーミングでは最後のチャンク）
+            started (float): 生成開始時刻（time.perf_counter基準。リトライの待ち時間を含む）
+
+        Returns:
+            dict: {'model', 'prompt_tokens', 'output_tokens', 'cached_tokens', 'latency_ms'}
+                応答キャッシュのヒット時はmodelが'response_cache'でトークン数は0
+        """
+        usage = getattr(response, 'usage_metadata', None)
+        return {
+            'model': model or RESPONSE_CACHE_MODEL,
+            'prompt_tokens': getattr(usage, 'prompt_token_count', None) or 0,
+            'output_tokens': getattr(usage, 'candidates_token_count', None) or 0,
+            'cached_tokens': getattr(usage, 'cached_content_token_count', None) or 0,
+            'latency_ms': round((time.perf_counter() - started) * 1000, 1),
+        }
+
+    def _retry_delay(self, error, attempt, has_fallback, deadline):
+        """
+        失敗した呼び出しを同じモデルでリトライするまでの待ち時間を決める
+
+        Args:
+            error (Exception): 発生した例外
+            attempt (int): このモデルでの失敗回数
+            has_fallback (bool): フォールバック先のモデルが残っているか
+            deadline (float): 全体の制限時刻（time.monotonic基準）
+
+        Returns:
+            float: 待ち時間（秒）、次のモデルに切り替える場合はNone
+
+        Raises:
+            Exception: リトライしないエラー（4xxなど）はそのまま送出
+        """
+        if not is_retryable(error):
+            raise error
+        if is_rate_limited(error) and has_fallback:
+            return None
+        if attempt > config.GEMINI_MAX_RETRIES:
+            return None
+
+        delay = retry_after(error) or backoff_delay(attempt)
+        if time.monotonic() + delay >= deadline:
+            return None
+        return delay
+
+    def _exhausted_error(self, chain, last_error, quota_errors):
+        """
+        すべてのモデルで失敗した場合に送出する例外
+        上限超過で終わった場合はQuotaExceeded（429）として返す
+        """
+        if last_error is not None and is_rate_limited(last_error):
+            return QuotaExceeded(
+                chain[-1],
+                retry_after(last_error) or config.GEMINI_RETRY_MAX_DELAY
+            )
+        if last_error is not None:
+            return last_error
+        if quota_errors:
+            return min(quota_errors, key=lambda e: e.retry_after)
+        return TimeoutError('Gemini APIの呼び出しが制限時間内に完了しませんでした')
+
+    def _acquire_first_available(self, messages, summary, deadline):
+        """
+        フォールバックチェーンの先頭から順に、クォータを確保できるモデルを探す
+
+        Returns:
+            tuple: (チェーン上の位置, 確保したトークン数)
+
+        Raises:
+            QuotaExceeded: すべてのモデルが利用上限に達している場合
+        """
+        quota_errors = []
+        for index, model in enumerate(self._model_chain()):
+            try:
+                return index, self._acquire_quota(model, messages, summary, deadline)
+            except QuotaExceeded as e:
+                quota_errors.append(e)
+        raise min(quota_errors, key=lambda e: e.retry_after)
+
+    async def _acquire_first_available_async(self, messages, summary, deadline):
+        """_acquire_first_availableの非同期版"""
+        quota_errors = []
+        for index, model in enumerate(self._model_chain()):
+            try:
+                return index, await self._acquire_quota_async(model, messages, summary, deadline)
+            except QuotaExceeded as e:
+                quota_errors.append(e)
+        raise min(quota_errors, key=lambda e: e.retry_after)
+
+    def _model_chain(self):
+        """主モデルとフォールバック先のモデル（重複を除いた呼び出し順）"""
+        chain = [self.model_id]
+        for model in config.GEMINI_FALLBACK_MODELS:
+            if model not in chain:
+                chain.append(model)
+        return chain
+
+    @staticmethod
+    def _deadline():
+        """リトライ・フォールバックを含めた1リクエストの制限時刻"""
+        return time.monotonic() + config.GEMINI_REQUEST_DEADLINE
+
+    def summarize(self, previous_summary, messages):
+        """
+        既存の要約に新しいメッセージを織り込んだ要約を生成
+        要約済みのメッセージは渡さないため、コストは会話の長さに依存しない
+
+        Args:
+            previous_summary (str): これまでの要約（初回はNoneまたは空文字）
+            messages (list): 前回の要約以降に追加された会話履歴
+
+        Returns:
+            str: 更新された要約テキスト
+        """
+        lines = []
+        for msg in messages:
+            speaker = 'ユーザー' if msg['role'] == 'user' else 'アシスタント'
+            lines.append(f"{speaker}: {msg['content']}")
+
+        prompt = (
+            "以下は会話の既存の要約と、その後に追加された会話です。\n"
+            "既存の要約に新しい会話の要点を統合し、重要な事実・決定事項・"
+            "ユーザーの前提条件を残した簡潔な要約を日本語で出力してください。\n\n"
+            f"## 既存の要約\n{previous_summary or '（なし）'}\n\n"
+            "## 追加された会話\n" + "\n".join(lines)
+        )
+
+        reserved = self._acquire_quota(
+            config.SUMMARY_MODEL,
+            [{'role': 'user', 'content': prompt}],
+            None
+        )
+
+        started = time.perf_counter()
+        try:
+            response = self.client.models.generate_content(
+                model=config.SUMMARY_MODEL,
+                contents=prompt
+            )
+            self._record_call(config.SUMMARY_MODEL, 'summarize', started)
+            self._settle_quota(config.SUMMARY_MODEL, reserved, response)
+            self._record_tokens(config.SUMMARY_MODEL, response)
+            return response.text
+        except Exception as e:
+            self._record_call(config.SUMMARY_MODEL, 'summarize', started, e)
+            print(f"Gemini API エラー: {e}")
+            raise Exception(f"要約の生成に失敗しました: {str(e)}")
+
     def generate_simple_response(self, prompt):
         """
         シンプルな1回限りの応答を生成
@@ -72,6 +696,143 @@ class GeminiService:
             print(f"Gemini API エラー: {e}")
             raise Exception(f"AI応答の生成に失敗しました: {str(e)}")
 
+    def _acquire_quota(self, model, messages, summary, deadline=None):
+        """
+        会話履歴の推定トークン数でクォータを確保
+
+        Args:
+            deadline (float, optional): 待機の期限（time.monotonic基準）
+
+        Returns:
+            int: 確保したトークン数（クォータ制御が無効なら0）
+        """
+        if not config.GEMINI_QUOTA_ENABLED:
+            return 0
+
+        reserved = self._estimate_request_tokens(messages, summary)
+        quota_scheduler.acquire(model, reserved, max_wait=self._remaining(deadline))
+        return reserved
+
+    async def _acquire_quota_async(self, model, messages, summary, deadline=None):
+        """_acquire_quotaの非同期版"""
+        if not config.GEMINI_QUOTA_ENABLED:
+            return 0
+
+        reserved = self._estimate_request_tokens(messages, summary)
+        await quota_scheduler.acquire_async(
+            model, reserved, max_wait=self._remaining(deadline)
+        )
+        return reserved
+
+    @staticmethod
+    def _remaining(deadline):
+        """期限までの残り秒数（期限なしはNone）"""
+        if deadline is None:
+            return None
+        return deadline - time.monotonic()
+
+    def _release_quota(self, model, reserved):
+        """
+        応答を得られなかったモデルで確保したトークンを返す（実績0で精算）
+        リクエスト数（RPM・RPD）は実際に呼び出した分として返さない
+        """
+        if not config.GEMINI_QUOTA_ENABLED or not reserved:
+            return
+
+        quota_scheduler.settle(model, reserved, 0)
+
+    def _settle_quota(self, model, reserved, response):
+        """応答の使用量メタデータで確保済みトークン数を精算"""
+        if not config.GEMINI_QUOTA_ENABLED:
+            return
+
+        quota_scheduler.settle(model, reserved, self._total_tokens(response))
+
+    @staticmethod
+    def _total_tokens(response):
+        """応答の使用量メタデータから合計トークン数を取得（不明ならNone）"""
+        usage = getattr(response, 'usage_metadata', None)
+        return getattr(usage, 'total_token_count', None) if usage else None
+
+    def _cache_key(self, messages, summary):
+        """応答キャッシュのキー（キャッシュが無効ならNone）"""
+        if not response_cache.enabled:
+            return None
+        return make_cache_key(self.model_id, summary, messages)
+
+    def _cacheable(self, cache_key, model):
+        """
+        応答をキャッシュに格納するか
+        キーは主モデル（self.model_id）で作るため、フォールバック先のモデルの応答は格納しない
+        """
+        return cache_key is not None and model == self.model_id
+
+    def _estimate_request_tokens(self, messages, summary):
+        """リクエスト1回分の推定トークン数（入力 + 出力の見込み）"""
+        prompt_tokens = sum(
+            msg.get('tokens') or estimate_message_tokens(msg)
+            for msg in messages
+        )
+        return prompt_tokens + estimate_tokens(summary) + config.GEMINI_EXPECTED_OUTPUT_TOKENS
+
+    def _build_contents(self, messages):
+        """
+        会話履歴をGemini API用のContentリストに変換
+
+        Args:
+            messages (list): 会話履歴
+
+        Returns:
+            list: types.Contentのリスト
+        """
+        # 履歴キャッシュ由来のメッセージは構築済みのContentを再利用する
+        return [
+            msg.get('gemini_content') or self.to_content(msg)
+            for msg in messages
+        ]
+
+    @staticmethod
+    def to_content(message):
+        """
+        1メッセージをGemini API用のContentに変換
+
+        Args:
+            message (dict): 'role'と'content'を持つメッセージ
+
+        Returns:
+            types.Content: 変換されたContent
+        """
+        from google.genai import types
+
+        role = 'user' if message['role'] == 'user' else 'model'
+        return types.Content(
+            role=role,
+            parts=[types.Part(text=message['content'])]
+        )
+
+    def _build_config(self, summary):
+        """
+        生成設定を構築（要約があればシステム指示として渡す）
+
+        Args:
+            summary (str): これまでの会話の要約
+
+        Returns:
+            types.GenerateContentConfig: 生成設定、要約がない場合はNone
+        """
+        if not summary:
+            return None
+
+        from google.genai import types
+
+        return types.GenerateContentConfig(
+            system_instruction=(
+                "以下はこの会話のこれまでの要約です。"
+                "直近のやり取りと合わせて文脈として利用してください。\n\n"
+                f"{summary}"
+            )
+        )
+
     def list_available_models(self):
         """
         利用可能なモデルの一覧を取得
@@ -0,0 +1,277 @@
+"""
+会話履歴キャッシュサービス
+スレッドごとの会話履歴（構築済みのGemini Content付き）をプロセス内に保持
+
+キャッシュはプロセスごとにあるため、格納時のスレッドのversion（表示が変わる更新の
+たびに増える）を一緒に保持し、読み出し時に現在のversionと違えば破棄する。
+他のワーカーやサーバーレスのインスタンスが追加・削除・ピン留めしたメッセージも
+次の読み出しで反映される。
+"""
+import sys
+import threading
+import time
+from collections import OrderedDict
+from config import config
+from services.gemini_service import GeminiService
+from services.token_estimator import estimate_message_tokens
+
+# 1メッセージあたりの辞書・Contentオブジェクトのおおよそのオーバーヘッド（バイト）
+_ENTRY_OVERHEAD_BYTES = 512
+
+
+def make_history_entry(message):
+    """
+    MongoDBのメッセージドキュメントから履歴エントリを作成
+
+    Args:
+        message (dict): '_id', 'role', 'content'を持つメッセージドキュメント
+
+    Returns:
+        dict: 履歴エントリ
+            {
+                'id': ObjectId,
+                'role': 'user',
+                'content': 'こんにちは',
+                'pinned': False,
+                'created_at': datetime,
+                'tokens': 9,
+                'gemini_content': types.Content
+            }
+    """
+    return {
+        'id': message['_id'],
+        'role': message['role'],
+        'content': message['content'],
+        'pinned': message.get('pinned', False),
+        'created_at': message.get('created_at'),
+        'tokens': estimate_message_tokens(message),
+        'gemini_content': GeminiService.to_content(message)
+    }
+
+
+def _entry_size(entry):
+    """履歴エントリのおおよそのメモリ使用量（バイト）"""
+    # テキストはentryとPartの両方から参照されるが、実体は共有される
+    return sys.getsizeof(entry['content']) + _ENTRY_OVERHEAD_BYTES
+
+
+class HistoryCache:
+    """スレッドIDをキーとした会話履歴のLRUキャッシュ"""
+
+    def __init__(self):
+        self.max_threads = config.HISTORY_CACHE_MAX_THREADS
+        self.max_bytes = config.HISTORY_CACHE_MAX_BYTES
+        self.ttl_seconds = config.HISTORY_CACHE_TTL_SECONDS
+        self.token_budget = config.HISTORY_TOKEN_BUDGET
+        self.max_messages = config.HISTORY_MAX_MESSAGES
+
+        self._records = OrderedDict()
+        self._lock = threading.Lock()
+        self._total_bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self):
+        """キャッシュが有効か"""
+        return self.max_threads > 0
+
+    def get(self, thread_id, version=None):
+        """
+        キャッシュ済みの会話履歴を取得
+
+        Args:
+            thread_id (str): スレッドID
+            version (int, optional): スレッドの現在のversion（格納時と違えば破棄する）
+
+        Returns:
+            list: 履歴エントリのリスト（作成日時の昇順）、未キャッシュならNone
+        """
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            record = self._records.get(thread_id)
+            if record is None or record['expires_at'] < time.monotonic() or (
+                version is not None and record['version'] != version
+            ):
+                if record is not None:
+                    self._discard(thread_id)
+                self.misses += 1
+                return None
+
+            self._records.move_to_end(thread_id)
+            self.hits += 1
+            return list(record['entries'])
+
+    def put(self, thread_id, entries, version=None):
+        """
+        会話履歴をキャッシュに格納
+
+        Args:
+            thread_id (str): スレッドID
+            entries (list): 履歴エントリのリスト（作成日時の昇順）
+            version (int, optional): 履歴を読んだときのスレッドのversion
+        """
+        if not self.enabled:
+            return
+
+        with self._lock:
+            self._discard(thread_id)
+            self._store(thread_id, list(entries), version)
+            self._evict()
+
+    def append(self, thread_id, entry):
+        """
+        キャッシュ済みの会話履歴にメッセージを追加（ライトスルー）
+
+        Args:
+            thread_id (str): スレッドID
+            entry (dict): 追加する履歴エントリ
+        """
+        self.extend(thread_id, [entry])
+
+    def extend(self, thread_id, new_entries, version=None):
+        """
+        キャッシュ済みの会話履歴にメッセージをまとめて追加（ライトスルー）
+        追加後はトークン予算に収まるよう古いメッセージを切り捨てる
+
+        保存でversionは1つだけ増えるため、キャッシュが保存直前のversion（version - 1）の
+        ものでなければ、間に他のワーカーが書き込んだとみなして破棄する
+
+        Args:
+            thread_id (str): スレッドID
+            new_entries (list): 追加する履歴エントリのリスト（作成日時の昇順）
+            version (int, optional): 保存後のスレッドのversion
+        """
+        with self._lock:
+            record = self._records.get(thread_id)
+            if record is None:
+                return
+            if version is not None:
+                if record['version'] != version - 1:
+                    self._discard(thread_id)
+                    return
+                record['version'] = version
+
+            entries = record['entries']
+            entries.extend(new_entries)
+            self._trim(entries)
+
+            self._total_bytes -= record['bytes']
+            record['bytes'] = sum(_entry_size(e) for e in entries)
+            self._total_bytes += record['bytes']
+            self._records.move_to_end(thread_id)
+            self._evict()
+
+    def remove(self, thread_id, message_id):
+        """
+        キャッシュ済みの会話履歴からメッセージを削除（ライトスルー）
+
+        Args:
+            thread_id (str): スレッドID
+            message_id (ObjectId): 削除するメッセージのID
+        """
+        with self._lock:
+            record = self._records.get(thread_id)
+            if record is None:
+                return
+
+            kept = [e for e in record['entries'] if e['id'] != message_id]
+            removed_bytes = sum(
+                _entry_size(e) for e in record['entries'] if e['id'] == message_id
+            )
+            record['entries'] = kept
+            record['bytes'] -= removed_bytes
+            self._total_bytes -= removed_bytes
+
+    def invalidate(self, thread_id):
+        """
+        スレッドのキャッシュを破棄
+
+        Args:
+            thread_id (str): スレッドID
+        """
+        with self._lock:
+            self._discard(thread_id)
+
+    def clear(self):
+        """キャッシュを全て破棄"""
+        with self._lock:
+            self._records.clear()
+            self._total_bytes = 0
+
+    def stats(self):
+        """
+        キャッシュの統計情報を取得
+
+        Returns:
+            dict: スレッド数・使用バイト数・ヒット/ミス数
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'threads': len(self._records),
+                'bytes': self._total_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
+
+    def _store(self, thread_id, entries, version=None):
+        """レコードを追加（ロック取得済みで呼び出す）"""
+        size = sum(_entry_size(e) for e in entries)
+        self._records[thread_id] = {
+            'entries': entries,
+            'version': version,
+            'bytes': size,
+            'expires_at': time.monotonic() + self.ttl_seconds
+        }
+        self._total_bytes += size
+
+    def _discard(self, thread_id):
+        """レコードを削除（ロック取得済みで呼び出す）"""
+        record = self._records.pop(thread_id, None)
+        if record is not None:
+            self._total_bytes -= record['bytes']
+
+    def _evict(self):
+        """件数・メモリ上限を超えた分を古い順に追い出す（ロック取得済みで呼び出す）"""
+        while self._records and (
+            len(self._records) > self.max_threads
+            or self._total_bytes > self.max_bytes
+        ):
+            _, record = self._records.popitem(last=False)
+            self._total_bytes -= record['bytes']
+            self.evictions += 1
+
+    def _trim(self, entries):
+        """
+        get_conversation_historyと同じ規則で履歴を切り詰める
+        最新のメッセージとピン留めメッセージは残す
+        """
+        total = sum(e['tokens'] for e in entries)
+        unpinned = [e for e in entries[:-1] if not e['pinned']]
+        dropped = set()
+
+        # トークン予算・件数上限を超えた分を古い順に削除
+        while unpinned and (
+            total > self.token_budget or len(unpinned) + 1 > self.max_messages
+        ):
+            oldest = unpinned.pop(0)
+            dropped.add(oldest['id'])
+            total -= oldest['tokens']
+
+        # 途中のAI応答から始まらないよう、先頭はユーザーメッセージに揃える
+        while unpinned and unpinned[0]['role'] != 'user':
+            dropped.add(unpinned.pop(0)['id'])
+
+        if dropped:
+            entries[:] = [e for e in entries if e['id'] not in dropped]
+
+
+# シングルトンインスタンス
+history_cache = HistoryCache()
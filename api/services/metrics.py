@@ -0,0 +1,244 @@
+"""
+Prometheus形式のメトリクス
+ルート・MongoDBコマンド・Gemini API呼び出しのレイテンシとカウンタを集計し、
+/api/metrics でテキスト形式（exposition format 0.0.4）として公開する
+
+prometheus_clientには依存せず、記録1回あたり数マイクロ秒で済む最小限の実装にしている。
+値はプロセスごとに保持する（サーバーレスではインスタンスごとの値になる）。
+"""
+import threading
+from bisect import bisect_left
+from pymongo import monitoring
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# レイテンシのバケット（秒）
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+GEMINI_LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30, 60)
+TOKEN_BUCKETS = (16, 64, 256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+
+def _escape(value):
+    """ラベル値のエスケープ"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=''):
+    """{name="value",...} 形式のラベル文字列"""
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_number(value):
+    """整数値は小数点なしで出力"""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """単調増加するカウンタ"""
+
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labelvalues, amount=1):
+        """
+        カウンタを増やす
+
+        Args:
+            *labelvalues: labelnamesと同じ順のラベル値
+            amount (int): 増やす量
+        """
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def value(self, *labelvalues):
+        """現在の値（未記録なら0）"""
+        with self._lock:
+            return self._values.get(labelvalues, 0)
+
+    def samples(self):
+        """出力する行のリスト"""
+        with self._lock:
+            values = list(self._values.items())
+        return [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_number(value)}"
+            for labels, value in values
+        ]
+
+
+class Histogram:
+    """値の分布をバケットごとに数えるヒストグラム"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # ラベル値 -> [バケットごとの件数（累積しない、最後は+Inf）, 合計, 件数]
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labelvalues):
+        """
+        値を記録
+
+        Args:
+            value (float): 記録する値（レイテンシは秒）
+            *labelvalues: labelnamesと同じ順のラベル値
+        """
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(labelvalues)
+            if series is None:
+                series = self._values[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def count(self, *labelvalues):
+        """記録した件数（未記録なら0）"""
+        with self._lock:
+            series = self._values.get(labelvalues)
+            return series[2] if series else 0
+
+    def samples(self):
+        """出力する行のリスト（バケットは累積値）"""
+        with self._lock:
+            values = [
+                (labels, list(counts), total, count)
+                for labels, (counts, total, count) in self._values.items()
+            ]
+
+        bounds = [_format_number(bound) for bound in self.buckets] + ['+Inf']
+        lines = []
+        for labels, counts, total, count in values:
+            cumulative = 0
+            for bound, bucket_count in zip(bounds, counts):
+                cumulative += bucket_count
+                le = f'le="{bound}"'
+                lines.append(
+                    f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}"
+                )
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {_format_number(total)}")
+            lines.append(f"{self.name}_count{label_text} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """メトリクスの登録とテキスト形式への変換"""
+
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, name, documentation, labelnames=()):
+        """カウンタを作成して登録"""
+        metric = Counter(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        """ヒストグラムを作成して登録"""
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        """
+        登録済みの全メトリクスをテキスト形式に変換
+
+        Returns:
+            str: /api/metrics のレスポンス本文
+        """
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return '\n'.join(lines) + '\n'
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """
+    pymongoのコマンド監視でMongoDBコマンドごとのレイテンシを記録
+    （DatabaseServiceのMongoClientにevent_listenersとして渡す）
+    """
+
+    def __init__(self):
+        # (request_id, connection_id) -> コレクション名（開始イベントにしか含まれない）
+        self._collections = {}
+
+    def started(self, event):
+        collection = event.command.get(event.command_name)
+        if not isinstance(collection, str):
+            # getMoreなどはコマンド名の値がカーソルIDのため、collectionから取る
+            collection = event.command.get('collection', '')
+        self._collections[(event.request_id, event.connection_id)] = collection
+
+    def succeeded(self, event):
+        self._record(event, 'ok')
+
+    def failed(self, event):
+        self._record(event, 'error')
+
+    def _record(self, event, outcome):
+        collection = self._collections.pop((event.request_id, event.connection_id), '')
+        mongo_command_duration.observe(
+            event.duration_micros / 1e6, event.command_name, collection, outcome
+        )
+
+
+# シングルトンインスタンス
+metrics = MetricsRegistry()
+
+http_request_duration = metrics.histogram(
+    'http_request_duration_seconds',
+    'HTTPリクエストの処理時間',
+    ('method', 'route', 'status')
+)
+mongo_command_duration = metrics.histogram(
+    'mongodb_command_duration_seconds',
+    'MongoDBコマンドの所要時間',
+    ('command', 'collection', 'outcome')
+)
+gemini_request_duration = metrics.histogram(
+    'gemini_request_duration_seconds',
+    'Gemini API呼び出し1回の所要時間（ストリーミングは最初のチャンクまで）',
+    ('model', 'operation', 'outcome'),
+    GEMINI_LATENCY_BUCKETS
+)
+gemini_tokens = metrics.histogram(
+    'gemini_tokens',
+    'Gemini API呼び出し1回のトークン数（direction: in=入力, out=出力）',
+    ('model', 'direction'),
+    TOKEN_BUCKETS
+)
+gemini_rate_limited = metrics.counter(
+    'gemini_rate_limited_total',
+    'Gemini APIが429を返した回数',
+    ('model',)
+)
+gemini_retries = metrics.counter(
+    'gemini_retries_total',
+    '同じモデルでGemini API呼び出しをリトライした回数',
+    ('model',)
+)
+response_cache_lookups = metrics.counter(
+    'response_cache_lookups_total',
+    '応答キャッシュの参照回数（result: memory_hit, mongo_hit, miss）',
+    ('result',)
+)
+
+mongo_command_listener = MongoCommandMetrics()
@@ -0,0 +1,262 @@
+"""
+Gemini APIクォータスケジューラー
+モデルごとのRPM・TPM・RPDをトークンバケットで管理し、429エラーを未然に防ぐ
+"""
+import asyncio
+import json
+import math
+import threading
+import time
+from pymongo.errors import DuplicateKeyError
+from config import config
+from services.db_service import db_service
+
+# バケット名 -> 補充周期（秒）
+_PERIODS = {
+    'rpm': 60,
+    'tpm': 60,
+    'rpd': 24 * 60 * 60,
+}
+
+
+class QuotaExceeded(Exception):
+    """クォータが回復するまで待てない場合の例外"""
+
+    def __init__(self, model, retry_after):
+        self.model = model
+        self.retry_after = retry_after
+        super().__init__(
+            f"Gemini APIの利用上限に達しました（{model}、{retry_after:.0f}秒後に再試行してください）"
+        )
+
+    @property
+    def retry_after_header(self):
+        """Retry-Afterヘッダー用の秒数（切り上げ）"""
+        return str(max(1, math.ceil(self.retry_after)))
+
+
+def take_tokens(state, limits, cost, now):
+    """
+    バケットを補充し、全てに余裕があれば消費する
+
+    Args:
+        state (dict): バケット名 -> {'tokens': 残量, 'updated': 最終更新時刻}（未作成ならNone）
+        limits (dict): バケット名 -> 上限値
+        cost (dict): バケット名 -> 消費量
+        now (float): 現在時刻（UNIX時間）
+
+    Returns:
+        tuple: (更新後のstate, 待ち時間（秒）)
+            待ち時間が0なら消費済み。上限を超える要求はmath.infを返す
+    """
+    state = dict(state or {})
+    wait = 0.0
+
+    for name, limit in limits.items():
+        rate = limit / _PERIODS[name]
+        bucket = state.get(name) or {'tokens': float(limit), 'updated': now}
+        tokens = min(float(limit), bucket['tokens'] + (now - bucket['updated']) * rate)
+        state[name] = {'tokens': tokens, 'updated': now}
+
+        need = cost.get(name, 0)
+        if need > limit:
+            wait = math.inf
+        elif need > tokens:
+            wait = max(wait, (need - tokens) / rate)
+
+    if wait == 0:
+        for name in limits:
+            state[name]['tokens'] -= cost.get(name, 0)
+
+    return state, wait
+
+
+class MemoryBucketStore:
+    """プロセス内でバケットの状態を保持するストア"""
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def transact(self, key, fn):
+        """keyの状態をfnで更新し、fnの戻り値を返す"""
+        with self._lock:
+            self._data[key], result = fn(self._data.get(key))
+            return result
+
+
+def _file_lock_module():
+    """
+    ファイルの排他ロックに使うfcntlを読み込む
+    fcntlはPOSIX専用のため、起動時には読み込まずファイルストアを使うときだけ読み込む
+
+    Returns:
+        module: fcntlモジュール、使えない環境（Windowsなど）ではNone
+    """
+    try:
+        import fcntl
+    except ImportError:
+        return None
+    return fcntl
+
+
+class FileBucketStore:
+    """ローカルファイルでバケットの状態を共有するストア（同一ホストのワーカー間で共有）"""
+
+    def __init__(self, path):
+        self.path = path
+
+    def transact(self, key, fn):
+        """ファイルを排他ロックしてkeyの状態をfnで更新し、fnの戻り値を返す"""
+        fcntl = _file_lock_module()
+        with open(self.path, 'a+') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                raw = f.read()
+                data = json.loads(raw) if raw else {}
+
+                data[key], result = fn(data.get(key))
+
+                f.seek(0)
+                f.truncate()
+                json.dump(data, f)
+                return result
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class MongoBucketStore:
+    """MongoDBでバケットの状態を共有するストア（複数ホスト・サーバーレス環境向け）"""
+
+    # 競合時の再試行回数
+    MAX_ATTEMPTS = 5
+
+    def transact(self, key, fn):
+        """バージョン番号による楽観ロックでkeyの状態をfnで更新し、fnの戻り値を返す"""
+        collection = db_service.get_collection(config.QUOTA_COLLECTION)
+
+        for _ in range(self.MAX_ATTEMPTS):
+            doc = collection.find_one({'_id': key}) or {}
+            version = doc.get('version', 0)
+            state, result = fn(doc.get('state'))
+
+            try:
+                updated = collection.update_one(
+                    {'_id': key, 'version': version} if doc else {'_id': key},
+                    {'$set': {'state': state, 'version': version + 1}},
+                    upsert=not doc
+                )
+            except DuplicateKeyError:
+                # 他のワーカーが同時に初期化した
+                continue
+            if doc and updated.matched_count == 0:
+                # 他のワーカーが先に更新した
+                continue
+            return result
+
+        raise QuotaExceeded(key, 1.0)
+
+
+class QuotaScheduler:
+    """モデルごとのトークンバケットでGemini API呼び出しを調整するクラス"""
+
+    def __init__(self, store=None):
+        self.store = store or self._create_store()
+        self.max_wait = config.GEMINI_QUOTA_MAX_WAIT
+
+    def acquire(self, model, tokens, max_wait=None):
+        """
+        リクエスト1回分と推定トークン数の枠を確保
+        間もなく回復する場合は待機し、待てない場合はQuotaExceededを送出する
+
+        Args:
+            model (str): モデル名
+            tokens (int): 推定トークン数（入力 + 出力の見込み）
+            max_wait (float, optional): 待機の上限秒数（省略時はself.max_wait）
+
+        Raises:
+            QuotaExceeded: max_wait秒以内に枠が確保できない場合
+        """
+        deadline = time.time() + self._max_wait(max_wait)
+        while True:
+            wait = self._try_acquire(model, tokens)
+            if wait == 0:
+                return
+            self._check_wait(model, wait, deadline)
+            time.sleep(wait)
+
+    async def acquire_async(self, model, tokens, max_wait=None):
+        """acquireの非同期版（待機中はイベントループを塞がない）"""
+        deadline = time.time() + self._max_wait(max_wait)
+        while True:
+            wait = await asyncio.to_thread(self._try_acquire, model, tokens)
+            if wait == 0:
+                return
+            self._check_wait(model, wait, deadline)
+            await asyncio.sleep(wait)
+
+    def settle(self, model, reserved, actual):
+        """
+        実際のトークン使用量との差分をTPMバケットに反映
+
+        Args:
+            model (str): モデル名
+            reserved (int): acquireで確保したトークン数
+            actual (int): 実際に使用したトークン数（不明ならNone）
+        """
+        if actual is None or actual == reserved:
+            return
+
+        def adjust(state):
+            state = dict(state or {})
+            if 'tpm' in state:
+                bucket = dict(state['tpm'])
+                bucket['tokens'] -= actual - reserved
+                state['tpm'] = bucket
+            return state, None
+
+        self.store.transact(model, adjust)
+
+    def _try_acquire(self, model, tokens):
+        """枠の確保を1回試み、必要な待ち時間を返す（0なら確保済み）"""
+        limits = self._limits_for(model)
+        cost = {'rpm': 1, 'rpd': 1, 'tpm': tokens}
+        return self.store.transact(
+            model,
+            lambda state: take_tokens(state, limits, cost, time.time())
+        )
+
+    def _max_wait(self, max_wait):
+        """待機の上限秒数（呼び出し元の指定はself.max_waitを超えない）"""
+        if max_wait is None:
+            return self.max_wait
+        return max(0, min(self.max_wait, max_wait))
+
+    def _check_wait(self, model, wait, deadline):
+        """待ち時間が許容範囲を超える場合はQuotaExceededを送出"""
+        if math.isinf(wait):
+            # 1回で上限を超える要求は待っても通らない
+            raise QuotaExceeded(model, _PERIODS['tpm'])
+        if time.time() + wait > deadline:
+            raise QuotaExceeded(model, wait)
+
+    def _limits_for(self, model):
+        """モデルのクォータ上限を取得（未登録のモデルは既定値）"""
+        return config.GEMINI_QUOTA_LIMITS.get(model, config.GEMINI_QUOTA_DEFAULT_LIMITS)
+
+    @staticmethod
+    def _create_store():
+        """設定に応じたストアを作成"""
+        if config.GEMINI_QUOTA_STORE == 'mongo':
+            return MongoBucketStore()
+        if config.GEMINI_QUOTA_STORE == 'memory':
+            return MemoryBucketStore()
+        if _file_lock_module() is None:
+            print("ファイルロックが使えないため、クォータの状態はプロセス内だけで管理します")
+            return MemoryBucketStore()
+        return FileBucketStore(config.GEMINI_QUOTA_FILE)
+
+
+# シングルトンインスタンス
+quota_scheduler = QuotaScheduler()
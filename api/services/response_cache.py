@@ -0,0 +1,199 @@
+"""
+AI応答キャッシュサービス
+同じモデル・生成設定・会話履歴に対する応答を再利用し、Gemini APIの呼び出しを省く
+プロセス内LRUとMongoDB（TTLインデックス付き）の2段構成
+"""
+import hashlib
+import json
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from config import config
+from services.db_service import db_service
+from services.metrics import response_cache_lookups
+
+# ヘッダーの値がこれらの場合はキャッシュを読まない
+_BYPASS_VALUES = {'1', 'true', 'yes'}
+
+
+def _normalize(text):
+    """キーの計算用にテキストを正規化（Unicode正規化と前後の空白除去）"""
+    return unicodedata.normalize('NFKC', text or '').strip()
+
+
+def make_cache_key(model, summary, messages):
+    """
+    モデル・生成設定・会話履歴からキャッシュキーを計算
+
+    Args:
+        model (str): モデル名
+        summary (str): システム指示として渡す会話の要約
+        messages (list): 'role'と'content'を持つ会話履歴
+
+    Returns:
+        str: SHA-256の16進文字列
+    """
+    payload = {
+        'model': model,
+        'summary': _normalize(summary),
+        'messages': [
+            [msg['role'], _normalize(msg['content'])]
+            for msg in messages
+        ]
+    }
+    encoded = json.dumps(payload, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+def bypass_requested(headers):
+    """
+    リクエストヘッダーでキャッシュの迂回が指定されているか
+
+    Args:
+        headers: リクエストヘッダー（Flask/Quartのrequest.headers）
+
+    Returns:
+        bool: キャッシュを読まない場合True
+    """
+    value = headers.get(config.RESPONSE_CACHE_BYPASS_HEADER, '')
+    return value.strip().lower() in _BYPASS_VALUES
+
+
+class ResponseCache:
+    """キャッシュキーをキーとしたAI応答の2段キャッシュ"""
+
+    def __init__(self):
+        self.enabled = config.RESPONSE_CACHE_ENABLED
+        self.max_entries = config.RESPONSE_CACHE_MAX_ENTRIES
+        self.ttl_seconds = config.RESPONSE_CACHE_TTL_SECONDS
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.memory_hits = 0
+        self.mongo_hits = 0
+        self.misses = 0
+        self.tokens_saved = 0
+
+    def get(self, key):
+        """
+        キャッシュ済みの応答を取得（LRU → MongoDBの順に探す）
+
+        Args:
+            key (str): make_cache_keyで計算したキー
+
+        Returns:
+            str: 応答テキスト、未キャッシュならNone
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry['expires_at'] > time.time():
+                self._entries.move_to_end(key)
+                self.memory_hits += 1
+                response_cache_lookups.inc('memory_hit')
+                self.tokens_saved += entry['tokens']
+                return entry['text']
+
+        doc = self._find(key)
+        with self._lock:
+            if doc is None:
+                self.misses += 1
+                response_cache_lookups.inc('miss')
+                return None
+
+            self.mongo_hits += 1
+            response_cache_lookups.inc('mongo_hit')
+            self.tokens_saved += doc.get('tokens', 0)
+            # MongoDBの日時はタイムゾーンなしのUTCで返る
+            expires_at = doc['expires_at'].replace(tzinfo=timezone.utc).timestamp()
+            self._remember(key, doc['response'], doc.get('tokens', 0), expires_at)
+            return doc['response']
+
+    def put(self, key, text, tokens=0):
+        """
+        応答をキャッシュに格納
+
+        Args:
+            key (str): make_cache_keyで計算したキー
+            text (str): 応答テキスト
+            tokens (int): 応答の生成に使ったトークン数（節約量の集計に使用）
+        """
+        if not text:
+            return
+
+        expires_at = datetime.utcnow() + timedelta(seconds=self.ttl_seconds)
+        with self._lock:
+            self._remember(key, text, tokens or 0, time.time() + self.ttl_seconds)
+        if not self._shared():
+            return
+
+        try:
+            db_service.get_collection(config.RESPONSE_CACHE_COLLECTION).replace_one(
+                {'_id': key},
+                {
+                    'response': text,
+                    'tokens': tokens or 0,
+                    'created_at': datetime.utcnow(),
+                    'expires_at': expires_at
+                },
+                upsert=True
+            )
+        except Exception as e:
+            # MongoDBに保存できなくてもプロセス内のキャッシュは使える
+            print(f"応答キャッシュ保存エラー: {e}")
+
+    def clear(self):
+        """プロセス内のキャッシュを全て破棄"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """
+        キャッシュの統計情報を取得
+
+        Returns:
+            dict: 件数・ヒット/ミス数・ヒット率・節約したトークン数
+        """
+        with self._lock:
+            hits = self.memory_hits + self.mongo_hits
+            lookups = hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'entries': len(self._entries),
+                'memory_hits': self.memory_hits,
+                'mongo_hits': self.mongo_hits,
+                'misses': self.misses,
+                'hit_rate': hits / lookups if lookups else 0.0,
+                'tokens_saved': self.tokens_saved
+            }
+
+    @staticmethod
+    def _shared():
+        """MongoDBのキャッシュも使うか（保存先がMongoDBの場合だけ）"""
+        return config.STORAGE_BACKEND == 'mongo'
+
+    def _find(self, key):
+        """MongoDBからキャッシュ済みの応答を取得（期限切れは除く）"""
+        if not self._shared():
+            return None
+        try:
+            return db_service.get_collection(config.RESPONSE_CACHE_COLLECTION).find_one({
+                '_id': key,
+                # TTLインデックスによる削除は即時ではないため期限も確認する
+                'expires_at': {'$gt': datetime.utcnow()}
+            })
+        except Exception as e:
+            print(f"応答キャッシュ取得エラー: {e}")
+            return None
+
+    def _remember(self, key, text, tokens, expires_at):
+        """LRUに格納し、上限を超えた分を古い順に追い出す（ロック取得済みで呼び出す）"""
+        self._entries[key] = {'text': text, 'tokens': tokens, 'expires_at': expires_at}
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+# シングルトンインスタンス
+response_cache = ResponseCache()
@@ -0,0 +1,95 @@
+"""
+Gemini API呼び出しのリトライ方針
+エラーの種類ごとにリトライ可否とバックオフ時間を判定する
+"""
+import random
+from config import config
+
+# バックオフしてリトライするHTTPステータス
+RETRYABLE_STATUS_CODES = {429, 500, 503, 504}
+
+# 上限超過（フォールバック先のモデルに切り替える）
+RATE_LIMIT_STATUS_CODE = 429
+
+
+def status_code(error):
+    """
+    例外からHTTPステータスコードを取り出す
+
+    Args:
+        error (Exception): Gemini API呼び出しで発生した例外
+
+    Returns:
+        int: ステータスコード、HTTPエラーでない場合はNone
+    """
+    code = getattr(error, 'code', None)
+    if isinstance(code, int):
+        return code
+    return getattr(error, 'status_code', None)
+
+
+def is_rate_limited(error):
+    """上限超過（429）のエラーか"""
+    return status_code(error) == RATE_LIMIT_STATUS_CODE
+
+
+def is_retryable(error):
+    """
+    リトライで回復しうるエラーか
+    429/5xx・通信エラーはリトライし、それ以外の4xxはリトライしない
+
+    Args:
+        error (Exception): Gemini API呼び出しで発生した例外
+
+    Returns:
+        bool: リトライすべきか
+    """
+    code = status_code(error)
+    if code is not None:
+        return code in RETRYABLE_STATUS_CODES
+
+    # httpxはgenaiクライアントと一緒に読み込まれるため、エラー判定のときまでimportしない
+    import httpx
+
+    return isinstance(error, (httpx.TransportError, TimeoutError, ConnectionError))
+
+
+def backoff_delay(attempt):
+    """
+    指数バックオフ（フルジッター）の待ち時間
+
+    Args:
+        attempt (int): リトライ回数（1始まり）
+
+    Returns:
+        float: 待ち時間（秒）
+    """
+    ceiling = min(
+        config.GEMINI_RETRY_MAX_DELAY,
+        config.GEMINI_RETRY_BASE_DELAY * (2 ** (attempt - 1))
+    )
+    return random.uniform(0, ceiling)
+
+
+def retry_after(error):
+    """
+    サーバーが指定した再試行までの秒数（エラー詳細のRetryInfo）
+
+    Args:
+        error (Exception): Gemini API呼び出しで発生した例外
+
+    Returns:
+        float: 待ち時間（秒）、指定がない場合はNone
+    """
+    details = getattr(error, 'details', None)
+    if not isinstance(details, dict):
+        return None
+
+    for detail in (details.get('error') or {}).get('details') or []:
+        delay = detail.get('retryDelay') if isinstance(detail, dict) else None
+        if isinstance(delay, str) and delay.endswith('s'):
+            try:
+                return float(delay[:-1])
+            except ValueError:
+                return None
+    return None
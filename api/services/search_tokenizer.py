@@ -0,0 +1,168 @@
+"""
+全文検索のトークン化
+MongoDBのテキストインデックスは日本語を単語に分けられない（空白で区切る）ため、
+インデックスに入れる前にテキストをn-gramに分け、空白区切りの文字列にして保存する
+
+    ひらがな・カタカナ・漢字の連続: 2文字ずつのn-gram（bigram）と、漢字1文字
+    それ以外の文字の連続（英数字など）: 単語全体
+正規化はNFKC（全角英数字・半角カナを揃える）と小文字化
+
+ひらがな・カタカナの1文字は索引しない（助詞などほぼすべてのテキストに一致し、
+インデックスが大きくなるだけで絞り込みに使えない）。そのため1文字のかなだけの検索語は
+QueryTooShortで拒否する
+"""
+import re
+import unicodedata
+
+# ひらがな・カタカナ（長音符を含む）・漢字（々・〆を含む）
+_CJK = '぀-ヿ㐀-䶿一-鿿豈-﫿々〆'
+_KANJI = re.compile(r'[㐀-䶿一-鿿豈-﫿々〆]')
+_RUN = re.compile(rf'(?P<cjk>[{_CJK}]+)|(?P<word>[^\W_{_CJK}]+)')
+
+# 1回の検索で使うトークン数の上限（長い検索語でインデックスを読みすぎないようにする）
+MAX_QUERY_TERMS = 32
+
+
+class QueryTooShort(Exception):
+    """検索語が1文字のかなだけで、索引したトークンで探せない場合の例外"""
+
+
+def normalize(text):
+    """
+    検索用にテキストを正規化（NFKCと小文字化）
+
+    Args:
+        text (str): 元のテキスト
+
+    Returns:
+        str: 正規化したテキスト
+    """
+    return unicodedata.normalize('NFKC', text or '').lower()
+
+
+def _run_tokens(run, kanji_unigrams):
+    """ひらがな・カタカナ・漢字の連続をn-gramに分ける（かな1文字は索引しない）"""
+    if len(run) == 1:
+        return [run] if _KANJI.match(run) else []
+    tokens = [run[i:i + 2] for i in range(len(run) - 1)]
+    if kanji_unigrams:
+        tokens.extend(char for char in run if _KANJI.match(char))
+    return tokens
+
+
+def tokenize(text):
+    """
+    インデックスに入れるトークン（出現回数を順位付けに使うため重複を残す）
+
+    Args:
+        text (str): 正規化済みのテキスト
+
+    Returns:
+        list: トークンのリスト
+    """
+    tokens = []
+    for match in _RUN.finditer(text):
+        if match.group('cjk'):
+            tokens.extend(_run_tokens(match.group('cjk'), kanji_unigrams=True))
+        else:
+            tokens.append(match.group('word'))
+    return tokens
+
+
+def query_terms(query):
+    """
+    検索語のトークン（すべてを含むテキストが一致する）
+    2文字以上の連続はbigramだけを使い、1文字の漢字はその文字で探す。
+    1文字のかなは索引にないため、ほかのトークンがあれば無視する
+
+    Args:
+        query (str): 検索語
+
+    Returns:
+        list: 重複を除いたトークン（出現順、最大MAX_QUERY_TERMS件）
+
+    Raises:
+        QueryTooShort: 検索語が1文字のかなだけの場合
+    """
+    terms = []
+    skipped = False
+    for match in _RUN.finditer(normalize(query)):
+        if match.group('cjk'):
+            tokens = _run_tokens(match.group('cjk'), kanji_unigrams=False)
+            skipped = skipped or not tokens
+        else:
+            tokens = [match.group('word')]
+        for token in tokens:
+            if token not in terms:
+                terms.append(token)
+    if skipped and not terms:
+        raise QueryTooShort(query)
+    return terms[:MAX_QUERY_TERMS]
+
+
+def search_text(text):
+    """
+    テキストインデックスに入れる文字列（トークンを空白でつなぐ）
+
+    Args:
+        text (str): 正規化済みのテキスト
+
+    Returns:
+        str: 空白区切りのトークン
+    """
+    return ' '.join(tokenize(text))
+
+
+def highlight(text, query, width=60):
+    """
+    テキストから検索語の周辺を切り出し、一致した位置を返す
+
+    検索語全体が見つかればその位置を、なければ最初に見つかったトークンの位置を中心にする。
+    位置は切り出したスニペット内の文字位置で、フロントエンドが強調表示する。
+
+    Args:
+        text (str): 正規化済みのテキスト
+        query (str): 検索語
+        width (int): スニペットのおおよその文字数
+
+    Returns:
+        tuple: (スニペット, [[開始位置, 終了位置], ...])
+    """
+    needles = [normalize(query).strip()] + query_terms(query)
+    needles = [needle for needle in needles if needle]
+    lowered = text.lower()
+
+    center = 0
+    for needle in needles:
+        position = lowered.find(needle)
+        if position >= 0:
+            center = position
+            break
+
+    start = max(0, center - width // 3)
+    end = min(len(text), start + width)
+    start = max(0, min(start, end - width))
+    snippet = text[start:end]
+    lowered_snippet = lowered[start:end]
+
+    covered = [False] * len(snippet)
+    for needle in needles:
+        position = lowered_snippet.find(needle)
+        while position >= 0:
+            for index in range(position, position + len(needle)):
+                covered[index] = True
+            position = lowered_snippet.find(needle, position + 1)
+
+    ranges = []
+    for index, hit in enumerate(covered):
+        if not hit:
+            continue
+        if ranges and ranges[-1][1] == index:
+            ranges[-1][1] = index + 1
+        else:
+            ranges.append([index, index + 1])
+
+    prefix = '…' if start > 0 else ''
+    suffix = '…' if end < len(text) else ''
+    offset = len(prefix)
+    return prefix + snippet + suffix, [[s + offset, e + offset] for s, e in ranges]
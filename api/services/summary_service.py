@@ -0,0 +1,124 @@
+"""
+会話要約サービス
+長いスレッドのローリング要約をバックグラウンドで更新
+"""
+import threading
+from config import config
+from models import message as message_model
+from models import thread as thread_model
+from services.gemini_service import gemini_service
+
+
+class SummaryService:
+    """スレッドごとのローリング要約を管理するクラス"""
+
+    def __init__(self):
+        self.interval = config.SUMMARY_REFRESH_INTERVAL
+        self._lock = threading.Lock()
+        self._in_progress = set()
+
+    def schedule_refresh(self, thread_id, message_count=None, summarized_count=0):
+        """
+        未要約のメッセージがinterval件以上たまっていれば、要約の更新をバックグラウンドで開始
+        件数は保存したときに返るスレッドのmessage_countとsummarized_countの差で判定し、
+        その場では保存先を読まない（要約情報とメッセージはバックグラウンドで読む）
+        同じスレッドの更新が実行中の場合は何もしない
+
+        Args:
+            thread_id (str): スレッドID
+            message_count (int, optional): スレッドのメッセージ数（省略時は件数を判定しない）
+            summarized_count (int): 要約済みのメッセージ数
+
+        Returns:
+            bool: 更新処理を開始したか
+        """
+        if message_count is not None and message_count - summarized_count < self.interval:
+            return False
+
+        with self._lock:
+            if thread_id in self._in_progress:
+                return False
+            self._in_progress.add(thread_id)
+
+        worker = threading.Thread(
+            target=self._run_refresh,
+            args=(thread_id,),
+            daemon=True
+        )
+        worker.start()
+        return True
+
+    async def schedule_refresh_async(self, thread_id, message_count=None, summarized_count=0):
+        """
+        非同期サーバー用のschedule_refresh
+        要約の更新は同期版のモデルで行う（MongoDBではmotorとは別に、db_serviceの
+        pymongoクライアントを使う）。判定は保存先を読まないため、イベントループで行う
+
+        Args:
+            thread_id (str): スレッドID
+            message_count (int, optional): スレッドのメッセージ数
+            summarized_count (int): 要約済みのメッセージ数
+
+        Returns:
+            bool: 更新処理を開始したか
+        """
+        return self.schedule_refresh(thread_id, message_count, summarized_count)
+
+    def refresh(self, thread_id):
+        """
+        未要約のメッセージがinterval件以上たまっていれば要約を更新
+        前回の要約以降のinterval件だけを織り込むため、1回あたりのコストは一定
+
+        summarized_count（要約済みのメッセージ数）も一緒に更新する。要約済みのメッセージが
+        削除されるなどしてずれた場合は、未要約の件数を読んだときに数え直す
+
+        Args:
+            thread_id (str): スレッドID
+
+        Returns:
+            bool: 要約を更新したか
+        """
+        state = thread_model.get_summary(thread_id)
+        if state is None:
+            return False
+
+        previous_until = state['summarized_until']
+        pending = message_model.get_messages_after(
+            thread_id, previous_until, self.interval
+        )
+        if len(pending) < self.interval:
+            # 未要約はlen(pending)件ちょうどなので、ずれていればここで直す
+            summarized_count = state['message_count'] - len(pending)
+            if summarized_count != state['summarized_count']:
+                thread_model.update_summary(
+                    thread_id, state['summary'], previous_until, previous_until, summarized_count
+                )
+            return False
+
+        summary = gemini_service.summarize(state['summary'], pending)
+
+        return thread_model.update_summary(
+            thread_id,
+            summary,
+            pending[-1]['created_at'],
+            previous_until,
+            state['summarized_count'] + len(pending)
+        )
+
+    def _run_refresh(self, thread_id):
+        """バックグラウンドスレッドで要約を更新"""
+        try:
+            self.refresh(thread_id)
+        except Exception as e:
+            print(f"要約更新エラー: {e}")
+        finally:
+            self._finish(thread_id)
+
+    def _finish(self, thread_id):
+        """スレッドの更新を実行中から外す"""
+        with self._lock:
+            self._in_progress.discard(thread_id)
+
+
+# シングルトンインスタンス
+summary_service = SummaryService()
@@ -0,0 +1,139 @@
+"""
+削除済みスレッドの後片付けサービス
+墓標（deleted_at）の付いたスレッドのメッセージを少しずつ削除し、最後に検索エントリとスレッド本体を削除する
+"""
+import threading
+import time
+from config import config
+from models import message as message_model
+from models import thread as thread_model
+from repositories import get_storage
+from services.history_cache import history_cache
+
+# 孤立メッセージ検出の進捗の名前（MongoDBではmaintenance_stateのドキュメントID）
+_ORPHAN_SWEEP_STATE = 'orphan_sweep'
+
+
+class ThreadReaper:
+    """削除済みスレッドと孤立メッセージを削除するクラス"""
+
+    def __init__(self):
+        self.batch_size = config.REAPER_BATCH_SIZE
+        self.throttle_seconds = config.REAPER_THROTTLE_SECONDS
+        self.orphan_scan_size = config.REAPER_ORPHAN_SCAN_SIZE
+        self._lock = threading.Lock()
+        self._running = False
+
+    def schedule(self):
+        """
+        後片付けをバックグラウンドで開始
+        実行中の場合は何もしない（実行中の処理が新しい墓標も拾う）
+
+        Returns:
+            bool: 処理を開始したか
+        """
+        with self._lock:
+            if self._running:
+                return False
+            self._running = True
+
+        worker = threading.Thread(target=self._run, daemon=True)
+        worker.start()
+        return True
+
+    def reap_deleted_threads(self, max_threads=None):
+        """
+        墓標の付いたスレッドを削除日時の古い順に片付ける
+        進捗はスレッドの墓標そのものなので、途中で止まっても次回に続きから処理できる
+
+        Args:
+            max_threads (int, optional): 片付ける最大スレッド数（省略時は残りすべて）
+
+        Returns:
+            dict: {'threads': 削除したスレッド数, 'messages': 削除したメッセージ数}
+        """
+        stats = {'threads': 0, 'messages': 0}
+        while max_threads is None or stats['threads'] < max_threads:
+            thread_ids = thread_model.get_deleted_thread_ids(1)
+            if not thread_ids:
+                break
+
+            thread_oid = thread_ids[0]
+            stats['messages'] += self.reap_thread(thread_oid)
+            thread_model.purge_thread(thread_oid)
+            stats['threads'] += 1
+        return stats
+
+    def reap_thread(self, thread_oid):
+        """
+        1スレッド分のメッセージをbatch_size件ずつ、間隔を空けて削除
+
+        Args:
+            thread_oid (ObjectId): スレッドID
+
+        Returns:
+            int: 削除したメッセージ数
+        """
+        history_cache.invalidate(str(thread_oid))
+
+        deleted = 0
+        while True:
+            count = message_model.delete_message_batch(thread_oid, self.batch_size)
+            if count == 0:
+                return deleted
+            deleted += count
+            # 他のリクエストの書き込みを妨げないよう間隔を空ける
+            time.sleep(self.throttle_seconds)
+
+    def sweep_orphans(self, max_scans=None):
+        """
+        スレッドドキュメントが存在しないメッセージ（と検索エントリ）を削除
+        確認済みのスレッドIDを保存しながら進めるため、中断しても続きから再開する
+
+        Args:
+            max_scans (int, optional): スレッドIDを確認する最大回数（省略時は最後まで）
+
+        Returns:
+            dict: {'threads': 孤立していたスレッドID数, 'messages': 削除したメッセージ数}
+        """
+        storage = get_storage()
+        after = storage.load_checkpoint(_ORPHAN_SWEEP_STATE).get('after')
+
+        stats = {'threads': 0, 'messages': 0}
+        scans = 0
+        while max_scans is None or scans < max_scans:
+            thread_ids = message_model.get_message_thread_ids(after, self.orphan_scan_size)
+            if not thread_ids:
+                # 最後まで確認したら次回は先頭からやり直す
+                storage.clear_checkpoint(_ORPHAN_SWEEP_STATE)
+                break
+
+            existing = thread_model.get_existing_thread_ids(thread_ids)
+            for thread_oid in thread_ids:
+                if thread_oid not in existing:
+                    stats['threads'] += 1
+                    stats['messages'] += self.reap_thread(thread_oid)
+                    storage.search.remove_by_thread(thread_oid)
+
+            after = thread_ids[-1]
+            storage.save_checkpoint(_ORPHAN_SWEEP_STATE, {'after': after})
+            scans += 1
+        return stats
+
+    def _run(self):
+        """バックグラウンドスレッドで墓標のなくなるまで片付ける"""
+        try:
+            while True:
+                stats = self.reap_deleted_threads()
+                if stats['threads'] == 0:
+                    break
+                print(f"削除済みスレッドを片付けました: {stats}")
+        except Exception as e:
+            print(f"スレッド後片付けエラー: {e}")
+        finally:
+            with self._lock:
+                self._running = False
+
+
+# シングルトンインスタンス
+thread_reaper = ThreadReaper()
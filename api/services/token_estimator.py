@@ -0,0 +1,53 @@
+"""
+トークン数推定サービス
+API呼び出しなしで、テキストのおおよそのトークン数を見積もる
+"""
+import re
+
+# 日本語（ひらがな・カタカナ・漢字・全角記号）は1文字あたり約1トークン
+_CJK_PATTERN = re.compile(
+    '[\u3000-\u303f'   # 全角記号・句読点
+    '\u3040-\u309f'    # ひらがな
+    '\u30a0-\u30ff'    # カタカナ
+    '\u3400-\u4dbf'    # CJK統合漢字拡張A
+    '\u4e00-\u9fff'    # CJK統合漢字
+    '\uff00-\uffef]'   # 全角英数・半角カナ
+)
+
+# 英数字などは約4文字で1トークン
+_CHARS_PER_TOKEN = 4
+
+# メッセージごとのロール・区切りのオーバーヘッド
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def estimate_tokens(text):
+    """
+    テキストのトークン数を推定
+
+    Args:
+        text (str): 対象テキスト
+
+    Returns:
+        int: 推定トークン数
+    """
+    if not text:
+        return 0
+
+    cjk_count = len(_CJK_PATTERN.findall(text))
+    other_count = len(text) - cjk_count
+
+    return cjk_count + (other_count + _CHARS_PER_TOKEN - 1) // _CHARS_PER_TOKEN
+
+
+def estimate_message_tokens(message):
+    """
+    1メッセージ分のトークン数を推定（オーバーヘッド込み）
+
+    Args:
+        message (dict): 'content'を持つメッセージ
+
+    Returns:
+        int: 推定トークン数
+    """
+    return estimate_tokens(message.get('content', '')) + MESSAGE_OVERHEAD_TOKENS
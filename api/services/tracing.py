@@ -0,0 +1,332 @@
+"""
+リクエストのトレース
+ルートハンドラ・modelsの関数・MongoDBコマンド・Gemini API呼び出しをスパンとして記録し、
+トレース（1リクエスト分のスパン）をJSON Lines形式でローカルファイルに書き出す
+
+    {"trace_id": "...", "span_id": "...", "parent_id": "...", "name": "thread.get_thread_by_id",
+     "start": "2025-01-01T00:00:00.000000+00:00", "duration_ms": 3.2, "status": "ok",
+     "attributes": {...}}
+
+サンプリングされなかったリクエストでは現在のスパンがNoneのままなので、
+記録の処理はContextVarを1回読むだけで終わる。
+"""
+import contextvars
+import functools
+import inspect
+import json
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pymongo import monitoring
+from config import config
+
+# W3C Trace Contextのヘッダー（version-trace_id-parent_id-flags）
+TRACEPARENT_HEADER = 'traceparent'
+
+# 1トレースに記録するスパン数の上限（長いストリーミングなどでメモリを使いすぎないため）
+_MAX_SPANS_PER_TRACE = 1000
+
+_current_span = contextvars.ContextVar('current_span', default=None)
+
+
+def _new_id(size):
+    """ランダムな16進ID（trace_idは16バイト、span_idは8バイト）"""
+    return os.urandom(size).hex()
+
+
+def parse_trace_header(headers):
+    """
+    リクエストヘッダーからトレースIDとサンプリングの指定を読み取る
+
+    traceparentはW3C Trace Contextの形式で、flagsの最下位ビットに従う。
+    config.TRACE_HEADERにトレースIDが指定されていれば常に記録する。
+
+    Args:
+        headers (Mapping): リクエストヘッダー
+
+    Returns:
+        tuple: (トレースID, サンプリングするか)。指定がなければ (None, None)
+    """
+    traceparent = headers.get(TRACEPARENT_HEADER)
+    if traceparent:
+        parts = traceparent.strip().split('-')
+        if len(parts) == 4 and len(parts[1]) == 32 and len(parts[3]) == 2:
+            try:
+                return parts[1].lower(), bool(int(parts[3], 16) & 1)
+            except ValueError:
+                pass
+
+    trace_id = headers.get(config.TRACE_HEADER)
+    if trace_id:
+        # ログに書き出すため長さと文字種を制限する
+        trace_id = ''.join(c for c in trace_id.strip() if c.isalnum() or c in '-_')[:64]
+        if trace_id:
+            return trace_id, True
+    return None, None
+
+
+class Span:
+    """処理1つ分の区間"""
+
+    __slots__ = ('trace', 'span_id', 'parent_id', 'name', 'attributes',
+                 'start', 'duration', 'status', '_started', '_token')
+
+    def __init__(self, trace, name, parent_id=None, attributes=None):
+        self.trace = trace
+        self.span_id = _new_id(8)
+        self.parent_id = parent_id
+        self.name = name
+        self.attributes = attributes or {}
+        self.start = time.time()
+        self.duration = None
+        self.status = 'ok'
+        self._started = time.perf_counter()
+        self._token = None
+
+    def set_attribute(self, key, value):
+        """属性を追加"""
+        self.attributes[key] = value
+
+    def finish(self, error=None):
+        """区間を閉じてトレースに追加"""
+        self.duration = time.perf_counter() - self._started
+        if error is not None:
+            self.status = 'error'
+            self.attributes['error'] = str(error)[:200]
+        self.trace.add(self)
+
+    def to_dict(self):
+        """書き出し用の辞書"""
+        return {
+            'trace_id': self.trace.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'start': datetime.fromtimestamp(self.start, timezone.utc).isoformat(),
+            'duration_ms': round(self.duration * 1000, 3),
+            'status': self.status,
+            'attributes': self.attributes
+        }
+
+
+class Trace:
+    """1リクエスト分のスパンを集める"""
+
+    def __init__(self, trace_id):
+        self.trace_id = trace_id
+        self.spans = []
+        self.dropped = 0
+
+    def add(self, span):
+        """閉じたスパンを追加（上限を超えた分は数だけ数える）"""
+        if len(self.spans) < _MAX_SPANS_PER_TRACE:
+            self.spans.append(span)
+        else:
+            self.dropped += 1
+
+
+class JsonLinesExporter:
+    """トレースをJSON Lines形式でファイルに追記する"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, trace):
+        """
+        トレースの全スパンを1行ずつ書き出す
+
+        Args:
+            trace (Trace): 書き出すトレース
+        """
+        lines = ''.join(
+            json.dumps(span.to_dict(), ensure_ascii=False, default=str) + '\n'
+            for span in trace.spans
+        )
+        try:
+            with self._lock:
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(lines)
+        except OSError as e:
+            print(f"トレース書き出しエラー: {e}")
+
+
+class Tracer:
+    """スパンの作成とトレースの書き出しを管理するクラス"""
+
+    def __init__(self, exporter=None):
+        self.exporter = exporter or JsonLinesExporter(config.TRACE_EXPORT_PATH)
+
+    def start_trace(self, name, headers=None, **attributes):
+        """
+        リクエストのルートスパンを開始
+
+        Args:
+            name (str): スパン名（ルートハンドラのエンドポイント名など）
+            headers (Mapping, optional): トレースIDを読み取るリクエストヘッダー
+            **attributes: スパンの属性
+
+        Returns:
+            Span: ルートスパン、サンプリングしない場合はNone
+        """
+        trace_id, sampled = parse_trace_header(headers or {})
+        if sampled is None:
+            sampled = random.random() < config.TRACE_SAMPLE_RATE
+        if not sampled:
+            # 同じスレッドの前のリクエストのスパンが残っていても引き継がない
+            _current_span.set(None)
+            return None
+
+        span = Span(Trace(trace_id or _new_id(16)), name, attributes=attributes)
+        span._token = _current_span.set(span)
+        return span
+
+    def end_trace(self, span, error=None, **attributes):
+        """
+        ルートスパンを閉じ、しきい値以上かかったトレースを書き出す
+
+        Args:
+            span (Span): start_traceで開始したスパン（Noneなら何もしない）
+            error (Exception, optional): 失敗した場合の例外
+            **attributes: 追加する属性（ステータスコードなど）
+        """
+        if span is None:
+            return
+
+        span.attributes.update(attributes)
+        span.finish(error)
+        try:
+            _current_span.reset(span._token)
+        except ValueError:
+            # ストリーミングの終了時など、開始時と別のコンテキストで閉じた場合
+            _current_span.set(None)
+
+        trace = span.trace
+        if trace.dropped:
+            span.set_attribute('dropped_spans', trace.dropped)
+        if span.duration * 1000 >= config.TRACE_MIN_DURATION_MS:
+            self.exporter.export(trace)
+
+    @contextmanager
+    def span(self, name, **attributes):
+        """
+        現在のスパンの子スパンを記録するコンテキストマネージャ
+        トレース中でなければ何もしない
+
+        Yields:
+            Span: 開始したスパン（トレース中でなければNone）
+        """
+        parent = _current_span.get()
+        if parent is None:
+            yield None
+            return
+
+        span = Span(parent.trace, name, parent.span_id, attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            _current_span.reset(token)
+            span.finish(e)
+            raise
+        _current_span.reset(token)
+        span.finish()
+
+    def record(self, name, duration, error=None, **attributes):
+        """
+        終わった処理を現在のスパンの子スパンとして記録（所要時間が後から分かる処理用）
+
+        Args:
+            name (str): スパン名
+            duration (float): 所要時間（秒）。終了時刻は現在時刻とする
+            error (Exception, optional): 失敗した場合の例外
+            **attributes: スパンの属性
+        """
+        parent = _current_span.get()
+        if parent is None:
+            return
+
+        span = Span(parent.trace, name, parent.span_id, attributes)
+        span.start -= duration
+        span._started -= duration
+        span.finish(error)
+
+    @staticmethod
+    def current_trace_id():
+        """現在のトレースID（トレース中でなければNone）"""
+        span = _current_span.get()
+        return span.trace.trace_id if span is not None else None
+
+
+def traced(name=None):
+    """
+    関数の呼び出しをスパンとして記録するデコレータ（同期・非同期の関数に対応）
+
+    Args:
+        name (str, optional): スパン名（省略時は「モジュール名.関数名」）
+    """
+    def decorator(func):
+        span_name = name or f"{func.__module__.rsplit('.', 1)[-1]}.{func.__name__}"
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                if _current_span.get() is None:
+                    return await func(*args, **kwargs)
+                with tracer.span(span_name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _current_span.get() is None:
+                return func(*args, **kwargs)
+            with tracer.span(span_name):
+                return func(*args, **kwargs)
+        return wrapper
+
+    return decorator
+
+
+class MongoCommandTracing(monitoring.CommandListener):
+    """
+    pymongoのコマンド監視でMongoDBコマンドをスパンとして記録
+    （同期版のpymongoはコマンドを呼び出したスレッドでイベントを通知する）
+    """
+
+    def __init__(self):
+        # (request_id, connection_id) -> コレクション名（トレース中のコマンドのみ）
+        self._collections = {}
+
+    def started(self, event):
+        if _current_span.get() is None:
+            return
+        collection = event.command.get(event.command_name)
+        if not isinstance(collection, str):
+            collection = event.command.get('collection', '')
+        self._collections[(event.request_id, event.connection_id)] = collection
+
+    def succeeded(self, event):
+        self._record(event)
+
+    def failed(self, event):
+        self._record(event, event.failure)
+
+    def _record(self, event, error=None):
+        collection = self._collections.pop((event.request_id, event.connection_id), None)
+        if collection is None:
+            return
+        tracer.record(
+            f"mongodb.{event.command_name}",
+            event.duration_micros / 1e6,
+            error,
+            collection=collection
+        )
+
+
+# シングルトンインスタンス
+tracer = Tracer()
+mongo_command_tracing = MongoCommandTracing()
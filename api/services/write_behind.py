@@ -0,0 +1,69 @@
+"""
+書き込みの後回し（write-behind）
+メッセージの保存で応答に必要ない書き込み（使用量の台帳・全文検索のエントリ）を
+キューに入れ、1本のバックグラウンドスレッドで順に実行する
+
+トランザクションを使わない場合、メッセージの保存はメッセージ・スレッド・台帳・検索の
+4回の書き込みを順に待っていた。台帳と検索を後回しにすると、応答までの往復は2回になる。
+キューは1本なので、同じエントリの追加と削除は投入した順に実行される。
+サーバーレス（Vercel）では応答後にプロセスが止まるため既定で無効（その場で書き込む）
+"""
+import atexit
+import queue
+import threading
+from config import config
+
+
+class WriteBehind:
+    """後回しにした書き込みを順に実行するクラス"""
+
+    def __init__(self, enabled=None):
+        self.enabled = config.WRITE_BEHIND if enabled is None else enabled
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker = None
+
+    def submit(self, write):
+        """
+        書き込みを後回しにする（無効な場合はその場で実行する）
+
+        Args:
+            write (callable): 引数なしで呼ぶ書き込み処理
+        """
+        if not self.enabled:
+            write()
+            return
+
+        self._ensure_worker()
+        self._queue.put(write)
+
+    def flush(self):
+        """投入済みの書き込みがすべて終わるまで待つ（テスト・終了時用）"""
+        if self._worker is not None:
+            self._queue.join()
+
+    def _ensure_worker(self):
+        """バックグラウンドスレッドを初回に起動"""
+        if self._worker is not None:
+            return
+        with self._lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, daemon=True)
+                self._worker.start()
+                # プロセスの終了時に残りを書き込む
+                atexit.register(self.flush)
+
+    def _run(self):
+        """キューの書き込みを順に実行（失敗しても後続は続ける）"""
+        while True:
+            write = self._queue.get()
+            try:
+                write()
+            except Exception as e:
+                print(f"後回しにした書き込みのエラー: {e}")
+            finally:
+                self._queue.task_done()
+
+
+# シングルトンインスタンス
+write_behind = WriteBehind()
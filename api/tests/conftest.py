@@ -9,7 +9,7 @@ import os
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from index import app as flask_app
-from services.db_service import db_service
+from repositories import get_storage
 
 
 @pytest.fixture
@@ -19,8 +19,8 @@ def app():
         'TESTING': True,
     })
 
-    # データベース接続を確立
-    db_service.connect()
+    # 保存先（config.STORAGE_BACKEND）への接続を確立
+    get_storage().connect()
 
     yield flask_app
 
@@ -2,7 +2,6 @@
 APIエンドポイントの統合テスト
 """
 import json
-import pytest
 
 
 class TestHealthCheck:
@@ -67,6 +66,48 @@ class TestThreads:
         assert isinstance(data['threads'], list)
         assert len(data['threads']) > 0
 
+    def test_get_threads_paginated(self, client):
+        """カーソルで次のページを取得でき、ページ間で重複しないこと"""
+        for i in range(3):
+            client.post(
+                '/api/threads',
+                data=json.dumps({'title': f'ページテスト{i}'}),
+                content_type='application/json'
+            )
+
+        response = client.get('/api/threads?limit=2')
+        assert response.status_code == 200
+        first_page = json.loads(response.data)
+        assert len(first_page['threads']) == 2
+        assert first_page['next_cursor'] is not None
+
+        response = client.get(
+            f'/api/threads?limit=2&cursor={first_page["next_cursor"]}'
+        )
+        second_page = json.loads(response.data)
+        first_ids = {t['id'] for t in first_page['threads']}
+        assert all(t['id'] not in first_ids for t in second_page['threads'])
+
+    def test_get_threads_title_filter(self, client):
+        """タイトルの前方一致で絞り込めること"""
+        client.post(
+            '/api/threads',
+            data=json.dumps({'title': '絞り込みテスト対象'}),
+            content_type='application/json'
+        )
+
+        response = client.get('/api/threads?prefix=絞り込みテスト')
+        assert response.status_code == 200
+
+        threads = json.loads(response.data)['threads']
+        assert len(threads) > 0
+        assert all(t['title'].startswith('絞り込みテスト') for t in threads)
+
+    def test_get_threads_invalid_limit(self, client):
+        """不正なページサイズは400が返ること"""
+        response = client.get('/api/threads?limit=0')
+        assert response.status_code == 400
+
     def test_get_thread_by_id(self, client):
         """IDでスレッドを取得できること"""
         # スレッド作成
@@ -132,6 +173,35 @@ class TestThreads:
         get_response = client.get(f'/api/threads/{thread_id}')
         assert get_response.status_code == 404
 
+    def test_deleted_thread_is_reaped(self, client):
+        """削除したスレッドのメッセージと本体が後片付けで消えること"""
+        from bson import ObjectId
+        from models import message as message_model
+        from repositories import get_storage
+        from services.thread_reaper import thread_reaper
+
+        create_response = client.post(
+            '/api/threads',
+            data=json.dumps({'title': '後片付けテスト'}),
+            content_type='application/json'
+        )
+        thread_id = json.loads(create_response.data)['id']
+        message_model.create_message(thread_id, 'user', '消えるメッセージ')
+
+        response = client.delete(f'/api/threads/{thread_id}')
+        assert response.status_code == 200
+
+        # 墓標の付いたスレッドは一覧に出ない
+        list_response = client.get('/api/threads')
+        ids = [t['id'] for t in json.loads(list_response.data)['threads']]
+        assert thread_id not in ids
+
+        thread_reaper.reap_deleted_threads()
+        thread_oid = ObjectId(thread_id)
+        storage = get_storage()
+        assert storage.threads.find_existing_ids([thread_oid]) == set()
+        assert storage.messages.count_after(thread_oid, None, 1) == 0
+
 
 class TestMessages:
     """メッセージ関連APIのテスト"""
@@ -194,6 +264,123 @@ class TestMessages:
         assert isinstance(data['messages'], list)
         assert len(data['messages']) == 2  # user + assistant
 
+    def test_send_message_stream(self, client):
+        """ストリーミングでAI応答を受け取り、完了後に保存されること"""
+        # スレッド作成
+        create_response = client.post(
+            '/api/threads',
+            data=json.dumps({'title': 'ストリーミングテスト'}),
+            content_type='application/json'
+        )
+        thread_id = json.loads(create_response.data)['id']
+
+        # ストリーミングでメッセージ送信
+        response = client.post(
+            f'/api/threads/{thread_id}/messages/stream',
+            data=json.dumps({'content': 'こんにちは'}),
+            content_type='application/json'
+        )
+        assert response.status_code == 200
+        assert response.mimetype == 'text/event-stream'
+
+        body = response.get_data(as_text=True)
+        events = [
+            line[len('event: '):]
+            for line in body.splitlines()
+            if line.startswith('event: ')
+        ]
+        assert events[0] == 'user_message'
+        assert 'chunk' in events
+        assert events[-1] == 'done'
+
+        # 応答が保存されていることを確認
+        list_response = client.get(f'/api/threads/{thread_id}/messages')
+        messages = json.loads(list_response.data)['messages']
+        assert len(messages) == 2
+        assert messages[1]['role'] == 'assistant'
+
+    def test_send_message_stream_to_nonexistent_thread(self, client):
+        """存在しないスレッドへのストリーミング送信は404が返ること"""
+        response = client.post(
+            '/api/threads/000000000000000000000000/messages/stream',
+            data=json.dumps({'content': 'テスト'}),
+            content_type='application/json'
+        )
+        assert response.status_code == 404
+
+    def test_pin_message(self, client):
+        """メッセージをピン留めできること"""
+        # スレッド作成
+        create_response = client.post(
+            '/api/threads',
+            data=json.dumps({'title': 'ピン留めテスト'}),
+            content_type='application/json'
+        )
+        thread_id = json.loads(create_response.data)['id']
+
+        # メッセージ送信
+        send_response = client.post(
+            f'/api/threads/{thread_id}/messages',
+            data=json.dumps({'content': '重要な前提条件です'}),
+            content_type='application/json'
+        )
+        message_id = json.loads(send_response.data)['user_message']['id']
+
+        # ピン留め
+        response = client.put(
+            f'/api/messages/{message_id}/pin',
+            data=json.dumps({'pinned': True}),
+            content_type='application/json'
+        )
+        assert response.status_code == 200
+        assert json.loads(response.data)['pinned'] is True
+
+    def test_get_messages_paginated(self, client):
+        """カーソルで古いページを順に取得できること"""
+        # スレッド作成
+        create_response = client.post(
+            '/api/threads',
+            data=json.dumps({'title': 'ページネーションテスト'}),
+            content_type='application/json'
+        )
+        thread_id = json.loads(create_response.data)['id']
+
+        # メッセージ送信（user + assistant で2件）
+        client.post(
+            f'/api/threads/{thread_id}/messages',
+            data=json.dumps({'content': 'テストメッセージ'}),
+            content_type='application/json'
+        )
+
+        # 最新ページ（1件）
+        response = client.get(f'/api/threads/{thread_id}/messages?limit=1')
+        assert response.status_code == 200
+        data = json.loads(response.data)
+        assert len(data['messages']) == 1
+        assert data['messages'][0]['role'] == 'assistant'
+        assert data['next_cursor'] is not None
+
+        # 古いページ
+        response = client.get(
+            f'/api/threads/{thread_id}/messages?limit=1&before={data["next_cursor"]}'
+        )
+        data = json.loads(response.data)
+        assert len(data['messages']) == 1
+        assert data['messages'][0]['role'] == 'user'
+        assert data['next_cursor'] is None
+
+    def test_get_messages_invalid_cursor(self, client):
+        """不正なカーソルは400が返ること"""
+        create_response = client.post(
+            '/api/threads',
+            data=json.dumps({'title': '不正カーソルテスト'}),
+            content_type='application/json'
+        )
+        thread_id = json.loads(create_response.data)['id']
+
+        response = client.get(f'/api/threads/{thread_id}/messages?before=invalid')
+        assert response.status_code == 400
+
     def test_send_message_to_nonexistent_thread(self, client):
         """存在しないスレッドにメッセージを送信すると404が返ること"""
         response = client.post(
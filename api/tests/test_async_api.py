@@ -0,0 +1,129 @@
+"""
+非同期サーバー（async_index.py）のテスト
+インメモリの保存先で同じ操作を行い、index.pyと同じJSON形式を返すことを確認する
+"""
+import asyncio
+from urllib.parse import quote
+import pytest
+
+pytest.importorskip('flask')
+pytest.importorskip('quart')
+pytest.importorskip('quart_cors')
+pytest.importorskip('motor')
+
+from config import config
+from repositories import reset_storage
+from services.gemini_service import gemini_service
+from services.history_cache import history_cache
+from services.write_behind import write_behind
+
+AI_RESPONSE = 'こんにちは！何かお手伝いできることはありますか？'
+
+
+@pytest.fixture(autouse=True)
+def memory_storage(monkeypatch):
+    """空のインメモリの保存先に切り替え、AI応答を固定する"""
+    monkeypatch.setattr(config, 'STORAGE_BACKEND', 'memory')
+    # 台帳・全文検索は保存と同時に書き込む（後回しはtest_write_behindで確認する）
+    monkeypatch.setattr(write_behind, 'enabled', False)
+
+    def generate_response(messages, summary=None, use_cache=True, usage=None):
+        return AI_RESPONSE
+
+    async def generate_response_async(messages, summary=None, use_cache=True, usage=None):
+        return AI_RESPONSE
+
+    monkeypatch.setattr(gemini_service, 'generate_response', generate_response)
+    monkeypatch.setattr(gemini_service, 'generate_response_async', generate_response_async)
+    reset_storage()
+    history_cache.clear()
+    yield
+    reset_storage()
+    history_cache.clear()
+
+
+def shape(value):
+    """JSONの形（キーと値の型）だけを取り出す（IDや日時の値は比較しない）"""
+    if isinstance(value, dict):
+        return {key: shape(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [shape(value[0])] if value else []
+    return type(value).__name__
+
+
+class FlaskClient:
+    """Flaskのテストクライアントを非同期クライアントと同じ呼び出し方にする"""
+
+    def __init__(self, client):
+        self.client = client
+
+    async def request(self, method, path, body=None):
+        response = self.client.open(path, method=method, json=body)
+        return response.status_code, response.get_json()
+
+
+class QuartClient:
+    """Quartのテストクライアント"""
+
+    def __init__(self, client):
+        self.client = client
+
+    async def request(self, method, path, body=None):
+        response = await self.client.open(path, method=method, json=body)
+        return response.status_code, await response.get_json()
+
+
+async def run_scenario(client):
+    """
+    スレッド作成から削除までの一連の操作を行い、各レスポンスの形を返す
+
+    Returns:
+        list: (操作名, ステータスコード, JSONの形)のリスト
+    """
+    results = []
+
+    async def call(name, method, path, body=None):
+        status, data = await client.request(method, path, body)
+        results.append((name, status, shape(data)))
+        return data
+
+    await call('index', 'GET', '/')
+    await call('test', 'GET', '/api/test')
+
+    thread = await call('create_thread', 'POST', '/api/threads', {'title': '契約テスト'})
+    thread_path = f"/api/threads/{thread['id']}"
+
+    await call('send_message', 'POST', f'{thread_path}/messages', {'content': 'こんにちは'})
+    await call('empty_message', 'POST', f'{thread_path}/messages', {'content': ' '})
+    await call('list_threads', 'GET', '/api/threads?limit=10')
+    await call('get_thread', 'GET', thread_path)
+    await call('update_thread', 'PUT', thread_path, {'title': '変更後'})
+    await call('list_messages', 'GET', f'{thread_path}/messages')
+    await call('page_messages', 'GET', f'{thread_path}/messages?limit=1')
+    await call('search', 'GET', f"/api/search?q={quote('こんにちは')}")
+    await call('usage', 'GET', '/api/usage')
+    await call('missing_thread', 'GET', '/api/threads/000000000000000000000000')
+    await call('delete_thread', 'DELETE', thread_path)
+    await call('unknown_route', 'GET', '/api/unknown')
+    return results
+
+
+class TestJsonContract:
+    """index.pyとasync_index.pyのJSON形式の比較"""
+
+    def test_async_routes_match_flask_routes(self):
+        """同じ操作に同じステータスコードと同じ形のJSONを返すこと"""
+        from index import app as flask_app
+        from async_index import app as quart_app
+
+        flask_app.config.update({'TESTING': True})
+        expected = asyncio.run(run_scenario(FlaskClient(flask_app.test_client())))
+
+        reset_storage()
+        history_cache.clear()
+        actual = asyncio.run(run_scenario(QuartClient(quart_app.test_client())))
+
+        assert [name for name, _, _ in actual] == [name for name, _, _ in expected]
+        for (name, status, body), (_, expected_status, expected_body) in zip(actual, expected):
+            assert (name, status) == (name, expected_status)
+            assert body == expected_body, name
@@ -0,0 +1,90 @@
+"""
+MongoDBインデックス定義（services.db_indexes）と使用状況レポートのテスト
+"""
+from config import config
+from services.db_indexes import INDEX_REGISTRY, registered_index_names
+from services.db_service import DatabaseService
+
+
+def index_keys(collection_name):
+    """コレクションに登録されているインデックスのキーのリスト"""
+    return [list(index.document['key'].items()) for index in INDEX_REGISTRY[collection_name]]
+
+
+def has_prefix(keys, prefix):
+    """いずれかのインデックスがprefixから始まるか（先頭一致でクエリに使える）"""
+    return any(key[:len(prefix)] == prefix for key in keys)
+
+
+class FakeCollection:
+    """$indexStatsの結果だけを返すコレクション"""
+
+    def __init__(self, usage):
+        self.usage = usage
+
+    def aggregate(self, pipeline):
+        assert pipeline == [{'$indexStats': {}}]
+        return [{'name': name, 'accesses': {'ops': ops}} for name, ops in self.usage.items()]
+
+
+class TestRegistry:
+    """INDEX_REGISTRYのテスト"""
+
+    def test_messages_are_read_by_thread_and_created_at(self):
+        """スレッド内のメッセージを作成日時順に読むインデックスがあること"""
+        keys = index_keys(config.MESSAGES_COLLECTION)
+        assert has_prefix(keys, [('thread_id', 1), ('created_at', 1)])
+
+    def test_threads_are_listed_by_updated_at_desc(self):
+        """スレッド一覧を更新日時の降順に読むインデックスがあること"""
+        keys = index_keys(config.THREADS_COLLECTION)
+        assert has_prefix(keys, [('updated_at', -1)])
+
+    def test_threads_are_filtered_by_title_prefix(self):
+        """タイトルの前方一致を支えるインデックスがあること"""
+        keys = index_keys(config.THREADS_COLLECTION)
+        assert has_prefix(keys, [('title', 1)])
+
+    def test_index_names_are_unique(self):
+        """コレクションごとのインデックス名が重複しないこと"""
+        for collection_name in INDEX_REGISTRY:
+            names = registered_index_names(collection_name)
+            assert len(names) == len(set(names)), collection_name
+
+
+class TestIndexReport:
+    """DatabaseService.index_reportのテスト"""
+
+    def make_service(self, usage_by_collection):
+        """$indexStatsの結果を差し替えたDatabaseService"""
+        service = DatabaseService()
+        service.db = {
+            name: FakeCollection(usage_by_collection.get(name, {}))
+            for name in INDEX_REGISTRY
+        }
+        return service
+
+    def test_classifies_missing_unregistered_and_unused(self):
+        """存在しない・未登録・未使用のインデックスを分類し、_id_は未使用にしないこと"""
+        messages = config.MESSAGES_COLLECTION
+        service = self.make_service({
+            messages: {
+                '_id_': 0,
+                'thread_id_created_at': 40,
+                'legacy_role': 0,
+            }
+        })
+
+        report = service.index_report()[messages]
+        assert report['missing'] == ['thread_id_pinned']
+        assert report['unregistered'] == ['legacy_role']
+        assert report['unused'] == ['legacy_role']
+        assert report['usage'] == {'_id_': 0, 'thread_id_created_at': 40, 'legacy_role': 0}
+
+    def test_collection_without_stats_reports_all_missing(self):
+        """インデックスのないコレクションは登録済みのものがすべて未作成になること"""
+        service = self.make_service({})
+        report = service.index_report()[config.THREADS_COLLECTION]
+        assert report['missing'] == registered_index_names(config.THREADS_COLLECTION)
+        assert report['unregistered'] == []
+        assert report['unused'] == []
@@ -0,0 +1,136 @@
+"""
+条件付きGET（routes.etag）とスレッドのversionのテスト
+"""
+import pytest
+from bson import ObjectId
+from config import config
+from models import message as message_model
+from models import thread as thread_model
+from repositories import get_storage, reset_storage
+from routes.etag import is_not_modified, messages_etag, threads_etag
+from services.history_cache import history_cache
+
+
+@pytest.fixture(autouse=True)
+def memory_storage(monkeypatch):
+    """空のインメモリの保存先に切り替える"""
+    monkeypatch.setattr(config, 'STORAGE_BACKEND', 'memory')
+    reset_storage()
+    history_cache.clear()
+    yield get_storage()
+    reset_storage()
+    history_cache.clear()
+
+
+def post(thread_id, content):
+    saved, _ = message_model.save_messages(
+        thread_id, [message_model.build_message(thread_id, 'user', content)]
+    )
+    return saved[0]
+
+
+class TestIfNoneMatch:
+    """If-None-Matchの比較のテスト"""
+
+    def test_matches(self):
+        """一覧のいずれか・弱いETag・*に一致し、ヘッダーがなければ一致しないこと"""
+        etag = messages_etag('abc', 3)
+
+        assert is_not_modified(etag, etag)
+        assert is_not_modified(f'"other", W/{etag}', etag)
+        assert is_not_modified('*', etag)
+        assert not is_not_modified(None, etag)
+        assert not is_not_modified(messages_etag('abc', 4), etag)
+
+    def test_messages_etag_follows_page(self):
+        """メッセージ一覧のETagはページの指定ごとに変わり、同じ指定なら同じであること"""
+        cursor = 'cursor'
+        etags = [
+            messages_etag('abc', 3),
+            messages_etag('abc', 3, 10),
+            messages_etag('abc', 3, 20),
+            messages_etag('abc', 3, 10, before=cursor),
+            messages_etag('abc', 3, 10, after=cursor),
+        ]
+
+        assert len(set(etags)) == len(etags)
+        assert messages_etag('abc', 3, 10, before=cursor) == etags[3]
+        assert messages_etag('abc', 3, None, '', '') == etags[0]
+
+
+class TestThreadVersion:
+    """表示が変わる更新でversionが増えることのテスト"""
+
+    def test_writes_bump_version(self):
+        """メッセージの保存・ピン留め・削除とタイトル変更のたびにversionが増えること"""
+        thread = thread_model.create_thread()
+        versions = [thread_model.get_thread_version(thread['id'])]
+
+        message = post(thread['id'], '最初のメッセージ')
+        versions.append(thread_model.get_thread_version(thread['id']))
+        message_model.set_message_pinned(message['id'], True)
+        versions.append(thread_model.get_thread_version(thread['id']))
+        message_model.delete_message(message['id'])
+        versions.append(thread_model.get_thread_version(thread['id']))
+        thread_model.update_thread(thread['id'], title='新しいタイトル')
+        versions.append(thread_model.get_thread_version(thread['id']))
+
+        assert versions == sorted(set(versions))
+
+    def test_reads_do_not_bump_version(self):
+        """メッセージの読み込み（ウィンドウからの取得）ではversionが変わらないこと"""
+        thread = thread_model.create_thread()
+        post(thread['id'], 'こんにちは')
+        version = thread_model.get_thread_version(thread['id'])
+
+        message_model.get_recent_messages(thread['id'])
+        message_model.get_messages_page(thread['id'], 10)
+
+        assert thread_model.get_thread_version(thread['id']) == version
+
+    def test_missing_or_deleted_thread(self):
+        """存在しない・削除済み・不正なIDのスレッドはNoneになること"""
+        thread = thread_model.create_thread()
+        thread_model.delete_thread(thread['id'])
+
+        assert thread_model.get_thread_version(thread['id']) is None
+        assert thread_model.get_thread_version(str(ObjectId())) is None
+        assert thread_model.get_thread_version('invalid') is None
+
+    def test_threads_etag_follows_list(self):
+        """一覧のETagはスレッドの更新・追加・削除で変わり、変更がなければ同じであること"""
+        first = thread_model.create_thread('1')
+        second = thread_model.create_thread('2')
+
+        def current():
+            return threads_etag(*thread_model.get_threads(10))
+
+        etags = [current(), current()]
+        post(first['id'], '更新')
+        etags.append(current())
+        third = thread_model.create_thread('3')
+        etags.append(current())
+        thread_model.delete_thread(second['id'])
+        etags.append(current())
+
+        assert etags[0] == etags[1]
+        assert len(set(etags[1:])) == 4
+        assert third['version'] == 0
+
+    def test_page_request_does_not_reuse_other_page_etag(self):
+        """全件取得のETagを送っても、ページを指定した取得は304にならないこと"""
+        pytest.importorskip('flask')
+        from index import app
+
+        thread = thread_model.create_thread()
+        for content in ('1', '2', '3'):
+            post(thread['id'], content)
+        client = app.test_client()
+        path = f"/api/threads/{thread['id']}/messages"
+
+        full = client.get(path)
+        assert client.get(path, headers={'If-None-Match': full.headers['ETag']}).status_code == 304
+
+        page = client.get(f'{path}?limit=1', headers={'If-None-Match': full.headers['ETag']})
+        assert page.status_code == 200
+        assert len(page.get_json()['messages']) == 1
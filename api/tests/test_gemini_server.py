@@ -0,0 +1,148 @@
+"""
+Gemini APIのスタンドインサーバー（loadtest.gemini_server）のテスト
+"""
+import json
+import types
+import urllib.error
+import urllib.request
+import pytest
+from config import config
+from loadtest.gemini_server import GeminiStandIn, make_profile
+from services.gemini_service import GeminiService
+from services.retry_policy import retry_after
+
+REQUEST = {'contents': [{'role': 'user', 'parts': [{'text': 'こんにちは'}]}]}
+
+
+def call(base_url, path, body=None):
+    """スタンドインを呼び出して (ステータス, 本文) を返す"""
+    data = json.dumps(body).encode('utf-8') if body is not None else None
+    request = urllib.request.Request(
+        base_url + path, data=data, method='POST' if data else 'GET',
+        headers={'Content-Type': 'application/json', 'x-goog-api-key': 'test-key'}
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=10) as response:
+            return response.getcode(), response.read().decode('utf-8')
+    except urllib.error.HTTPError as e:
+        return e.code, e.read().decode('utf-8')
+
+
+def events(body):
+    """SSEの本文からイベントのJSONを取り出す"""
+    return [
+        json.loads(line[len('data:'):])
+        for line in body.splitlines() if line.startswith('data:')
+    ]
+
+
+@pytest.fixture
+def start():
+    """スタンドインを空いているポートで起動し、終了時に止める"""
+    started = []
+
+    def start(**options):
+        standin = GeminiStandIn(port=0, **options)
+        standin.start()
+        started.append(standin)
+        return standin
+
+    yield start
+    for standin in started:
+        standin.stop()
+
+
+def fast(**overrides):
+    return make_profile('instant', **overrides)
+
+
+class TestFake:
+    """合成した応答のテスト"""
+
+    def test_generate_and_stream(self, start):
+        """応答の長さ・使用量がプロファイルどおりで、ストリーミングは分割されること"""
+        standin = start(profile=fast(response_tokens=45, chunk_tokens=20))
+        path = '/v1beta/models/gemini-2.5-flash-lite'
+
+        status, body = call(standin.base_url, f'{path}:generateContent', REQUEST)
+        response = json.loads(body)
+        assert status == 200
+        assert len(response['candidates'][0]['content']['parts'][0]['text']) == 45
+        assert response['usageMetadata']['candidatesTokenCount'] == 45
+
+        status, body = call(standin.base_url, f'{path}:streamGenerateContent?alt=sse', REQUEST)
+        chunks = events(body)
+        assert status == 200
+        assert [len(c['candidates'][0]['content']['parts'][0]['text']) for c in chunks] == [20, 20, 5]
+        assert chunks[-1]['candidates'][0]['finishReason'] == 'STOP'
+        assert chunks[-1]['usageMetadata']['candidatesTokenCount'] == 45
+
+    def test_list_models(self, start):
+        """モデル一覧を返すこと"""
+        standin = start(profile=fast(), models=['models/a', 'models/b'])
+
+        status, body = call(standin.base_url, '/v1beta/models')
+
+        assert status == 200
+        assert [m['name'] for m in json.loads(body)['models']] == ['models/a', 'models/b']
+
+    def test_rate_limit_injection(self, start):
+        """指定した割合で429を返し、retry_policyが読めるretryDelayを含むこと"""
+        standin = start(profile=fast(rate_limit_rate=1.0, retry_delay=3), seed=1)
+
+        status, body = call(
+            standin.base_url, '/v1beta/models/gemini-2.5-flash:generateContent', REQUEST
+        )
+
+        assert status == 429
+        error = types.SimpleNamespace(code=429, details=json.loads(body))
+        assert retry_after(error) == 3
+        assert standin.stats['rate_limited'] == 1
+
+
+class TestRecordReplay:
+    """カセットの記録・再生のテスト"""
+
+    def test_replay_returns_recorded_responses(self, start, tmp_path):
+        """記録した応答を上流なしで同じ順に再生し、未記録のリクエストは404になること"""
+        upstream = start(profile=fast(response_tokens=10, response_tokens_max=300), seed=7)
+        recorder = start(mode='record', cassette_dir=str(tmp_path), upstream=upstream.base_url)
+        path = '/v1beta/models/gemini-2.5-flash-lite'
+
+        recorded = [
+            call(recorder.base_url, f'{path}:generateContent', REQUEST),
+            call(recorder.base_url, f'{path}:generateContent', REQUEST),
+            call(recorder.base_url, f'{path}:streamGenerateContent?alt=sse', REQUEST),
+        ]
+        assert recorder.stats['recorded'] == 3
+        assert 'test-key' not in ''.join(p.read_text() for p in tmp_path.iterdir())
+
+        upstream.stop()
+        replayer = start(mode='replay', cassette_dir=str(tmp_path), replay_speed=100)
+        replayed = [
+            call(replayer.base_url, f'{path}:generateContent', REQUEST),
+            call(replayer.base_url, f'{path}:generateContent', REQUEST),
+            call(replayer.base_url, f'{path}:streamGenerateContent?alt=sse', REQUEST),
+        ]
+        assert replayed[:2] == recorded[:2]
+        assert events(replayed[2][1]) == events(recorded[2][1])
+
+        status, _ = call(replayer.base_url, f'{path}:generateContent', {'contents': []})
+        assert status == 404
+        assert replayer.stats['misses'] == 1
+
+
+class TestGeminiService:
+    """GEMINI_BASE_URLの設定のテスト"""
+
+    def test_client_uses_base_url(self, monkeypatch):
+        """GEMINI_BASE_URLがあれば接続先として渡し、APIキーがなくても作成できること"""
+        monkeypatch.setattr(config, 'GEMINI_API_KEY', None)
+        monkeypatch.setattr(config, 'GEMINI_BASE_URL', None)
+        assert 'http_options' not in GeminiService._client_options()
+
+        monkeypatch.setattr(config, 'GEMINI_BASE_URL', 'http://127.0.0.1:8765')
+        options = GeminiService._client_options()
+
+        assert options['http_options'] == {'base_url': 'http://127.0.0.1:8765'}
+        assert options['api_key']
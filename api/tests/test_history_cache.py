@@ -0,0 +1,118 @@
+"""
+会話履歴キャッシュのテスト
+"""
+import pytest
+from bson import ObjectId
+from services.history_cache import HistoryCache, make_history_entry
+
+
+def _entry(role, content, pinned=False):
+    """テスト用の履歴エントリを作成"""
+    return make_history_entry({
+        '_id': ObjectId(),
+        'role': role,
+        'content': content,
+        'pinned': pinned
+    })
+
+
+@pytest.fixture
+def cache():
+    """小さな上限を設定したキャッシュ"""
+    cache = HistoryCache()
+    cache.max_threads = 2
+    cache.max_bytes = 1024 * 1024
+    cache.token_budget = 1000
+    cache.max_messages = 100
+    return cache
+
+
+class TestHistoryCache:
+    """HistoryCacheのテスト"""
+
+    def test_hit_and_miss(self, cache):
+        """未格納ならミス、格納後はヒットとして数えること"""
+        assert cache.get('t1') is None
+        cache.put('t1', [_entry('user', 'こんにちは')])
+
+        history = cache.get('t1')
+        assert [e['content'] for e in history] == ['こんにちは']
+        assert 'gemini_content' in history[0]
+
+        stats = cache.stats()
+        assert stats['hits'] == 1
+        assert stats['misses'] == 1
+
+    def test_lru_eviction_by_count(self, cache):
+        """件数上限を超えると最も古く使われたスレッドを追い出すこと"""
+        cache.put('t1', [_entry('user', 'a')])
+        cache.put('t2', [_entry('user', 'b')])
+        cache.get('t1')
+        cache.put('t3', [_entry('user', 'c')])
+
+        assert cache.get('t2') is None
+        assert cache.get('t1') is not None
+        assert cache.stats()['evictions'] == 1
+
+    def test_eviction_by_bytes(self, cache):
+        """メモリ上限を超えると追い出すこと"""
+        cache.max_bytes = 4096
+        cache.put('t1', [_entry('user', 'あ' * 1000)])
+        cache.put('t2', [_entry('user', 'い' * 1000)])
+
+        assert cache.get('t1') is None
+        assert cache.stats()['bytes'] <= cache.max_bytes
+
+    def test_append_is_write_through(self, cache):
+        """キャッシュ済みのスレッドにのみ追加されること"""
+        cache.append('missing', _entry('user', 'x'))
+        assert cache.get('missing') is None
+
+        cache.put('t1', [_entry('user', '質問')])
+        cache.append('t1', _entry('assistant', '回答'))
+        assert [e['role'] for e in cache.get('t1')] == ['user', 'assistant']
+
+    def test_append_trims_to_budget(self, cache):
+        """予算を超えたら古いメッセージから切り捨て、ピン留めは残すこと"""
+        cache.token_budget = 30
+        pinned = _entry('user', '前提', pinned=True)
+        cache.put('t1', [pinned, _entry('user', 'あ' * 10), _entry('assistant', 'い' * 10)])
+        cache.append('t1', _entry('user', 'う' * 10))
+
+        history = cache.get('t1')
+        assert [e['content'] for e in history] == ['前提', 'う' * 10]
+        assert sum(e['tokens'] for e in history) <= 30
+
+    def test_remove_and_invalidate(self, cache):
+        """メッセージ削除とスレッド破棄が反映されること"""
+        first = _entry('user', 'a')
+        cache.put('t1', [first, _entry('assistant', 'b')])
+        cache.remove('t1', first['id'])
+        assert [e['content'] for e in cache.get('t1')] == ['b']
+
+        cache.invalidate('t1')
+        assert cache.get('t1') is None
+
+
+class TestVersion:
+    """スレッドのversionによるキャッシュの検証のテスト"""
+
+    def test_version_mismatch_discards(self, cache):
+        """格納時と違うversionで読むと破棄してミスにすること"""
+        cache.put('t1', [_entry('user', '質問')], version=3)
+
+        assert cache.get('t1', 3) is not None
+        assert cache.get('t1', 4) is None
+        assert cache.get('t1', 3) is None
+
+    def test_extend_follows_own_write(self, cache):
+        """保存直前のversionのキャッシュにだけ追加し、versionを進めること"""
+        cache.put('t1', [_entry('user', '質問')], version=3)
+        cache.extend('t1', [_entry('assistant', '回答'), _entry('user', '次')], version=4)
+        assert [e['content'] for e in cache.get('t1', 4)] == ['質問', '回答', '次']
+
+    def test_extend_after_other_writer_discards(self, cache):
+        """間に他のワーカーの書き込みがあればキャッシュを破棄すること"""
+        cache.put('t1', [_entry('user', '質問')], version=3)
+        cache.extend('t1', [_entry('assistant', '回答')], version=5)
+        assert cache.get('t1') is None
@@ -0,0 +1,93 @@
+"""
+ロードテスト（loadtestパッケージ）の集計とスタンドインのテスト
+"""
+from loadtest.runner import compare, percentile, run_scenario
+from loadtest.scenarios import Scenario
+from loadtest.standins import FakeModels
+
+
+class FakeTestResponse:
+    def __init__(self, status_code, body):
+        self.status_code = status_code
+        self.body = body
+
+    def get_json(self, silent=False):
+        return self.body
+
+
+class FakeTestClient:
+    """Flaskのテストクライアントの代わりにリクエストを記録する"""
+
+    def __init__(self, calls):
+        self.calls = calls
+
+    def open(self, path, method='GET', json=None):
+        self.calls.append((method, path))
+        status = 500 if path.endswith('/fail') else 200
+        return FakeTestResponse(status, {'ok': True})
+
+
+class FakeApp:
+    def __init__(self):
+        self.calls = []
+
+    def test_client(self):
+        return FakeTestClient(self.calls)
+
+
+class PingScenario(Scenario):
+    name = 'ping'
+
+    def run(self, session, context):
+        session.request('ping', 'GET', '/api/health')
+        session.request('fail', 'GET', '/api/fail')
+
+
+class TestRunner:
+    """集計のテスト"""
+
+    def test_percentile_nearest_rank(self):
+        """最近傍順位法でパーセンタイルを求めること"""
+        values = list(range(1, 101))
+        assert percentile(values, 50) == 50
+        assert percentile(values, 95) == 95
+        assert percentile(values, 99) == 99
+        assert percentile([7], 99) == 7
+        assert percentile([], 50) is None
+
+    def test_run_scenario_counts_iterations_and_errors(self):
+        """合計iterations回実行し、期待と異なるステータスをエラーとして数えること"""
+        app = FakeApp()
+        result = run_scenario(app, PingScenario({}), concurrency=4, iterations=10)
+
+        assert len(app.calls) == 20
+        assert result['requests'] == 20
+        assert result['errors'] == 10
+        assert result['operations']['ping']['errors'] == 0
+        assert result['operations']['fail']['errors'] == 10
+        assert result['p99_ms'] is not None
+
+    def test_compare_reports_percent_change(self):
+        """前回の結果との変化率を求めること"""
+        current = {'list_threads': {'throughput_rps': 110, 'p50_ms': 9, 'p95_ms': 20, 'p99_ms': 30}}
+        baseline = {'list_threads': {'throughput_rps': 100, 'p50_ms': 10, 'p95_ms': 20, 'p99_ms': 40}}
+
+        changes = compare(current, baseline)['list_threads']
+        assert changes['throughput_rps'] == 10
+        assert changes['p50_ms'] == -10
+        assert changes['p95_ms'] == 0
+        assert changes['p99_ms'] == -25
+
+
+class TestGeminiStandIn:
+    """Geminiスタンドインのテスト"""
+
+    def test_stream_returns_usage_on_last_chunk(self):
+        """応答トークン数分のテキストを分割して返し、使用量は最後のチャンクに付けること"""
+        models = FakeModels(ttft=0, tokens_per_second=1_000_000, response_tokens=45, chunk_tokens=20)
+        chunks = list(models.generate_content_stream('model', 'こんにちは'))
+
+        assert [len(chunk.text) for chunk in chunks] == [20, 20, 5]
+        assert all(chunk.usage_metadata is None for chunk in chunks[:-1])
+        assert chunks[-1].usage_metadata.candidates_token_count == 45
+        assert chunks[-1].usage_metadata.prompt_token_count == 5
@@ -0,0 +1,378 @@
+"""
+インメモリの保存先（repositories.memory）のテスト
+モデル層を通して、MongoDBの保存先と同じ結果になることを確認する
+"""
+import time
+from datetime import datetime, timedelta
+import pytest
+from bson import ObjectId
+from benchmark_hotpaths import HOTPATH_BUDGET_MS, measure
+from config import config
+from models import message as message_model
+from models import thread as thread_model
+from repositories import get_storage, reset_storage
+from services.history_cache import history_cache
+from services.thread_reaper import thread_reaper
+
+
+@pytest.fixture(autouse=True)
+def memory_storage(monkeypatch):
+    """空のインメモリの保存先に切り替える"""
+    monkeypatch.setattr(config, 'STORAGE_BACKEND', 'memory')
+    monkeypatch.setattr(thread_reaper, 'throttle_seconds', 0)
+    reset_storage()
+    history_cache.clear()
+    yield get_storage()
+    reset_storage()
+    history_cache.clear()
+
+
+def add_messages(thread_id, count, start=None):
+    """1秒間隔のメッセージをcount件追加"""
+    start = start or datetime.utcnow() - timedelta(seconds=count)
+    docs = []
+    for index in range(count):
+        doc = message_model.build_message(
+            thread_id, 'user' if index % 2 == 0 else 'assistant', f'メッセージ{index}'
+        )
+        doc['created_at'] = start + timedelta(seconds=index)
+        docs.append(doc)
+    message_model.save_messages(thread_id, docs)
+    return docs
+
+
+def read_all(read_page):
+    """カーソルをたどって全ページを読む"""
+    items, cursor = [], None
+    while True:
+        page, cursor = read_page(cursor)
+        items.extend(page)
+        if not cursor:
+            return items
+
+
+class TestThreads:
+    """スレッドの保存・一覧のテスト"""
+
+    def test_pages_follow_updated_at_desc(self):
+        """一覧は更新日時の降順で、ページをまたいでも重複・欠落がないこと"""
+        created = [thread_model.create_thread(f'スレッド{i}') for i in range(7)]
+        time.sleep(0.002)
+        thread_model.touch_thread(created[2]['id'])
+
+        threads = read_all(lambda cursor: thread_model.get_threads(3, cursor))
+
+        ids = [thread['id'] for thread in threads]
+        assert ids[0] == created[2]['id']
+        assert sorted(ids) == sorted(thread['id'] for thread in created)
+        assert ids == [thread['id'] for thread in sorted(
+            threads, key=lambda t: (t['updated_at'], t['id']), reverse=True
+        )]
+
+    def test_title_filters(self):
+        """前方一致と大文字小文字を区別しない部分一致で絞り込めること"""
+        thread_model.create_thread('Python入門')
+        thread_model.create_thread('はじめてのpython')
+        thread_model.create_thread('料理')
+
+        prefixed, _ = thread_model.get_threads(10, title_prefix='Python')
+        matched, _ = thread_model.get_threads(10, query='PYTHON')
+
+        assert [t['title'] for t in prefixed] == ['Python入門']
+        assert {t['title'] for t in matched} == {'Python入門', 'はじめてのpython'}
+
+    def test_invalid_cursor_raises(self):
+        """不正なカーソルはValueErrorになること（ルートで400にする）"""
+        with pytest.raises(ValueError):
+            thread_model.get_threads(10, cursor='壊れたカーソル')
+
+    def test_update_summary_is_conditional(self):
+        """summarized_untilが変わっていたら要約を上書きしないこと"""
+        thread = thread_model.create_thread()
+        until = datetime(2025, 1, 1)
+
+        assert thread_model.update_summary(thread['id'], '要約1', until, None)
+        assert not thread_model.update_summary(thread['id'], '要約2', until, None)
+        assert thread_model.get_summary(thread['id'])['summary'] == '要約1'
+
+    def test_returned_documents_are_copies(self, memory_storage):
+        """返したドキュメントを書き換えても保存先に影響しないこと"""
+        thread = thread_model.create_thread('元のタイトル')
+        doc = memory_storage.threads.find(ObjectId(thread['id']), window=True)
+        doc['title'] = '書き換え'
+        doc['recent_messages'].append({'_id': ObjectId()})
+
+        assert thread_model.get_thread_by_id(thread['id'])['title'] == '元のタイトル'
+        stored = memory_storage.threads.find(ObjectId(thread['id']), window=True)
+        assert stored['recent_messages'] == []
+
+
+class TestMessages:
+    """メッセージの保存・ページ取得のテスト"""
+
+    def test_pages_before_and_after(self):
+        """before/afterのカーソルで古い方・新しい方へ読み進められること"""
+        thread = thread_model.create_thread()
+        docs = add_messages(thread['id'], 25)
+        expected = [str(doc['_id']) for doc in docs]
+
+        latest, cursor = message_model.get_messages_page(thread['id'], 10)
+        assert [m['id'] for m in latest] == expected[-10:]
+
+        pages, before = [], cursor
+        while before:
+            page, before = message_model.get_messages_page(thread['id'], 10, before=before)
+            pages.insert(0, page)
+        assert [m['id'] for page in pages for m in page] == expected[:-10]
+
+        newer, _ = message_model.get_messages_page(thread['id'], 100, after=cursor)
+        assert [m['id'] for m in newer] == expected[-9:]
+
+    def test_recent_messages_from_window(self):
+        """ウィンドウで足りる場合は埋め込みから、足りない場合は保存先から読むこと"""
+        thread = thread_model.create_thread()
+        docs = add_messages(thread['id'], config.THREAD_RECENT_MESSAGES + 5)
+
+        messages, cursor = message_model.get_recent_messages(thread['id'], 10)
+        assert [m['id'] for m in messages] == [str(doc['_id']) for doc in docs[-10:]]
+        assert cursor is not None
+
+        messages, _ = message_model.get_recent_messages(thread['id'])
+        assert len(messages) == len(docs)
+
+    def test_delete_and_pin_update_window(self, memory_storage):
+        """削除・ピン留めがウィンドウとメッセージ数に反映されること"""
+        thread = thread_model.create_thread()
+        first, second = add_messages(thread['id'], 2)
+
+        assert message_model.set_message_pinned(str(first['_id']), True)['pinned']
+        assert message_model.delete_message(str(second['_id']))
+
+        stored = memory_storage.threads.find(ObjectId(thread['id']), window=True)
+        assert stored['message_count'] == 1
+        assert [(m['_id'], m['pinned']) for m in stored['recent_messages']] == [
+            (first['_id'], True)
+        ]
+
+    def test_delete_does_not_make_count_negative(self, memory_storage):
+        """メッセージ数がずれていても、削除で負の値にならないこと"""
+        thread = thread_model.create_thread()
+        (doc,) = add_messages(thread['id'], 1)
+        memory_storage.threads.update(ObjectId(thread['id']), {'message_count': 0})
+
+        assert message_model.delete_message(str(doc['_id']))
+        assert thread_model.get_thread_by_id(thread['id'])['message_count'] == 0
+
+    def test_thread_list_preview(self, memory_storage, monkeypatch):
+        """一覧にメッセージ数と最新メッセージのプレビューが付き、削除すると1つ前に戻ること"""
+        monkeypatch.setattr(config, 'THREAD_RECENT_MESSAGES', 2)
+        monkeypatch.setattr(config, 'THREAD_PREVIEW_CHARS', 5)
+        thread = thread_model.create_thread()
+        docs = add_messages(thread['id'], 4)
+
+        listed = thread_model.get_threads(10)[0][0]
+        assert listed['message_count'] == 4
+        assert listed['last_message']['id'] == str(docs[3]['_id'])
+        assert listed['last_message']['preview'] == 'メッセージ'
+
+        # ウィンドウを使い切ったらメッセージから1つ前を探す
+        for doc in reversed(docs[1:]):
+            assert message_model.delete_message(str(doc['_id']))
+            previous = thread_model.get_thread_by_id(thread['id'])['last_message']
+            assert previous['id'] == str(docs[docs.index(doc) - 1]['_id'])
+
+        assert message_model.delete_message(str(docs[0]['_id']))
+        emptied = thread_model.get_thread_by_id(thread['id'])
+        assert (emptied['message_count'], emptied['last_message']) == (0, None)
+
+    def test_recount_messages(self, memory_storage):
+        """ずれたメッセージ数とプレビューを数え直せること"""
+        thread = thread_model.create_thread()
+        docs = add_messages(thread['id'], 3)
+        memory_storage.threads.update(
+            ObjectId(thread['id']), {'message_count': 99, 'last_message': None}
+        )
+
+        assert thread_model.recount_messages() == 1
+        repaired = thread_model.get_thread_by_id(thread['id'])
+        assert repaired['message_count'] == 3
+        assert repaired['last_message']['id'] == str(docs[2]['_id'])
+
+    def test_count_and_find_after(self):
+        """指定日時より後のメッセージを数え、取得できること"""
+        thread = thread_model.create_thread()
+        docs = add_messages(thread['id'], 6, start=datetime(2025, 1, 1))
+        after = docs[2]['created_at']
+
+        assert message_model.count_messages_after(thread['id'], after, 10) == 3
+        assert message_model.count_messages_after(thread['id'], None, 4) == 4
+        assert [m['content'] for m in message_model.get_messages_after(thread['id'], after, 2)] == [
+            'メッセージ3', 'メッセージ4'
+        ]
+
+    def test_save_to_deleted_thread_is_rolled_back(self, memory_storage):
+        """削除済みのスレッドに保存したメッセージは取り消されること"""
+        thread = thread_model.create_thread()
+        thread_model.delete_thread(thread['id'])
+
+        message = message_model.build_message(thread['id'], 'user', '孤立しない')
+        _, updated = message_model.save_messages(thread['id'], [message])
+
+        assert updated is None
+        assert memory_storage.messages.find_all(ObjectId(thread['id'])) == []
+
+
+class TestSaveMessages:
+    """save_messagesのテスト"""
+
+    def test_saves_turn_and_returns_touched_thread(self, monkeypatch):
+        """ユーザーメッセージとAI応答をまとめて保存し、touch_threadの結果を返すこと"""
+        touched = []
+        touch_thread = thread_model.touch_thread
+
+        def record_touch(*args, **kwargs):
+            touched.append(touch_thread(*args, **kwargs))
+            return touched[-1]
+
+        monkeypatch.setattr(thread_model, 'touch_thread', record_touch)
+
+        thread = thread_model.create_thread()
+        user_doc = message_model.build_message(thread['id'], 'user', '質問')
+        assistant_doc = message_model.build_message(thread['id'], 'assistant', '回答')
+        assistant_doc['created_at'] = user_doc['created_at'] + timedelta(seconds=1)
+        (user_message, assistant_message), updated = message_model.save_messages(
+            thread['id'], [user_doc, assistant_doc]
+        )
+
+        assert len(touched) == 1
+        assert updated is touched[0]
+        assert updated['message_count'] == 2
+        assert updated['last_message']['id'] == assistant_message['id']
+        assert [user_message['id'], assistant_message['id']] == [
+            str(user_doc['_id']), str(assistant_doc['_id'])
+        ]
+        messages = message_model.get_messages_by_thread(thread['id'])
+        assert [m['content'] for m in messages] == ['質問', '回答']
+
+    def test_failed_ai_call_saves_only_user_message(self, monkeypatch):
+        """AI応答の生成に失敗した場合はユーザーメッセージだけを保存すること"""
+        flask = pytest.importorskip('flask')
+        from index import app
+        from services.gemini_service import gemini_service
+
+        def fail(*args, **kwargs):
+            raise RuntimeError('Gemini unavailable')
+
+        monkeypatch.setattr(gemini_service, 'generate_response', fail)
+        assert flask
+
+        thread = thread_model.create_thread()
+        response = app.test_client().post(
+            f"/api/threads/{thread['id']}/messages", json={'content': '届かない質問'}
+        )
+
+        assert response.status_code == 500
+        data = response.get_json()
+        assert data['user_message']['content'] == '届かない質問'
+        messages = message_model.get_messages_by_thread(thread['id'])
+        assert [(m['role'], m['content']) for m in messages] == [('user', '届かない質問')]
+        assert thread_model.get_thread_by_id(thread['id'])['message_count'] == 1
+
+
+class TestThreadContext:
+    """get_thread_contextのテスト"""
+
+    def test_unknown_thread_returns_none(self):
+        """存在しないスレッド・不正なIDにはNoneを返すこと"""
+        assert message_model.get_thread_context(str(ObjectId())) is None
+        assert message_model.get_thread_context('invalid') is None
+
+    def test_history_is_same_from_every_source(self, monkeypatch):
+        """ウィンドウ・保存先・キャッシュのどれから読んでも同じ履歴になること"""
+        monkeypatch.setattr(config, 'THREAD_RECENT_MESSAGES', 4)
+        thread = thread_model.create_thread()
+        docs = add_messages(thread['id'], 8)
+        message_model.set_message_pinned(str(docs[2]['_id']), True)
+
+        # ウィンドウに収まらないため、1回目は保存先から、2回目はキャッシュから読む
+        contexts = [message_model.get_thread_context(thread['id']) for _ in range(2)]
+        expected = [doc['content'] for doc in docs]
+        for context in contexts:
+            assert context['thread']['id'] == thread['id']
+            assert context['summary'] is None
+            assert [entry['content'] for entry in context['history']] == expected
+
+    def test_cache_sees_writes_from_other_workers(self, memory_storage):
+        """他のワーカーが保存したメッセージも、次の読み込みで履歴に含まれること"""
+        thread = thread_model.create_thread()
+        add_messages(thread['id'], 2)
+        assert len(message_model.get_thread_context(thread['id'])['history']) == 2
+
+        # 別プロセスの書き込み（このプロセスのキャッシュには追加されない）
+        doc = message_model.build_message(thread['id'], 'user', '別のワーカー')
+        memory_storage.messages.insert_many(ObjectId(thread['id']), [doc])
+        memory_storage.threads.touch(ObjectId(thread['id']), [doc])
+
+        history = message_model.get_thread_context(thread['id'])['history']
+        assert [entry['content'] for entry in history][-1] == '別のワーカー'
+
+    def test_short_thread_uses_window(self, memory_storage, monkeypatch):
+        """ウィンドウが会話全体を含めば、メッセージの保存先を読まないこと"""
+        thread = thread_model.create_thread()
+        docs = add_messages(thread['id'], 4)
+        history_cache.clear()
+        monkeypatch.setattr(memory_storage.messages, 'context_sources', pytest.fail)
+
+        context = message_model.get_thread_context(thread['id'])
+        assert [entry['id'] for entry in context['history']] == [doc['_id'] for doc in docs]
+
+
+class TestReaper:
+    """後片付けのテスト"""
+
+    def test_reap_deleted_threads(self, memory_storage):
+        """墓標の付いたスレッドのメッセージと本体が消えること"""
+        thread = thread_model.create_thread()
+        add_messages(thread['id'], 5)
+        thread_model.delete_thread(thread['id'])
+
+        stats = thread_reaper.reap_deleted_threads()
+
+        assert stats == {'threads': 1, 'messages': 5}
+        assert memory_storage.threads.find_existing_ids([ObjectId(thread['id'])]) == set()
+
+    def test_sweep_orphans_and_checkpoint(self, memory_storage, monkeypatch):
+        """スレッドのないメッセージを消し、最後まで確認したら進捗を消すこと"""
+        monkeypatch.setattr(thread_reaper, 'orphan_scan_size', 1)
+        kept = thread_model.create_thread()
+        add_messages(kept['id'], 2)
+        orphan_oid = ObjectId()
+        memory_storage.messages.insert_many(orphan_oid, [
+            message_model.build_message(str(orphan_oid), 'user', '孤立')
+        ])
+
+        first = thread_reaper.sweep_orphans(max_scans=1)
+        assert memory_storage.load_checkpoint('orphan_sweep') != {}
+
+        rest = thread_reaper.sweep_orphans()
+        assert first['messages'] + rest['messages'] == 1
+        assert memory_storage.messages.find_thread_ids(None, 10) == [ObjectId(kept['id'])]
+        assert memory_storage.load_checkpoint('orphan_sweep') == {}
+
+
+class TestHotPaths:
+    """ホットパスの回帰テスト（MongoDBを使わずミリ秒単位で計測）"""
+
+    def test_hot_paths_within_budget(self):
+        """主な操作のp95が上限時間内に収まること"""
+        results = measure(thread_count=1000, message_count=1000, repeat=30)
+
+        over = {
+            name: round(stats['p95_ms'], 3)
+            for name, stats in results.items()
+            if stats['p95_ms'] > HOTPATH_BUDGET_MS
+        }
+        assert over == {}, (
+            f"p95が上限 {HOTPATH_BUDGET_MS} ms を超えました: {over}"
+            "（python benchmark_hotpaths.py で確認）"
+        )
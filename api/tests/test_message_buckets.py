@@ -0,0 +1,108 @@
+"""
+メッセージのバケット保存のテスト
+"""
+from datetime import datetime, timedelta
+import pytest
+from bson import ObjectId
+from models import message_buckets
+from models.pagination import encode_cursor
+
+START = datetime(2025, 1, 1)
+
+
+class FakeCursor(list):
+    """sortとcloseだけを持つテスト用のカーソル"""
+
+    def sort(self, keys):
+        for field, direction in reversed(keys):
+            super().sort(key=lambda doc: doc[field], reverse=direction < 0)
+        return self
+
+    def close(self):
+        pass
+
+
+class FakeBuckets:
+    """thread_idと日時の範囲条件だけを解釈するテスト用のコレクション"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+
+    def find(self, query, projection=None):
+        def matches(bucket):
+            if bucket['thread_id'] != query['thread_id']:
+                return False
+            if 'first_at' in query and bucket['first_at'] > query['first_at']['$lte']:
+                return False
+            if 'last_at' in query and bucket['last_at'] < query['last_at']['$gte']:
+                return False
+            return True
+        return FakeCursor(b for b in self.buckets if matches(b))
+
+
+def make_bucket(thread_oid, seconds):
+    """指定した秒数の位置にメッセージを持つバケットを作成"""
+    messages = [
+        {
+            '_id': ObjectId(),
+            'role': 'user',
+            'content': f'メッセージ{s}',
+            'pinned': False,
+            'created_at': START + timedelta(seconds=s)
+        }
+        for s in seconds
+    ]
+    return {
+        '_id': ObjectId(),
+        'thread_id': thread_oid,
+        'messages': messages,
+        'first_at': messages[0]['created_at'],
+        'last_at': messages[-1]['created_at']
+    }
+
+
+@pytest.fixture
+def thread_oid(monkeypatch):
+    """時間範囲が重なるバケットを持つスレッド"""
+    thread_oid = ObjectId()
+    buckets = [
+        make_bucket(thread_oid, [0, 1, 2, 5]),
+        # 同時書き込みで作られた、範囲が重なるバケット
+        make_bucket(thread_oid, [3, 4, 6]),
+        make_bucket(thread_oid, [7, 8]),
+    ]
+    monkeypatch.setattr(message_buckets, 'get_collection', lambda: FakeBuckets(buckets))
+    return thread_oid
+
+
+def contents(messages):
+    return [msg['content'] for msg in messages]
+
+
+def test_iterates_in_order_across_overlapping_buckets(thread_oid):
+    """バケットの範囲が重なっていても作成日時順に返すこと"""
+    newest_first = contents(message_buckets.iter_messages(thread_oid))
+    assert newest_first == [f'メッセージ{s}' for s in range(8, -1, -1)]
+    assert contents(message_buckets.find_all(thread_oid)) == [f'メッセージ{s}' for s in range(9)]
+
+
+def test_find_page_with_cursor(thread_oid):
+    """カーソルより古い・新しいメッセージをlimit件まで返すこと"""
+    all_messages = message_buckets.find_all(thread_oid)
+    pivot = all_messages[5]
+    cursor = encode_cursor(pivot['created_at'], pivot['_id'])
+
+    older = message_buckets.find_page(thread_oid, 3, before=cursor)
+    assert contents(older) == ['メッセージ4', 'メッセージ3', 'メッセージ2']
+
+    newer = message_buckets.find_page(thread_oid, 2, after=cursor)
+    assert contents(newer) == ['メッセージ6', 'メッセージ7']
+
+
+def test_find_after(thread_oid):
+    """指定日時より後のメッセージを昇順で返すこと"""
+    after = START + timedelta(seconds=5)
+    assert contents(message_buckets.find_after(thread_oid, after, 10)) == [
+        'メッセージ6', 'メッセージ7', 'メッセージ8'
+    ]
+    assert message_buckets.count_after(thread_oid, after, 10) == 3
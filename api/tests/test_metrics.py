@@ -0,0 +1,106 @@
+"""
+メトリクス（Prometheus形式）のテスト
+"""
+import time
+from types import SimpleNamespace
+from services.metrics import MetricsRegistry, MongoCommandMetrics, mongo_command_duration
+
+# 記録1回あたりの上限（同じ引数で何もしない関数を呼ぶ時間の倍率）
+# 実時間ではなく同じマシンでの比で判定するため、CIの負荷に左右されない（通常は10倍未満）
+OBSERVE_OVERHEAD_RATIO = 50
+
+
+def best_time(record, iterations=20000, rounds=3):
+    """ヒストグラムとカウンタを1回ずつ記録するループの最短時間（秒）"""
+    observe, inc = record
+    times = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        for _ in range(iterations):
+            observe(0.01, 'GET', '/api/threads', '200')
+            inc('/api/threads')
+        times.append(time.perf_counter() - started)
+    return min(times)
+
+
+def noop(*labels):
+    """記録の代わりに呼ぶ何もしない関数"""
+
+
+class TestRegistry:
+    """カウンタ・ヒストグラムとテキスト形式のテスト"""
+
+    def test_renders_cumulative_buckets(self):
+        """バケットは累積値で、_sumと_countを出力すること"""
+        registry = MetricsRegistry()
+        histogram = registry.histogram('latency_seconds', 'テスト', ('route',), buckets=(0.1, 1))
+        histogram.observe(0.05, '/a')
+        histogram.observe(0.5, '/a')
+        histogram.observe(5, '/a')
+
+        lines = registry.render().splitlines()
+        assert '# TYPE latency_seconds histogram' in lines
+        assert 'latency_seconds_bucket{route="/a",le="0.1"} 1' in lines
+        assert 'latency_seconds_bucket{route="/a",le="1"} 2' in lines
+        assert 'latency_seconds_bucket{route="/a",le="+Inf"} 3' in lines
+        assert 'latency_seconds_sum{route="/a"} 5.55' in lines
+        assert 'latency_seconds_count{route="/a"} 3' in lines
+
+    def test_counter_escapes_label_values(self):
+        """ラベル値の引用符とバックスラッシュをエスケープすること"""
+        registry = MetricsRegistry()
+        counter = registry.counter('errors_total', 'テスト', ('message',))
+        counter.inc('say "hi"\\')
+        counter.inc('say "hi"\\', amount=2)
+
+        assert 'errors_total{message="say \\"hi\\"\\\\"} 3' in registry.render().splitlines()
+
+    def test_observe_overhead(self):
+        """1回の記録が関数呼び出し数回分で済むこと"""
+        registry = MetricsRegistry()
+        histogram = registry.histogram('latency_seconds', 'テスト', ('method', 'route', 'status'))
+        counter = registry.counter('requests_total', 'テスト', ('route',))
+
+        baseline = best_time((noop, noop))
+        recorded = best_time((histogram.observe, counter.inc))
+
+        assert recorded < baseline * OBSERVE_OVERHEAD_RATIO, (
+            f"記録の時間が何もしない呼び出しの{recorded / baseline:.1f}倍です"
+        )
+
+
+class TestMongoCommandMetrics:
+    """pymongoのコマンド監視のテスト"""
+
+    def test_records_command_with_collection(self):
+        """開始イベントのコレクション名を完了イベントの記録に使うこと"""
+        listener = MongoCommandMetrics()
+        before = mongo_command_duration.count('find', 'threads', 'ok')
+
+        listener.started(SimpleNamespace(
+            command={'find': 'threads', 'filter': {}},
+            command_name='find', request_id=1, connection_id=('localhost', 27017)
+        ))
+        listener.succeeded(SimpleNamespace(
+            command_name='find', request_id=1, connection_id=('localhost', 27017),
+            duration_micros=1500
+        ))
+
+        assert mongo_command_duration.count('find', 'threads', 'ok') == before + 1
+        assert listener._collections == {}
+
+    def test_get_more_uses_collection_field(self):
+        """getMoreはcollectionフィールドからコレクション名を取ること"""
+        listener = MongoCommandMetrics()
+        before = mongo_command_duration.count('getMore', 'messages', 'error')
+
+        listener.started(SimpleNamespace(
+            command={'getMore': 12345, 'collection': 'messages'},
+            command_name='getMore', request_id=2, connection_id=('localhost', 27017)
+        ))
+        listener.failed(SimpleNamespace(
+            command_name='getMore', request_id=2, connection_id=('localhost', 27017),
+            duration_micros=800
+        ))
+
+        assert mongo_command_duration.count('getMore', 'messages', 'error') == before + 1
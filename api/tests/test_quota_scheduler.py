@@ -0,0 +1,96 @@
+"""
+Gemini APIクォータスケジューラーのテスト
+"""
+import math
+import pytest
+from services.quota_scheduler import (
+    FileBucketStore,
+    MemoryBucketStore,
+    QuotaExceeded,
+    QuotaScheduler,
+    take_tokens,
+)
+
+LIMITS = {'rpm': 2, 'tpm': 1000, 'rpd': 10}
+
+
+class TestTakeTokens:
+    """take_tokensのテスト"""
+
+    def test_consumes_when_available(self):
+        """枠があれば消費して待ち時間0を返すこと"""
+        state, wait = take_tokens(None, LIMITS, {'rpm': 1, 'tpm': 100, 'rpd': 1}, now=0)
+        assert wait == 0
+        assert state['rpm']['tokens'] == 1
+        assert state['tpm']['tokens'] == 900
+
+    def test_waits_until_refill(self):
+        """枠が足りなければ補充までの秒数を返し、消費しないこと"""
+        state = {
+            'rpm': {'tokens': 0.0, 'updated': 0},
+            'tpm': {'tokens': 1000.0, 'updated': 0},
+            'rpd': {'tokens': 10.0, 'updated': 0},
+        }
+        new_state, wait = take_tokens(state, LIMITS, {'rpm': 1, 'tpm': 100, 'rpd': 1}, now=0)
+        # 2 requests/minute → 1リクエスト分の補充に30秒
+        assert wait == pytest.approx(30)
+        assert new_state['tpm']['tokens'] == 1000
+
+    def test_refills_over_time(self):
+        """時間経過で上限まで補充されること"""
+        state = {'rpm': {'tokens': 0.0, 'updated': 0}}
+        new_state, wait = take_tokens(state, {'rpm': 2}, {'rpm': 1}, now=600)
+        assert wait == 0
+        assert new_state['rpm']['tokens'] == 1
+
+    def test_request_larger_than_limit(self):
+        """上限を超える要求は待っても通らないこと"""
+        _, wait = take_tokens(None, LIMITS, {'tpm': 5000}, now=0)
+        assert math.isinf(wait)
+
+
+class TestQuotaScheduler:
+    """QuotaSchedulerのテスト"""
+
+    @pytest.fixture
+    def scheduler(self, monkeypatch):
+        """上限の小さいスケジューラー"""
+        from config import config
+        monkeypatch.setattr(config, 'GEMINI_QUOTA_LIMITS', {'test-model': LIMITS})
+        scheduler = QuotaScheduler(store=MemoryBucketStore())
+        scheduler.max_wait = 0
+        return scheduler
+
+    def test_fail_fast_with_retry_after(self, scheduler):
+        """待てない場合はRetry-After付きで即座に失敗すること"""
+        scheduler.acquire('test-model', 10)
+        scheduler.acquire('test-model', 10)
+
+        with pytest.raises(QuotaExceeded) as exc_info:
+            scheduler.acquire('test-model', 10)
+        assert exc_info.value.retry_after > 0
+        assert int(exc_info.value.retry_after_header) >= 1
+
+    def test_file_store_is_shared(self, tmp_path, monkeypatch):
+        """ファイルストアの状態が別インスタンスからも見えること"""
+        from config import config
+        monkeypatch.setattr(config, 'GEMINI_QUOTA_LIMITS', {'test-model': LIMITS})
+        path = str(tmp_path / 'quota.json')
+
+        first = QuotaScheduler(store=FileBucketStore(path))
+        second = QuotaScheduler(store=FileBucketStore(path))
+        first.max_wait = second.max_wait = 0
+
+        first.acquire('test-model', 10)
+        second.acquire('test-model', 10)
+        with pytest.raises(QuotaExceeded):
+            first.acquire('test-model', 10)
+
+    def test_falls_back_to_memory_without_file_lock(self, monkeypatch):
+        """fcntlのない環境（Windowsなど）ではプロセス内のストアを使うこと"""
+        import sys
+        from config import config
+        monkeypatch.setattr(config, 'GEMINI_QUOTA_STORE', 'file')
+        monkeypatch.setitem(sys.modules, 'fcntl', None)
+
+        assert isinstance(QuotaScheduler().store, MemoryBucketStore)
@@ -0,0 +1,108 @@
+"""
+スレッドに埋め込んだ直近メッセージのテスト
+"""
+from datetime import datetime, timedelta
+from bson import ObjectId
+from models.message import history_from_window, messages_from_window
+from repositories.base import preview_entry, window_entry
+from repositories.mongo import build_recount_pipeline, build_remove_update, build_touch_update
+
+
+def make_window(count):
+    """作成日時の昇順に並んだウィンドウを作成"""
+    start = datetime(2025, 1, 1)
+    return [
+        {
+            '_id': ObjectId(),
+            'role': 'user' if i % 2 == 0 else 'assistant',
+            'content': f'メッセージ{i}',
+            'pinned': False,
+            'created_at': start + timedelta(seconds=i)
+        }
+        for i in range(count)
+    ]
+
+
+def make_thread(window, message_count, recent_window=True):
+    thread = {
+        '_id': ObjectId(),
+        'recent_messages': window,
+        'message_count': message_count
+    }
+    if recent_window:
+        thread['recent_window'] = True
+    return thread
+
+
+class TestMessagesFromWindow:
+    """messages_from_windowのテスト"""
+
+    def test_returns_whole_short_thread(self):
+        """ウィンドウが会話全体を含めば全件を返すこと"""
+        window = make_window(4)
+        messages, next_cursor = messages_from_window(make_thread(window, 4))
+        assert [m['content'] for m in messages] == [m['content'] for m in window]
+        assert next_cursor is None
+
+    def test_latest_page_of_long_thread(self):
+        """長い会話でも最新ページはウィンドウから返し、続きのカーソルを付けること"""
+        window = make_window(10)
+        messages, next_cursor = messages_from_window(make_thread(window, 100), limit=3)
+        assert [m['content'] for m in messages] == ['メッセージ7', 'メッセージ8', 'メッセージ9']
+        assert next_cursor is not None
+
+    def test_falls_back_when_window_is_not_enough(self):
+        """ウィンドウで足りない場合と、ウィンドウ導入前のスレッドはNoneを返すこと"""
+        window = make_window(10)
+        assert messages_from_window(make_thread(window, 100)) is None
+        assert messages_from_window(make_thread(window, 100), limit=20) is None
+        assert messages_from_window(make_thread(window, 10, recent_window=False)) is None
+
+
+class TestHistoryFromWindow:
+    """history_from_windowのテスト"""
+
+    def test_builds_history_for_short_thread(self):
+        """ウィンドウが会話全体を含めば会話履歴を作ること"""
+        window = make_window(4)
+        history = history_from_window(make_thread(window, 4))
+        assert [entry['id'] for entry in history] == [m['_id'] for m in window]
+
+    def test_long_thread_needs_messages_collection(self):
+        """ウィンドウ外にメッセージがあればNoneを返すこと"""
+        assert history_from_window(make_thread(make_window(4), 5)) is None
+
+
+def test_touch_update_caps_window():
+    """メッセージの追加は$sliceで件数を制限し、メッセージ数とversionを加算すること"""
+    messages = make_window(2)
+    update = build_touch_update(messages)
+    assert update['$push']['recent_messages']['$each'] == [window_entry(m) for m in messages]
+    assert update['$push']['recent_messages']['$slice'] < 0
+    assert update['$inc'] == {'message_count': 2, 'version': 1}
+    assert update['$set']['last_message'] == preview_entry(messages[-1])
+    assert '$push' not in build_touch_update()
+
+
+def test_remove_update_never_goes_negative():
+    """メッセージの削除はウィンドウから取り除き、メッセージ数を0で止めること"""
+    message_oid = ObjectId()
+    update = build_remove_update(message_oid)[0]['$set']
+    assert update['message_count'] == {
+        '$max': [{'$subtract': [{'$ifNull': ['$message_count', 0]}, 1]}, 0]
+    }
+    window = update['recent_messages']['$cond']
+    assert window[1]['$filter']['cond'] == {'$ne': ['$$this._id', message_oid]}
+    assert window[2] == '$$REMOVE'
+
+
+def test_recount_pipeline_merges_into_threads():
+    """数え直しは1回の集計でメッセージ（バケットは展開して）を読み、threadsに書き戻すこと"""
+    pipeline = build_recount_pipeline()
+    assert pipeline[1]['$lookup']['from'] == 'messages'
+    assert pipeline[-1]['$merge']['into'] == 'threads'
+    assert pipeline[-1]['$merge']['whenNotMatched'] == 'discard'
+
+    buckets = build_recount_pipeline(buckets=True)
+    assert buckets[1]['$lookup']['from'] == 'message_buckets'
+    assert buckets[1]['$lookup']['pipeline'][0] == {'$unwind': '$messages'}
@@ -0,0 +1,72 @@
+"""
+AI応答キャッシュのテスト
+"""
+import pytest
+from services.db_service import db_service
+from services.response_cache import ResponseCache, bypass_requested, make_cache_key
+
+MESSAGES = [{'role': 'user', 'content': 'はじめに何をすればいいですか？'}]
+
+
+class FakeCollection:
+    """replace_oneだけを受け付けるテスト用のコレクション"""
+
+    def replace_one(self, *args, **kwargs):
+        pass
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    """MongoDB層を切り離したキャッシュ"""
+    monkeypatch.setattr(db_service, 'get_collection', lambda name: FakeCollection())
+    cache = ResponseCache()
+    cache.max_entries = 2
+    monkeypatch.setattr(cache, '_find', lambda key: None)
+    return cache
+
+
+class TestCacheKey:
+    """make_cache_keyのテスト"""
+
+    def test_normalizes_whitespace_and_width(self):
+        """前後の空白や全角英数字の違いは同じキーになること"""
+        a = make_cache_key('m', None, [{'role': 'user', 'content': 'ＡＢＣ '}])
+        b = make_cache_key('m', '', [{'role': 'user', 'content': 'ABC'}])
+        assert a == b
+
+    def test_distinguishes_model_and_summary(self):
+        """モデルや要約が異なれば別のキーになること"""
+        base = make_cache_key('m', None, MESSAGES)
+        assert make_cache_key('other', None, MESSAGES) != base
+        assert make_cache_key('m', '要約', MESSAGES) != base
+
+
+class TestResponseCache:
+    """ResponseCacheのテスト"""
+
+    def test_hit_counts_tokens_saved(self, cache):
+        """ヒット時に応答を返し、節約したトークン数を集計すること"""
+        cache.put('k', '応答', tokens=120)
+        assert cache.get('k') == '応答'
+        assert cache.get('missing') is None
+
+        stats = cache.stats()
+        assert stats['memory_hits'] == 1
+        assert stats['misses'] == 1
+        assert stats['hit_rate'] == 0.5
+        assert stats['tokens_saved'] == 120
+
+    def test_evicts_least_recently_used(self, cache):
+        """件数上限を超えると最も古く使われた応答を追い出すこと"""
+        cache.put('a', 'A')
+        cache.put('b', 'B')
+        cache.get('a')
+        cache.put('c', 'C')
+        assert cache.get('b') is None
+        assert cache.get('a') == 'A'
+
+    def test_bypass_header(self):
+        """迂回ヘッダーの値を判定すること"""
+        assert bypass_requested({'X-Cache-Bypass': '1'})
+        assert bypass_requested({'X-Cache-Bypass': 'true'})
+        assert not bypass_requested({})
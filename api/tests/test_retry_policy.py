@@ -0,0 +1,185 @@
+"""
+Gemini APIのリトライ・フォールバックのテスト
+"""
+import pytest
+from config import config
+from services.gemini_service import GeminiService
+from services.metrics import gemini_rate_limited, gemini_request_duration, gemini_retries
+from services.quota_scheduler import MemoryBucketStore, QuotaExceeded, quota_scheduler
+from services.response_cache import response_cache
+from services.retry_policy import is_retryable, retry_after
+
+
+class FakeAPIError(Exception):
+    """genaiのAPIErrorと同じ属性を持つテスト用の例外"""
+
+    def __init__(self, code, details=None):
+        super().__init__(f"{code} error")
+        self.code = code
+        self.details = details
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+        self.usage_metadata = None
+
+
+class FakeModels:
+    """モデルごとに用意した結果を順に返すgenerate_content"""
+
+    def __init__(self, outcomes):
+        self.outcomes = outcomes
+        self.calls = []
+
+    def generate_content(self, model, contents, config=None):
+        self.calls.append(model)
+        outcome = self.outcomes[model].pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return FakeResponse(outcome)
+
+    def generate_content_stream(self, model, contents, config=None):
+        return iter([self.generate_content(model, contents, config)])
+
+
+class FakeClient:
+    def __init__(self, outcomes):
+        self.models = FakeModels(outcomes)
+
+
+@pytest.fixture
+def retry_config(monkeypatch):
+    """待ち時間なしでリトライするための設定"""
+    monkeypatch.setattr(config, 'GEMINI_QUOTA_ENABLED', False)
+    monkeypatch.setattr(config, 'GEMINI_FALLBACK_MODELS', ['fallback'])
+    monkeypatch.setattr(config, 'GEMINI_MAX_RETRIES', 2)
+    monkeypatch.setattr(config, 'GEMINI_RETRY_BASE_DELAY', 0)
+    monkeypatch.setattr(config, 'GEMINI_REQUEST_DEADLINE', 5)
+
+
+def make_service(outcomes):
+    """APIクライアントを差し替えたGeminiServiceを作成"""
+    service = GeminiService.__new__(GeminiService)
+    service.model_id = 'primary'
+    service.client = FakeClient(outcomes)
+    return service
+
+
+MESSAGES = [{'role': 'user', 'content': 'こんにちは'}]
+
+
+class TestRetryPolicy:
+    """エラー分類のテスト"""
+
+    def test_classifies_status_codes(self):
+        """429/5xxはリトライし、それ以外の4xxはリトライしないこと"""
+        assert is_retryable(FakeAPIError(429))
+        assert is_retryable(FakeAPIError(503))
+        assert not is_retryable(FakeAPIError(400))
+        assert not is_retryable(FakeAPIError(403))
+
+    def test_reads_retry_delay(self):
+        """RetryInfoのretryDelayを秒数として読み取ること"""
+        details = {'error': {'details': [
+            {'@type': 'type.googleapis.com/google.rpc.RetryInfo', 'retryDelay': '12s'}
+        ]}}
+        assert retry_after(FakeAPIError(429, details)) == 12.0
+        assert retry_after(FakeAPIError(429)) is None
+
+
+class TestFallbackChain:
+    """GeminiServiceのリトライ・フォールバックのテスト"""
+
+    def test_retries_server_errors(self, retry_config):
+        """503は同じモデルでリトライすること"""
+        service = make_service({'primary': [FakeAPIError(503), 'ok']})
+        assert service.generate_response(MESSAGES) == 'ok'
+        assert service.client.models.calls == ['primary', 'primary']
+
+    def test_falls_back_when_rate_limited(self, retry_config):
+        """429は次のモデルに切り替えること"""
+        service = make_service({'primary': [FakeAPIError(429)], 'fallback': ['ok']})
+        assert service.generate_response(MESSAGES) == 'ok'
+        assert service.client.models.calls == ['primary', 'fallback']
+
+    def test_does_not_retry_client_errors(self, retry_config):
+        """400はリトライもフォールバックもしないこと"""
+        service = make_service({'primary': [FakeAPIError(400)], 'fallback': ['ok']})
+        with pytest.raises(Exception, match='AI応答の生成に失敗しました'):
+            service.generate_response(MESSAGES)
+        assert service.client.models.calls == ['primary']
+
+    def test_rate_limited_everywhere_raises_quota_exceeded(self, retry_config, monkeypatch):
+        """すべてのモデルが429ならQuotaExceededを送出すること"""
+        monkeypatch.setattr(config, 'GEMINI_MAX_RETRIES', 0)
+        service = make_service({
+            'primary': [FakeAPIError(429)],
+            'fallback': [FakeAPIError(429)],
+        })
+        with pytest.raises(QuotaExceeded):
+            service.generate_response(MESSAGES)
+
+    def test_records_retry_and_rate_limit_metrics(self, retry_config):
+        """リトライ・429・呼び出しごとの所要時間がメトリクスに記録されること"""
+        retries = gemini_retries.value('primary')
+        rate_limited = gemini_rate_limited.value('primary')
+        calls = gemini_request_duration.count('primary', 'generate', '503')
+
+        service = make_service({'primary': [FakeAPIError(503), FakeAPIError(429)], 'fallback': ['ok']})
+        assert service.generate_response(MESSAGES) == 'ok'
+
+        assert gemini_retries.value('primary') == retries + 1
+        assert gemini_rate_limited.value('primary') == rate_limited + 1
+        assert gemini_request_duration.count('primary', 'generate', '503') == calls + 1
+
+    def test_retries_reuse_quota_and_release_tokens(self, retry_config, monkeypatch):
+        """リトライは確保済みの枠を使い、切り替えたモデルのトークンは返すこと"""
+        monkeypatch.setattr(config, 'GEMINI_QUOTA_ENABLED', True)
+        monkeypatch.setattr(config, 'GEMINI_QUOTA_LIMITS', {})
+        monkeypatch.setattr(
+            config, 'GEMINI_QUOTA_DEFAULT_LIMITS', {'rpm': 100, 'tpm': 100000, 'rpd': 100}
+        )
+        store = MemoryBucketStore()
+        monkeypatch.setattr(quota_scheduler, 'store', store)
+
+        service = make_service({
+            'primary': [FakeAPIError(503), FakeAPIError(503), FakeAPIError(503)],
+            'fallback': ['ok'],
+        })
+        assert service.generate_response(MESSAGES) == 'ok'
+
+        primary = store.transact('primary', lambda state: (state, state))
+        assert primary['rpd']['tokens'] == 99
+        assert primary['tpm']['tokens'] == pytest.approx(100000, abs=1)
+        assert store.transact('fallback', lambda state: (state, state))['rpd']['tokens'] == 99
+
+
+class TestFallbackCaching:
+    """フォールバック時の応答キャッシュのテスト"""
+
+    @pytest.fixture
+    def stored(self, retry_config, monkeypatch):
+        """応答キャッシュに格納されたキーを記録する"""
+        stored = []
+        monkeypatch.setattr(response_cache, 'enabled', True)
+        monkeypatch.setattr(response_cache, 'get', lambda key: None)
+        monkeypatch.setattr(response_cache, 'put', lambda key, text, tokens: stored.append(key))
+        return stored
+
+    def test_caches_primary_model_response(self, stored):
+        """主モデルの応答は主モデルのキーで格納すること"""
+        service = make_service({'primary': ['ok', 'ok']})
+        assert service.generate_response(MESSAGES) == 'ok'
+        assert ''.join(service.generate_response_stream(MESSAGES)) == 'ok'
+        assert stored == [service._cache_key(MESSAGES, None)] * 2
+
+    def test_does_not_cache_fallback_response(self, stored):
+        """フォールバック先の応答は主モデルのキーで格納しないこと"""
+        service = make_service({
+            'primary': [FakeAPIError(429), FakeAPIError(429)],
+            'fallback': ['ok', 'ok'],
+        })
+        assert service.generate_response(MESSAGES) == 'ok'
+        assert ''.join(service.generate_response_stream(MESSAGES)) == 'ok'
+        assert stored == []
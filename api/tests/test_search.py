@@ -0,0 +1,203 @@
+"""
+全文検索（トークン化・インメモリの検索・スニペット）のテスト
+MongoDB版はパイプラインの形だけを確認する
+"""
+from datetime import datetime, timedelta
+import pytest
+from bson import ObjectId
+from config import config
+from models import message as message_model
+from models import search as search_model
+from models import thread as thread_model
+from models.pagination import encode_score_cursor
+from repositories import get_storage, reset_storage
+from repositories.mongo import build_search_pipeline
+from services.history_cache import history_cache
+from services.search_tokenizer import (
+    QueryTooShort,
+    highlight,
+    normalize,
+    query_terms,
+    tokenize,
+)
+from services.thread_reaper import thread_reaper
+from services.write_behind import write_behind
+
+
+@pytest.fixture(autouse=True)
+def memory_storage(monkeypatch):
+    """空のインメモリの保存先に切り替える"""
+    monkeypatch.setattr(config, 'STORAGE_BACKEND', 'memory')
+    # 台帳・全文検索は保存と同時に書き込む（後回しはtest_write_behindで確認する）
+    monkeypatch.setattr(write_behind, 'enabled', False)
+    reset_storage()
+    history_cache.clear()
+    yield get_storage()
+    reset_storage()
+    history_cache.clear()
+
+
+def post(thread_id, *contents):
+    """ユーザーとAIのメッセージを交互に保存（作成日時は1秒ずつずらす）"""
+    start = datetime.utcnow()
+    docs = []
+    for index, content in enumerate(contents):
+        role = 'user' if index % 2 == 0 else 'assistant'
+        doc = message_model.build_message(thread_id, role, content)
+        doc['created_at'] = start + timedelta(seconds=index)
+        docs.append(doc)
+    saved, _ = message_model.save_messages(thread_id, docs)
+    return saved
+
+
+class TestTokenizer:
+    """n-gramのトークン化のテスト"""
+
+    def test_tokenize_japanese_and_words(self):
+        """日本語はbigramと漢字1文字、英数字は単語になり、全角・大文字を揃えること"""
+        text = normalize('東京都のＰｙｔｈｏｎ勉強会')
+
+        assert tokenize(text) == [
+            '東京', '京都', '都の', '東', '京', '都', 'python', '勉強', '強会', '勉', '強', '会',
+        ]
+
+    def test_query_terms(self):
+        """検索語は2文字以上の連続をbigramだけにし、重複を除くこと"""
+        assert query_terms('東京 東京タワー') == ['東京', '京タ', 'タワ', 'ワー']
+        assert query_terms('京 API') == ['京', 'api']
+        assert query_terms('!?') == []
+
+    def test_single_kana(self):
+        """かな1文字は索引せず、1文字のかなだけの検索語は拒否すること"""
+        assert tokenize(normalize('A の B 木')) == ['a', 'b', '木']
+        assert query_terms('ね API') == ['api']
+        with pytest.raises(QueryTooShort):
+            query_terms('ね')
+
+    def test_highlight(self):
+        """一致した部分を中心に切り出し、スニペット内の位置を返すこと"""
+        text = 'あ' * 100 + '検索エンジン' + 'い' * 100
+
+        snippet, ranges = highlight(text, '検索', width=30)
+
+        assert snippet.startswith('…') and snippet.endswith('…')
+        start, end = ranges[0]
+        assert snippet[start:end] == '検索'
+
+
+class TestSearch:
+    """インメモリの保存先での検索のテスト"""
+
+    def test_finds_titles_and_messages(self):
+        """タイトルと本文のどちらも検索でき、すべてのトークンを含むものだけが一致すること"""
+        travel = thread_model.create_thread('京都旅行の計画')
+        recipe = thread_model.create_thread('夕食のレシピ')
+        post(travel['id'], '京都で紅葉を見たい', '11月の京都がおすすめです')
+        post(recipe['id'], '東京で人気のレシピ', 'カレーはいかがですか')
+
+        results, next_cursor = search_model.search('京都', 10)
+
+        assert next_cursor is None
+        assert {r['type'] for r in results} == {'thread', 'message'}
+        assert {r['thread_id'] for r in results} == {travel['id']}
+        assert results[0]['type'] == 'thread'
+        assert results[0]['thread_title'] == '京都旅行の計画'
+
+        results, _ = search_model.search('京都 紅葉', 10)
+        assert [r['snippet'] for r in results] == ['京都で紅葉を見たい']
+        assert results[0]['highlights'] == [[0, 2], [3, 5]]
+
+    def test_rank_by_term_frequency(self):
+        """検索語を多く含むメッセージほど上位になること"""
+        thread = thread_model.create_thread('雑談')
+        post(thread['id'], 'pythonの話', 'python python pythonの話')
+
+        results, _ = search_model.search('Python', 10)
+
+        assert [r['snippet'] for r in results] == ['python python pythonの話', 'pythonの話']
+
+    def test_pagination(self):
+        """カーソルで重複なく最後まで読めること"""
+        thread = thread_model.create_thread('雑談')
+        post(thread['id'], *[f'テスト {i}' for i in range(7)])
+
+        seen = []
+        cursor = None
+        while True:
+            results, cursor = search_model.search('テスト', 3, cursor)
+            seen.extend(r['id'] for r in results)
+            if not cursor:
+                break
+
+        assert len(seen) == len(set(seen)) == 7
+
+    def test_candidates_are_capped(self, monkeypatch):
+        """一致が多くても、スコアの上位SEARCH_MAX_CANDIDATES件までしか読まないこと"""
+        monkeypatch.setattr(config, 'SEARCH_MAX_CANDIDATES', 4)
+        thread = thread_model.create_thread('雑談')
+        post(thread['id'], *[f'テスト {i}' for i in range(7)])
+
+        first, cursor = search_model.search('テスト', 3)
+        second, cursor = search_model.search('テスト', 3, cursor)
+
+        assert len(first) + len(second) == 4
+        assert cursor is None
+
+    def test_invalid_cursor(self):
+        """不正なカーソルはValueErrorになること"""
+        with pytest.raises(ValueError):
+            search_model.search('テスト', 10, 'invalid')
+
+    def test_updates_follow_writes(self):
+        """タイトル変更・メッセージ削除が検索に反映されること"""
+        thread = thread_model.create_thread('新しい会話')
+        saved = post(thread['id'], '削除するメッセージ')
+
+        thread_model.update_thread(thread['id'], title='会議の議事録')
+        message_model.delete_message(saved[0]['id'])
+
+        assert search_model.search('新しい', 10)[0] == []
+        assert search_model.search('削除', 10)[0] == []
+        assert [r['type'] for r in search_model.search('議事録', 10)[0]] == ['thread']
+
+    def test_deleted_threads(self, memory_storage):
+        """削除したスレッドは結果から除かれ、後片付けでエントリも消えること"""
+        thread = thread_model.create_thread('秘密の計画')
+        post(thread['id'], '秘密の内容')
+        thread_model.delete_thread(thread['id'])
+
+        assert search_model.search('秘密', 10)[0] == []
+
+        thread_reaper.reap_deleted_threads()
+        assert memory_storage.search.search(query_terms('秘密'), 10) == []
+
+    def test_rebuild_index(self, memory_storage):
+        """エントリのない既存データを取り込めること"""
+        thread = thread_model.create_thread('古い会話')
+        post(thread['id'], '導入前のメッセージ')
+        memory_storage.search.remove_by_thread(ObjectId(thread['id']))
+
+        stats = search_model.rebuild_index(batch_size=1)
+
+        assert stats == {'threads': 1, 'entries': 2}
+        assert len(search_model.search('導入前', 10)[0]) == 1
+
+
+class TestMongoQueries:
+    """MongoDB版の検索パイプラインの形のテスト"""
+
+    def test_pipeline(self):
+        """すべてのトークンを語句として$textで探し、(スコア, _id)のキーセットで続きを読むこと"""
+        entry_id = ObjectId()
+        pipeline = build_search_pipeline(['京都', 'api'], 21, encode_score_cursor(1.5, entry_id))
+
+        assert pipeline[0] == {'$match': {'$text': {'$search': '"京都" "api"'}}}
+        assert pipeline[1:3] == [
+            {'$sort': {'text_score': {'$meta': 'textScore'}, '_id': -1}},
+            {'$limit': config.SEARCH_MAX_CANDIDATES},
+        ]
+        assert pipeline[4] == {'$match': {'$or': [
+            {'score': {'$lt': 1.5}},
+            {'score': 1.5, '_id': {'$lt': entry_id}},
+        ]}}
+        assert pipeline[-2:] == [{'$limit': 21}, {'$project': {'terms': 0}}]
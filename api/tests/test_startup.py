@@ -0,0 +1,63 @@
+"""
+コールドスタート（index.pyのimport時間・遅延初期化）のテスト
+"""
+import pytest
+from benchmark_startup import IMPORT_BUDGET_MS, LAZY_MODULES, measure, parse_importtime
+from services import db_service as db_service_module
+from services.db_service import DatabaseService
+from services.gemini_service import GeminiService
+
+
+@pytest.fixture(scope='module')
+def startup():
+    """index.pyのimport時間（1回目のバイトコード生成を除いた3回の中央値）"""
+    measure(1)
+    return measure(3)
+
+
+class TestImportBudget:
+    """import時間の回帰テスト"""
+
+    def test_import_time_within_budget(self, startup):
+        """index.pyのimportが上限時間内に終わる"""
+        assert startup['total_ms'] <= IMPORT_BUDGET_MS, (
+            f"import時間 {startup['total_ms']:.1f} ms が上限 {IMPORT_BUDGET_MS:.0f} ms を超えました"
+            "（python benchmark_startup.py で内訳を確認）"
+        )
+
+    def test_heavy_modules_are_not_imported(self, startup):
+        """遅延importの対象が起動時に読み込まれない"""
+        loaded = [name for name in LAZY_MODULES if name in startup['modules']]
+        assert loaded == []
+
+    def test_parse_importtime(self):
+        """-X importtimeの出力を解析できる"""
+        output = (
+            "import time: self [us] | cumulative | imported package\n"
+            "import time:       120 |        120 |     bson.codec\n"
+            "import time:       300 |        420 |   bson\n"
+        )
+        assert parse_importtime(output) == {
+            'bson.codec': {'self_us': 120, 'cumulative_us': 120},
+            'bson': {'self_us': 300, 'cumulative_us': 420}
+        }
+
+
+class TestLazyInitialization:
+    """遅延初期化のテスト"""
+
+    def test_gemini_client_is_created_on_first_use(self):
+        """GeminiServiceの作成時にはgenaiクライアントを作らない"""
+        service = GeminiService()
+        assert service._client is None
+
+    def test_connect_reuses_existing_client(self, monkeypatch):
+        """接続済みならMongoClientを作り直さず、pingもしない"""
+        def fail(*args, **kwargs):
+            raise AssertionError("MongoClientが作り直されました")
+
+        monkeypatch.setattr(db_service_module, 'MongoClient', fail)
+        service = DatabaseService()
+        service.db = object()
+
+        assert service.connect() is True
@@ -0,0 +1,131 @@
+"""
+ストリーミング送信（/messages/stream）のテスト
+インメモリの保存先で、切断時のメッセージの保存とクォータの返却を確認する
+"""
+import asyncio
+import json
+import pytest
+from config import config
+from models import message as message_model
+from models import thread as thread_model
+from repositories import reset_storage
+from services.gemini_service import AsyncReservedStream, ReservedStream, gemini_service
+from services.history_cache import history_cache
+
+
+@pytest.fixture(autouse=True)
+def memory_storage(monkeypatch):
+    """空のインメモリの保存先に切り替える"""
+    monkeypatch.setattr(config, 'STORAGE_BACKEND', 'memory')
+    reset_storage()
+    history_cache.clear()
+    yield
+    reset_storage()
+    history_cache.clear()
+
+
+def chunks(*texts):
+    """テキストの断片を順に返すジェネレータ"""
+    yield from texts
+
+
+async def async_chunks(*texts):
+    for text in texts:
+        yield text
+
+
+class TestReservedStream:
+    """ReservedStreamのテスト"""
+
+    def test_close_before_reading_releases_quota(self):
+        """最初の断片を読む前に閉じたら確保したトークンを返すこと"""
+        released = []
+        stream = ReservedStream(chunks('a'), lambda: released.append(True))
+        stream.close()
+        stream.close()
+        assert released == [True]
+
+    def test_close_after_reading_keeps_quota(self):
+        """生成を始めた後は返さないこと（使用量は完了時に精算する）"""
+        released = []
+        stream = ReservedStream(chunks('a', 'b'), lambda: released.append(True))
+        assert next(stream) == 'a'
+        stream.close()
+        assert released == []
+
+    def test_async_close_before_reading_releases_quota(self):
+        """非同期版も最初の断片を読む前に閉じたら返すこと"""
+        released = []
+
+        async def run():
+            stream = AsyncReservedStream(async_chunks('a'), lambda: released.append(True))
+            await stream.aclose()
+
+            read = AsyncReservedStream(async_chunks('a'), lambda: released.append(False))
+            assert [text async for text in read] == ['a']
+            await read.aclose()
+
+        asyncio.run(run())
+        assert released == [True]
+
+
+def read_events(body):
+    """SSEの本文を(イベント名, データ)のリストに分解"""
+    events = []
+    for block in body.strip().split('\n\n'):
+        lines = dict(line.split(': ', 1) for line in block.split('\n'))
+        events.append((lines['event'], json.loads(lines['data'])))
+    return events
+
+
+class TestStreamRoute:
+    """Flaskのストリーミング送信ルートのテスト"""
+
+    @pytest.fixture
+    def client(self):
+        pytest.importorskip('flask')
+        from index import app
+        return app.test_client()
+
+    def stub_stream(self, monkeypatch, *texts):
+        """generate_response_streamを固定の断片を返すストリームに置き換える"""
+        released = []
+
+        def generate_response_stream(messages, summary=None, use_cache=True, usage=None):
+            return ReservedStream(chunks(*texts), lambda: released.append(True))
+
+        monkeypatch.setattr(gemini_service, 'generate_response_stream', generate_response_stream)
+        return released
+
+    def test_saves_user_message_before_streaming(self, client, monkeypatch):
+        """ユーザーメッセージは保存済みのものを送り、完了時にAI応答を保存すること"""
+        self.stub_stream(monkeypatch, 'こん', 'にちは')
+        thread = thread_model.create_thread()
+
+        response = client.post(
+            f"/api/threads/{thread['id']}/messages/stream", json={'content': '質問'}
+        )
+        events = read_events(response.get_data(as_text=True))
+
+        assert [name for name, _ in events] == ['user_message', 'chunk', 'chunk', 'done']
+        assert events[-1][1]['content'] == 'こんにちは'
+        saved = message_model.get_messages_by_thread(thread['id'])
+        assert [m['id'] for m in saved] == [events[0][1]['id'], events[-1][1]['id']]
+
+    def test_disconnect_keeps_user_message_and_releases_quota(self, client, monkeypatch):
+        """生成前に切断されても、ユーザーメッセージを残しクォータを返すこと"""
+        released = self.stub_stream(monkeypatch, '届かない応答')
+        thread = thread_model.create_thread()
+
+        response = client.post(
+            f"/api/threads/{thread['id']}/messages/stream",
+            json={'content': '質問'},
+            buffered=False
+        )
+        first = next(response.response)
+        response.close()
+
+        assert b'user_message' in first
+        saved = message_model.get_messages_by_thread(thread['id'])
+        assert [(m['role'], m['content']) for m in saved] == [('user', '質問')]
+        assert released == [True]
@@ -0,0 +1,188 @@
+"""
+ローリング要約（services.summary_service）のテスト
+インメモリの保存先で、更新の契機・差分の織り込み・要約済みメッセージの除外を確認する
+"""
+import time
+from datetime import datetime, timedelta
+import pytest
+from bson import ObjectId
+from config import config
+from models import message as message_model
+from models import thread as thread_model
+from models.message import drop_summarized
+from repositories import get_storage, reset_storage
+from services.gemini_service import gemini_service
+from services.history_cache import history_cache
+from services.summary_service import summary_service
+
+INTERVAL = 4
+
+
+@pytest.fixture(autouse=True)
+def memory_storage(monkeypatch):
+    """空のインメモリの保存先に切り替え、要約の間隔を短くする"""
+    monkeypatch.setattr(config, 'STORAGE_BACKEND', 'memory')
+    monkeypatch.setattr(summary_service, 'interval', INTERVAL)
+    reset_storage()
+    history_cache.clear()
+    yield get_storage()
+    reset_storage()
+    history_cache.clear()
+
+
+@pytest.fixture
+def summarize_calls(monkeypatch):
+    """gemini_service.summarizeを呼び出しを記録するだけの関数に置き換える"""
+    calls = []
+
+    def fake_summarize(previous_summary, messages):
+        calls.append((previous_summary, [msg['content'] for msg in messages]))
+        return f'要約{len(calls)}'
+
+    monkeypatch.setattr(gemini_service, 'summarize', fake_summarize)
+    return calls
+
+
+def add_messages(thread_id, contents, start):
+    """1秒間隔でユーザーとAIが交互に話すメッセージを追加"""
+    docs = []
+    for index, content in enumerate(contents):
+        doc = message_model.build_message(
+            thread_id, 'user' if index % 2 == 0 else 'assistant', content
+        )
+        doc['created_at'] = start + timedelta(seconds=index)
+        docs.append(doc)
+    message_model.save_messages(thread_id, docs)
+    return docs
+
+
+def new_thread():
+    return thread_model.create_thread('要約テスト')['id']
+
+
+START = datetime(2025, 1, 1)
+
+
+class TestRefresh:
+    """SummaryService.refreshのテスト"""
+
+    def test_refreshes_after_interval_messages(self, summarize_calls):
+        """未要約のメッセージがinterval件たまるまでは要約しないこと"""
+        thread_id = new_thread()
+        add_messages(thread_id, ['m0', 'm1', 'm2'], START)
+        assert summary_service.refresh(thread_id) is False
+        assert summarize_calls == []
+
+        add_messages(thread_id, ['m3'], START + timedelta(seconds=3))
+        assert summary_service.refresh(thread_id) is True
+        assert summarize_calls == [(None, ['m0', 'm1', 'm2', 'm3'])]
+
+        state = thread_model.get_summary(thread_id)
+        assert state['summary'] == '要約1'
+        assert state['summarized_until'] == START + timedelta(seconds=3)
+        assert state['summarized_count'] == 4
+
+    def test_folds_only_messages_after_summarized_until(self, summarize_calls):
+        """2回目以降は前回の要約と、それ以降のメッセージだけを渡すこと"""
+        thread_id = new_thread()
+        add_messages(thread_id, [f'm{i}' for i in range(INTERVAL)], START)
+        assert summary_service.refresh(thread_id) is True
+
+        later = START + timedelta(minutes=1)
+        add_messages(thread_id, [f'n{i}' for i in range(INTERVAL + 1)], later)
+        assert summary_service.refresh(thread_id) is True
+
+        assert summarize_calls[1] == ('要約1', ['n0', 'n1', 'n2', 'n3'])
+        state = thread_model.get_summary(thread_id)
+        assert state['summarized_until'] == later + timedelta(seconds=INTERVAL - 1)
+
+    def test_recounts_summarized_messages_when_they_drift(self, summarize_calls):
+        """要約済みのメッセージ数がずれていたら、要約せずに数え直すこと"""
+        thread_id = new_thread()
+        docs = add_messages(thread_id, [f'm{i}' for i in range(INTERVAL)], START)
+        assert summary_service.refresh(thread_id) is True
+
+        # 要約済みのメッセージを削除すると、message_countとsummarized_countの差が小さくなる
+        message_model.delete_message(str(docs[0]['_id']))
+        add_messages(thread_id, ['n0'], START + timedelta(minutes=1))
+        assert summary_service.refresh(thread_id) is False
+
+        state = thread_model.get_summary(thread_id)
+        assert state['summarized_count'] == INTERVAL - 1
+        assert state['message_count'] - state['summarized_count'] == 1
+
+    def test_update_summary_rejects_stale_previous_until(self, summarize_calls):
+        """他のワーカーが先に更新していた場合は上書きしないこと"""
+        thread_id = new_thread()
+        add_messages(thread_id, [f'm{i}' for i in range(INTERVAL)], START)
+        assert summary_service.refresh(thread_id) is True
+
+        # 更新前のsummarized_until（None）を前提にした古い書き込み
+        assert thread_model.update_summary(thread_id, '古い要約', START, None) is False
+        assert thread_model.get_summary(thread_id)['summary'] == '要約1'
+
+
+class TestScheduleRefresh:
+    """SummaryService.schedule_refreshのテスト"""
+
+    def test_short_thread_starts_no_worker(self, summarize_calls, monkeypatch):
+        """メッセージ数がinterval件未満なら保存先も読まずに終えること"""
+        monkeypatch.setattr(thread_model, 'get_summary', pytest.fail)
+        assert summary_service.schedule_refresh(new_thread(), INTERVAL - 1) is False
+
+    def test_decides_from_the_saved_thread_without_reads(self, summarize_calls, monkeypatch):
+        """保存したときのスレッドのカウントだけで判定し、保存先を読まないこと"""
+        thread_id = new_thread()
+        add_messages(thread_id, [f'm{i}' for i in range(INTERVAL)], START)
+        assert summary_service.refresh(thread_id) is True
+
+        (_,), thread = message_model.save_messages(
+            thread_id, [message_model.build_message(thread_id, 'user', 'n0')]
+        )
+        monkeypatch.setattr(thread_model, 'get_summary', pytest.fail)
+        monkeypatch.setattr(message_model, 'get_messages_after', pytest.fail)
+        assert summary_service.schedule_refresh(
+            thread_id, thread['message_count'], thread['summarized_count']
+        ) is False
+        assert thread_id not in summary_service._in_progress
+
+    def test_starts_worker_when_refresh_is_due(self, summarize_calls):
+        """未要約のメッセージがinterval件あればバックグラウンドで要約すること"""
+        thread_id = new_thread()
+        add_messages(thread_id, [f'm{i}' for i in range(INTERVAL)], START)
+        assert summary_service.schedule_refresh(thread_id, INTERVAL) is True
+
+        deadline = time.monotonic() + 5
+        while thread_id in summary_service._in_progress and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert thread_model.get_summary(thread_id)['summary'] == '要約1'
+
+
+class TestSummarizedHistory:
+    """要約済みのメッセージを会話履歴から除くテスト"""
+
+    def test_context_sends_only_messages_after_summary(self, summarize_calls):
+        """要約があれば、それ以降のメッセージとピン留めメッセージだけを履歴にすること"""
+        thread_id = new_thread()
+        docs = add_messages(thread_id, [f'm{i}' for i in range(INTERVAL)], START)
+        message_model.set_message_pinned(str(docs[0]['_id']), True)
+        assert summary_service.refresh(thread_id) is True
+        add_messages(thread_id, ['n0', 'n1'], START + timedelta(minutes=1))
+
+        # 1回目は保存先から、2回目はキャッシュから履歴を作る
+        for _ in range(2):
+            context = message_model.get_thread_context(thread_id)
+            assert context['summary'] == '要約1'
+            assert [entry['content'] for entry in context['history']] == ['m0', 'n0', 'n1']
+
+    def test_history_starts_with_user_message(self):
+        """要約の境界で切った履歴がAI応答から始まらないこと"""
+        until = START + timedelta(seconds=1)
+        history = [
+            {'id': ObjectId(), 'role': role, 'pinned': False,
+             'created_at': START + timedelta(seconds=i)}
+            for i, role in enumerate(['user', 'assistant', 'assistant', 'user', 'assistant'])
+        ]
+        kept = drop_summarized(history, until)
+        assert [entry['role'] for entry in kept] == ['user', 'assistant']
+        assert drop_summarized(history, None) == history
@@ -0,0 +1,36 @@
+"""
+トークン数推定のテスト
+"""
+from services.token_estimator import (
+    MESSAGE_OVERHEAD_TOKENS,
+    estimate_message_tokens,
+    estimate_tokens,
+)
+
+
+class TestEstimateTokens:
+    """estimate_tokensのテスト"""
+
+    def test_empty_text(self):
+        """空文字は0トークンになること"""
+        assert estimate_tokens('') == 0
+        assert estimate_tokens(None) == 0
+
+    def test_japanese_text(self):
+        """日本語は1文字あたり1トークンで数えること"""
+        assert estimate_tokens('こんにちは') == 5
+        assert estimate_tokens('会話履歴') == 4
+
+    def test_ascii_text(self):
+        """英数字は4文字あたり1トークン（切り上げ）で数えること"""
+        assert estimate_tokens('abcd') == 1
+        assert estimate_tokens('abcde') == 2
+
+    def test_mixed_text(self):
+        """日本語と英数字の混在を合算すること"""
+        assert estimate_tokens('Pythonとは') == 2 + 2
+
+    def test_message_overhead(self):
+        """メッセージ単位ではオーバーヘッドを加算すること"""
+        message = {'role': 'user', 'content': 'こんにちは'}
+        assert estimate_message_tokens(message) == 5 + MESSAGE_OVERHEAD_TOKENS
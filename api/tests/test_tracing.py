@@ -0,0 +1,132 @@
+"""
+リクエストのトレースのテスト
+"""
+import asyncio
+import json
+from types import SimpleNamespace
+import pytest
+from config import config
+from services.tracing import (
+    JsonLinesExporter,
+    MongoCommandTracing,
+    Tracer,
+    parse_trace_header,
+    traced,
+)
+from services import tracing
+
+
+@pytest.fixture
+def exported(tmp_path, monkeypatch):
+    """一時ファイルに書き出すトレーサーに差し替え、書き出されたスパンを読む関数を返す"""
+    path = tmp_path / 'traces.jsonl'
+    monkeypatch.setattr(tracing, 'tracer', Tracer(JsonLinesExporter(str(path))))
+    monkeypatch.setattr(config, 'TRACE_SAMPLE_RATE', 1.0)
+    monkeypatch.setattr(config, 'TRACE_MIN_DURATION_MS', 0)
+
+    def read():
+        if not path.exists():
+            return []
+        return [json.loads(line) for line in path.read_text(encoding='utf-8').splitlines()]
+    return read
+
+
+@traced()
+def load_thread(thread_id):
+    return {'_id': thread_id}
+
+
+@traced('custom.name')
+def fail():
+    raise ValueError('boom')
+
+
+@traced()
+async def load_thread_async(thread_id):
+    return load_thread(thread_id)
+
+
+class TestTraceHeader:
+    """トレースIDの受け取りのテスト"""
+
+    def test_parses_traceparent(self):
+        """traceparentのトレースIDとsampledフラグを読み取ること"""
+        header = {'traceparent': '00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01'}
+        assert parse_trace_header(header) == ('4bf92f3577b34da6a3ce929d0e0e4736', True)
+
+        header = {'traceparent': '00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-00'}
+        assert parse_trace_header(header) == ('4bf92f3577b34da6a3ce929d0e0e4736', False)
+
+    def test_trace_id_header_forces_sampling(self):
+        """独自ヘッダーのトレースIDは常に記録し、使えない文字は取り除くこと"""
+        assert parse_trace_header({config.TRACE_HEADER: 'req-1\n"x"'}) == ('req-1x', True)
+        assert parse_trace_header({}) == (None, None)
+
+
+class TestTracer:
+    """スパンの記録と書き出しのテスト"""
+
+    def test_nested_spans_are_exported(self, exported):
+        """ルートスパンの下にmodelsの関数とMongoDBコマンドのスパンが記録されること"""
+        root = tracing.tracer.start_trace('messages.send_message', {config.TRACE_HEADER: 'abc'})
+        load_thread('t1')
+        with pytest.raises(ValueError):
+            fail()
+        tracing.tracer.record('mongodb.find', 0.002, collection='threads')
+        tracing.tracer.end_trace(root, status_code=201)
+
+        spans = {span['name']: span for span in exported()}
+        assert set(spans) == {'messages.send_message', 'test_tracing.load_thread',
+                              'custom.name', 'mongodb.find'}
+        assert all(span['trace_id'] == 'abc' for span in spans.values())
+        root_id = spans['messages.send_message']['span_id']
+        assert spans['test_tracing.load_thread']['parent_id'] == root_id
+        assert spans['custom.name']['status'] == 'error'
+        assert spans['mongodb.find']['attributes'] == {'collection': 'threads'}
+        assert spans['messages.send_message']['attributes']['status_code'] == 201
+
+    def test_async_functions_keep_parent(self, exported):
+        """非同期関数の中から呼んだ関数も同じトレースの子スパンになること"""
+        async def handler():
+            root = tracing.tracer.start_trace('threads.get_thread')
+            await load_thread_async('t1')
+            tracing.tracer.end_trace(root)
+
+        asyncio.run(handler())
+
+        spans = {span['name']: span for span in exported()}
+        outer = spans['test_tracing.load_thread_async']
+        assert spans['test_tracing.load_thread']['parent_id'] == outer['span_id']
+
+    def test_unsampled_requests_record_nothing(self, exported, monkeypatch):
+        """サンプリングしないリクエストではスパンを記録しないこと"""
+        monkeypatch.setattr(config, 'TRACE_SAMPLE_RATE', 0.0)
+        assert tracing.tracer.start_trace('threads.get_threads') is None
+        assert load_thread('t1') == {'_id': 't1'}
+        assert exported() == []
+
+    def test_skips_fast_traces(self, exported, monkeypatch):
+        """しきい値より短いリクエストは書き出さないこと"""
+        monkeypatch.setattr(config, 'TRACE_MIN_DURATION_MS', 60_000)
+        root = tracing.tracer.start_trace('threads.get_threads')
+        tracing.tracer.end_trace(root)
+        assert exported() == []
+
+    def test_mongo_commands_become_spans(self, exported):
+        """トレース中のMongoDBコマンドがコレクション名付きで記録されること"""
+        listener = MongoCommandTracing()
+        root = tracing.tracer.start_trace('threads.get_threads')
+        connection = ('localhost', 27017)
+        listener.started(SimpleNamespace(
+            command={'find': 'threads'}, command_name='find',
+            request_id=1, connection_id=connection
+        ))
+        listener.succeeded(SimpleNamespace(
+            command_name='find', request_id=1, connection_id=connection,
+            duration_micros=1500
+        ))
+        tracing.tracer.end_trace(root)
+
+        spans = {span['name']: span for span in exported()}
+        assert spans['mongodb.find']['attributes'] == {'collection': 'threads'}
+        assert spans['mongodb.find']['duration_ms'] == pytest.approx(1.5, abs=0.5)
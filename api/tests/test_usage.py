@@ -0,0 +1,171 @@
+"""
+使用量（メッセージ・スレッドの合計・台帳）のテスト
+インメモリの保存先を使い、MongoDB版はパイプラインの形だけを確認する
+"""
+from datetime import datetime
+import pytest
+from bson import ObjectId
+from config import config
+from loadtest.standins import FakeGeminiClient
+from models import message as message_model
+from models import thread as thread_model
+from models import usage as usage_model
+from repositories import get_storage, reset_storage
+from repositories.mongo import build_touch_update, build_usage_pipeline
+from services.gemini_service import RESPONSE_CACHE_MODEL, GeminiService
+from services.history_cache import history_cache
+from services.response_cache import response_cache
+from services.write_behind import write_behind
+
+
+@pytest.fixture(autouse=True)
+def memory_storage(monkeypatch):
+    """空のインメモリの保存先に切り替える"""
+    monkeypatch.setattr(config, 'STORAGE_BACKEND', 'memory')
+    # 台帳・全文検索は保存と同時に書き込む（後回しはtest_write_behindで確認する）
+    monkeypatch.setattr(write_behind, 'enabled', False)
+    reset_storage()
+    history_cache.clear()
+    yield get_storage()
+    reset_storage()
+    history_cache.clear()
+
+
+def usage(model='models/flash', prompt=100, output=20, cached=0, latency=500.0):
+    return {
+        'model': model, 'prompt_tokens': prompt, 'output_tokens': output,
+        'cached_tokens': cached, 'latency_ms': latency,
+    }
+
+
+def send_turn(thread_id, turn_usage, created_at=None):
+    """ユーザーメッセージと使用量付きのAI応答を保存"""
+    user_doc = message_model.build_message(thread_id, 'user', '質問')
+    assistant_doc = message_model.build_message(thread_id, 'assistant', '回答', usage=turn_usage)
+    if created_at:
+        user_doc['created_at'] = assistant_doc['created_at'] = created_at
+    return message_model.save_messages(thread_id, [user_doc, assistant_doc])
+
+
+class TestGeminiUsage:
+    """GeminiServiceが書き込む使用量のテスト"""
+
+    def test_generate_response_fills_usage(self, monkeypatch):
+        """応答のトークン数とモデル・所要時間を書き込むこと"""
+        monkeypatch.setattr(config, 'GEMINI_QUOTA_ENABLED', False)
+        monkeypatch.setattr(response_cache, 'enabled', False)
+        service = GeminiService.__new__(GeminiService)
+        service.model_id = 'models/primary'
+        service.client = FakeGeminiClient(ttft=0, tokens_per_second=1_000_000, response_tokens=30)
+
+        filled = {}
+        service.generate_response([{'role': 'user', 'content': 'こんにちは'}], usage=filled)
+
+        assert filled['model'] == 'models/primary'
+        assert filled['prompt_tokens'] > 0
+        assert filled['output_tokens'] == 30
+        assert filled['cached_tokens'] == 0
+        assert filled['latency_ms'] >= 0
+
+    def test_cache_hit_usage(self):
+        """応答キャッシュのヒットはトークン数0で記録すること"""
+        filled = {}
+        GeminiService._fill_usage(filled, None, None, 0.0)
+
+        assert filled['model'] == RESPONSE_CACHE_MODEL
+        assert filled['prompt_tokens'] == filled['output_tokens'] == 0
+
+
+class TestUsageLedger:
+    """メッセージ・スレッド・台帳への記録のテスト"""
+
+    def test_message_and_thread_totals(self):
+        """メッセージに使用量が残り、スレッドの合計に加算されること"""
+        thread = thread_model.create_thread()
+        (_, assistant), _ = send_turn(thread['id'], usage(prompt=100, output=20, cached=40))
+        _, updated = send_turn(thread['id'], usage(prompt=150, output=30, latency=300.0))
+
+        assert assistant['usage']['cached_tokens'] == 40
+        assert updated['usage'] == {
+            'requests': 2, 'prompt_tokens': 250, 'output_tokens': 50, 'cached_tokens': 40,
+            'total_tokens': 300, 'avg_latency_ms': 400.0,
+        }
+        recent, _ = message_model.get_recent_messages(thread['id'])
+        assert [m.get('usage', {}).get('output_tokens') for m in recent] == [None, 20, None, 30]
+
+    def test_aggregate_by_day_and_model(self):
+        """台帳を期間で絞り込み、日付・モデルごとに集計すること"""
+        thread = thread_model.create_thread()
+        send_turn(thread['id'], usage('models/a', 10, 1), datetime(2025, 3, 1, 9))
+        send_turn(thread['id'], usage('models/a', 20, 2), datetime(2025, 3, 1, 23))
+        send_turn(thread['id'], usage('models/b', 40, 4), datetime(2025, 3, 1, 12))
+        send_turn(thread['id'], usage('models/a', 80, 8), datetime(2025, 3, 2, 0))
+        send_turn(thread['id'], usage('models/a', 160, 16), datetime(2025, 3, 5, 0))
+
+        result = usage_model.get_usage_by_day('2025-03-01', '2025-03-02')
+
+        assert [(d['day'], d['model'], d['requests'], d['prompt_tokens']) for d in result['days']] == [
+            ('2025-03-01', 'models/a', 2, 30),
+            ('2025-03-01', 'models/b', 1, 40),
+            ('2025-03-02', 'models/a', 1, 80),
+        ]
+        assert result['models']['models/a']['output_tokens'] == 11
+        assert result['totals']['total_tokens'] == 150 + 15
+
+    def test_ledger_survives_thread_deletion(self):
+        """スレッドを削除しても消費した使用量は台帳に残ること"""
+        thread = thread_model.create_thread()
+        send_turn(thread['id'], usage(), datetime(2025, 3, 1))
+        thread_model.delete_thread(thread['id'])
+
+        assert usage_model.get_usage_by_day('2025-03-01', '2025-03-01')['totals']['requests'] == 1
+
+    def test_deleted_thread_is_not_recorded(self, memory_storage):
+        """保存時にスレッドが削除されていれば台帳にも記録しないこと"""
+        thread = thread_model.create_thread()
+        thread_model.delete_thread(thread['id'])
+
+        send_turn(thread['id'], usage(), datetime(2025, 3, 1))
+
+        assert memory_storage.usage.aggregate('2025-03-01', '2025-03-01') == []
+
+
+class TestPeriod:
+    """集計期間の検証のテスト"""
+
+    def test_parse_period(self):
+        """省略時は直近30日で、不正な日付・順序・長すぎる期間はValueErrorになること"""
+        start, end = usage_model.parse_period()
+        assert (datetime.fromisoformat(end) - datetime.fromisoformat(start)).days == 29
+        assert usage_model.parse_period('2025-01-01', '2025-01-31') == ('2025-01-01', '2025-01-31')
+
+        for start, end in (('2025-1-x', None), ('2025-02-01', '2025-01-01'),
+                           ('2024-01-01', '2025-12-31')):
+            with pytest.raises(ValueError):
+                usage_model.parse_period(start, end)
+
+
+class TestMongoQueries:
+    """MongoDB版の更新・集計の形のテスト"""
+
+    def test_touch_increments_thread_totals(self):
+        """使用量を持つメッセージだけをスレッドの合計に$incで加えること"""
+        thread_id = str(ObjectId())
+        docs = [
+            message_model.build_message(thread_id, 'user', '質問'),
+            message_model.build_message(thread_id, 'assistant', '回答', usage=usage(cached=5)),
+        ]
+
+        increments = build_touch_update(docs)['$inc']
+
+        assert increments == {
+            'version': 1, 'message_count': 2, 'usage.requests': 1, 'usage.prompt_tokens': 100,
+            'usage.output_tokens': 20, 'usage.cached_tokens': 5, 'usage.latency_ms': 500.0,
+        }
+
+    def test_pipeline_matches_indexed_day_first(self):
+        """最初のステージがday_modelインデックスで読める期間の絞り込みであること"""
+        pipeline = build_usage_pipeline('2025-03-01', '2025-03-31')
+
+        assert pipeline[0] == {'$match': {'day': {'$gte': '2025-03-01', '$lte': '2025-03-31'}}}
+        assert pipeline[1]['$group']['_id'] == {'day': '$day', 'model': '$model'}
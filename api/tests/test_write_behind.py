@@ -0,0 +1,111 @@
+"""
+書き込みの後回し（services.write_behind）とメッセージ保存での使い方のテスト
+インメモリの保存先を使う
+"""
+import threading
+import pytest
+from config import config
+from models import message as message_model
+from models import search as search_model
+from models import thread as thread_model
+from models import usage as usage_model
+from repositories import get_storage, reset_storage
+from services.history_cache import history_cache
+from services.write_behind import WriteBehind, write_behind
+
+
+@pytest.fixture(autouse=True)
+def memory_storage(monkeypatch):
+    """空のインメモリの保存先に切り替え、後回しの書き込みを有効にする"""
+    monkeypatch.setattr(config, 'STORAGE_BACKEND', 'memory')
+    monkeypatch.setattr(write_behind, 'enabled', True)
+    reset_storage()
+    history_cache.clear()
+    yield get_storage()
+    write_behind.flush()
+    reset_storage()
+    history_cache.clear()
+
+
+def send_turn(thread_id):
+    """ユーザーメッセージと使用量付きのAI応答を保存"""
+    usage = {
+        'model': 'models/flash', 'prompt_tokens': 100, 'output_tokens': 20,
+        'cached_tokens': 0, 'latency_ms': 500.0,
+    }
+    return message_model.save_messages(thread_id, [
+        message_model.build_message(thread_id, 'user', '会議の予定'),
+        message_model.build_message(thread_id, 'assistant', '回答', usage=usage),
+    ])
+
+
+def usage_requests():
+    """今日までの台帳のリクエスト数"""
+    start, end = usage_model.parse_period()
+    return usage_model.get_usage_by_day(start, end)['totals']['requests']
+
+
+class TestWriteBehind:
+    """WriteBehindのテスト"""
+
+    def test_disabled_writes_inline(self):
+        """無効な場合はその場で実行すること"""
+        calls = []
+        WriteBehind(enabled=False).submit(lambda: calls.append(threading.current_thread()))
+        assert calls == [threading.current_thread()]
+
+    def test_runs_in_order_and_survives_errors(self):
+        """投入した順に実行し、失敗した書き込みの後も続けること"""
+        writer = WriteBehind(enabled=True)
+        calls = []
+
+        def fail():
+            raise RuntimeError('書き込み失敗')
+
+        writer.submit(lambda: calls.append(1))
+        writer.submit(fail)
+        writer.submit(lambda: calls.append(2))
+        writer.flush()
+
+        assert calls == [1, 2]
+
+
+class TestSaveMessages:
+    """メッセージの保存で台帳と全文検索を後回しにするテスト"""
+
+    def test_ledger_and_search_are_written_after_the_response(self, monkeypatch):
+        """メッセージとスレッドはその場で、台帳と全文検索はキューから書き込むこと"""
+        thread = thread_model.create_thread('雑談')
+        pending = []
+        monkeypatch.setattr(write_behind, 'submit', pending.append)
+
+        (user_message, _), updated = send_turn(thread['id'])
+
+        assert updated['message_count'] == 2
+        assert usage_requests() == 0
+        assert search_model.search('会議', 10)[0] == []
+
+        for write in pending:
+            write()
+        assert usage_requests() == 1
+        assert [r['id'] for r in search_model.search('会議', 10)[0]] == [user_message['id']]
+
+    def test_delete_runs_after_pending_index(self):
+        """エントリの追加を待たずに削除しても、削除したメッセージが検索に残らないこと"""
+        thread = thread_model.create_thread('雑談')
+        (user_message, _), _ = send_turn(thread['id'])
+
+        assert message_model.delete_message(user_message['id'])
+        write_behind.flush()
+
+        assert search_model.search('会議', 10)[0] == []
+
+    def test_transactions_write_everything_together(self, monkeypatch):
+        """トランザクションを使う場合は後回しにしないこと"""
+        monkeypatch.setattr(config, 'MONGODB_USE_TRANSACTIONS', True)
+        monkeypatch.setattr(write_behind, 'submit', pytest.fail)
+        thread = thread_model.create_thread('雑談')
+
+        send_turn(thread['id'])
+
+        assert usage_requests() == 1
@@ -31,9 +31,10 @@ apiClient.interceptors.response.use(
 export const threadsApi = {
   /**
    * スレッド一覧を取得
+   * @param {object} params - 絞り込み・ページネーション条件 { limit, cursor, prefix, q }
    */
-  getThreads() {
-    return apiClient.get('/threads')
+  getThreads(params = {}) {
+    return apiClient.get('/threads', { params })
   },
 
   /**
@@ -77,9 +78,10 @@ export const messagesApi = {
   /**
    * スレッドのメッセージ一覧を取得
    * @param {string} threadId - スレッドID
+   * @param {object} params - ページネーション条件 { limit, before, after }（省略時は全件）
    */
-  getMessages(threadId) {
-    return apiClient.get(`/threads/${threadId}/messages`)
+  getMessages(threadId, params = {}) {
+    return apiClient.get(`/threads/${threadId}/messages`, { params })
   },
 
   /**
@@ -91,6 +93,48 @@ export const messagesApi = {
     return apiClient.post(`/threads/${threadId}/messages`, { content })
   },
 
+  /**
+   * メッセージを送信し、AI応答をストリーミングで受信
+   * @param {string} threadId - スレッドID
+   * @param {string} content - メッセージ内容
+   * @param {function} onEvent - イベント受信時のコールバック (event, data)
+   */
+  async streamMessage(threadId, content, onEvent) {
+    const response = await fetch(`${API_BASE_URL}/threads/${threadId}/messages/stream`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ content })
+    })
+    if (!response.ok) {
+      throw new Error(`HTTP ${response.status}`)
+    }
+
+    const reader = response.body.getReader()
+    const decoder = new TextDecoder()
+    let buffer = ''
+
+    while (true) {
+      const { value, done } = await reader.read()
+      if (done) break
+      buffer += decoder.decode(value, { stream: true })
+
+      // SSEのイベントは空行で区切られる
+      let boundary
+      while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+        const raw = buffer.slice(0, boundary)
+        buffer = buffer.slice(boundary + 2)
+
+        let event = 'message'
+        let data = ''
+        for (const line of raw.split('\n')) {
+          if (line.startsWith('event: ')) event = line.slice(7)
+          else if (line.startsWith('data: ')) data += line.slice(6)
+        }
+        onEvent(event, data ? JSON.parse(data) : null)
+      }
+    }
+  },
+
   /**
    * メッセージを削除
    * @param {string} messageId - メッセージID
@@ -5,11 +5,16 @@
 import { defineStore } from 'pinia'
 import { threadsApi } from '../services/api'
 
+// 1回に読み込むスレッド数（続きはnext_cursorで読み込む）
+const THREAD_PAGE_SIZE = 50
+
 export const useThreadStore = defineStore('thread', {
   state: () => ({
     threads: [],
     currentThreadId: null,
+    nextCursor: null,
     loading: false,
+    loadingMore: false,
     error: null
   }),
 
@@ -28,6 +33,13 @@ export const useThreadStore = defineStore('thread', {
       return state.threads.length > 0
     },
 
+    /**
+     * 続きのスレッドがあるかどうか
+     */
+    hasMoreThreads: (state) => {
+      return state.nextCursor !== null
+    },
+
     /**
      * 更新日時でソートされたスレッド一覧
      */
@@ -40,14 +52,15 @@ export const useThreadStore = defineStore('thread', {
 
   actions: {
     /**
-     * スレッド一覧を取得
+     * スレッド一覧の最初のページを取得
      */
     async fetchThreads() {
       this.loading = true
       this.error = null
       try {
-        const response = await threadsApi.getThreads()
+        const response = await threadsApi.getThreads({ limit: THREAD_PAGE_SIZE })
         this.threads = response.data.threads
+        this.nextCursor = response.data.next_cursor ?? null
       } catch (error) {
         this.error = 'スレッド一覧の取得に失敗しました'
         console.error('Failed to fetch threads:', error)
@@ -57,6 +70,34 @@ export const useThreadStore = defineStore('thread', {
       }
     },
 
+    /**
+     * スレッド一覧の続きのページを取得（next_cursorがなければ何もしない）
+     */
+    async fetchMoreThreads() {
+      if (!this.nextCursor || this.loadingMore) {
+        return
+      }
+      this.loadingMore = true
+      this.error = null
+      try {
+        const response = await threadsApi.getThreads({
+          limit: THREAD_PAGE_SIZE,
+          cursor: this.nextCursor
+        })
+        // 読み込み中に作成・更新されたスレッドは先頭のページにあるため重複を除く
+        const loadedIds = new Set(this.threads.map(t => t.id))
+        const olderThreads = response.data.threads.filter(t => !loadedIds.has(t.id))
+        this.threads.push(...olderThreads)
+        this.nextCursor = response.data.next_cursor ?? null
+      } catch (error) {
+        this.error = 'スレッド一覧の取得に失敗しました'
+        console.error('Failed to fetch more threads:', error)
+        throw error
+      } finally {
+        this.loadingMore = false
+      }
+    },
+
     /**
      * 新規スレッドを作成
      * @param {string} title - スレッドのタイトル